@@ -0,0 +1,167 @@
+# Admission control simulation: a burst of new callers lands on the app while active sessions are
+# mid-conversation, against fake upstreams that enforce provider limits (Gemini: N concurrent
+# requests, AssemblyAI: N transcription jobs in progress; 429 + Retry-After past them). Each mode runs in a fresh
+# process (the settings are read at import):
+#   none      - no admission control, no retries (every call fires immediately, 429s become errors)
+#   retry     - no admission control, fast retries (what naive clients do: a retry storm)
+#   admission - per-upstream limits, fair queue with priority for active sessions, busy fast-fail
+#               and jittered backoff that backs off on Retry-After
+#
+#   python -m benchmarks.admission_sim --active 8 --burst 40
+#
+# Turns go through POST /process-audio with batch STT. A turn is "ok" with a real reply and audio,
+# "busy" when the cached busy phrase came back, "error" otherwise.
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.fake_upstreams import UpstreamProfile, build_app, free_port, silent_wav, start_server, stop_server
+
+PARENT_ENV = dict(os.environ)
+PORT = free_port()
+os.environ.setdefault("GEMINI_API_BASE", f"http://127.0.0.1:{PORT}")
+os.environ.setdefault("MURF_WS_URL", f"ws://127.0.0.1:{PORT}/v1/speech/stream-input")
+os.environ.setdefault("ASSEMBLY_API_BASE", f"http://127.0.0.1:{PORT}")
+os.environ.setdefault("ASSEMBLY_STREAMING_URL", f"ws://127.0.0.1:{PORT}/v3/ws")
+os.environ.setdefault("STT_BACKEND", "batch")
+os.environ.setdefault("RESPONSE_CACHE", "0")
+os.environ.setdefault("TOOLS_ENABLED", "0")
+os.environ.setdefault("TTS_CACHE_DIR", tempfile.mkdtemp(prefix="nick-bench-tts-"))
+os.environ.setdefault("LOG_LEVEL", "ERROR")
+
+GEMINI_LIMIT = 8
+STT_JOBS = 8
+
+MODES = {
+    "none": {"ADMISSION": "0", "RETRY_ATTEMPTS": "0"},
+    "retry": {"ADMISSION": "0", "RETRY_ATTEMPTS": "4", "RETRY_BASE_DELAY": "0.02", "RETRY_MAX_DELAY": "0.1"},
+    # The limits match the providers'; a transcription holds its slot from upload to result
+    "admission": {
+        "ADMISSION": "1", "ADMIT_GEMINI_CONCURRENCY": str(GEMINI_LIMIT), "ADMIT_ASSEMBLYAI_CONCURRENCY": str(STT_JOBS),
+    },
+}
+
+
+def classify(result: dict) -> str:
+    if result.get("busy"):
+        return "busy"
+    reply = result.get("gemini") or ""
+    if result.get("error") or not result.get("audio_base64") or reply.startswith(("[", "Sorry")):
+        return "error"
+    return "ok"
+
+
+async def caller(client, session_id: str, kind: str, turns: int, deadline: float, audio: bytes, results: list,
+                 delay: float = 0.0):
+    await asyncio.sleep(delay)
+    for _ in range(turns):
+        if time.perf_counter() > deadline:
+            return
+        started = time.perf_counter()
+        resp = await client.post(f"/process-audio/{session_id}", files={"file": ("turn.wav", audio, "audio/wav")})
+        results.append((kind, classify(resp.json()), time.perf_counter() - started))
+        # The caller listens to the reply before speaking again
+        await asyncio.sleep(1.0)
+
+
+async def run(args) -> dict:
+    import httpx
+    import main as nick
+    from services import connections
+
+    profile = UpstreamProfile(
+        gemini_first_token=0.3, gemini_token_interval=0.02, stt_processing=0.4, murf_first_audio=0.1,
+        murf_chunk_interval=0.02, jitter=0.2, gemini_limit=GEMINI_LIMIT, stt_jobs=STT_JOBS,
+    )
+    fakes = build_app(profile)
+    server = await start_server(fakes, PORT)
+    audio = silent_wav(1.0)
+    results = []
+    try:
+        await connections.startup()
+        # Let the busy phrase get into the TTS cache, as it is at startup
+        await nick.tts_cache.prewarm([(nick.murf_cache_key(nick.BUSY_PHRASE), lambda: nick.murf_tts_live(nick.BUSY_PHRASE))])
+        transport = httpx.ASGITransport(app=nick.app)
+        limits = httpx.Limits(max_connections=None)
+        async with httpx.AsyncClient(transport=transport, base_url="http://nick", timeout=120, limits=limits) as client:
+            deadline = time.perf_counter() + args.duration
+            # Active sessions start spread over two seconds and keep talking until the deadline
+            active = [
+                asyncio.create_task(caller(client, f"active-{i}", "active", 1000, deadline, audio, results,
+                                           2.0 * i / max(args.active, 1)))
+                for i in range(args.active)
+            ]
+            # The burst: new callers arriving over half a second, two turns each
+            await asyncio.sleep(args.burst_at)
+            burst = []
+            for i in range(args.burst):
+                burst.append(asyncio.create_task(caller(client, f"new-{i}", "new", 2, deadline + 30, audio, results)))
+                await asyncio.sleep(0.5 / max(args.burst, 1))
+            await asyncio.gather(*active, *burst)
+        stats = nick.admission.stats()
+    finally:
+        await connections.shutdown()
+        await stop_server(*server)
+    return {
+        "results": results,
+        "throttled": fakes.state.throttled,
+        "gemini_peak": fakes.state.gemini_peak,
+        "admission": {name: {k: s[k] for k in ("rejected", "timeouts", "retries", "throttled")}
+                      for name, s in stats["upstreams"].items() if s["admitted"] or s["rejected"]},
+    }
+
+
+def run_mode(mode: str, args) -> dict:
+    env = dict(PARENT_ENV, **MODES[mode])
+    cmd = [sys.executable, "-m", "benchmarks.admission_sim", "--child", "--active", str(args.active),
+           "--burst", str(args.burst), "--burst-at", str(args.burst_at), "--duration", str(args.duration)]
+    out = subprocess.run(cmd, env=env, capture_output=True, text=True, check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def summarize(results: list, kind: str) -> str:
+    rows = [r for r in results if r[0] == kind]
+    ok = sorted(seconds for _, outcome, seconds in rows if outcome == "ok")
+    busy = [seconds for _, outcome, seconds in rows if outcome == "busy"]
+    errors = sum(1 for r in rows if r[1] == "error")
+
+    def pct(values, q):
+        return statistics.quantiles(values, n=100)[q - 1] * 1000 if len(values) > 1 else (values or [0])[0] * 1000
+    return (f"{kind:<8}{len(rows):>6}{len(ok):>6}{len(busy):>6}{errors:>7}"
+            f"{pct(ok, 50):>9.0f}{pct(ok, 95):>8.0f}{pct(busy, 50):>10.0f}")
+
+
+def main(args) -> int:
+    print(f"{args.active} active sessions, burst of {args.burst} new callers at {args.burst_at:.0f} s;"
+          f" upstream limits: Gemini {GEMINI_LIMIT} concurrent, AssemblyAI {STT_JOBS} jobs")
+    for mode in MODES:
+        r = run_mode(mode, args)
+        print(f"\n{mode}: upstream 429s gemini {r['throttled']['gemini']}, assemblyai {r['throttled']['assemblyai']};"
+              f" Gemini peak concurrency {r['gemini_peak']}")
+        print(f"{'callers':<8}{'turns':>6}{'ok':>6}{'busy':>6}{'errors':>7}{'ok p50':>9}{'ok p95':>8}{'busy p50':>10}  (ms)")
+        for kind in ("active", "new"):
+            print(summarize(r["results"], kind))
+        for name, counters in r["admission"].items():
+            print(f"  admission {name}: {counters}")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Admission control under a burst against rate-limited fakes")
+    parser.add_argument("--active", type=int, default=8, help="sessions talking throughout")
+    parser.add_argument("--burst", type=int, default=40, help="new callers arriving at once")
+    parser.add_argument("--burst-at", type=float, default=3.0, help="seconds into the run")
+    parser.add_argument("--duration", type=float, default=15.0, help="seconds the active sessions keep talking")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        print(json.dumps(asyncio.run(run(args))))
+    else:
+        sys.exit(main(args))
@@ -0,0 +1,191 @@
+# Barge-in check: cancel turns at random points and measure how fast they stop.
+#
+#   python -m benchmarks.barge_in --trials 30
+#
+# Each trial starts a turn against local fake Gemini/Murf servers, interrupts it somewhere between
+# "still waiting on Gemini" and "audio playing", and then checks that no audio from the old turn
+# reaches the client, that Murf was told to clear the context, and that no upstream connections
+# were left behind. Then --disconnects /ws/voice sessions (voice_agent_ws) end before their first
+# final transcript, while the session's Murf socket is still being dialed, and must leave no pooled
+# socket checked out. Every task either part starts (turns, dials, Murf readers, the session's
+# receiver) must be done when it is over. Exits non-zero if any check fails.
+
+import argparse
+import asyncio
+import contextvars
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+from benchmarks.fake_upstreams import UpstreamProfile, build_app, free_port, start_server, stop_server
+
+PORT = free_port()
+os.environ.setdefault("GEMINI_API_BASE", f"http://127.0.0.1:{PORT}")
+os.environ.setdefault("MURF_WS_URL", f"ws://127.0.0.1:{PORT}/v1/speech/stream-input")
+os.environ.setdefault("ASSEMBLY_STREAMING_URL", f"ws://127.0.0.1:{PORT}/v3/ws")
+os.environ.setdefault("TTS_CACHE_DIR", tempfile.mkdtemp(prefix="nick-bench-tts-"))
+
+from services.connections import http_client, murf_pool  # noqa: E402
+from services.murf_ws import MurfSession  # noqa: E402
+from services.turns import TurnScheduler  # noqa: E402
+from services.voice_stream_ws import run_turn, voice_agent_ws  # noqa: E402
+
+SETTLE = 0.3  # how long to watch for stray audio after a cancel
+
+
+class RecordingSocket:
+    def __init__(self):
+        self.audio_bytes = 0
+        self.first_audio = None
+
+    async def send_json(self, data):
+        pass
+
+    async def send_bytes(self, data):
+        if self.first_audio is None:
+            self.first_audio = time.perf_counter()
+        self.audio_bytes += len(data)
+
+
+class LeavingSocket(RecordingSocket):
+    # A /ws/voice client that sends its config and hangs up before saying anything
+    query_params = {}
+
+    def __init__(self):
+        super().__init__()
+        self.messages = [{"type": "websocket.receive", "text": '{"input_format": "pcm16_16000"}'}]
+
+    async def accept(self):
+        pass
+
+    async def receive(self):
+        return self.messages.pop() if self.messages else {"type": "websocket.disconnect"}
+
+    async def close(self, code: int = 1000):
+        pass
+
+
+def busy_http_connections() -> int:
+    pool = http_client("gemini")._transport._pool
+    return sum(1 for conn in pool.connections if not conn.is_idle())
+
+
+async def trial(murf: MurfSession, turns: TurnScheduler, interrupt_after: float):
+    websocket = RecordingSocket()
+    await turns.start(run_turn(websocket, "Tell me something long", murf, "pcm16_24000"))
+    await asyncio.sleep(interrupt_after)
+    playing = websocket.first_audio is not None
+    started = time.perf_counter()
+    interrupted = await turns.cancel()
+    latency = time.perf_counter() - started
+    heard = websocket.audio_bytes
+    await asyncio.sleep(SETTLE)
+    return {
+        "interrupted": interrupted,
+        "playing": playing,
+        "latency": latency,
+        "stray_bytes": websocket.audio_bytes - heard,
+    }
+
+
+async def barge_ins(app, trials: int) -> list:
+    murf = MurfSession()
+    await murf.connect()
+    turns = TurnScheduler()
+    results = [await trial(murf, turns, random.uniform(0.05, 1.5)) for _ in range(trials)]
+    await turns.close()
+    await asyncio.sleep(SETTLE)
+
+    latencies = [r["latency"] for r in results if r["interrupted"]]
+    playing = sum(r["playing"] for r in results)
+    print(f"{len(latencies)}/{trials} turns interrupted ({playing} while audio was playing)")
+    if latencies:
+        print(f"cancel latency p50 {statistics.median(latencies) * 1000:6.1f} ms"
+              f"  max {max(latencies) * 1000:6.1f} ms  (deadline {turns.deadline * 1000:.0f} ms)")
+    stray = sum(r["stray_bytes"] for r in results)
+    print(f"Murf clears sent: {app.state.murf_clears} | stray audio bytes: {stray}"
+          f" | open Murf contexts: {len(murf._contexts)} | busy Gemini connections: {busy_http_connections()}")
+
+    failures = []
+    if turns.overruns:
+        failures.append(f"{turns.overruns} cancellations exceeded the deadline")
+    if stray:
+        failures.append("audio reached the client after cancel returned")
+    if murf._contexts:
+        failures.append("Murf contexts left open")
+    if busy_http_connections():
+        failures.append("Gemini streams left open")
+    await murf.close()
+    return failures
+
+
+async def disconnects(sessions: int) -> list:
+    for _ in range(sessions):
+        await voice_agent_ws(LeavingSocket())
+    print(f"{sessions} sessions closed before a final transcript | Murf sockets in use: {murf_pool._in_use}"
+          f" | dialing: {murf_pool._dialing}")
+    failures = []
+    if murf_pool._in_use or murf_pool._dialing:
+        failures.append("Murf sockets left checked out by closed sessions")
+    # Sockets handed back for reuse keep their tasks until the pool closes
+    await murf_pool.close()
+    return failures
+
+
+# Tasks started while a check runs, by it or by any task it started (they inherit the context)
+TRACKED = contextvars.ContextVar("tracked", default=None)
+
+
+def task_factory(loop, coro, **kwargs):
+    task = asyncio.Task(coro, loop=loop, **kwargs)
+    tasks = TRACKED.get()
+    if tasks is not None:
+        tasks.append(task)
+    return task
+
+
+async def run_tracked(name: str, check) -> list:
+    # Runs check() and fails it if any task it started (session, turn, dial, Murf reader, ...)
+    # is still running once it is over
+    tasks = []
+
+    async def tracked():
+        TRACKED.set(tasks)
+        return await check()
+
+    failures = await asyncio.create_task(tracked())
+    await asyncio.sleep(SETTLE)
+    running = [task for task in tasks if not task.done()]
+    print(f"{name}: {len(tasks)} tasks started, {len(running)} still running")
+    for task in running[:5]:
+        print(f"  still running: {task.get_coro().__qualname__}")
+    if running:
+        failures.append(f"{name}: orphaned tasks")
+    return failures
+
+
+async def main(trials: int, sessions: int, seed: int):
+    random.seed(seed)
+    asyncio.get_running_loop().set_task_factory(task_factory)
+    app = build_app(UpstreamProfile(jitter=0.2))
+    server = await start_server(app, PORT)
+    try:
+        failures = await run_tracked("barge-in", lambda: barge_ins(app, trials))
+        failures += await run_tracked("early disconnects", lambda: disconnects(sessions))
+    finally:
+        await stop_server(*server)
+    for failure in failures:
+        print("FAIL:", failure)
+    return not failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Barge-in cancellation check")
+    parser.add_argument("--trials", type=int, default=30)
+    parser.add_argument("--disconnects", type=int, default=10, help="sessions that hang up before a final transcript")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    sys.exit(0 if asyncio.run(main(args.trials, args.disconnects, args.seed)) else 1)
@@ -0,0 +1,103 @@
+# Audio conversion throughput: audio-seconds processed per CPU-second.
+#
+#   python -m benchmarks.codec_throughput --seconds 60
+#   python -m benchmarks.codec_throughput --wav path/to/fixture.wav
+#
+# Without --wav a speech-like test signal is generated. The ffmpeg stages run only if ffmpeg is installed.
+
+import argparse
+import asyncio
+import os
+import resource
+import tempfile
+import time
+import numpy as np
+
+os.environ.setdefault("TTS_CACHE_DIR", tempfile.mkdtemp(prefix="nick-bench-tts-"))
+
+from services.audio_codec import FFMPEG, Resampler, WavFragmentResampler, parse_wav_header, wav_header, wav_to_opus  # noqa: E402
+
+CHUNK_SECONDS = 0.1
+
+
+def test_signal(seconds: float, sample_rate: int = 44100) -> bytes:
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    envelope = 0.5 + 0.5 * np.sin(2 * np.pi * 3 * t)
+    signal = envelope * (np.sin(2 * np.pi * 220 * t) + 0.3 * np.sin(2 * np.pi * 1800 * t))
+    return (signal * 9000).astype("<i2").tobytes()
+
+
+def load_wav(path: str):
+    with open(path, "rb") as f:
+        data = f.read()
+    header = parse_wav_header(data)
+    if header is None or header[1] != 1 or header[2] != 16:
+        raise SystemExit("fixture must be a mono PCM16 WAV")
+    return data[header[3]:], header[0]
+
+
+def chunks_of(pcm: bytes, sample_rate: int):
+    size = int(sample_rate * CHUNK_SECONDS) * 2
+    view = memoryview(pcm)
+    return [view[i:i + size] for i in range(0, len(view), size)]
+
+
+def bench_resampler(pcm: bytes, in_rate: int, out_rate: int) -> float:
+    resampler = Resampler(in_rate, out_rate)
+    chunks = chunks_of(pcm, in_rate)
+    started = time.process_time()
+    for chunk in chunks:
+        resampler.process(chunk)
+    return time.process_time() - started
+
+
+def bench_fragments(pcm: bytes, in_rate: int, out_rate: int) -> float:
+    # Murf-style WAV fragments in, WAV fragments out
+    fragments = [wav_header(in_rate, len(c)) + bytes(c) for c in chunks_of(pcm, in_rate)]
+    resampler = WavFragmentResampler(out_rate)
+    started = time.process_time()
+    for fragment in fragments:
+        resampler.process(fragment)
+    return time.process_time() - started
+
+
+async def bench_opus(pcm: bytes, in_rate: int) -> float:
+    async def source():
+        yield wav_header(in_rate)
+        for chunk in chunks_of(pcm, in_rate):
+            yield bytes(chunk)
+
+    started = time.process_time()
+    async for _ in wav_to_opus().transcode(source()):
+        pass
+    # ffmpeg runs in a child process, so count its CPU time too
+    child = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return time.process_time() - started + child.ru_utime + child.ru_stime
+
+
+def report(name: str, audio_seconds: float, cpu_seconds: float):
+    rate = audio_seconds / cpu_seconds if cpu_seconds else float("inf")
+    print(f"{name:<28} {audio_seconds:7.1f} s audio in {cpu_seconds * 1000:8.1f} ms CPU  ->  {rate:9.0f}x realtime")
+
+
+def main(seconds: float, wav: str):
+    if wav:
+        pcm, rate = load_wav(wav)
+    else:
+        pcm, rate = test_signal(seconds), 44100
+    audio_seconds = len(pcm) / 2 / rate
+    for out_rate in (24000, 22050, 16000):
+        report(f"resample {rate}->{out_rate}", audio_seconds, bench_resampler(pcm, rate, out_rate))
+    report(f"wav fragments {rate}->24000", audio_seconds, bench_fragments(pcm, rate, 24000))
+    if FFMPEG:
+        report("opus encode (ffmpeg)", audio_seconds, asyncio.run(bench_opus(pcm, rate)))
+    else:
+        print("opus encode (ffmpeg)         skipped, ffmpeg not installed")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Audio conversion throughput")
+    parser.add_argument("--seconds", type=float, default=60.0)
+    parser.add_argument("--wav", default="")
+    args = parser.parse_args()
+    main(args.seconds, args.wav)
@@ -0,0 +1,97 @@
+# Prompt size and Gemini request latency vs. conversation length for three context strategies:
+#   last exchange - previous bot reply + latest user message (the old behaviour)
+#   full history  - every stored turn
+#   budgeted      - services.context.ContextBuilder (token budget + background rolling summary)
+#
+#   python -m benchmarks.context_budget --exchanges 100 --budget 1500
+#
+# Runs against the local fake Gemini, whose prompt processing time grows with prompt size.
+
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+from benchmarks.fake_upstreams import UpstreamProfile, build_app, free_port, start_server, stop_server
+
+PORT = free_port()
+os.environ.setdefault("GEMINI_API_BASE", f"http://127.0.0.1:{PORT}")
+os.environ.setdefault("TTS_CACHE_DIR", tempfile.mkdtemp(prefix="nick-bench-tts-"))
+
+from services.connections import GEMINI_API_BASE, http_client, shutdown  # noqa: E402
+from services.context import ContextBuilder, prompt_tokens  # noqa: E402
+from services.sessions import MemorySessionStore  # noqa: E402
+
+CHECKPOINTS = (1, 5, 10, 25, 50, 100, 200)
+USER_LINES = [
+    "What's a good way to get started with running if I've never done it before?",
+    "How often should I run in the first month, and how long should each run be?",
+    "My knees hurt a little after yesterday, should I take a break or keep going?",
+    "Can you suggest a simple stretching routine I can do in under ten minutes?",
+]
+
+
+def last_exchange(history):
+    contents = []
+    if len(history) >= 2 and history[-2].role == "bot":
+        contents.append({"role": "model", "parts": [{"text": history[-2].text}]})
+    contents.append({"role": "user", "parts": [{"text": history[-1].text}]})
+    return contents
+
+
+def full_history(history):
+    return [{"role": "model" if t.role == "bot" else "user", "parts": [{"text": t.text}]} for t in history]
+
+
+async def ask(contents):
+    url = f"{GEMINI_API_BASE}/v1beta/models/gemini-2.0-flash:generateContent?key=bench"
+    started = time.perf_counter()
+    resp = await http_client("gemini").post(url, json={"contents": contents})
+    resp.raise_for_status()
+    return time.perf_counter() - started, resp.json()["candidates"][0]["content"]["parts"][0]["text"]
+
+
+async def conversation(name, exchanges, budget):
+    store = MemorySessionStore(max_turns=exchanges * 2 + 2)
+    builder = ContextBuilder(store, budget=budget)
+    rows, build_times = {}, []
+    for i in range(1, exchanges + 1):
+        await store.append("bench", "user", USER_LINES[i % len(USER_LINES)])
+        history = await store.history("bench")
+        started = time.perf_counter()
+        if name == "budgeted":
+            contents = await builder.build("bench", history)
+        else:
+            contents = last_exchange(history) if name == "last exchange" else full_history(history)
+        build_times.append(time.perf_counter() - started)
+        latency, reply = await ask(contents)
+        await store.append("bench", "bot", reply)
+        if i in CHECKPOINTS:
+            rows[i] = (prompt_tokens(contents), latency)
+    await builder.close()
+    return rows, build_times, builder.summaries
+
+
+async def main(exchanges: int, budget: int):
+    profile = UpstreamProfile(gemini_first_token=0.05, gemini_token_interval=0.002, gemini_prefill_per_1k=0.08)
+    server = await start_server(build_app(profile), PORT)
+    try:
+        for name in ("last exchange", "full history", "budgeted"):
+            rows, build_times, summaries = await conversation(name, exchanges, budget)
+            print(f"{name} (context build p50 {statistics.median(build_times) * 1e6:.0f} us"
+                  + (f", {summaries} background summaries)" if name == "budgeted" else ")"))
+            for i, (tokens, latency) in rows.items():
+                print(f"  exchange {i:4d}: prompt {tokens:6d} tokens, Gemini {latency * 1000:7.1f} ms")
+    finally:
+        await shutdown()
+        await stop_server(*server)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Context size vs. conversation length")
+    parser.add_argument("--exchanges", type=int, default=100)
+    parser.add_argument("--budget", type=int, default=1500)
+    args = parser.parse_args()
+    asyncio.run(main(args.exchanges, args.budget))
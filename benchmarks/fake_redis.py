@@ -0,0 +1,190 @@
+# A local Redis stand-in for SESSION_STORE=redis: an asyncio RESP2 server holding strings, lists
+# and hashes in memory with key expiry, enough for services.sessions.RedisSessionStore.
+#
+#   python -m benchmarks.fake_redis --port 6399
+#
+# Or in-process: server = await start_fake_redis(port) ... server.close()
+
+import argparse
+import asyncio
+import time
+
+WRONGTYPE = "WRONGTYPE Operation against a key holding the wrong kind of value"
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+        self.expires = {}
+        self.commands = 0
+
+    def _live(self, key):
+        deadline = self.expires.get(key)
+        if deadline is not None and time.monotonic() >= deadline:
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+        return self.data.get(key)
+
+    def _typed(self, key, kind, create: bool = False):
+        value = self._live(key)
+        if value is None and create:
+            value = self.data[key] = kind()
+        if value is not None and not isinstance(value, kind):
+            raise TypeError(WRONGTYPE)
+        return value
+
+    def execute(self, name: str, args: list):
+        self.commands += 1
+        handler = getattr(self, "cmd_" + name.lower(), None)
+        if handler is None:
+            return Exception(f"ERR unknown command '{name}'")
+        try:
+            return handler(*args)
+        except TypeError as e:
+            message = str(e)
+            return Exception(message if message.startswith("WRONGTYPE") else f"ERR wrong arguments for '{name}'")
+        except ValueError:
+            return Exception("ERR value is not an integer or out of range")
+
+    def cmd_ping(self, *args):
+        return "PONG"
+
+    def cmd_auth(self, *args):
+        return "OK"
+
+    def cmd_select(self, db):
+        return "OK"
+
+    def cmd_flushall(self, *args):
+        self.data.clear()
+        self.expires.clear()
+        return "OK"
+
+    def cmd_dbsize(self):
+        return sum(1 for key in list(self.data) if self._live(key) is not None)
+
+    def cmd_get(self, key):
+        return self._typed(key, bytes)
+
+    def cmd_set(self, key, value):
+        self.data[key] = value
+        self.expires.pop(key, None)
+        return "OK"
+
+    def cmd_del(self, *keys):
+        removed = 0
+        for key in keys:
+            if self._live(key) is not None:
+                del self.data[key]
+                removed += 1
+            self.expires.pop(key, None)
+        return removed
+
+    def cmd_exists(self, *keys):
+        return sum(1 for key in keys if self._live(key) is not None)
+
+    def cmd_pexpire(self, key, ms):
+        if self._live(key) is None:
+            return 0
+        self.expires[key] = time.monotonic() + int(ms) / 1000
+        return 1
+
+    def cmd_expire(self, key, seconds):
+        return self.cmd_pexpire(key, int(seconds) * 1000)
+
+    def cmd_rpush(self, key, *values):
+        items = self._typed(key, list, create=True)
+        items.extend(values)
+        return len(items)
+
+    def cmd_lrange(self, key, start, stop):
+        items = self._typed(key, list) or []
+        start, stop = int(start), int(stop)
+        start = max(start + len(items), 0) if start < 0 else start
+        stop = stop + len(items) if stop < 0 else stop
+        return items[start:stop + 1]
+
+    def cmd_ltrim(self, key, start, stop):
+        items = self._typed(key, list)
+        if items is not None:
+            items[:] = self.cmd_lrange(key, start, stop)
+            if not items:
+                self.cmd_del(key)
+        return "OK"
+
+    def cmd_hset(self, key, *pairs):
+        fields = self._typed(key, dict, create=True)
+        added = sum(1 for field in pairs[::2] if field not in fields)
+        fields.update(zip(pairs[::2], pairs[1::2]))
+        return added
+
+    def cmd_hmget(self, key, *names):
+        fields = self._typed(key, dict) or {}
+        return [fields.get(name) for name in names]
+
+    def cmd_hgetall(self, key):
+        fields = self._typed(key, dict) or {}
+        return [item for pair in fields.items() for item in pair]
+
+
+def encode_reply(reply) -> bytes:
+    if isinstance(reply, Exception):
+        return b"-%s\r\n" % str(reply).encode()
+    if isinstance(reply, str):
+        return b"+%s\r\n" % reply.encode()
+    if isinstance(reply, int):
+        return b":%d\r\n" % reply
+    if reply is None:
+        return b"$-1\r\n"
+    if isinstance(reply, bytes):
+        return b"$%d\r\n%s\r\n" % (len(reply), reply)
+    return b"*%d\r\n" % len(reply) + b"".join(encode_reply(item) for item in reply)
+
+
+async def read_command(reader: asyncio.StreamReader):
+    line = await reader.readline()
+    if not line:
+        return None
+    if not line.startswith(b"*"):
+        # Inline command (redis-cli / telnet style)
+        return line.split()
+    args = []
+    for _ in range(int(line[1:-2])):
+        size = int((await reader.readline())[1:-2])
+        args.append((await reader.readexactly(size + 2))[:-2])
+    return args
+
+
+async def start_fake_redis(port: int, host: str = "127.0.0.1", store: FakeRedis = None):
+    store = store or FakeRedis()
+
+    async def serve(reader, writer):
+        try:
+            while (command := await read_command(reader)) is not None:
+                if command:
+                    writer.write(encode_reply(store.execute(command[0].decode(), command[1:])))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(serve, host, port)
+    server.store = store
+    return server
+
+
+async def main(port: int):
+    server = await start_fake_redis(port)
+    print(f"fake redis on 127.0.0.1:{port}", flush=True)
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="In-memory Redis stand-in for SESSION_STORE=redis")
+    parser.add_argument("--port", type=int, default=6379)
+    try:
+        asyncio.run(main(parser.parse_args().port))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,347 @@
+# Local stand-ins for the Gemini, Murf and AssemblyAI APIs, used by the benchmarks in this folder.
+# Nothing here talks to the network; latencies are simulated with asyncio.sleep.
+
+import asyncio
+import base64
+import json
+import random
+import socket
+import threading
+import time
+import uuid
+import uvicorn
+from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from starlette.requests import ClientDisconnect
+
+DEFAULT_REPLY = (
+    "Hey there, it's Nick! The weather looks lovely today, perfect for a walk. "
+    "If you want, I can check the forecast for your city. "
+    "Or we could just chat for a bit, whatever you like."
+)
+DEFAULT_TRANSCRIPT = "Hi Nick, how is the weather today?"
+
+
+class UpstreamProfile:
+    def __init__(
+        self,
+        gemini_first_token: float = 0.35,
+        gemini_token_interval: float = 0.04,
+        gemini_prefill_per_1k: float = 0.0,
+        words_per_token: int = 3,
+        murf_handshake: float = 0.12,
+        murf_first_audio: float = 0.15,
+        murf_chunk_interval: float = 0.05,
+        chars_per_chunk: int = 40,
+        stt_processing: float = 0.7,
+        stt_partial_every: float = 0.3,
+        stt_final_delay: float = 0.15,
+        tool_latency: float = 0.2,
+        jitter: float = 0.0,
+        gemini_limit: int = 0,
+        stt_jobs: int = 0,
+        upload_bandwidth: float = 0.0,
+        gemini_models: dict = None,
+        gemini_tail: float = 0.0,
+        gemini_tail_scale: float = 4.0,
+        reply: str = DEFAULT_REPLY,
+        transcript: str = DEFAULT_TRANSCRIPT,
+    ):
+        self.gemini_first_token = gemini_first_token
+        self.gemini_token_interval = gemini_token_interval
+        self.gemini_prefill_per_1k = gemini_prefill_per_1k
+        self.words_per_token = words_per_token
+        self.murf_handshake = murf_handshake
+        self.murf_first_audio = murf_first_audio
+        self.murf_chunk_interval = murf_chunk_interval
+        self.chars_per_chunk = chars_per_chunk
+        self.stt_processing = stt_processing
+        self.stt_partial_every = stt_partial_every
+        self.stt_final_delay = stt_final_delay
+        self.tool_latency = tool_latency
+        self.jitter = jitter
+        # Provider-side limits (0 = none): concurrent Gemini requests, AssemblyAI transcription jobs
+        # in progress. Past them the fake answers 429 with Retry-After, like the real APIs.
+        self.gemini_limit = gemini_limit
+        self.stt_jobs = stt_jobs
+        # AssemblyAI /v2/upload speed in bytes/s (0 = unlimited): the upload of a recording takes time
+        self.upload_bandwidth = upload_bandwidth
+        # Gemini first-token time per model (a multiplier, 1.0 for models not listed), and a heavy
+        # tail: gemini_tail of the requests wait gemini_tail_scale x Pareto(1.5) times longer
+        self.gemini_models = gemini_models or {}
+        self.gemini_tail = gemini_tail
+        self.gemini_tail_scale = gemini_tail_scale
+        self.reply = reply
+        self.transcript = transcript
+
+    def delay(self, seconds: float) -> float:
+        if self.jitter:
+            seconds *= random.uniform(1 - self.jitter, 1 + self.jitter)
+        return max(seconds, 0.0)
+
+    def first_token(self, model: str) -> float:
+        seconds = self.gemini_first_token * self.gemini_models.get(model, 1.0)
+        if self.gemini_tail and random.random() < self.gemini_tail:
+            seconds *= self.gemini_tail_scale * random.paretovariate(1.5)
+        return self.delay(seconds)
+
+
+def reply_tokens(profile: UpstreamProfile) -> list:
+    words = profile.reply.split(" ")
+    step = profile.words_per_token
+    return [" ".join(words[i:i + step]) + (" " if i + step < len(words) else "") for i in range(0, len(words), step)]
+
+
+def fake_audio(text: str, profile: UpstreamProfile) -> list:
+    # ~0.1 s of 44.1 kHz PCM16 silence per chunk, like a Murf WAV fragment
+    n_chunks = max(1, -(-len(text) // profile.chars_per_chunk))
+    return [bytes(8820) for _ in range(n_chunks)]
+
+
+def build_app(profile: UpstreamProfile) -> FastAPI:
+    app = FastAPI()
+
+    app.state.gemini_prompt_tokens = []
+    app.state.throttled = {"gemini": 0, "assemblyai": 0}
+    app.state.gemini_active = 0
+    app.state.gemini_peak = 0
+    app.state.gemini_requests = {}  # model -> requests
+    app.state.gemini_cancelled = 0  # streams the client hung up on before the last token
+
+    def too_many(upstream: str) -> JSONResponse:
+        app.state.throttled[upstream] += 1
+        return JSONResponse({"error": "rate limited"}, status_code=429, headers={"Retry-After": "1"})
+
+    @app.post("/v1beta/models/{model_action}")
+    async def gemini(model_action: str, request: Request):
+        if profile.gemini_limit and app.state.gemini_active >= profile.gemini_limit:
+            return too_many("gemini")
+        app.state.gemini_active += 1
+        model = model_action.split(":")[0]
+        app.state.gemini_requests[model] = app.state.gemini_requests.get(model, 0) + 1
+        app.state.gemini_peak = max(app.state.gemini_peak, app.state.gemini_active)
+        try:
+            body = await request.body()
+        except ClientDisconnect:
+            # Cancelled (e.g. a hedge that lost) before its prompt was even read
+            app.state.gemini_active -= 1
+            app.state.gemini_cancelled += 1
+            return Response(status_code=499)
+        try:
+            return await answer_gemini(model_action, body)
+        finally:
+            if model_action.endswith(":generateContent"):
+                app.state.gemini_active -= 1
+
+    async def answer_gemini(model_action: str, body: bytes):
+        tokens = reply_tokens(profile)
+        # Prompt processing time grows with the prompt (~4 characters per token)
+        prompt_tokens = len(body) // 4
+        app.state.gemini_prompt_tokens.append(prompt_tokens)
+        prefill = profile.gemini_prefill_per_1k * prompt_tokens / 1000
+        first_token = profile.first_token(model_action.split(":")[0])
+        if model_action.endswith(":generateContent"):
+            await asyncio.sleep(profile.delay(prefill + profile.gemini_token_interval * len(tokens)) + first_token)
+            return JSONResponse({"candidates": [{"content": {"parts": [{"text": profile.reply}]}}]})
+
+        async def sse():
+            finished = False
+            try:
+                await asyncio.sleep(profile.delay(prefill) + first_token)
+                for i, token in enumerate(tokens):
+                    if i:
+                        await asyncio.sleep(profile.delay(profile.gemini_token_interval))
+                    data = {"candidates": [{"content": {"parts": [{"text": token}]}}]}
+                    yield f"data: {json.dumps(data)}\r\n\r\n".encode()
+                finished = True
+            finally:
+                app.state.gemini_cancelled += not finished
+                # A streamed request counts against the limit until its last token
+                app.state.gemini_active -= 1
+        return StreamingResponse(sse(), media_type="text/event-stream")
+
+    app.state.murf_clears = 0
+
+    @app.websocket("/v1/speech/stream-input")
+    async def murf(websocket: WebSocket):
+        # Stand-in for DNS + TCP + TLS + WS upgrade on a fresh dial
+        await asyncio.sleep(profile.delay(profile.murf_handshake))
+        await websocket.accept()
+        jobs = asyncio.Queue()
+        cleared = set()
+
+        async def synthesize():
+            while True:
+                context_id, text, end = await jobs.get()
+                if context_id in cleared:
+                    continue
+                if text:
+                    await asyncio.sleep(profile.delay(profile.murf_first_audio))
+                    for chunk in fake_audio(text, profile):
+                        if context_id in cleared:
+                            break
+                        await websocket.send_text(json.dumps({
+                            "context_id": context_id,
+                            "audio": base64.b64encode(chunk).decode(),
+                            "final": False,
+                        }))
+                        await asyncio.sleep(profile.delay(profile.murf_chunk_interval))
+                if end and context_id not in cleared:
+                    await websocket.send_text(json.dumps({"context_id": context_id, "final": True}))
+
+        worker = asyncio.create_task(synthesize())
+        try:
+            while True:
+                msg = json.loads(await websocket.receive_text())
+                if "voice_config" in msg:
+                    continue
+                context_id = msg.get("context_id", "default")
+                if msg.get("clear"):
+                    app.state.murf_clears += 1
+                    cleared.add(context_id)
+                    continue
+                jobs.put_nowait((context_id, msg.get("text"), bool(msg.get("end"))))
+        except WebSocketDisconnect:
+            pass
+        finally:
+            worker.cancel()
+
+    # AssemblyAI batch: upload, create job, poll
+    stt_jobs = {}
+    app.state.stt_polls = 0
+
+    @app.post("/v2/upload")
+    async def upload(request: Request):
+        # Read (and dropped) as it arrives, at upload_bandwidth, like a chunked upload to the real API
+        size, started = 0, time.monotonic()
+        async for chunk in request.stream():
+            size += len(chunk)
+            if profile.upload_bandwidth:
+                await asyncio.sleep(max(0.0, started + size / profile.upload_bandwidth - time.monotonic()))
+        return {"upload_url": f"https://cdn.fake/{uuid.uuid4()}", "bytes": size}
+
+    @app.post("/v2/transcript")
+    async def create_transcript(request: Request):
+        if profile.stt_jobs and sum(1 for ready in stt_jobs.values() if ready > time.monotonic()) >= profile.stt_jobs:
+            return too_many("assemblyai")
+        transcript_id = str(uuid.uuid4())
+        stt_jobs[transcript_id] = time.monotonic() + profile.delay(profile.stt_processing)
+        return {"id": transcript_id, "status": "queued"}
+
+    @app.get("/v2/transcript/{transcript_id}")
+    async def get_transcript(transcript_id: str):
+        app.state.stt_polls += 1
+        if time.monotonic() < stt_jobs[transcript_id]:
+            return {"id": transcript_id, "status": "processing"}
+        return {"id": transcript_id, "status": "completed", "text": profile.transcript}
+
+    # AssemblyAI realtime (v3 streaming): PCM16 in, Turn events out
+    @app.websocket("/v3/ws")
+    async def streaming_stt(websocket: WebSocket):
+        await websocket.accept()
+        sample_rate = int(websocket.query_params.get("sample_rate", "16000"))
+        partial_bytes = int(sample_rate * 2 * profile.stt_partial_every)
+        words = profile.transcript.split()
+        await websocket.send_text(json.dumps({"type": "Begin", "id": str(uuid.uuid4())}))
+        received = 0
+        try:
+            while True:
+                msg = await websocket.receive()
+                if msg["type"] == "websocket.disconnect":
+                    return
+                if msg.get("bytes") is not None:
+                    before = received // partial_bytes
+                    received += len(msg["bytes"])
+                    if received // partial_bytes > before:
+                        n = min(len(words), received // partial_bytes)
+                        await websocket.send_text(json.dumps({
+                            "type": "Turn", "transcript": " ".join(words[:n]), "end_of_turn": False,
+                        }))
+                elif msg.get("text") and json.loads(msg["text"]).get("type") == "ForceEndpoint":
+                    await websocket.send_text(json.dumps({
+                        "type": "Turn", "transcript": profile.transcript, "end_of_turn": True,
+                        "end_of_turn_confidence": 1.0,
+                    }))
+                    received = 0
+                elif msg.get("text") and json.loads(msg["text"]).get("type") == "Terminate":
+                    # Audio since the last endpoint becomes a final turn; nothing pending, no turn
+                    if received:
+                        await asyncio.sleep(profile.delay(profile.stt_final_delay))
+                        await websocket.send_text(json.dumps({
+                            "type": "Turn", "transcript": profile.transcript, "end_of_turn": True,
+                            "end_of_turn_confidence": 0.9,
+                        }))
+                    await websocket.send_text(json.dumps({"type": "Termination"}))
+                    return
+        except WebSocketDisconnect:
+            pass
+
+    # WeatherAPI.com current conditions and Tavily search
+    app.state.tool_calls = 0
+
+    @app.get("/v1/current.json")
+    async def weather(q: str):
+        app.state.tool_calls += 1
+        await asyncio.sleep(profile.delay(profile.tool_latency))
+        return {
+            "location": {"name": q.title(), "country": "Testland"},
+            "current": {"temp_c": 24.0, "feelslike_c": 26.0, "condition": {"text": "Partly cloudy"}},
+        }
+
+    @app.post("/search")
+    async def search(payload: dict):
+        app.state.tool_calls += 1
+        await asyncio.sleep(profile.delay(profile.tool_latency))
+        return {"answer": f"Fake answer for {payload.get('query')}", "results": []}
+
+    return app
+
+
+def silent_wav(seconds: float, sample_rate: int = 16000) -> bytes:
+    data_size = int(seconds * sample_rate) * 2
+    header = (
+        b"RIFF" + (36 + data_size).to_bytes(4, "little") + b"WAVE"
+        + b"fmt " + (16).to_bytes(4, "little") + (1).to_bytes(2, "little") + (1).to_bytes(2, "little")
+        + sample_rate.to_bytes(4, "little") + (sample_rate * 2).to_bytes(4, "little")
+        + (2).to_bytes(2, "little") + (16).to_bytes(2, "little")
+        + b"data" + data_size.to_bytes(4, "little")
+    )
+    return header + bytes(data_size)
+
+
+def free_port(host: str = "127.0.0.1") -> int:
+    with socket.socket() as sock:
+        sock.bind((host, 0))
+        return sock.getsockname()[1]
+
+
+async def start_server(app: FastAPI, port: int, host: str = "127.0.0.1"):
+    config = uvicorn.Config(app, host=host, port=port, log_level="warning", lifespan="off", ws_ping_interval=None)
+    server = uvicorn.Server(config)
+    task = asyncio.create_task(server.serve())
+    while not server.started:
+        if task.done():
+            task.result()
+        await asyncio.sleep(0.01)
+    return server, task
+
+
+async def stop_server(server, task):
+    server.should_exit = True
+    await task
+
+
+def start_server_thread(app: FastAPI, port: int, host: str = "127.0.0.1", lifespan: str = "off"):
+    # For measuring blocking clients: a server on the caller's own loop would never get to answer
+    config = uvicorn.Config(app, host=host, port=port, log_level="warning", lifespan=lifespan, ws_ping_interval=None)
+    server = uvicorn.Server(config)
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    return server, thread
+
+
+def stop_server_thread(server, thread):
+    server.should_exit = True
+    thread.join()
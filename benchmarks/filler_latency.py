@@ -0,0 +1,142 @@
+# Filler audio on slow turns: perceived time to first audio (filler included) vs. the answer's own
+# first audio, with fillers off and on, against slow local fakes of AssemblyAI, Gemini, Murf and
+# WeatherAPI.
+#
+#   python -m benchmarks.filler_latency --turns 6 --after-ms 800
+#
+# Scenarios (the fakes are slowed down one stage at a time):
+#   fast      - default fake latencies; fillers should not fire
+#   slow_stt  - 44.1 kHz upload, so AssemblyAI's batch upload/poll path, 2 s of processing
+#   slow_llm  - 1.8 s to Gemini's first token
+#   tool      - a weather question, with a 1.5 s WeatherAPI lookup before Gemini starts
+# Turns go to /stream-chat (SSE) and /process-audio (frames), half each. Numbers come from the
+# turns' traces: perceived_first_audio, first_audio, and filler_wait_ms (how long the answer
+# queued behind filler audio already at the client).
+
+import argparse
+import asyncio
+import logging
+import os
+import tempfile
+
+from benchmarks.fake_upstreams import UpstreamProfile, build_app, free_port, silent_wav, start_server, stop_server
+
+PORT = free_port()
+os.environ.setdefault("GEMINI_API_BASE", f"http://127.0.0.1:{PORT}")
+os.environ.setdefault("MURF_WS_URL", f"ws://127.0.0.1:{PORT}/v1/speech/stream-input")
+os.environ.setdefault("ASSEMBLY_API_BASE", f"http://127.0.0.1:{PORT}")
+os.environ.setdefault("ASSEMBLY_STREAMING_URL", f"ws://127.0.0.1:{PORT}/v3/ws")
+os.environ.setdefault("WEATHER_API_BASE", f"http://127.0.0.1:{PORT}")
+os.environ.setdefault("RESPONSE_CACHE", "0")
+os.environ.setdefault("TTS_CACHE_DIR", tempfile.mkdtemp(prefix="nick-bench-tts-"))
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+import httpx  # noqa: E402
+
+import main as nick  # noqa: E402
+from services import connections  # noqa: E402
+from services.audio_codec import wav_header  # noqa: E402
+from services.audio_framing import FRAMES_MEDIA_TYPE  # noqa: E402
+from services.pipeline import pipeline  # noqa: E402
+from services.telemetry import get_logger  # noqa: E402
+from services.tts_cache import FILLER_PHRASES, tts_cache  # noqa: E402
+
+SPEECH_SECONDS_PER_CHAR = 0.065
+
+SCENARIOS = {
+    "fast": {},
+    "slow_stt": {"stt_processing": 2.0},
+    "slow_llm": {"gemini_first_token": 1.8},
+    # A new city for each run, so the weather lookup is never served from the tool cache
+    "tool": {"tool_latency": 1.5, "transcript": "What's the weather in {city} today?"},
+}
+
+
+class TurnCollector(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        if record.getMessage() == "turn":
+            self.records.append(record.fields)
+
+
+def pct(values: list, q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))] if values else float("nan")
+
+
+async def run(client, collector, name: str, turns: int):
+    collector.records.clear()
+    audio = silent_wav(1.0, 44100 if name == "slow_stt" else 16000)
+
+    async def one(i):
+        files = {"file": ("turn.wav", audio, "audio/wav")}
+        if i % 2:
+            await client.post(f"/process-audio/{name}-{i}", files=files, headers={"Accept": FRAMES_MEDIA_TYPE})
+        else:
+            await client.post(f"/stream-chat/{name}-{i}", files=files)
+
+    await asyncio.gather(*(one(i) for i in range(turns)))
+    perceived, answer, heard, fillers = [], [], [], 0
+    for record in collector.records:
+        stages = record["stages_ms"]
+        if "first_audio" not in stages:
+            continue
+        answer.append(stages["first_audio"])
+        perceived.append(stages.get("perceived_first_audio", stages["first_audio"]))
+        heard.append(stages["first_audio"] + record.get("filler_wait_ms", 0.0))
+        fillers += record.get("filler", 0)
+    return perceived, answer, heard, fillers, len(collector.records)
+
+
+async def main(turns: int, after_ms: int):
+    profile = UpstreamProfile()
+    defaults = dict(vars(profile))
+    server = await start_server(build_app(profile), PORT)
+    collector = TurnCollector()
+    trace_log = get_logger("trace")
+    trace_log.addHandler(collector)
+    trace_log.setLevel(logging.INFO)
+    trace_log.propagate = False
+    pipeline.filler.after = after_ms / 1000
+    transport = httpx.ASGITransport(app=nick.app)
+    try:
+        await connections.startup(warm_murf=False)
+        # The filler bank, as the app's startup warmup would store it. The fake Murf speaks far
+        # faster than a person, so the phrases get a realistic length instead (SPEECH_SECONDS_PER_CHAR).
+        fragment = wav_header(44100, 8820) + bytes(8820)
+        for text in FILLER_PHRASES:
+            await tts_cache.put(pipeline.tts.cache_key(text),
+                                [fragment] * max(1, round(len(text) * SPEECH_SECONDS_PER_CHAR * 10)))
+        print(f"{turns} turns per row, filler after {after_ms} ms; ms: p50 / p95")
+        print(f"{'scenario':<9} {'filler':<6} {'perceived first audio':>22} {'answer first audio':>20}"
+              f" {'answer heard':>16} {'fillers':>8}")
+        async with httpx.AsyncClient(transport=transport, base_url="http://nick", timeout=60) as client:
+            # Connections to the fakes are opened here, not in the first measured row
+            await run(client, collector, "warmup", 2)
+            for name, overrides in SCENARIOS.items():
+                for enabled in (False, True):
+                    vars(profile).update(defaults, **overrides)
+                    profile.transcript = profile.transcript.replace("{city}", "Paris" if enabled else "London")
+                    pipeline.filler.enabled = enabled
+                    perceived, answer, heard, fillers, traced = await run(client, collector, name, turns)
+                    print(f"{name:<9} {'on' if enabled else 'off':<6}"
+                          f" {pct(perceived, 0.5):>10.0f} / {pct(perceived, 0.95):>7.0f}"
+                          f" {pct(answer, 0.5):>9.0f} / {pct(answer, 0.95):>7.0f}"
+                          f" {pct(heard, 0.5):>6.0f} / {pct(heard, 0.95):>6.0f}"
+                          f" {fillers:>8}" + (f"  ({traced - len(answer)} turns without audio)"
+                                               if traced != len(answer) else ""))
+        print(f"filler stats: {pipeline.filler.stats()}")
+        await connections.shutdown()
+    finally:
+        await stop_server(*server)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Perceived vs. answer latency with filler audio on slow turns")
+    parser.add_argument("--turns", type=int, default=6)
+    parser.add_argument("--after-ms", type=int, default=800)
+    args = parser.parse_args()
+    asyncio.run(main(args.turns, args.after_ms))
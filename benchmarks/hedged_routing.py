@@ -0,0 +1,138 @@
+# Hedged requests and latency-aware routing (services.routing) against a heavy-tailed fake Gemini:
+# a few percent of requests take several times longer (Pareto), and the lite model is faster.
+# The same open-loop stream of replies (Poisson arrivals, mostly short turns) runs through
+# pipeline.generate four ways:
+#   fixed          - one model, no hedging (what every turn did before routing)
+#   hedged         - one model, a hedge after its p95
+#   routed         - short turns may take the faster lite model, no hedging
+#   routed+hedged  - both
+#
+#   python -m benchmarks.hedged_routing --replies 400 --rate 10 --tail 0.03
+#
+# Time to first token is what the turn waits on. Extra cost is upstream requests per reply (the
+# fake counts them) and the hedges' losers cancelled mid-stream.
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+from benchmarks.fake_upstreams import UpstreamProfile, build_app, free_port, start_server_thread, stop_server_thread
+
+PORT = free_port()
+os.environ.setdefault("GEMINI_API_BASE", f"http://127.0.0.1:{PORT}")
+os.environ.setdefault("RESPONSE_CACHE", "0")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+os.environ.setdefault("TTS_CACHE_DIR", tempfile.mkdtemp(prefix="nick-bench-tts-"))
+
+from services import connections  # noqa: E402
+from services.pipeline import pipeline  # noqa: E402
+from services.providers import GeminiProvider  # noqa: E402
+from services.routing import ModelRouter, parse_routes  # noqa: E402
+
+MODEL, LITE = "gemini-2.0-flash", "gemini-2.0-flash-lite"
+CONFIGS = (
+    ("fixed", f"{MODEL}:2", False),
+    ("hedged", f"{MODEL}:2", True),
+    ("routed", f"{MODEL}:2,{LITE}:1", False),
+    ("routed+hedged", f"{MODEL}:2,{LITE}:1", True),
+)
+SHORT = "How are you doing today?"
+LONG = ("Can you walk me through how I should plan a three day trip to the mountains in autumn, "
+        "including what to pack and how to stay safe on the trails?")
+
+
+def pct(values: list, q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))] * 1000 if values else float("nan")
+
+
+async def reply(prompt: str, session_id: str, first_tokens: list, totals: list, errors: list):
+    started = time.perf_counter()
+    first = None
+    try:
+        async for _ in pipeline.generate(prompt, session_id=session_id):
+            if first is None:
+                first = time.perf_counter() - started
+    except Exception as e:
+        # e.g. a tail request past the Gemini read timeout
+        errors.append(repr(e))
+        return
+    first_tokens.append(first)
+    totals.append(time.perf_counter() - started)
+
+
+async def run(app, router: ModelRouter, args, seed: int) -> dict:
+    pipeline.llm = GeminiProvider(router)
+    rng = random.Random(seed)
+    prompts = [SHORT if rng.random() < args.short else LONG for _ in range(args.warmup + args.replies)]
+    gaps = [rng.expovariate(args.rate) for _ in prompts]
+    random.seed(seed)  # the fake's tail and the router's exploration draw from here
+
+    async def phase(batch: list, gaps: list) -> tuple:
+        first_tokens, totals, errors, tasks = [], [], [], []
+        for i, (prompt, gap) in enumerate(zip(batch, gaps)):
+            tasks.append(asyncio.create_task(reply(prompt, f"caller-{i}", first_tokens, totals, errors)))
+            await asyncio.sleep(gap)
+        await asyncio.gather(*tasks)
+        return first_tokens, totals, errors
+
+    # Warm-up: the router learns each route's latency before anything is counted
+    await phase(prompts[:args.warmup], gaps[:args.warmup])
+    requests_before = sum(app.state.gemini_requests.values())
+    cancelled_before = app.state.gemini_cancelled
+    hedged_before, wins_before = router.hedged, router.hedge_wins
+    first_tokens, totals, errors = await phase(prompts[args.warmup:], gaps[args.warmup:])
+    return {
+        "first_token": first_tokens,
+        "total": totals,
+        "errors": errors,
+        "requests": sum(app.state.gemini_requests.values()) - requests_before,
+        "cancelled": app.state.gemini_cancelled - cancelled_before,
+        "hedged": router.hedged - hedged_before,
+        "hedge_wins": router.hedge_wins - wins_before,
+    }
+
+
+async def main(args) -> int:
+    profile = UpstreamProfile(gemini_first_token=args.first_token, gemini_models={LITE: args.lite_speed},
+                              gemini_tail=args.tail, gemini_tail_scale=args.tail_scale, jitter=args.jitter)
+    app = build_app(profile)
+    server = start_server_thread(app, PORT)
+    await connections.startup(warm_murf=False)
+    print(f"{args.replies} replies at {args.rate:g}/s, {args.short:.0%} short; first token {args.first_token * 1000:.0f} ms, "
+          f"+/-{args.jitter:.0%}, lite x{args.lite_speed:g}; {args.tail:.0%} of requests x{args.tail_scale:g} Pareto(1.5) slower")
+    print(f"{'':<15}{'first token p50 / p95 / p99 ms':>32}{'reply p99':>11}{'requests/reply':>16}"
+          f"{'hedges won':>12}{'cancelled':>11}{'errors':>8}")
+    results = {}
+    try:
+        for name, routes, hedging in CONFIGS:
+            r = results[name] = await run(app, ModelRouter(parse_routes(routes), hedging=hedging), args, args.seed)
+            first = r["first_token"]
+            print(f"{name:<15}{pct(first, 0.5):>14.0f} / {pct(first, 0.95):>5.0f} / {pct(first, 0.99):>5.0f}"
+                  f"{pct(r['total'], 0.99):>11.0f}{r['requests'] / args.replies:>16.3f}"
+                  f"{r['hedge_wins']:>6} / {r['hedged']:<4}{r['cancelled']:>11}{len(r['errors']):>8}")
+    finally:
+        await connections.shutdown()
+        stop_server_thread(*server)
+    before, after = pct(results["fixed"]["first_token"], 0.99), pct(results["routed+hedged"]["first_token"], 0.99)
+    print(f"first token p99 {before:.0f} -> {after:.0f} ms ({(after - before) / before:+.0%})")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="p99 and request cost of hedged, latency-routed Gemini calls")
+    parser.add_argument("--replies", type=int, default=400)
+    parser.add_argument("--warmup", type=int, default=80)
+    parser.add_argument("--rate", type=float, default=10.0, help="replies started per second")
+    parser.add_argument("--short", type=float, default=0.7, help="share of short conversational turns")
+    parser.add_argument("--first-token", type=float, default=0.35, help="fake Gemini first token, seconds")
+    parser.add_argument("--lite-speed", type=float, default=0.6, help="the lite model's first token vs the main one")
+    parser.add_argument("--jitter", type=float, default=0.2, help="+/- share of every fake delay")
+    parser.add_argument("--tail", type=float, default=0.03, help="share of requests in the slow tail")
+    parser.add_argument("--tail-scale", type=float, default=4.0)
+    parser.add_argument("--seed", type=int, default=7)
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,135 @@
+# Per-stage latency report: p50/p95/p99 for every pipeline stage.
+#
+#   LOG_FORMAT=json uvicorn main:app > nick.log
+#   python -m benchmarks.latency_report nick.log              # exact, from the "turn" log records
+#   python -m benchmarks.latency_report --metrics http://localhost:8000/metrics
+#
+# Log input is read from files (or stdin with "-"); non-JSON lines are skipped. The /metrics input
+# estimates quantiles from the Prometheus histogram buckets (linear within a bucket, like
+# histogram_quantile), so it is only as precise as services.telemetry.LATENCY_BUCKETS.
+
+import argparse
+import json
+import math
+import os
+import sys
+import tempfile
+from collections import defaultdict
+
+os.environ.setdefault("TTS_CACHE_DIR", tempfile.mkdtemp(prefix="nick-bench-tts-"))
+
+from services.telemetry import STAGES  # noqa: E402
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+def percentile(values: list, q: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))
+    return ordered[index]
+
+
+def turn_records(lines):
+    for line in lines:
+        line = line.strip()
+        if not line.startswith("{"):
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            continue
+        if record.get("msg") == "turn" and "stages_ms" in record:
+            yield record
+
+
+def stages_from_records(records) -> dict:
+    # {pipeline: {stage: [ms, ...]}}
+    stages = defaultdict(lambda: defaultdict(list))
+    for record in records:
+        for stage, ms in record["stages_ms"].items():
+            stages[record.get("pipeline", "?")][stage].append(ms)
+    return stages
+
+
+def report_from_records(records) -> dict:
+    # {pipeline: {stage: (count, p50, p95, p99)}}
+    return {
+        pipeline: {
+            stage: (len(values), *(percentile(values, q) for q in QUANTILES))
+            for stage, values in stages.items()
+        }
+        for pipeline, stages in stages_from_records(records).items()
+    }
+
+
+def bucket_quantile(q: float, buckets: list) -> float:
+    # buckets: [(upper_bound, cumulative_count)] sorted, ending with +Inf
+    total = buckets[-1][1]
+    if total == 0:
+        return float("nan")
+    rank = q * total
+    lower, below = 0.0, 0
+    for upper, count in buckets:
+        if count >= rank:
+            if math.isinf(upper):
+                return lower
+            return lower + (upper - lower) * (rank - below) / max(count - below, 1)
+        lower, below = upper, count
+    return lower
+
+
+def report_from_metrics(text: str) -> dict:
+    from prometheus_client.parser import text_string_to_metric_families
+
+    buckets = defaultdict(list)
+    for family in text_string_to_metric_families(text):
+        if family.name != "nick_stage_seconds":
+            continue
+        for sample in family.samples:
+            if sample.name.endswith("_bucket"):
+                key = (sample.labels["pipeline"], sample.labels["stage"])
+                buckets[key].append((float(sample.labels["le"]), sample.value))
+    report = defaultdict(dict)
+    for (pipeline, stage), points in buckets.items():
+        points.sort()
+        count = int(points[-1][1])
+        if count:
+            report[pipeline][stage] = (count, *(bucket_quantile(q, points) * 1000 for q in QUANTILES))
+    return report
+
+
+def print_report(report: dict, out=sys.stdout):
+    order = {stage: i for i, stage in enumerate(STAGES)}
+    for pipeline in sorted(report):
+        print(f"{pipeline}", file=out)
+        print(f"  {'stage':<16}{'n':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}", file=out)
+        for stage in sorted(report[pipeline], key=lambda s: order.get(s, len(order))):
+            count, p50, p95, p99 = report[pipeline][stage]
+            print(f"  {stage:<16}{count:>7}{p50:>10.1f}{p95:>10.1f}{p99:>10.1f}", file=out)
+
+
+def main(paths: list, metrics_url: str):
+    if metrics_url:
+        import httpx
+        report = report_from_metrics(httpx.get(metrics_url, timeout=10).text)
+    else:
+        records = []
+        for path in paths or ["-"]:
+            if path == "-":
+                records.extend(turn_records(sys.stdin))
+            else:
+                with open(path, encoding="utf-8") as f:
+                    records.extend(turn_records(f))
+        report = report_from_records(records)
+    if not report:
+        print("no turns found")
+        return
+    print_report(report)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-stage latency report")
+    parser.add_argument("paths", nargs="*", help="JSON log files (LOG_FORMAT=json), - for stdin")
+    parser.add_argument("--metrics", default="", help="scrape this /metrics URL instead")
+    args = parser.parse_args()
+    main(args.paths, args.metrics)
@@ -0,0 +1,280 @@
+# Load test for the whole voice agent, with no network access needed.
+#
+#   python -m benchmarks.load_test --callers 30 --duration 60
+#   python -m benchmarks.load_test --ci        # small run; exits non-zero on errors or missing turns
+#
+# Every upstream is replaced by benchmarks.fake_upstreams: AssemblyAI upload/poll and realtime WS,
+# Gemini generateContent and streamGenerateContent, Murf stream-input. Latencies are the
+# UpstreamProfile defaults times --latency-scale, with --jitter. The app runs under uvicorn in its
+# own thread, the fakes in another, and simulated callers on this loop:
+#   ws      - /ws/voice, 16 kHz PCM16 sent in 100 ms frames at real-time pace, several turns per call
+#   process - /process-audio/{session_id}: "speaks" for the utterance length, then uploads the WAV
+#   stream  - /stream-chat/{session_id}: same, reading the SSE events as they arrive
+# Turn latency is end of speech -> first reply audio (and -> end of reply). Event-loop lag is
+# sampled on the app's loop. RSS is for the whole process (app, fakes and callers) - compare it with
+# the baseline printed before the load starts. Response and TTS caches are off unless --caches.
+
+import argparse
+import asyncio
+import json
+import os
+import resource
+import statistics
+import sys
+import tempfile
+import time
+import httpx
+import websockets
+
+from benchmarks.fake_upstreams import UpstreamProfile, build_app, free_port, start_server_thread, stop_server_thread
+
+UPSTREAM_PORT = free_port()
+os.environ.setdefault("GEMINI_API_BASE", f"http://127.0.0.1:{UPSTREAM_PORT}")
+os.environ.setdefault("MURF_WS_URL", f"ws://127.0.0.1:{UPSTREAM_PORT}/v1/speech/stream-input")
+os.environ.setdefault("ASSEMBLY_API_BASE", f"http://127.0.0.1:{UPSTREAM_PORT}")
+os.environ.setdefault("ASSEMBLY_STREAMING_URL", f"ws://127.0.0.1:{UPSTREAM_PORT}/v3/ws")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+from benchmarks.vad_endpointing import SAMPLE_RATE, synthetic_utterance  # noqa: E402
+
+FRAME_MS = 100
+REPLY_QUIET = 0.6  # /ws/voice has no end-of-reply message; this much silence ends a reply
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+def rss_bytes() -> int:
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    # Peak rather than current, but still bounds growth
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+
+
+def wav(pcm: bytes) -> bytes:
+    size = len(pcm)
+    header = (
+        b"RIFF" + (36 + size).to_bytes(4, "little") + b"WAVE"
+        + b"fmt " + (16).to_bytes(4, "little") + (1).to_bytes(2, "little") + (1).to_bytes(2, "little")
+        + SAMPLE_RATE.to_bytes(4, "little") + (SAMPLE_RATE * 2).to_bytes(4, "little")
+        + (2).to_bytes(2, "little") + (16).to_bytes(2, "little")
+        + b"data" + size.to_bytes(4, "little")
+    )
+    return header + pcm
+
+
+class Results:
+    def __init__(self):
+        self.first_audio = []
+        self.turn = []
+        self.errors = []
+
+    def summary(self, elapsed: float) -> str:
+        def pct(values, q):
+            return statistics.quantiles(values, n=100)[q - 1] * 1000 if len(values) > 1 else (values or [0])[0] * 1000
+        return (f"{len(self.turn):>6}{len(self.errors):>7}{len(self.turn) / elapsed:>9.2f}"
+                f"{pct(self.first_audio, 50):>9.0f}{pct(self.first_audio, 95):>8.0f}{pct(self.first_audio, 99):>8.0f}"
+                f"{pct(self.turn, 50):>9.0f}{pct(self.turn, 95):>8.0f}{pct(self.turn, 99):>8.0f}")
+
+
+async def ws_caller(base: str, index: int, utterance: tuple, deadline: float, results: Results):
+    pcm, speech_end = utterance
+    frame = SAMPLE_RATE * 2 * FRAME_MS // 1000
+    async with websockets.connect(f"{base.replace('http', 'ws')}/ws/voice", max_size=None) as ws:
+        await ws.send(json.dumps({"input_format": f"pcm16_{SAMPLE_RATE}", "output_format": "wav"}))
+        audio_at = []
+
+        async def read():
+            async for message in ws:
+                if isinstance(message, bytes):
+                    audio_at.append(time.perf_counter())
+                elif json.loads(message).get("type") == "error":
+                    results.errors.append(json.loads(message).get("error"))
+
+        reader = asyncio.create_task(read())
+        try:
+            while time.perf_counter() < deadline and not reader.done():
+                started = time.perf_counter()
+                seen = len(audio_at)
+                for offset in range(0, len(pcm), frame):
+                    await ws.send(pcm[offset:offset + frame])
+                    # Real-time pacing against the wall clock, so send jitter does not accumulate
+                    await asyncio.sleep(max(0.0, started + (offset + frame) / (SAMPLE_RATE * 2) - time.perf_counter()))
+                spoke_until = started + speech_end
+                # Wait for the reply to start, then for it to go quiet
+                while len(audio_at) == seen and time.perf_counter() - spoke_until < 15 and not reader.done():
+                    await asyncio.sleep(0.02)
+                if len(audio_at) == seen:
+                    results.errors.append(f"ws caller {index}: no reply audio")
+                    break
+                while time.perf_counter() - audio_at[-1] < REPLY_QUIET:
+                    await asyncio.sleep(0.05)
+                results.first_audio.append(audio_at[seen] - spoke_until)
+                results.turn.append(audio_at[-1] - spoke_until)
+            await ws.send("__END__")
+            await asyncio.wait_for(reader, 15)
+        finally:
+            reader.cancel()
+
+
+async def http_caller(client: httpx.AsyncClient, path: str, index: int, utterance: tuple, deadline: float,
+                      results: Results):
+    pcm, speech_end = utterance
+    body = wav(pcm)
+    turn = 0
+    while time.perf_counter() < deadline:
+        # The browser records the whole utterance before it uploads
+        await asyncio.sleep(len(pcm) / (SAMPLE_RATE * 2))
+        spoke_until = time.perf_counter() - (len(pcm) / (SAMPLE_RATE * 2) - speech_end)
+        session_id = f"load-{index}"
+        turn += 1
+        files = {"file": (f"turn-{turn}.wav", body, "audio/wav")}
+        try:
+            if path == "process":
+                resp = await client.post(f"/process-audio/{session_id}", files=files)
+                resp.raise_for_status()
+                data = resp.json()
+                if data.get("error") or not data.get("audio_base64"):
+                    raise RuntimeError(data.get("error") or "no audio")
+                done = time.perf_counter()
+                results.first_audio.append(done - spoke_until)
+                results.turn.append(done - spoke_until)
+            else:
+                first = None
+                async with client.stream("POST", f"/stream-chat/{session_id}", files=files) as resp:
+                    resp.raise_for_status()
+                    async for line in resp.aiter_lines():
+                        if line == "event: audio" and first is None:
+                            first = time.perf_counter()
+                        elif line == "event: error":
+                            raise RuntimeError("error event")
+                if first is None:
+                    raise RuntimeError("no audio")
+                results.first_audio.append(first - spoke_until)
+                results.turn.append(time.perf_counter() - spoke_until)
+        except Exception as e:
+            results.errors.append(f"{path} caller {index}: {e!r}")
+
+
+async def sample(stop: asyncio.Event, rss: list, interval: float = 0.25):
+    while not stop.is_set():
+        rss.append(rss_bytes())
+        await asyncio.sleep(interval)
+
+
+async def loop_lag(lags: list, interval: float = 0.01):
+    # Runs on the app's loop: how late a 10 ms timer fires
+    while True:
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - started - interval)
+
+
+async def drive(base: str, server_loop, args) -> int:
+    kinds = [kind for kind in args.mix.split(",") if kind]
+    utterances = [synthetic_utterance(0.3, args.speech, 1.0, -50, seed) for seed in range(8)]
+    results = {kind: Results() for kind in kinds}
+    lags = []
+    lag_task = asyncio.run_coroutine_threadsafe(loop_lag(lags), server_loop)
+    rss = [rss_bytes()]
+    stop = asyncio.Event()
+    sampler = asyncio.create_task(sample(stop, rss))
+    limits = httpx.Limits(max_connections=args.callers * 2, max_keepalive_connections=args.callers)
+    started = time.perf_counter()
+    deadline = started + args.duration
+    async with httpx.AsyncClient(base_url=base, timeout=60, limits=limits) as client:
+        callers = []
+        for i in range(args.callers):
+            kind = kinds[i % len(kinds)]
+            utterance = utterances[i % len(utterances)]
+            if kind == "ws":
+                callers.append(ws_caller(base, i, utterance, deadline, results[kind]))
+            else:
+                callers.append(http_caller(client, kind, i, utterance, deadline, results[kind]))
+        # Stagger arrivals over the first second
+        callers = [asyncio.create_task(stagger(c, i / max(args.callers, 1))) for i, c in enumerate(callers)]
+        outcomes = await asyncio.gather(*callers, return_exceptions=True)
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await sampler
+    lag_task.cancel()
+    for i, outcome in enumerate(outcomes):
+        if isinstance(outcome, Exception):
+            results[kinds[i % len(kinds)]].errors.append(f"caller {i}: {outcome!r}")
+
+    print(f"{args.callers} callers ({args.mix}) for {elapsed:.1f} s, upstream latency x{args.latency_scale},"
+          f" jitter {args.jitter:.0%}")
+    print(f"{'endpoint':<10}{'turns':>6}{'errors':>7}{'turns/s':>9}"
+          f"{'first audio p50/95/99 ms':>25}{'reply end p50/95/99 ms':>25}")
+    for kind in kinds:
+        print(f"{kind:<10}{results[kind].summary(elapsed)}")
+    if lags:
+        lags.sort()
+        print(f"app event-loop lag: p50 {lags[len(lags) // 2] * 1000:.1f} ms, p99 {lags[int(len(lags) * 0.99)] * 1000:.1f} ms,"
+              f" max {lags[-1] * 1000:.1f} ms")
+    print(f"process RSS: baseline {rss[0] / 2**20:.0f} MiB, peak {max(rss) / 2**20:.0f} MiB"
+          f" (+{(max(rss) - rss[0]) / 2**20:.0f} MiB)")
+    failed = 0
+    for kind in kinds:
+        for error in results[kind].errors[:5]:
+            print(f"  {kind} error: {error}")
+        if results[kind].errors or not results[kind].turn:
+            failed += 1
+        if args.max_p95_ms and len(results[kind].first_audio) > 1:
+            p95 = statistics.quantiles(results[kind].first_audio, n=100)[94] * 1000
+            if p95 > args.max_p95_ms:
+                print(f"  {kind}: first audio p95 {p95:.0f} ms over --max-p95-ms {args.max_p95_ms}")
+                failed += 1
+    return 1 if failed else 0
+
+
+async def stagger(caller, delay: float):
+    await asyncio.sleep(delay)
+    return await caller
+
+
+def main(args) -> int:
+    # Fake Murf audio must never land in the real TTS cache, with --caches or without
+    os.environ.setdefault("TTS_CACHE_DIR", tempfile.mkdtemp(prefix="nick-load-tts-"))
+    if not args.caches:
+        os.environ["RESPONSE_CACHE"] = "0"
+        os.environ["TTS_CACHE_MEMORY_BYTES"] = "0"
+        os.environ["TTS_CACHE_DISK_BYTES"] = "0"
+    os.environ.setdefault("STT_BACKEND", args.stt)
+    import main as nick
+
+    s = args.latency_scale
+    profile = UpstreamProfile(
+        gemini_first_token=0.35 * s, gemini_token_interval=0.04 * s, murf_handshake=0.12 * s,
+        murf_first_audio=0.15 * s, murf_chunk_interval=0.05 * s, stt_processing=0.7 * s,
+        stt_final_delay=0.15 * s, jitter=args.jitter,
+    )
+    upstreams = start_server_thread(build_app(profile), UPSTREAM_PORT)
+    app_port = free_port()
+    app_server = start_server_thread(nick.app, app_port, lifespan="on")
+    try:
+        server_loop = app_server[0].servers[0].get_loop()
+        return asyncio.run(drive(f"http://127.0.0.1:{app_port}", server_loop, args))
+    finally:
+        stop_server_thread(*app_server)
+        stop_server_thread(*upstreams)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Voice agent load test against local fake upstreams")
+    parser.add_argument("--callers", type=int, default=12)
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds of new turns")
+    parser.add_argument("--mix", default="ws,process,stream", help="caller kinds, assigned round robin")
+    parser.add_argument("--speech", type=float, default=1.5, help="seconds of speech per utterance")
+    parser.add_argument("--latency-scale", type=float, default=1.0)
+    parser.add_argument("--jitter", type=float, default=0.2)
+    parser.add_argument("--stt", default="batch", help="STT_BACKEND for the HTTP endpoints")
+    parser.add_argument("--caches", action="store_true", help="keep the response and TTS caches on")
+    parser.add_argument("--max-p95-ms", type=float, default=0.0, help="fail if first-audio p95 is higher")
+    parser.add_argument("--ci", action="store_true", help="6 callers for 8 s with faster upstreams")
+    args = parser.parse_args()
+    if args.ci:
+        args.callers, args.duration, args.latency_scale = 6, 8.0, 0.5
+    sys.exit(main(args))
@@ -0,0 +1,105 @@
+# Connection pool load test: per-turn overhead with a fresh client/socket per call
+# vs. the shared pooled clients in services/connections.py.
+#
+#   python -m benchmarks.pool_load --sessions 60 --turns 5
+#
+# A "turn" is one Gemini reply plus one Murf TTS utterance, like /process-audio.
+
+import argparse
+import asyncio
+import base64
+import json
+import os
+import statistics
+import tempfile
+import time
+import httpx
+import websockets
+
+from benchmarks.fake_upstreams import UpstreamProfile, build_app, fake_audio, free_port, reply_tokens, start_server, stop_server
+
+PORT = free_port()
+os.environ.setdefault("GEMINI_API_BASE", f"http://127.0.0.1:{PORT}")
+os.environ.setdefault("MURF_WS_URL", f"ws://127.0.0.1:{PORT}/v1/speech/stream-input")
+os.environ.setdefault("TTS_CACHE_DIR", tempfile.mkdtemp(prefix="nick-bench-tts-"))
+
+from services import connections  # noqa: E402
+from services.murf_ws import VOICE_CONFIG, murf_ws_url  # noqa: E402
+from services.pipeline import pipeline  # noqa: E402
+
+
+async def fresh_turn(text):
+    # What every turn paid before: new httpx client and a new Murf dial
+    url = f"{connections.GEMINI_API_BASE}/v1beta/models/gemini-2.0-flash:generateContent"
+    async with httpx.AsyncClient() as client:
+        resp = await client.post(url, json={"contents": [{"parts": [{"text": text}]}]})
+        reply = resp.json()["candidates"][0]["content"]["parts"][0]["text"]
+    async with websockets.connect(murf_ws_url()) as ws:
+        await ws.send(json.dumps({"voice_config": VOICE_CONFIG}))
+        await ws.send(json.dumps({"context_id": "ctx", "text": reply, "end": True}))
+        while True:
+            data = json.loads(await ws.recv())
+            if "audio" in data:
+                base64.b64decode(data["audio"])
+            if data.get("final"):
+                break
+
+
+async def pooled_turn(text):
+    reply = "".join([chunk async for chunk in pipeline.generate(text)])
+    # tts.synthesize, not pipeline.speak: the TTS cache would hide the connection cost
+    async for _ in pipeline.tts.synthesize(reply):
+        pass
+
+
+async def run(turn, sessions: int, turns: int):
+    latencies = []
+
+    async def session():
+        for _ in range(turns):
+            started = time.perf_counter()
+            await turn("Hi Nick, how are you?")
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(session() for _ in range(sessions)))
+    return latencies, time.perf_counter() - started
+
+
+def service_time(profile: UpstreamProfile) -> float:
+    # Time the fake upstreams spend "thinking" per turn, excluding any connection cost
+    gemini = profile.gemini_first_token + profile.gemini_token_interval * len(reply_tokens(profile))
+    murf = profile.murf_first_audio + profile.murf_chunk_interval * len(fake_audio(profile.reply, profile))
+    return gemini + murf
+
+
+def report(name, latencies, wall, ideal):
+    latencies.sort()
+    p50 = statistics.median(latencies)
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(f"{name:<7} turns {len(latencies):5d} in {wall:6.2f} s | turn p50 {p50 * 1000:7.1f} ms"
+          f"  p95 {p95 * 1000:7.1f} ms | overhead p50 {(p50 - ideal) * 1000:7.1f} ms")
+
+
+async def main(sessions: int, turns: int):
+    profile = UpstreamProfile()
+    server, task = await start_server(build_app(profile), PORT)
+    ideal = service_time(profile)
+    try:
+        report("fresh", *await run(fresh_turn, sessions, turns), ideal)
+        await connections.startup()
+        try:
+            report("pooled", *await run(pooled_turn, sessions, turns), ideal)
+            print(json.dumps(connections.pool_stats(), indent=2))
+        finally:
+            await connections.shutdown()
+    finally:
+        await stop_server(server, task)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Connection pool load test")
+    parser.add_argument("--sessions", type=int, default=60)
+    parser.add_argument("--turns", type=int, default=5)
+    args = parser.parse_args()
+    asyncio.run(main(args.sessions, args.turns))
@@ -0,0 +1,150 @@
+# Event-loop lag with blocking (SDK-style) providers: the vendor SDKs called straight from the
+# async turn (how LLMService/STTService/TTSService used to be used) vs. through services.blocking.
+#
+#   python -m benchmarks.provider_loop_lag --turns 40 --concurrency 20 --stt-ms 150 --llm-ms 300 --tts-ms 200
+#
+# Every turn runs the whole engine (Pipeline.turn: STT -> LLM -> segmented TTS) with providers
+# whose calls sleep in the calling thread like an SDK waiting on the network. No upstreams are
+# needed. Lag is how late a 10 ms ticker on the loop wakes up.
+
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+os.environ.setdefault("RESPONSE_CACHE", "0")
+os.environ.setdefault("TOOLS_ENABLED", "0")
+os.environ.setdefault("TTS_CACHE_DIR", tempfile.mkdtemp(prefix="nick-bench-tts-"))
+
+from services.blocking import BlockingPool  # noqa: E402
+from services.pipeline import Pipeline  # noqa: E402
+from services.providers import (STUB_REPLY, LLMProvider, SegmentSession, STTProvider, StubTTS,  # noqa: E402
+                                TTSProvider)
+
+TICK = 0.01
+
+
+class BlockingSTT(STTProvider):
+    name = "blocking"
+
+    def __init__(self, seconds: float, pool: BlockingPool = None):
+        self.seconds, self.pool = seconds, pool
+
+    def transcribe_sync(self, audio_bytes: bytes) -> str:
+        time.sleep(self.seconds)
+        return audio_bytes.decode()
+
+    async def transcribe(self, audio_bytes: bytes) -> str:
+        if self.pool is None:
+            return self.transcribe_sync(audio_bytes)
+        return await self.pool.run("stt", self.transcribe_sync, audio_bytes)
+
+
+class BlockingLLM(LLMProvider):
+    name = "blocking"
+
+    def __init__(self, seconds: float, pool: BlockingPool = None):
+        self.seconds, self.pool = seconds, pool
+
+    def generate_sync(self, prompt, system_prompt: str) -> str:
+        time.sleep(self.seconds)
+        return STUB_REPLY
+
+    async def stream(self, prompt, system_prompt: str):
+        if self.pool is None:
+            yield self.generate_sync(prompt, system_prompt)
+        else:
+            yield await self.pool.run("llm", self.generate_sync, prompt, system_prompt)
+
+
+class BlockingTTS(TTSProvider):
+    name = "blocking"
+
+    def __init__(self, seconds: float, pool: BlockingPool = None):
+        self.seconds, self.pool = seconds, pool
+        self.stub = StubTTS()
+
+    def session(self):
+        return SegmentSession(self.synthesize)
+
+    def render_sync(self, text: str):
+        time.sleep(self.seconds)
+
+    async def synthesize(self, text: str):
+        if self.pool is None:
+            self.render_sync(text)
+        else:
+            await self.pool.run("tts", self.render_sync, text)
+        async for chunk in self.stub.synthesize(text):
+            yield chunk
+
+    def cache_key(self, text: str) -> str:
+        return self.stub.cache_key(text)
+
+
+async def ticker(lags: list, stop: asyncio.Event):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(TICK)
+        lags.append(time.perf_counter() - started - TICK)
+
+
+async def run(name: str, engine: Pipeline, turns: int, concurrency: int, pool: BlockingPool = None):
+    lags, stop = [], asyncio.Event()
+    tick = asyncio.create_task(ticker(lags, stop))
+    gate = asyncio.Semaphore(concurrency)
+    first_audio, errors = [], 0
+
+    async def one(i):
+        nonlocal errors
+        async with gate:
+            started = time.perf_counter()
+            first = None
+            # Unique transcripts, so no turn is answered from a cache
+            async for kind, _ in engine.turn(f"question number {i} from {name}".encode(), None):
+                if kind == "audio" and first is None:
+                    first = time.perf_counter() - started
+                errors += kind == "error"
+            if first is not None:
+                first_audio.append(first)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(turns)))
+    wall = time.perf_counter() - started
+    stop.set()
+    await tick
+    lags.sort()
+    p99 = lags[int(len(lags) * 0.99)] if lags else 0.0
+    print(f"{name:<14} wall {wall:6.2f} s | first audio p50 {statistics.median(first_audio) * 1000:7.1f} ms"
+          f" | loop lag p50 {statistics.median(lags) * 1000:6.1f} ms p99 {p99 * 1000:7.1f} ms"
+          f" max {lags[-1] * 1000:7.1f} ms | errors {errors}")
+    if pool is not None:
+        stats = pool.stats()
+        calls = ", ".join(f"{kind} {entry['calls']}" for kind, entry in stats["calls"].items())
+        print(f"  pool: {stats['workers']} workers, max wait {stats['max_wait_ms']} ms, calls {calls}")
+
+
+async def main(args):
+    seconds = args.stt_ms / 1000, args.llm_ms / 1000, args.tts_ms / 1000
+    inline = Pipeline(BlockingSTT(seconds[0]), BlockingLLM(seconds[1]), BlockingTTS(seconds[2]))
+    await run("inline", inline, args.turns, args.concurrency)
+    # One event loop for both runs: the pool's semaphore is bound to it
+    pool = BlockingPool(args.workers)
+    pooled = Pipeline(BlockingSTT(seconds[0], pool), BlockingLLM(seconds[1], pool), BlockingTTS(seconds[2], pool))
+    try:
+        await run("blocking pool", pooled, args.turns, args.concurrency, pool)
+    finally:
+        pool.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Event-loop lag with blocking SDK providers")
+    parser.add_argument("--turns", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--workers", type=int, default=int(os.getenv("BLOCKING_WORKERS", "8")))
+    parser.add_argument("--stt-ms", type=float, default=150)
+    parser.add_argument("--llm-ms", type=float, default=300)
+    parser.add_argument("--tts-ms", type=float, default=200)
+    asyncio.run(main(parser.parse_args()))
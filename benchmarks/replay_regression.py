@@ -0,0 +1,203 @@
+# Performance regression test on recorded conversations (services.recording): record the upstream
+# traffic of a few conversations once, then replay it against the current code - at the recorded
+# speed, to compare latencies with a baseline, or accelerated, to soak the engine quickly.
+#
+#   python -m benchmarks.replay_regression --conversations 4 --turns 3 --speed 1 10
+#   python -m benchmarks.replay_regression --record traces/           # record only (local fakes)
+#   python -m benchmarks.replay_regression --replay traces/ --save baseline.json
+#   python -m benchmarks.replay_regression --replay traces/ --compare baseline.json --tolerance 0.2
+#
+# Recording runs the conversations against local fakes of AssemblyAI, Gemini and Murf (or, with
+# RECORD_DIR set on a real deployment, use that directory with --replay). Replay posts each
+# conversation's recorded audio to /stream-chat again, turn by turn, with STT/LLM/TTS served from
+# the traces. Numbers come from the turns' traces; --compare exits 1 when replayed first audio or
+# turn time (p50) is more than --tolerance slower than the saved baseline.
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import tempfile
+
+from benchmarks.fake_upstreams import UpstreamProfile, build_app, free_port, silent_wav, start_server, stop_server
+
+PORT = free_port()
+os.environ.setdefault("GEMINI_API_BASE", f"http://127.0.0.1:{PORT}")
+os.environ.setdefault("MURF_WS_URL", f"ws://127.0.0.1:{PORT}/v1/speech/stream-input")
+os.environ.setdefault("ASSEMBLY_API_BASE", f"http://127.0.0.1:{PORT}")
+os.environ.setdefault("ASSEMBLY_STREAMING_URL", f"ws://127.0.0.1:{PORT}/v3/ws")
+os.environ.setdefault("RESPONSE_CACHE", "0")
+os.environ.setdefault("TOOLS_ENABLED", "0")
+os.environ.setdefault("FILLER", "0")
+os.environ.setdefault("TTS_CACHE_DIR", tempfile.mkdtemp(prefix="nick-bench-tts-"))
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+import httpx  # noqa: E402
+
+import main as nick  # noqa: E402
+from services import connections  # noqa: E402
+from services.pipeline import pipeline  # noqa: E402
+from services.providers import ReplayLLM, ReplaySTT, ReplayTTS  # noqa: E402
+from services.recording import load_trace, recorder, replay_store  # noqa: E402
+from services.telemetry import get_logger  # noqa: E402
+
+QUESTIONS = [
+    "Hi Nick, how are you doing today?",
+    "Can you tell me a fun fact about octopuses?",
+    "What should I cook for dinner tonight?",
+    "Thanks, that was helpful. Goodbye!",
+]
+METRICS = ("first_audio", "turn")
+
+
+class TurnCollector(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        if record.getMessage() == "turn":
+            self.records.append(record.fields)
+
+
+def pct(values: list, q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))] if values else float("nan")
+
+
+def summary(records: list) -> dict:
+    result = {"turns": len(records), "errors": sum(record["outcome"] != "ok" for record in records)}
+    for metric in METRICS:
+        values = [record["stages_ms"][metric] for record in records if metric in record["stages_ms"]]
+        result[metric] = {"p50": round(pct(values, 0.5), 1), "p95": round(pct(values, 0.95), 1)}
+    return result
+
+
+def show(name: str, result: dict):
+    print(f"{name:<22} {result['turns']:>5}" + "".join(
+        f" {result[metric]['p50']:>9.0f} / {result[metric]['p95']:>6.0f}" for metric in METRICS)
+        + f" {result['errors']:>7}")
+
+
+async def converse(client, collector, conversations: dict) -> dict:
+    # conversations: session id -> recordings, one per turn; turn j of every conversation at once
+    collector.records.clear()
+    for j in range(max(len(turns) for turns in conversations.values())):
+        await asyncio.gather(*(
+            client.post(f"/stream-chat/{session_id}", files={"file": ("turn.wav", turns[j], "audio/wav")})
+            for session_id, turns in conversations.items() if j < len(turns)))
+    return summary(collector.records)
+
+
+async def record(client, collector, directory: str, conversations: int, turns: int) -> dict:
+    profile = UpstreamProfile()
+    server = await start_server(build_app(profile), PORT)
+    recorder.directory, recorder.enabled = directory, True
+    try:
+        collector.records.clear()
+        for j in range(turns):
+            profile.transcript = QUESTIONS[j % len(QUESTIONS)]
+            # A different length for every recording, so each one is a distinct STT call
+            await asyncio.gather(*(
+                client.post(f"/stream-chat/conv-{i}", files={"file": (
+                    "turn.wav", silent_wav(1.0 + 0.01 * (i * turns + j)), "audio/wav")})
+                for i in range(conversations)))
+        return summary(collector.records)
+    finally:
+        recorder.close()
+        recorder.enabled = False
+        await stop_server(*server)
+
+
+def recorded_audio(directory: str) -> dict:
+    # Every conversation's uploads, in order, from its trace and the audio store
+    conversations = {}
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith(".nkt"):
+            continue
+        turns = []
+        for call in load_trace(os.path.join(directory, name)):
+            if call.op == "stt.transcribe":
+                with open(os.path.join(directory, "audio", call.request["audio"]["sha1"]), "rb") as f:
+                    turns.append(f.read())
+        if turns:
+            conversations[name[:-len(".nkt")]] = turns
+    return conversations
+
+
+async def replay(client, collector, directory: str, speed: float, run: int) -> dict:
+    replay_store.load(directory)
+    pipeline.stt, pipeline.llm, pipeline.tts = ReplaySTT(speed), ReplayLLM(speed), ReplayTTS(speed)
+    # New session ids, so every replay starts from an empty history like the recording did
+    conversations = {f"{session_id}-replay{run}": turns for session_id, turns in recorded_audio(directory).items()}
+    result = await converse(client, collector, conversations)
+    result["replay"] = replay_store.stats()
+    return result
+
+
+async def main(args) -> int:
+    collector = TurnCollector()
+    trace_log = get_logger("trace")
+    trace_log.addHandler(collector)
+    trace_log.setLevel(logging.INFO)
+    trace_log.propagate = False
+    directory = args.replay or args.record or tempfile.mkdtemp(prefix="nick-bench-traces-")
+    status = 0
+    await connections.startup(warm_murf=False)
+    transport = httpx.ASGITransport(app=nick.app)
+    print(f"{'run':<22} {'turns':>5} {'first audio p50 / p95':>21} {'turn p50 / p95':>18} {'errors':>7}")
+    async with httpx.AsyncClient(transport=transport, base_url="http://nick", timeout=120) as client:
+        if args.replay is None:
+            show("recorded (fakes)", await record(client, collector, directory, args.conversations, args.turns))
+            print(f"  traces in {directory}: {recorder.stats()}")
+        if args.record is None:
+            results = {}
+            for run, speed in enumerate(args.speed):
+                results[speed] = await replay(client, collector, directory, speed, run)
+                show(f"replay x{speed:g}", results[speed])
+                print(f"  {results[speed]['replay']}")
+            baseline_speed = args.speed[0]
+            if args.save:
+                with open(args.save, "w") as f:
+                    json.dump({"speed": baseline_speed, **results[baseline_speed]}, f, indent=2)
+            if args.compare:
+                status = compare(args.compare, results, args.tolerance)
+    await connections.shutdown()
+    return status
+
+
+def compare(path: str, results: dict, tolerance: float) -> int:
+    with open(path) as f:
+        baseline = json.load(f)
+    current = results.get(baseline["speed"])
+    if current is None:
+        print(f"baseline was replayed at x{baseline['speed']:g}; replay at that speed to compare")
+        return 1
+    status = 0
+    for metric in METRICS:
+        before, after = baseline[metric]["p50"], current[metric]["p50"]
+        change = (after - before) / before if before else 0.0
+        verdict = "REGRESSION" if change > tolerance else "ok"
+        status |= change > tolerance
+        print(f"{metric:<12} p50 {before:8.0f} -> {after:8.0f} ms ({change:+.0%}) {verdict}")
+    if current["errors"] > baseline["errors"]:
+        print(f"errors {baseline['errors']} -> {current['errors']} REGRESSION")
+        status = 1
+    return int(status)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay recorded conversations as a performance regression test")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--record", metavar="DIR", help="only record conversations (against the local fakes) into DIR")
+    source.add_argument("--replay", metavar="DIR", help="only replay the traces in DIR")
+    parser.add_argument("--conversations", type=int, default=4)
+    parser.add_argument("--turns", type=int, default=3)
+    parser.add_argument("--speed", type=float, nargs="+", default=[1.0, 10.0],
+                        help="replay speeds; 0 = no waiting at all")
+    parser.add_argument("--save", metavar="JSON", help="save the first speed's results as a baseline")
+    parser.add_argument("--compare", metavar="JSON", help="compare with a saved baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    sys.exit(asyncio.run(main(parser.parse_args())))
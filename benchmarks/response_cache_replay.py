@@ -0,0 +1,117 @@
+# Offline replay of a transcript log through the response cache.
+#
+#   python -m benchmarks.response_cache_replay
+#   python -m benchmarks.response_cache_replay --log transcripts.txt --gemini-ms 900
+#
+# The log has one user utterance per line; a blank line starts a new session. Without --log a
+# synthetic log of small talk (with paraphrases and STT-style noise) and one-off questions is used.
+# Misses are "answered" with a placeholder reply and stored, as generate_reply does.
+
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+os.environ.setdefault("TTS_CACHE_DIR", tempfile.mkdtemp(prefix="nick-bench-tts-"))
+
+from services.response_cache import ResponseCache  # noqa: E402
+from services.sessions import Turn  # noqa: E402
+
+SYSTEM_PROMPT = "bench"
+SMALL_TALK = [
+    ["What's your name?", "what is your name", "whats your name", "What's your name, Nick?", "Tell me your name."],
+    ["How are you, Nick?", "how are you nick", "How are you doing, Nick?", "hey how are you", "How are you today?"],
+    ["Who made you?", "who created you", "Who built you?", "who made you nick"],
+    ["Tell me a joke.", "tell me a joke", "Can you tell me a joke?", "Tell me a funny joke."],
+    ["What can you do?", "what can you do", "What are you able to do?", "What can you help me with?"],
+    ["Thank you, Nick.", "thanks nick", "Thank you so much.", "thanks a lot"],
+]
+FOLLOW_UPS = ["Tell me more.", "Why is that?", "Can you say it again?", "Yes, please."]
+TOPICS = ["black holes", "the Roman empire", "sourdough bread", "jazz piano", "electric cars", "honey bees",
+          "the stock market", "volcanoes", "chess openings", "machine learning", "coral reefs", "the moon landing"]
+ASKS = ["Explain {} simply.", "What is interesting about {}?", "Give me three facts about {}.", "How does {} work?"]
+
+
+def synthetic_log(sessions: int, turns: int, seed: int) -> list:
+    rng = random.Random(seed)
+    log = []
+    for _ in range(sessions):
+        session = []
+        for _ in range(turns):
+            roll = rng.random()
+            if roll < 0.55:
+                session.append(rng.choice(rng.choice(SMALL_TALK)))
+            elif roll < 0.7:
+                session.append(rng.choice(FOLLOW_UPS))
+            else:
+                session.append(rng.choice(ASKS).format(rng.choice(TOPICS)) + (" " + str(rng.randrange(1000)) if rng.random() < 0.5 else ""))
+        log.append(session)
+    return log
+
+
+def read_log(path: str) -> list:
+    sessions, current = [], []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                if current:
+                    sessions.append(current)
+                current = []
+            else:
+                current.append(line)
+    if current:
+        sessions.append(current)
+    return sessions
+
+
+def replay(log: list, approx: bool, threshold: float, max_entries: int):
+    cache = ResponseCache(max_entries=max_entries, threshold=threshold, approx=approx, enabled=True)
+    lookups, approx_matches = [], []
+    for session in log:
+        history = []
+        for text in session:
+            started = time.perf_counter()
+            before = cache.approx_hits
+            reply = cache.get(text, SYSTEM_PROMPT, history)
+            lookups.append(time.perf_counter() - started)
+            if cache.approx_hits > before:
+                approx_matches.append((text, reply))
+            if reply is None:
+                reply = f"reply to: {text}"
+                cache.put(text, reply, SYSTEM_PROMPT, history)
+            history += [Turn("user", text), Turn("bot", reply)]
+    return cache, lookups, approx_matches
+
+
+def main(log_path: str, sessions: int, turns: int, gemini_ms: float, threshold: float, max_entries: int):
+    log = read_log(log_path) if log_path else synthetic_log(sessions, turns, 11)
+    total = sum(len(s) for s in log)
+    print(f"{len(log)} sessions, {total} utterances")
+    for approx in (False, True):
+        cache, lookups, matches = replay(log, approx, threshold, max_entries)
+        stats = cache.stats()
+        lookups.sort()
+        hits = stats["exact_hits"] + stats["approx_hits"]
+        print(f"{'exact + approximate' if approx else 'exact only':<20} hit ratio {stats['hit_ratio']:.1%}"
+              f" (exact {stats['exact_hits']}, approx {stats['approx_hits']}, misses {stats['misses']})"
+              f" | lookup p50 {statistics.median(lookups) * 1e6:5.0f} us p99 {lookups[int(len(lookups) * 0.99)] * 1e6:5.0f} us"
+              f" | Gemini time saved ~{hits * gemini_ms / 1000:.0f} s")
+        if approx:
+            print("  sample approximate matches (query -> cached answer):")
+            for text, reply in list(dict.fromkeys(matches))[:8]:
+                print(f"    {text!r} -> {reply!r}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Response cache replay")
+    parser.add_argument("--log", default="")
+    parser.add_argument("--sessions", type=int, default=500)
+    parser.add_argument("--turns", type=int, default=8)
+    parser.add_argument("--gemini-ms", type=float, default=800.0)
+    parser.add_argument("--threshold", type=float, default=0.86)
+    parser.add_argument("--max-entries", type=int, default=2000)
+    args = parser.parse_args()
+    main(args.log, args.sessions, args.turns, args.gemini_ms, args.threshold, args.max_entries)
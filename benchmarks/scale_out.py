@@ -0,0 +1,204 @@
+# Scale-out benchmark: serve.py with 1..N workers behind its router, chat history in a shared
+# Redis-compatible store (benchmarks/fake_redis.py), against the fake upstreams. Each caller is a
+# session taking turns back to back through POST /process-audio/<session>?history=full; a turn
+# counts as "ok" with a reply, audio and the session's whole history so far (which only holds
+# when every worker sees the same store). Then, with the most workers, the launcher gets SIGTERM
+# while a round of turns is in flight: the drain has to let all of them finish.
+#
+#   python -m benchmarks.scale_out --workers 1,2,4 --callers 32 --duration 10
+#
+# Upstream latencies are short, so a turn mostly costs the app's own CPU. The callers, the router,
+# the fakes and the workers share this machine's cores: throughput stops growing at the core count.
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uvicorn
+
+from benchmarks.fake_upstreams import UpstreamProfile, build_app, free_port, silent_wav
+
+
+def serve_upstreams(port: int):
+    profile = UpstreamProfile(
+        gemini_first_token=0.02, gemini_token_interval=0.002, murf_handshake=0.01, murf_first_audio=0.01,
+        murf_chunk_interval=0.002, stt_processing=0.02, stt_final_delay=0.01,
+    )
+    uvicorn.run(build_app(profile), host="127.0.0.1", port=port, log_level="warning", ws_ping_interval=None)
+
+
+def wait_port(port: int, process, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and getattr(process, "poll", lambda: None)() is not None:
+            raise RuntimeError(f"process on port {port} exited")
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"nothing listening on port {port}")
+
+
+def app_env(upstream_port: int, redis_port: int) -> dict:
+    env = dict(os.environ)
+    env.update({
+        "GEMINI_API_BASE": f"http://127.0.0.1:{upstream_port}",
+        "MURF_WS_URL": f"ws://127.0.0.1:{upstream_port}/v1/speech/stream-input",
+        "ASSEMBLY_API_BASE": f"http://127.0.0.1:{upstream_port}",
+        "ASSEMBLY_STREAMING_URL": f"ws://127.0.0.1:{upstream_port}/v3/ws",
+        "STT_BACKEND": "batch",
+        "RESPONSE_CACHE": "0",
+        "TOOLS_ENABLED": "0",
+        "SESSION_STORE": "redis",
+        "SESSION_REDIS_URL": f"redis://127.0.0.1:{redis_port}/0",
+        "SESSION_MAX_TURNS": "1000",
+        "TTS_CACHE_DIR": tempfile.mkdtemp(prefix="nick-bench-tts-"),
+        "LOG_LEVEL": "WARNING",
+    })
+    return env
+
+
+def classify(resp, turns_taken: int) -> str:
+    if resp.status_code != 200:
+        return "error"
+    result = resp.json()
+    if result.get("error") or not result.get("audio_base64") or not result.get("gemini"):
+        return "error"
+    # Every earlier turn of this session, whichever worker handled it
+    return "ok" if len(result.get("history") or []) == 2 * (turns_taken + 1) else "lost_history"
+
+
+async def caller(port: int, session_id: str, audio: bytes, deadline: float, results: list):
+    import httpx
+    # One client (and so one connection) per session, like one browser per caller
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=60) as client:
+        taken = 0
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                resp = await client.post(f"/process-audio/{session_id}?history=full",
+                                         files={"file": ("turn.wav", audio, "audio/wav")})
+                outcome = classify(resp, taken)
+            except httpx.HTTPError:
+                outcome = "error"
+            results.append((outcome, time.perf_counter() - started))
+            taken += outcome != "error"
+
+
+async def drive(port: int, args, tag: str) -> dict:
+    audio = silent_wav(0.5)
+    results = []
+    deadline = time.perf_counter() + args.duration
+    started = time.perf_counter()
+    await asyncio.gather(*(caller(port, f"{tag}-{i}", audio, deadline, results) for i in range(args.callers)))
+    elapsed = time.perf_counter() - started
+    ok = sorted(seconds for outcome, seconds in results if outcome == "ok")
+    return {
+        "turns": len(results),
+        "ok": len(ok),
+        "lost_history": sum(1 for r in results if r[0] == "lost_history"),
+        "errors": sum(1 for r in results if r[0] == "error"),
+        "turns_per_second": len(ok) / elapsed,
+        "p50": statistics.median(ok) if ok else 0.0,
+        "p95": statistics.quantiles(ok, n=20)[18] if len(ok) > 1 else (ok or [0.0])[0],
+    }
+
+
+async def drain_round(port: int, launcher, args) -> dict:
+    # One turn per caller in flight, then SIGTERM to the launcher
+    import httpx
+    audio = silent_wav(0.5)
+
+    async def one(i):
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=60) as client:
+            try:
+                resp = await client.post(f"/process-audio/drain-{i}", files={"file": ("turn.wav", audio, "audio/wav")})
+                return classify(resp, 0)
+            except httpx.HTTPError:
+                return "error"
+    turns = [asyncio.create_task(one(i)) for i in range(args.callers)]
+    # Signal only once every turn has reached a worker
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}") as client:
+        while sum(w["connections"] for w in (await client.get("/stats/router")).json()["workers"].values()) < args.callers:
+            await asyncio.sleep(0.01)
+    await asyncio.sleep(args.drain_after)
+    signalled = time.perf_counter()
+    launcher.send_signal(signal.SIGTERM)
+    outcomes = await asyncio.gather(*turns)
+    while launcher.poll() is None:
+        await asyncio.sleep(0.05)
+    return {
+        "in_flight": len(outcomes),
+        "ok": outcomes.count("ok"),
+        "failed": len(outcomes) - outcomes.count("ok"),
+        "stop_seconds": time.perf_counter() - signalled,
+        "exit_code": launcher.returncode,
+    }
+
+
+def run_workers(workers: int, env: dict, args, drain: bool) -> tuple:
+    port = free_port()
+    launcher = subprocess.Popen(
+        [sys.executable, "serve.py", "--workers", str(workers), "--host", "127.0.0.1", "--port", str(port),
+         "--base-port", str(free_port()), "--log-level", "warning", "--no-access-log"],
+        env=env, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    )
+    try:
+        wait_port(port, launcher)
+        result = asyncio.run(drive(port, args, f"w{workers}"))
+        stopped = asyncio.run(drain_round(port, launcher, args)) if drain else None
+    finally:
+        if launcher.poll() is None:
+            launcher.send_signal(signal.SIGTERM)
+            launcher.wait(timeout=60)
+    return result, stopped
+
+
+def main(args) -> int:
+    counts = [int(n) for n in args.workers.split(",")]
+    upstream_port, redis_port = free_port(), free_port()
+    upstreams = multiprocessing.get_context("spawn").Process(target=serve_upstreams, args=(upstream_port,), daemon=True)
+    upstreams.start()
+    redis = subprocess.Popen([sys.executable, "-m", "benchmarks.fake_redis", "--port", str(redis_port)],
+                             stdout=subprocess.DEVNULL)
+    try:
+        wait_port(upstream_port, None)
+        wait_port(redis_port, redis)
+        env = app_env(upstream_port, redis_port)
+        print(f"{args.callers} sessions taking turns back to back for {args.duration:.0f} s; {os.cpu_count()} CPU(s)")
+        print(f"{'workers':<9}{'turns/s':>9}{'speedup':>9}{'ok':>7}{'lost hist':>11}{'errors':>8}"
+              f"{'p50 ms':>9}{'p95 ms':>9}")
+        base = None
+        stopped = None
+        for workers in counts:
+            r, stopped = run_workers(workers, env, args, drain=workers == counts[-1])
+            base = base or r["turns_per_second"] or 1.0
+            print(f"{workers:<9}{r['turns_per_second']:>9.1f}{r['turns_per_second'] / base:>8.2f}x{r['ok']:>7}"
+                  f"{r['lost_history']:>11}{r['errors']:>8}{r['p50'] * 1000:>9.0f}{r['p95'] * 1000:>9.0f}")
+        print(f"\nSIGTERM with {stopped['in_flight']} turns in flight ({counts[-1]} workers): {stopped['ok']} completed,"
+              f" {stopped['failed']} failed; launcher exited {stopped['exit_code']} after {stopped['stop_seconds']:.2f} s")
+        return 0 if stopped["failed"] == 0 else 1
+    finally:
+        redis.terminate()
+        redis.wait()
+        upstreams.terminate()
+        upstreams.join()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Turns/sec with 1..N workers behind serve.py, and drain on SIGTERM")
+    parser.add_argument("--workers", default=",".join(str(n) for n in sorted({1, 2, os.cpu_count() or 1})),
+                        help="comma-separated worker counts")
+    parser.add_argument("--callers", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--drain-after", type=float, default=0.1,
+                        help="seconds between the drain round's turns reaching the workers and SIGTERM")
+    sys.exit(main(parser.parse_args()))
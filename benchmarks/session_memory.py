@@ -0,0 +1,102 @@
+# Session store memory benchmark: the old unbounded chat_histories dict vs. the bounded stores.
+#
+#   python -m benchmarks.session_memory --sessions 100000 --turns 6
+#   python -m benchmarks.session_memory --sessions 100000 --max-sessions 20000 --sqlite 10000
+#
+# Memory is measured with tracemalloc (Python heap only). Also reports the size of a
+# /process-audio "history" field with full history vs. the per-turn delta.
+
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+
+os.environ.setdefault("TTS_CACHE_DIR", tempfile.mkdtemp(prefix="nick-bench-tts-"))
+
+from services.sessions import MemorySessionStore, SQLiteSessionStore  # noqa: E402
+
+USER_TEXT = "Hi Nick, what's the weather like in Mumbai this afternoon?"
+BOT_TEXT = "It's warm and humid in Mumbai right now, around 31 degrees with a chance of showers later on."
+
+
+def legacy(sessions: int, turns: int) -> dict:
+    chat_histories = {}
+    for i in range(sessions):
+        history = chat_histories.setdefault(f"session-{i}", [])
+        for t in range(turns):
+            history.append({"role": "user", "text": USER_TEXT + str(t)})
+            history.append({"role": "bot", "text": BOT_TEXT + str(t)})
+    return chat_histories
+
+
+async def fill(store, sessions: int, turns: int):
+    for i in range(sessions):
+        for t in range(turns):
+            await store.append(f"session-{i}", "user", USER_TEXT + str(t))
+            await store.append(f"session-{i}", "bot", BOT_TEXT + str(t))
+
+
+def measure(build):
+    tracemalloc.start()
+    started = time.perf_counter()
+    keep = build()
+    elapsed = time.perf_counter() - started
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return keep, current, elapsed
+
+
+def report(name: str, sessions: int, current: int, elapsed: float):
+    print(f"{name:<34} {current / 2**20:8.1f} MiB  {current / max(sessions, 1):7.0f} B/session"
+          f"  {elapsed:6.2f} s to fill")
+
+
+def main(sessions: int, turns: int, max_sessions: int, max_turns: int, sqlite: int):
+    _, current, elapsed = measure(lambda: legacy(sessions, turns))
+    report("dict of dict lists (unbounded)", sessions, current, elapsed)
+
+    def bounded(limit):
+        store = MemorySessionStore(ttl=3600, max_sessions=limit, max_turns=max_turns)
+        asyncio.run(fill(store, sessions, turns))
+        return store
+
+    store, current, elapsed = measure(lambda: bounded(sessions))
+    report(f"memory store, {max_turns} turn cap", sessions, current, elapsed)
+    store, current, elapsed = measure(lambda: bounded(max_sessions))
+    report(f"memory store, LRU {max_sessions} sessions", len(store._sessions), current, elapsed)
+    print(f"  evicted {store.evicted} sessions, {len(store._sessions)} kept")
+
+    if sqlite:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "sessions.sqlite3")
+            db = SQLiteSessionStore(path, ttl=3600, max_sessions=max_sessions, max_turns=max_turns)
+            started = time.perf_counter()
+            asyncio.run(fill(db, sqlite, turns))
+            elapsed = time.perf_counter() - started
+            appends = sqlite * turns * 2
+            print(f"{f'sqlite store, {sqlite} sessions':<34} {os.path.getsize(path) / 2**20:8.1f} MiB on disk"
+                  f"  {elapsed / appends * 1e6:7.0f} us/append  ({db.stats()['sessions']} sessions kept)")
+            db.close()
+
+    # Response size of the history field on the last turn of a long session
+    store = MemorySessionStore(max_turns=max_turns)
+    asyncio.run(fill(store, 1, turns))
+    full = asyncio.run(store.history("session-0"))
+    full_bytes = len(json.dumps([turn.as_dict() for turn in full]))
+    delta_bytes = len(json.dumps([turn.as_dict() for turn in full[-2:]]))
+    print(f"/process-audio history after {turns} turns: full {full_bytes} B, delta {delta_bytes} B")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Session store memory benchmark")
+    parser.add_argument("--sessions", type=int, default=100000)
+    parser.add_argument("--turns", type=int, default=6, help="user+bot exchanges per session")
+    parser.add_argument("--max-sessions", type=int, default=20000)
+    parser.add_argument("--max-turns", type=int, default=8)
+    parser.add_argument("--sqlite", type=int, default=0, metavar="SESSIONS",
+                        help="also fill a SQLite store with this many sessions")
+    args = parser.parse_args()
+    main(args.sessions, args.turns, args.max_sessions, args.max_turns, args.sqlite)
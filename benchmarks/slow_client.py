@@ -0,0 +1,253 @@
+# Slow client benchmark: many /ws/voice callers that read reply audio slower than real time while
+# the fake Murf synthesizes ~10x faster than real time. Runs the same load twice, each in a fresh
+# process (services.flow reads FLOW_CONTROL at import):
+#   FLOW_CONTROL=1 - bounded buffers: Murf backs up at the outbound high watermark, RSS stays flat
+#   FLOW_CONTROL=0 - unbounded buffers: every session holds the whole reply in memory
+#
+#   python -m benchmarks.slow_client --callers 30 --duration 12
+#
+# The callers shrink their socket receive buffer and read one message at a time, so the kernel
+# can't absorb the backlog for them. The fakes run in a process of their own, so RSS is the app's
+# (plus the callers', which hold one message each): with flow control on, the backlog stays in
+# Murf's process instead.
+#
+# Before the load, buffer_checks() exercises services.flow directly: the block policy holds the
+# producer from the high to the low watermark, drop_oldest keeps the newest audio, queued chunks
+# merge up to merge_max, abort() releases a blocked producer, and the pacer holds audio past its
+# lead. Any failed check or uncapped buffer exits 1.
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uvicorn
+import websockets
+
+from benchmarks.fake_upstreams import UpstreamProfile, build_app, free_port, start_server_thread, stop_server_thread
+
+# Each mode's process picks its own ports
+PARENT_ENV = dict(os.environ)
+UPSTREAM_PORT = free_port()
+os.environ.setdefault("GEMINI_API_BASE", f"http://127.0.0.1:{UPSTREAM_PORT}")
+os.environ.setdefault("MURF_WS_URL", f"ws://127.0.0.1:{UPSTREAM_PORT}/v1/speech/stream-input")
+os.environ.setdefault("ASSEMBLY_API_BASE", f"http://127.0.0.1:{UPSTREAM_PORT}")
+os.environ.setdefault("ASSEMBLY_STREAMING_URL", f"ws://127.0.0.1:{UPSTREAM_PORT}/v3/ws")
+os.environ.setdefault("RESPONSE_CACHE", "0")
+os.environ.setdefault("TTS_CACHE_MEMORY_BYTES", "0")
+os.environ.setdefault("TTS_CACHE_DIR", tempfile.mkdtemp(prefix="nick-bench-tts-"))
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+from benchmarks.load_test import FRAME_MS, rss_bytes  # noqa: E402
+from benchmarks.vad_endpointing import SAMPLE_RATE, synthetic_utterance  # noqa: E402
+
+# A very long answer, synthesized in many small fragments: ~3 minutes (15 MiB) of audio per turn,
+# more than the kernel socket buffers between the app and a caller can hold
+LONG_REPLY = " ".join(["Here is a rather long answer that keeps going for a while."] * 60)
+
+
+async def slow_caller(port: int, utterance: tuple, read_speed: float, deadline: float, received: list):
+    pcm, _ = utterance
+    frame = SAMPLE_RATE * 2 * FRAME_MS // 1000
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 16 * 1024)
+    sock.setblocking(False)
+    await asyncio.get_running_loop().sock_connect(sock, ("127.0.0.1", port))
+    async with websockets.connect(f"ws://127.0.0.1:{port}/ws/voice", sock=sock, max_size=None, max_queue=1) as ws:
+        await ws.send(json.dumps({"input_format": f"pcm16_{SAMPLE_RATE}", "output_format": "wav"}))
+        started = time.perf_counter()
+        for offset in range(0, len(pcm), frame):
+            await ws.send(pcm[offset:offset + frame])
+            await asyncio.sleep(max(0.0, started + (offset + frame) / (SAMPLE_RATE * 2) - time.perf_counter()))
+        # Keep the STT stream fed with silence while reading the reply at read_speed x real time
+        while time.perf_counter() < deadline:
+            try:
+                message = await asyncio.wait_for(ws.recv(), max(0.01, deadline - time.perf_counter()))
+            except asyncio.TimeoutError:
+                break
+            if isinstance(message, bytes):
+                received.append(len(message))
+                await asyncio.sleep(len(message) / (44100 * 2) / read_speed)
+
+
+async def sample_server(flow_monitor, peaks: dict, interval: float = 0.1):
+    # Runs on the app's loop, so the session table isn't read mid-update
+    while True:
+        stats = flow_monitor.stats(top=1)
+        peaks["buffered"] = max(peaks["buffered"], stats["buffered_bytes"])
+        for flow in flow_monitor.sessions.values():
+            if flow.outbound is not None:
+                peaks["session"] = max(peaks["session"], flow.outbound.buffered)
+                peaks["waits"] = max(peaks["waits"], flow.out_waits + flow.outbound.producer_waits)
+        await asyncio.sleep(interval)
+
+
+async def drive(port: int, server_loop, flow_monitor, args) -> dict:
+    utterance = synthetic_utterance(0.3, 1.0, 1.0, -50, 0)
+    peaks = {"buffered": 0, "session": 0, "waits": 0}
+    sampler = asyncio.run_coroutine_threadsafe(sample_server(flow_monitor, peaks), server_loop)
+    baseline = rss_bytes()
+    rss = [baseline]
+    received = []
+    deadline = time.perf_counter() + args.duration
+    callers = [
+        asyncio.create_task(slow_caller(port, utterance, args.read_speed, deadline, received))
+        for _ in range(args.callers)
+    ]
+    while not all(c.done() for c in callers):
+        rss.append(rss_bytes())
+        await asyncio.sleep(0.1)
+    outcomes = await asyncio.gather(*callers, return_exceptions=True)
+    sampler.cancel()
+    return {
+        "rss_growth": max(rss) - baseline,
+        "peak_buffered": peaks["buffered"],
+        "peak_session": peaks["session"],
+        "producer_waits": peaks["waits"],
+        "audio_seconds": sum(received) / (44100 * 2),
+        "errors": [repr(o) for o in outcomes if isinstance(o, Exception)],
+    }
+
+
+def serve_upstreams(port: int):
+    profile = UpstreamProfile(
+        gemini_first_token=0.1, gemini_token_interval=0.005, words_per_token=8, murf_handshake=0.05,
+        murf_first_audio=0.05, murf_chunk_interval=0.01, chars_per_chunk=2, stt_partial_every=0.3,
+        reply=LONG_REPLY,
+    )
+    uvicorn.run(build_app(profile), host="127.0.0.1", port=port, log_level="warning", ws_ping_interval=None)
+
+
+def child(args):
+    upstreams = multiprocessing.get_context("spawn").Process(target=serve_upstreams, args=(UPSTREAM_PORT,), daemon=True)
+    upstreams.start()
+    while True:
+        try:
+            socket.create_connection(("127.0.0.1", UPSTREAM_PORT), timeout=1).close()
+            break
+        except OSError:
+            time.sleep(0.05)
+
+    import main as nick
+    from services.flow import flow_monitor
+
+    app_port = free_port()
+    app_server = start_server_thread(nick.app, app_port, lifespan="on")
+    try:
+        server_loop = app_server[0].servers[0].get_loop()
+        result = asyncio.run(drive(app_port, server_loop, flow_monitor, args))
+    finally:
+        stop_server_thread(*app_server)
+        upstreams.terminate()
+        upstreams.join()
+    print(json.dumps(result))
+
+
+def run_mode(flow_control: str, args) -> dict:
+    env = dict(PARENT_ENV, FLOW_CONTROL=flow_control)
+    cmd = [sys.executable, "-m", "benchmarks.slow_client", "--child", "--callers", str(args.callers),
+           "--duration", str(args.duration), "--read-speed", str(args.read_speed)]
+    out = subprocess.run(cmd, env=env, capture_output=True, text=True, check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+async def buffer_checks() -> list:
+    from services.flow import AudioBuffer, AudioPacer
+
+    failures = []
+
+    def check(ok: bool, what: str):
+        if not ok:
+            failures.append(what)
+
+    # block: the 4th chunk waits at the high watermark until the buffer drains to the low one
+    buffer = AudioBuffer(100, 50, "block")
+    for _ in range(3):
+        await buffer.put(bytes(40))
+    producer = asyncio.create_task(buffer.put(bytes(40)))
+    await asyncio.sleep(0.01)
+    check(not producer.done() and buffer.buffered == 120, "block: producer not held at the high watermark")
+    await buffer.get()
+    await asyncio.sleep(0.01)
+    check(not producer.done(), "block: producer released above the low watermark")
+    await buffer.get()
+    await asyncio.sleep(0.01)
+    check(producer.done() and buffer.buffered == 80, "block: producer not released at the low watermark")
+
+    # drop_oldest: never more than the high watermark queued, and what is left is the newest audio
+    buffer = AudioBuffer(100, 50, "drop_oldest")
+    most = 0
+    for i in range(10):
+        await buffer.put(bytes([i]) * 20)
+        most = max(most, buffer.buffered)
+    check(most <= 100, f"drop_oldest: {most} bytes queued, above the high watermark")
+    kept = [(await buffer.get())[0] for _ in range(len(buffer._chunks))]
+    check(kept == list(range(10 - len(kept), 10)) and buffer.dropped_chunks == 10 - len(kept),
+          f"drop_oldest: kept {kept}, dropped {buffer.dropped_chunks}")
+
+    # merge: queued chunks go upstream as one message of at most merge_max bytes
+    buffer = AudioBuffer(1000, 500, "drop_oldest", merge_max=64)
+    for _ in range(4):
+        await buffer.put(bytes(20))
+    check([len(await buffer.get()), len(await buffer.get())] == [60, 20], "merge: chunks not merged up to merge_max")
+
+    # abort: a producer blocked on a full buffer is let go, and the consumer sees the end
+    buffer = AudioBuffer(40, 20, "block")
+    await buffer.put(bytes(40))
+    producer = asyncio.create_task(buffer.put(bytes(40)))
+    await asyncio.sleep(0.01)
+    buffer.abort()
+    await asyncio.sleep(0.01)
+    check(producer.done() and await buffer.get() is None and buffer.buffered == 0, "abort: producer still blocked")
+
+    # pacing: with a 100 ms lead, 300 ms of audio sent at once holds the next chunk ~200 ms
+    pacer = AudioPacer(lead_ms=100)
+    await pacer.pace(0.3)
+    check(0.15 < pacer.delay() <= 0.2, f"pacer: delay {pacer.delay():.3f} s after 0.3 s of audio")
+    return failures
+
+
+def main(args) -> int:
+    from services.flow import FLOW_CONTROL
+
+    if FLOW_CONTROL:
+        failures = asyncio.run(buffer_checks())
+        for failure in failures:
+            print("FAIL:", failure)
+        print("buffer checks " + ("failed" if failures else "passed"))
+        if failures:
+            return 1
+    print(f"{args.callers} callers reading at {args.read_speed}x real time for {args.duration:.0f} s")
+    print(f"{'flow control':<14}{'RSS growth':>12}{'buffered peak':>15}{'per session':>13}{'Murf waits':>12}"
+          f"{'audio read':>12}")
+    results = {}
+    for mode, label in (("1", "on"), ("0", "off")):
+        r = results[mode] = run_mode(mode, args)
+        print(f"{label:<14}{r['rss_growth'] / 2**20:>9.1f} MiB{r['peak_buffered'] / 2**20:>11.2f} MiB"
+              f"{r['peak_session'] / 1024:>9.0f} KiB{r['producer_waits']:>12}{r['audio_seconds']:>10.0f} s")
+        for error in r["errors"][:3]:
+            print(f"  error: {error}")
+    on = results["1"]
+    # Bounded: no session ever holds more than the high watermark plus one Murf fragment
+    from services.flow import FLOW_OUT_HIGH_BYTES
+    capped = on["peak_session"] <= FLOW_OUT_HIGH_BYTES + 8820 * 2 and not on["errors"]
+    print("outbound buffers capped" if capped else "outbound buffers NOT capped")
+    return 0 if capped else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Memory under slow /ws/voice clients, with and without flow control")
+    parser.add_argument("--callers", type=int, default=30)
+    parser.add_argument("--duration", type=float, default=12.0)
+    parser.add_argument("--read-speed", type=float, default=0.5, help="client playback speed vs real time")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(args)
+    else:
+        sys.exit(main(args))
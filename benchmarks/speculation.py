@@ -0,0 +1,109 @@
+# Speculative generation on partial transcripts: hit rate, wasted tokens, and end-of-speech to
+# first-audio latency with and without speculation, against the local fake Gemini/Murf servers.
+#
+#   python -m benchmarks.speculation --utterances 20 --final-delay 0.5 --corrected 0.2
+#
+# Partials arrive word by word with occasional mid-sentence pauses; the final transcript comes
+# --final-delay seconds after the user stops talking, and a --corrected fraction of finals differ
+# from the last partial (the STT provider rewrote words).
+
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from benchmarks.fake_upstreams import UpstreamProfile, build_app, free_port, start_server, stop_server
+
+PORT = free_port()
+os.environ.setdefault("GEMINI_API_BASE", f"http://127.0.0.1:{PORT}")
+os.environ.setdefault("MURF_WS_URL", f"ws://127.0.0.1:{PORT}/v1/speech/stream-input")
+os.environ.setdefault("TOOLS_ENABLED", "0")
+os.environ.setdefault("TTS_CACHE_DIR", tempfile.mkdtemp(prefix="nick-bench-tts-"))
+
+from services.connections import shutdown  # noqa: E402
+from services.murf_ws import MurfSession  # noqa: E402
+from services.speculation import Speculator  # noqa: E402
+from services.voice_stream_ws import llm_reply, run_turn  # noqa: E402
+
+UTTERANCES = [
+    ("can you recommend a good book for a long flight", "can you recommend a good book for a long fight"),
+    ("what should I cook for dinner tonight with rice and beans", "what should I cook for dinner tonight with ice and beans"),
+    ("tell me a fun fact about octopuses", "tell me a fun fact about octopus is"),
+    ("how do I keep my basil plant alive indoors", "how do I keep my basic plan alive indoors"),
+]
+
+
+class RecordingSocket:
+    def __init__(self):
+        self.first_audio = None
+
+    async def send_json(self, data):
+        pass
+
+    async def send_bytes(self, data):
+        if self.first_audio is None:
+            self.first_audio = time.perf_counter()
+
+
+async def utterance(murf, speculator, words, final_text, final_delay, rng):
+    for n in range(1, len(words) + 1):
+        if speculator:
+            speculator.on_partial(" ".join(words[:n]))
+        pause = rng.uniform(0.3, 0.5) if rng.random() < 0.15 else rng.uniform(0.12, 0.22)
+        await asyncio.sleep(pause if n < len(words) else 0.05)
+    end_of_speech = time.perf_counter()
+    await asyncio.sleep(final_delay)
+    llm = await speculator.on_final(final_text) if speculator else None
+    websocket = RecordingSocket()
+    await run_turn(websocket, final_text, murf, "pcm16_24000", None, llm)
+    return websocket.first_audio - end_of_speech
+
+
+async def run(murf, speculate, utterances, final_delay, corrected, stable_ms, seed):
+    rng = random.Random(seed)
+    speculator = Speculator(llm_reply, stable_ms=stable_ms) if speculate else None
+    latencies = []
+    for i in range(utterances):
+        spoken, misheard = UTTERANCES[i % len(UTTERANCES)]
+        # The final either confirms the partials (with punctuation) or corrects them
+        if rng.random() < corrected:
+            words, final_text = misheard.split(), spoken.capitalize() + "?"
+        else:
+            words, final_text = spoken.split(), spoken.capitalize() + "?"
+        latencies.append(await utterance(murf, speculator, words, final_text, final_delay, rng))
+    if speculator:
+        await speculator.close()
+    return latencies, speculator.stats() if speculator else None
+
+
+async def main(utterances, final_delay, corrected, stable_ms):
+    server = await start_server(build_app(UpstreamProfile(jitter=0.1)), PORT)
+    murf = MurfSession()
+    try:
+        await murf.connect()
+        for speculate in (False, True):
+            latencies, stats = await run(murf, speculate, utterances, final_delay, corrected, stable_ms, 3)
+            name = "speculative" if speculate else "wait for final"
+            print(f"{name:<15} end of speech -> first audio p50 {statistics.median(latencies) * 1000:7.1f} ms"
+                  f"  max {max(latencies) * 1000:7.1f} ms")
+            if stats:
+                print(f"  started {stats['started']} | hits {stats['hits']} | misses {stats['misses']}"
+                      f" | hit rate {stats['hit_rate']:.0%} | wasted {stats['wasted_tokens']} tokens"
+                      f" ({stats['wasted_tokens'] / utterances:.1f} per utterance)")
+    finally:
+        await murf.close()
+        await shutdown()
+        await stop_server(*server)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Speculative generation benchmark")
+    parser.add_argument("--utterances", type=int, default=20)
+    parser.add_argument("--final-delay", type=float, default=0.5)
+    parser.add_argument("--corrected", type=float, default=0.2)
+    parser.add_argument("--stable-ms", type=int, default=250)
+    args = parser.parse_args()
+    asyncio.run(main(args.utterances, args.final_delay, args.corrected, args.stable_ms))
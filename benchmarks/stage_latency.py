@@ -0,0 +1,107 @@
+# Stage latency benchmark: drives /process-audio and /stream-chat through the real app against
+# the fake upstreams, then prints the per-stage report from the "turn" log records and from the
+# /metrics histograms, plus the cost of tracing a turn.
+#
+#   python -m benchmarks.stage_latency --turns 20
+
+import argparse
+import asyncio
+import logging
+import os
+import tempfile
+import time
+
+from benchmarks.fake_upstreams import UpstreamProfile, build_app, free_port, silent_wav, start_server, stop_server
+
+PORT = free_port()
+os.environ.setdefault("GEMINI_API_BASE", f"http://127.0.0.1:{PORT}")
+os.environ.setdefault("MURF_WS_URL", f"ws://127.0.0.1:{PORT}/v1/speech/stream-input")
+os.environ.setdefault("ASSEMBLY_API_BASE", f"http://127.0.0.1:{PORT}")
+os.environ.setdefault("ASSEMBLY_STREAMING_URL", f"ws://127.0.0.1:{PORT}/v3/ws")
+os.environ.setdefault("RESPONSE_CACHE", "0")
+os.environ.setdefault("TTS_CACHE_MEMORY_BYTES", "0")
+os.environ.setdefault("TTS_CACHE_DIR", tempfile.mkdtemp(prefix="nick-bench-tts-"))
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+import httpx  # noqa: E402
+
+import main as nick  # noqa: E402
+from benchmarks.latency_report import print_report, report_from_metrics, report_from_records  # noqa: E402
+from services import connections  # noqa: E402
+from services.telemetry import StructuredFormatter, TurnTrace, get_logger  # noqa: E402
+
+
+class TurnCollector(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        if record.getMessage() == "turn":
+            self.records.append(record.fields)
+
+
+def trace_cost(turns: int) -> float:
+    # One turn's worth of tracing: every stage marked, client sends counted, finished
+    started = time.perf_counter()
+    for _ in range(turns):
+        trace = TurnTrace("bench", "s")
+        t = trace.started
+        for stage in ("audio_receive", "stt", "llm_first_token", "llm_complete", "tts_first_byte", "tts_complete",
+                      "first_audio"):
+            trace.mark(stage, t)
+        for _ in range(20):
+            trace.add_send(0.0001)
+        trace.finish()
+    return (time.perf_counter() - started) / turns
+
+
+async def main(turns: int, seconds: float):
+    server = await start_server(build_app(UpstreamProfile(jitter=0.2)), PORT)
+    collector = TurnCollector()
+    trace_log = get_logger("trace")
+    trace_log.addHandler(collector)
+    trace_log.setLevel(logging.INFO)
+    trace_log.propagate = False
+    audio = silent_wav(seconds)
+    transport = httpx.ASGITransport(app=nick.app)
+    try:
+        await connections.startup(warm_murf=False)
+        async with httpx.AsyncClient(transport=transport, base_url="http://nick", timeout=60) as client:
+            for i in range(turns):
+                files = {"file": ("turn.wav", audio, "audio/wav")}
+                await client.post(f"/process-audio/bench-{i}", files=files)
+                await client.post(f"/stream-chat/bench-{i}", files=files)
+            metrics = (await client.get("/metrics")).text
+        print(f"{len(collector.records)} turns traced\n")
+        print("from turn log records (exact):")
+        print_report(report_from_records(collector.records))
+        print("\nfrom /metrics histograms (bucket estimate):")
+        print_report(report_from_metrics(metrics))
+    finally:
+        trace_log.removeHandler(collector)
+        trace_log.propagate = True
+        await connections.shutdown()
+        await stop_server(*server)
+
+    trace_log.setLevel(logging.WARNING)
+    quiet = trace_cost(20000)
+    # Full JSON formatting, written to /dev/null
+    root = logging.getLogger("nick")
+    handlers = root.handlers[:]
+    with open(os.devnull, "w") as devnull:
+        sink = logging.StreamHandler(devnull)
+        sink.setFormatter(StructuredFormatter(json_lines=True))
+        root.handlers[:] = [sink]
+        trace_log.setLevel(logging.INFO)
+        logged = trace_cost(20000)
+        root.handlers[:] = handlers
+    print(f"\ntracing cost per turn: {quiet * 1e6:.1f} us (turn log off), {logged * 1e6:.1f} us (turn log on)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-stage latency benchmark")
+    parser.add_argument("--turns", type=int, default=20)
+    parser.add_argument("--seconds", type=float, default=2.0)
+    args = parser.parse_args()
+    asyncio.run(main(args.turns, args.seconds))
@@ -0,0 +1,175 @@
+# Cold-start benchmark, against a startup budget and tracked over time.
+#   import      - `python -X importtime -c "import main"` in a fresh interpreter: the whole import of
+#                 the app, and the packages that cost the most of it
+#   first reply - a fresh `uvicorn main:app` process until its first HTTP response
+#   warm        - until the background warmup is done (GET /stats/startup: TLS, lazy imports,
+#                 upstream connections to the fakes, cached fallback phrases)
+# Each is the median of --runs fresh processes. With --record the result is appended to
+# benchmarks/startup_history.jsonl (with the commit), and every run compares itself to the last
+# recorded one. Exits 1 when the first reply misses the budget (STARTUP_BUDGET_MS), so CI can
+# run it too.
+#
+#   python -m benchmarks.startup_time --runs 5 --record
+
+import argparse
+import datetime
+import json
+import multiprocessing
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+import uvicorn
+
+from benchmarks.fake_upstreams import UpstreamProfile, build_app, free_port
+
+STARTUP_BUDGET_MS = float(os.getenv("STARTUP_BUDGET_MS", "750"))
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HISTORY = os.path.join(ROOT, "benchmarks", "startup_history.jsonl")
+
+
+def import_profile() -> tuple:
+    # Returns (ms for `import main`, {package or services module: ms including what it imported first})
+    err = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"], cwd=ROOT,
+                         capture_output=True, text=True, check=True).stderr
+    total = 0.0
+    packages = {}
+    for line in err.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        name = name.strip()
+        ms = int(cumulative) / 1000
+        if name == "main":
+            total = ms
+        # Third-party packages as a whole, and the app's own modules one by one
+        if name != "main" and ("." not in name or name.startswith("services.")):
+            packages.setdefault(name, ms)
+    return total, packages
+
+
+def get(url: str):
+    try:
+        with urllib.request.urlopen(url, timeout=1) as resp:
+            return resp.status, resp.read()
+    except urllib.error.HTTPError as e:
+        return e.code, b""
+
+
+def cold_start(env: dict, timeout: float = 60.0) -> tuple:
+    # Returns (ms to the first response, ms until the warmup reports ready)
+    port = free_port()
+    started = time.perf_counter()
+    app = subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+                           cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    first = warm = None
+    try:
+        while time.perf_counter() - started < timeout and app.poll() is None:
+            try:
+                status, body = get(f"http://127.0.0.1:{port}/stats/startup")
+            except OSError:
+                time.sleep(0.002)
+                continue
+            now = (time.perf_counter() - started) * 1000
+            first = first or now
+            # Trees without /stats/startup (404) have no background warmup to wait for
+            if status == 404 or json.loads(body).get("ready"):
+                warm = now
+                break
+            time.sleep(0.005)
+    finally:
+        app.terminate()
+        app.wait()
+    if first is None:
+        raise RuntimeError("the app never answered")
+    return first, warm or first
+
+
+def serve_upstreams(port: int):
+    uvicorn.run(build_app(UpstreamProfile()), host="127.0.0.1", port=port, log_level="warning", ws_ping_interval=None)
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty"], cwd=ROOT, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def last_recorded():
+    try:
+        with open(HISTORY, encoding="utf-8") as f:
+            lines = [line for line in f if line.strip()]
+    except FileNotFoundError:
+        return None
+    return json.loads(lines[-1]) if lines else None
+
+
+def main(args) -> int:
+    upstream_port = free_port()
+    upstreams = multiprocessing.get_context("spawn").Process(target=serve_upstreams, args=(upstream_port,), daemon=True)
+    upstreams.start()
+    env = dict(os.environ,
+               GEMINI_API_BASE=f"http://127.0.0.1:{upstream_port}",
+               MURF_WS_URL=f"ws://127.0.0.1:{upstream_port}/v1/speech/stream-input",
+               ASSEMBLY_API_BASE=f"http://127.0.0.1:{upstream_port}",
+               ASSEMBLY_STREAMING_URL=f"ws://127.0.0.1:{upstream_port}/v3/ws",
+               TTS_CACHE_DIR=tempfile.mkdtemp(prefix="nick-bench-tts-"),
+               LOG_LEVEL="WARNING")
+    try:
+        # Warm the OS page cache once, so every run measures the interpreter and not the disk
+        import_profile()
+        imports = [import_profile() for _ in range(args.runs)]
+        starts = [cold_start(env) for _ in range(args.runs)]
+    finally:
+        upstreams.terminate()
+        upstreams.join()
+
+    import_ms = statistics.median(total for total, _ in imports)
+    first_ms = statistics.median(first for first, _ in starts)
+    warm_ms = statistics.median(warm for _, warm in starts)
+    packages = {name: statistics.median(p.get(name, 0.0) for _, p in imports) for name in imports[0][1]}
+    top = sorted(packages.items(), key=lambda item: item[1], reverse=True)[:args.top]
+
+    print(f"median of {args.runs} fresh processes ({os.cpu_count()} CPU(s), Python {platform.python_version()})")
+    print(f"  import main      {import_ms:8.0f} ms")
+    print(f"  first response   {first_ms:8.0f} ms   (budget {args.budget_ms:.0f} ms)")
+    print(f"  warmup done      {warm_ms:8.0f} ms")
+    print("  heaviest imports: " + ", ".join(f"{name} {ms:.0f} ms" for name, ms in top))
+    previous = last_recorded()
+    if previous:
+        print(f"  vs {previous['commit']} ({previous['date']}): import {import_ms - previous['import_ms']:+.0f} ms,"
+              f" first response {first_ms - previous['first_response_ms']:+.0f} ms")
+    if args.record:
+        entry = {
+            "date": datetime.date.today().isoformat(),
+            "commit": git_commit(),
+            "cpus": os.cpu_count(),
+            "python": platform.python_version(),
+            "runs": args.runs,
+            "import_ms": round(import_ms, 1),
+            "first_response_ms": round(first_ms, 1),
+            "warm_ms": round(warm_ms, 1),
+            "top_imports": {name: round(ms, 1) for name, ms in top},
+        }
+        with open(HISTORY, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry) + "\n")
+        print(f"  recorded in {os.path.relpath(HISTORY, ROOT)}")
+    within = first_ms <= args.budget_ms
+    print("within the cold-start budget" if within else "OVER the cold-start budget")
+    return 0 if within else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import time and cold start of the app, against a budget")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=8, help="heaviest top-level imports to list")
+    parser.add_argument("--budget-ms", type=float, default=STARTUP_BUDGET_MS, help="first-response budget")
+    parser.add_argument("--record", action="store_true", help="append the result to startup_history.jsonl")
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,188 @@
+# Streaming ingest benchmark (services.ingest): end of speech -> transcript, and the app's memory,
+# for /stream-chat uploads sent two ways:
+#   multipart - the browser client today: the recording is posted as a form once the user stops
+#   chunked   - the recording is streamed as a chunked request body while the user talks, 100 ms of
+#               PCM at a time at real-time pace
+# at 16 kHz (PCM16 WAV: AssemblyAI realtime) and 44.1 kHz (WAV too, but batch upload + transcript
+# job), for every --seconds clip length. Each run is a fresh process (the fakes in another), so
+# RSS growth is the app's plus the callers', which share one copy of the clip.
+#
+#   python -m benchmarks.streaming_ingest --callers 20 --seconds 3 10 30
+#
+# Uploads to the fake AssemblyAI go at --upload-bandwidth, so a recording uploaded after speech
+# costs its upload time. The multipart mode also runs against a tree from before services.ingest
+# (check it out and copy this file and fake_upstreams.py in) to compare with buffering uploads.
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import httpx
+import uvicorn
+
+from benchmarks.fake_upstreams import UpstreamProfile, build_app, free_port, start_server_thread, stop_server_thread
+
+PARENT_ENV = dict(os.environ)
+UPSTREAM_PORT = free_port()
+os.environ.setdefault("GEMINI_API_BASE", f"http://127.0.0.1:{UPSTREAM_PORT}")
+os.environ.setdefault("MURF_WS_URL", f"ws://127.0.0.1:{UPSTREAM_PORT}/v1/speech/stream-input")
+os.environ.setdefault("ASSEMBLY_API_BASE", f"http://127.0.0.1:{UPSTREAM_PORT}")
+os.environ.setdefault("ASSEMBLY_STREAMING_URL", f"ws://127.0.0.1:{UPSTREAM_PORT}/v3/ws")
+os.environ.setdefault("RESPONSE_CACHE", "0")
+os.environ.setdefault("TOOLS_ENABLED", "0")
+os.environ.setdefault("FILLER", "0")
+os.environ.setdefault("TTS_CACHE_DIR", tempfile.mkdtemp(prefix="nick-bench-tts-"))
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+from benchmarks.load_test import rss_bytes  # noqa: E402
+
+FRAME_MS = 100
+MODES = ("multipart", "chunked")
+RATES = (16000, 44100)
+
+
+def wav_header(sample_rate: int, data_size: int) -> bytes:
+    return (
+        b"RIFF" + (36 + data_size).to_bytes(4, "little") + b"WAVE"
+        + b"fmt " + (16).to_bytes(4, "little") + (1).to_bytes(2, "little") + (1).to_bytes(2, "little")
+        + sample_rate.to_bytes(4, "little") + (sample_rate * 2).to_bytes(4, "little")
+        + (2).to_bytes(2, "little") + (16).to_bytes(2, "little")
+        + b"data" + data_size.to_bytes(4, "little")
+    )
+
+
+async def until_transcript(response, ended: float) -> float:
+    async for line in response.aiter_lines():
+        if line == "event: transcript":
+            return time.perf_counter() - ended
+    raise RuntimeError(f"no transcript (HTTP {response.status_code})")
+
+
+async def multipart_caller(client, session_id: str, pcm: bytes, sample_rate: int) -> float:
+    # Talks for the clip's length, then uploads the whole recording
+    await asyncio.sleep(len(pcm) / (sample_rate * 2))
+    ended = time.perf_counter()
+    files = {"file": ("turn.wav", wav_header(sample_rate, len(pcm)) + pcm, "audio/wav")}
+    async with client.stream("POST", f"/stream-chat/{session_id}", files=files) as response:
+        return await until_transcript(response, ended)
+
+
+async def chunked_caller(client, session_id: str, pcm: bytes, sample_rate: int) -> float:
+    # Streams the recording while it is being made; the WAV header can't know the size yet
+    frame = sample_rate * 2 * FRAME_MS // 1000
+    view = memoryview(pcm)
+    sent = {}
+
+    async def body():
+        yield wav_header(sample_rate, 0xFFFFFFFF - 36)
+        started = time.perf_counter()
+        for offset in range(0, len(view), frame):
+            await asyncio.sleep(max(0.0, started + (offset + frame) / (sample_rate * 2) - time.perf_counter()))
+            yield bytes(view[offset:offset + frame])
+        sent["ended"] = time.perf_counter()
+
+    headers = {"content-type": "audio/wav"}
+    async with client.stream("POST", f"/stream-chat/{session_id}", content=body(), headers=headers) as response:
+        transcript = await until_transcript(response, 0.0)
+    return transcript - sent["ended"]
+
+
+async def drive(port: int, args) -> dict:
+    pcm = bytes(int(args.seconds * args.rate) * 2)
+    caller = multipart_caller if args.mode == "multipart" else chunked_caller
+    limits = httpx.Limits(max_connections=args.callers * 2)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=120, limits=limits) as client:
+        # One warm-up turn, so connection pools and lazy imports aren't in the numbers
+        await caller(client, "warmup", pcm[:args.rate * 2], args.rate)
+        baseline = rss_bytes()
+        rss = [baseline]
+        callers = [asyncio.create_task(caller(client, f"caller-{i}", pcm, args.rate)) for i in range(args.callers)]
+        while not all(c.done() for c in callers):
+            rss.append(rss_bytes())
+            await asyncio.sleep(0.05)
+        outcomes = await asyncio.gather(*callers, return_exceptions=True)
+    latencies = [o for o in outcomes if not isinstance(o, BaseException)]
+    return {
+        "rss_growth": max(rss) - baseline,
+        "latencies": latencies,
+        "errors": [repr(o) for o in outcomes if isinstance(o, BaseException)],
+    }
+
+
+def serve_upstreams(port: int, upload_bandwidth: float):
+    profile = UpstreamProfile(upload_bandwidth=upload_bandwidth)
+    uvicorn.run(build_app(profile), host="127.0.0.1", port=port, log_level="warning", ws_ping_interval=None)
+
+
+def child(args):
+    upstreams = multiprocessing.get_context("spawn").Process(
+        target=serve_upstreams, args=(UPSTREAM_PORT, args.upload_bandwidth), daemon=True)
+    upstreams.start()
+    while True:
+        try:
+            socket.create_connection(("127.0.0.1", UPSTREAM_PORT), timeout=1).close()
+            break
+        except OSError:
+            time.sleep(0.05)
+
+    import main as nick
+
+    app_port = free_port()
+    app_server = start_server_thread(nick.app, app_port, lifespan="on")
+    try:
+        result = asyncio.run(drive(app_port, args))
+    finally:
+        stop_server_thread(*app_server)
+        upstreams.terminate()
+        upstreams.join()
+    print(json.dumps(result))
+
+
+def run(mode: str, rate: int, seconds: float, args) -> dict:
+    cmd = [sys.executable, "-m", "benchmarks.streaming_ingest", "--child", "--mode", mode, "--rate", str(rate),
+           "--seconds", str(seconds), "--callers", str(args.callers), "--upload-bandwidth", str(args.upload_bandwidth)]
+    out = subprocess.run(cmd, env=PARENT_ENV, capture_output=True, text=True, check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main(args) -> int:
+    print(f"{args.callers} concurrent /stream-chat callers, uploads to STT at {args.upload_bandwidth / 1e6:g} MB/s")
+    print(f"{'upload':<11}{'rate':>7}{'clip':>7}{'speech end -> transcript p50 / p95':>37}{'RSS growth':>13}{'errors':>8}")
+    failed = False
+    for rate in args.rates:
+        for seconds in args.seconds:
+            for mode in args.modes:
+                r = run(mode, rate, seconds, args)
+                values = sorted(r["latencies"]) or [float("nan")]
+                p95 = values[min(len(values) - 1, int(len(values) * 0.95))]
+                print(f"{mode:<11}{rate:>7}{seconds:>6g}s{statistics.median(values) * 1000:>26.0f} / {p95 * 1000:>6.0f} ms"
+                      f"{r['rss_growth'] / 2**20:>9.1f} MiB{len(r['errors']):>8}")
+                for error in r["errors"][:3]:
+                    print(f"  error: {error}")
+                failed |= bool(r["errors"])
+    return int(failed)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="End of speech -> transcript and memory for streamed vs buffered uploads")
+    parser.add_argument("--callers", type=int, default=20)
+    parser.add_argument("--seconds", type=float, nargs="+", default=[3.0, 10.0, 30.0])
+    parser.add_argument("--rates", type=int, nargs="+", default=list(RATES))
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--upload-bandwidth", type=float, default=2e6, help="bytes/s to the fake AssemblyAI upload")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--mode", choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument("--rate", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        args.seconds = args.seconds[0]
+        child(args)
+    else:
+        sys.exit(main(args))
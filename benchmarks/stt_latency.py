@@ -0,0 +1,88 @@
+# STT latency benchmark: end-of-speech to transcript for the old fixed 2 s polling,
+# the adaptive batch backend and the realtime streaming backend.
+#
+#   python -m benchmarks.stt_latency --turns 5 --seconds 3
+
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+from benchmarks.fake_upstreams import UpstreamProfile, build_app, free_port, silent_wav, start_server, stop_server
+
+PORT = free_port()
+os.environ.setdefault("ASSEMBLY_API_BASE", f"http://127.0.0.1:{PORT}")
+os.environ.setdefault("ASSEMBLY_STREAMING_URL", f"ws://127.0.0.1:{PORT}/v3/ws")
+os.environ.setdefault("TTS_CACHE_DIR", tempfile.mkdtemp(prefix="nick-bench-tts-"))
+
+from services import connections  # noqa: E402
+from services.connections import ASSEMBLY_API_BASE, http_client  # noqa: E402
+from services.transcription import BatchTranscriber, StreamingTranscriber, pcm16_from_wav  # noqa: E402
+
+
+async def fixed_poll_transcribe(audio_bytes):
+    # The original process_audio loop: upload, create, poll every 2 s
+    client = http_client("assemblyai")
+    upload = await client.post(f"{ASSEMBLY_API_BASE}/v2/upload", content=audio_bytes)
+    job = await client.post(f"{ASSEMBLY_API_BASE}/v2/transcript", json={"audio_url": upload.json()["upload_url"]})
+    transcript_id = job.json()["id"]
+    while True:
+        poll = await client.get(f"{ASSEMBLY_API_BASE}/v2/transcript/{transcript_id}")
+        if poll.json()["status"] == "completed":
+            return poll.json()["text"]
+        await asyncio.sleep(2)
+
+
+async def batch_latency(transcribe, audio_bytes):
+    # The whole recording exists only once the user stopped talking
+    started = time.perf_counter()
+    await transcribe(audio_bytes)
+    return time.perf_counter() - started
+
+
+async def streaming_latency(audio_bytes):
+    transcriber = StreamingTranscriber(realtime=True)
+    pcm = pcm16_from_wav(audio_bytes, transcriber.sample_rate)
+    end_of_speech = None
+
+    async def paced():
+        nonlocal end_of_speech
+        async for chunk in transcriber._chunks(pcm):
+            yield chunk
+        end_of_speech = time.perf_counter()
+
+    async for event in transcriber.stream(paced()):
+        if event["message_type"] == "FinalTranscript":
+            return time.perf_counter() - end_of_speech
+
+
+async def main(turns: int, seconds: float):
+    app = build_app(UpstreamProfile(jitter=0.2))
+    server, task = await start_server(app, PORT)
+    await connections.startup(warm_murf=False)
+    audio = silent_wav(seconds)
+    try:
+        runs = [
+            ("fixed 2s poll", lambda: batch_latency(fixed_poll_transcribe, audio)),
+            ("adaptive poll", lambda: batch_latency(BatchTranscriber().transcribe, audio)),
+            ("streaming", lambda: streaming_latency(audio)),
+        ]
+        for name, run in runs:
+            polls_before = app.state.stt_polls
+            latencies = [await run() for _ in range(turns)]
+            polls = (app.state.stt_polls - polls_before) / turns
+            print(f"{name:<14} end-of-speech -> transcript p50 {statistics.median(latencies) * 1000:7.1f} ms"
+                  f"  max {max(latencies) * 1000:7.1f} ms | polls/turn {polls:4.1f}")
+    finally:
+        await connections.shutdown()
+        await stop_server(server, task)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="STT latency benchmark")
+    parser.add_argument("--turns", type=int, default=5)
+    parser.add_argument("--seconds", type=float, default=3.0)
+    args = parser.parse_args()
+    asyncio.run(main(args.turns, args.seconds))
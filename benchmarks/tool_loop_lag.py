@@ -0,0 +1,100 @@
+# Event-loop lag while many requests look up weather/search at once:
+# blocking requests.get in the handler (how get_weather used to work) vs. services.tools.
+#
+#   python -m benchmarks.tool_loop_lag --requests 200 --concurrency 50 --cities 10
+#
+# The fake weather/search server runs in its own thread so the blocking client can reach it.
+# Lag is how late a 10 ms ticker on the server loop wakes up.
+
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import tempfile
+import time
+import requests
+
+from benchmarks.fake_upstreams import UpstreamProfile, build_app, free_port, start_server_thread, stop_server_thread
+
+PORT = free_port()
+os.environ.setdefault("WEATHER_API_BASE", f"http://127.0.0.1:{PORT}")
+os.environ.setdefault("TAVILY_API_BASE", f"http://127.0.0.1:{PORT}")
+os.environ.setdefault("TTS_CACHE_DIR", tempfile.mkdtemp(prefix="nick-bench-tts-"))
+
+from services.connections import shutdown, startup  # noqa: E402
+from services.tools import WEATHER_API_BASE, get_weather, tool_cache, web_search  # noqa: E402
+
+TICK = 0.01
+CITIES = ["Mumbai", "Delhi", "London", "Paris", "Tokyo", "New York", "Sydney", "Berlin", "Toronto", "Dubai",
+          "Lagos", "Lima", "Seoul", "Madrid", "Cairo", "Oslo"]
+
+
+async def ticker(lags: list, stop: asyncio.Event):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(TICK)
+        lags.append(time.perf_counter() - started - TICK)
+
+
+async def blocking_weather(city: str):
+    resp = requests.get(f"{WEATHER_API_BASE}/v1/current.json?key=bench&q={city}")
+    return resp.json()
+
+
+async def async_lookup(city: str, search: bool):
+    if search:
+        return await web_search(f"latest news about {city}")
+    return await get_weather(city)
+
+
+async def run(name: str, lookup, requests_total: int, concurrency: int, cities: int, seed: int):
+    rng = random.Random(seed)
+    lags, stop = [], asyncio.Event()
+    tick = asyncio.create_task(ticker(lags, stop))
+    gate = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(i):
+        async with gate:
+            started = time.perf_counter()
+            await lookup(CITIES[rng.randrange(cities)], i % 4 == 0)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests_total)))
+    wall = time.perf_counter() - started
+    stop.set()
+    await tick
+    lags.sort()
+    p99 = lags[int(len(lags) * 0.99)] if lags else 0.0
+    print(f"{name:<22} wall {wall:6.2f} s | request p50 {statistics.median(latencies) * 1000:7.1f} ms"
+          f" | loop lag p50 {statistics.median(lags) * 1000:6.1f} ms p99 {p99 * 1000:7.1f} ms"
+          f" max {lags[-1] * 1000:7.1f} ms")
+
+
+async def main(requests_total: int, concurrency: int, cities: int):
+    app = build_app(UpstreamProfile(tool_latency=0.15))
+    server = start_server_thread(app, PORT)
+    try:
+        # Clients are created at app startup, not on the first lookup
+        await startup(warm_murf=False)
+        calls = app.state.tool_calls
+        await run("blocking requests.get", lambda city, search: blocking_weather(city),
+                  requests_total, concurrency, cities, 1)
+        print(f"  upstream calls: {app.state.tool_calls - calls}")
+        calls = app.state.tool_calls
+        await run("services.tools", async_lookup, requests_total, concurrency, cities, 1)
+        print(f"  upstream calls: {app.state.tool_calls - calls} | cache {tool_cache.stats()}")
+        await shutdown()
+    finally:
+        stop_server_thread(*server)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Event-loop lag during tool lookups")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--cities", type=int, default=10)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.concurrency, min(args.cities, len(CITIES))))
@@ -0,0 +1,78 @@
+# Reply transport benchmark: bytes on the wire and peak server memory per concurrent turn
+# for JSON base64 (/process-audio), SSE base64 (/stream-chat) and binary frames.
+#
+#   python -m benchmarks.transport_bytes --sessions 50 --seconds 6
+
+import argparse
+import asyncio
+import base64
+import json
+import os
+import tempfile
+import tracemalloc
+
+os.environ.setdefault("TTS_CACHE_DIR", tempfile.mkdtemp(prefix="nick-bench-tts-"))
+
+from services.audio_framing import frame_stream, sse_stream  # noqa: E402
+
+CHUNK_BYTES = 8820  # ~0.1 s of 44.1 kHz mono PCM16, about what Murf sends per message
+
+
+async def murf_audio(seconds: float):
+    for _ in range(int(seconds * 10)):
+        await asyncio.sleep(0)
+        yield bytes(CHUNK_BYTES)
+
+
+async def events(seconds: float):
+    yield "meta", {"text": "Hi Nick", "gemini": "Hey there, it's Nick!"}
+    async for chunk in murf_audio(seconds):
+        yield "audio", chunk
+
+
+async def json_base64_turn(seconds: float) -> int:
+    # call_murf_tts + JSON response: whole WAV joined, base64'd, then serialized
+    chunks = [chunk async for chunk in murf_audio(seconds)]
+    audio_base64 = base64.b64encode(b"".join(chunks)).decode("utf-8")
+    body = json.dumps({"text": "Hi Nick", "gemini": "Hey there, it's Nick!", "audio_base64": audio_base64})
+    return len(body.encode())
+
+
+async def drain(stream) -> int:
+    sent = 0
+    async for part in stream:
+        sent += len(part)
+    return sent
+
+
+async def sse_turn(seconds: float) -> int:
+    return await drain(sse_stream(events(seconds)))
+
+
+async def frames_turn(seconds: float) -> int:
+    return await drain(frame_stream(events(seconds)))
+
+
+async def measure(turn, sessions: int, seconds: float):
+    tracemalloc.start()
+    sent = await asyncio.gather(*(turn(seconds) for _ in range(sessions)))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return sent[0], peak / sessions
+
+
+async def main(sessions: int, seconds: float):
+    audio_bytes = int(seconds * 10) * CHUNK_BYTES
+    print(f"raw audio per turn: {audio_bytes / 1024:8.1f} KiB")
+    for name, turn in [("json+base64", json_base64_turn), ("sse+base64", sse_turn), ("frames", frames_turn)]:
+        wire, peak = await measure(turn, sessions, seconds)
+        print(f"{name:<12} wire {wire / 1024:8.1f} KiB ({wire / audio_bytes:5.2f}x)"
+              f" | peak heap per concurrent turn {peak / 1024:8.1f} KiB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reply transport benchmark")
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument("--seconds", type=float, default=6.0)
+    args = parser.parse_args()
+    asyncio.run(main(args.sessions, args.seconds))
@@ -0,0 +1,104 @@
+# Turn latency benchmark: serial per-chunk Murf dials vs. the pipelined run_turn engine.
+#
+#   python -m benchmarks.turn_latency --turns 10
+#
+# Reports time to first audio byte and end of turn against local fake Gemini/Murf servers.
+
+import argparse
+import asyncio
+import base64
+import json
+import os
+import statistics
+import tempfile
+import time
+import websockets
+
+from benchmarks.fake_upstreams import UpstreamProfile, build_app, free_port, start_server, stop_server
+
+PORT = free_port()
+os.environ.setdefault("GEMINI_API_BASE", f"http://127.0.0.1:{PORT}")
+os.environ.setdefault("MURF_WS_URL", f"ws://127.0.0.1:{PORT}/v1/speech/stream-input")
+os.environ.setdefault("TTS_CACHE_DIR", tempfile.mkdtemp(prefix="nick-bench-tts-"))
+
+from services.murf_ws import VOICE_CONFIG, MurfSession, murf_ws_url  # noqa: E402
+from services.pipeline import pipeline  # noqa: E402
+from services.voice_stream_ws import VOICE_SYSTEM_PROMPT, run_turn  # noqa: E402
+
+
+# Stands in for the browser end of /ws/voice and timestamps what it receives
+class RecordingSocket:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.first_audio = None
+        self.audio_bytes = 0
+
+    async def send_json(self, data):
+        pass
+
+    async def send_bytes(self, data):
+        if self.first_audio is None:
+            self.first_audio = time.perf_counter()
+        self.audio_bytes += len(data)
+
+
+async def legacy_murf_stream(text):
+    # Fresh Murf dial per call, as murf_stream did before pooling
+    async with websockets.connect(murf_ws_url()) as ws:
+        await ws.send(json.dumps({"voice_config": VOICE_CONFIG}))
+        await ws.send(json.dumps({"context_id": "streaming-ctx", "text": text, "end": True}))
+        while True:
+            data = json.loads(await ws.recv())
+            if "audio" in data:
+                yield base64.b64decode(data["audio"])
+            if data.get("final"):
+                break
+
+
+async def legacy_turn(websocket, transcript):
+    # The pre-pipelining loop from voice_agent_ws
+    async for gemini_chunk in pipeline.generate(transcript, VOICE_SYSTEM_PROMPT):
+        await websocket.send_json({"type": "gemini", "text": gemini_chunk})
+        async for audio_chunk in legacy_murf_stream(gemini_chunk):
+            await websocket.send_bytes(audio_chunk)
+
+
+async def measure(turn, turns: int):
+    first_audio, end_of_turn = [], []
+    for _ in range(turns):
+        websocket = RecordingSocket()
+        await turn(websocket)
+        done = time.perf_counter()
+        first_audio.append((websocket.first_audio or done) - websocket.started)
+        end_of_turn.append(done - websocket.started)
+    return first_audio, end_of_turn
+
+
+def report(name, first_audio, end_of_turn):
+    print(f"{name:<10} first audio p50 {statistics.median(first_audio) * 1000:7.1f} ms"
+          f"  max {max(first_audio) * 1000:7.1f} ms"
+          f" | end of turn p50 {statistics.median(end_of_turn) * 1000:7.1f} ms"
+          f"  max {max(end_of_turn) * 1000:7.1f} ms")
+
+
+async def main(turns: int, jitter: float):
+    server, task = await start_server(build_app(UpstreamProfile(jitter=jitter)), PORT)
+    transcript = "Hi Nick, how is the weather today?"
+    try:
+        report("before", *await measure(lambda ws: legacy_turn(ws, transcript), turns))
+        murf = MurfSession()
+        await murf.connect()
+        try:
+            report("after", *await measure(lambda ws: run_turn(ws, transcript, murf), turns))
+        finally:
+            await murf.close()
+    finally:
+        await stop_server(server, task)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Turn latency benchmark")
+    parser.add_argument("--turns", type=int, default=10)
+    parser.add_argument("--jitter", type=float, default=0.2)
+    args = parser.parse_args()
+    asyncio.run(main(args.turns, args.jitter))
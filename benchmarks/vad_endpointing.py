@@ -0,0 +1,87 @@
+# Offline VAD benchmark: endpoint delay (true end of speech -> end_of_turn) and upstream bandwidth saved.
+#
+#   python -m benchmarks.vad_endpointing
+#   python -m benchmarks.vad_endpointing --wav a.wav --wav b.wav --speech-end 2.4 --speech-end 3.1
+#
+# Without --wav, synthetic utterances (voiced harmonics over background noise) are generated.
+
+import argparse
+import os
+import tempfile
+import numpy as np
+
+os.environ.setdefault("TTS_CACHE_DIR", tempfile.mkdtemp(prefix="nick-bench-tts-"))
+
+from services.audio_codec import Resampler, parse_wav_header  # noqa: E402
+from services.vad import StreamingVAD  # noqa: E402
+
+SAMPLE_RATE = 16000
+CHUNK_MS = 250  # what MediaRecorder.start(250) delivers
+
+
+def synthetic_utterance(lead: float, speech: float, tail: float, noise_db: float, seed: int):
+    rng = np.random.default_rng(seed)
+    n = int((lead + speech + tail) * SAMPLE_RATE)
+    audio = rng.normal(0, 10 ** (noise_db / 20), n)
+    t = np.arange(int(speech * SAMPLE_RATE)) / SAMPLE_RATE
+    pitch = 140 + 30 * np.sin(2 * np.pi * 0.7 * t)
+    phase = 2 * np.pi * np.cumsum(pitch) / SAMPLE_RATE
+    voiced = sum(np.sin(k * phase) / k for k in range(1, 8))
+    syllables = np.clip(np.sin(2 * np.pi * 4 * t), 0.15, 1)  # ~4 syllables/s with short dips
+    start = int(lead * SAMPLE_RATE)
+    audio[start:start + len(t)] += 0.25 * voiced * syllables
+    pcm = (np.clip(audio, -1, 1) * 32767).astype("<i2").tobytes()
+    return pcm, lead + speech
+
+
+def load_fixture(path: str):
+    with open(path, "rb") as f:
+        data = f.read()
+    header = parse_wav_header(data)
+    if header is None or header[1] != 1 or header[2] != 16:
+        raise SystemExit(f"{path}: fixture must be a mono PCM16 WAV")
+    pcm = data[header[3]:]
+    if header[0] != SAMPLE_RATE:
+        pcm = Resampler(header[0], SAMPLE_RATE).process(pcm)
+    return pcm
+
+
+def run(pcm: bytes, speech_end: float, **vad_options):
+    vad = StreamingVAD(sample_rate=SAMPLE_RATE, **vad_options)
+    chunk = SAMPLE_RATE * 2 * CHUNK_MS // 1000
+    endpoint = None
+    for offset in range(0, len(pcm), chunk):
+        _, events = vad.process(pcm[offset:offset + chunk])
+        if "end_of_turn" in events and endpoint is None:
+            # Events surface when the chunk containing them arrives
+            endpoint = min(offset + chunk, len(pcm)) / (SAMPLE_RATE * 2)
+    delay = endpoint - speech_end if endpoint is not None else None
+    return delay, vad.stats()
+
+
+def main(wavs: list, speech_ends: list):
+    if wavs:
+        cases = [(path, load_fixture(path), end) for path, end in zip(wavs, speech_ends)]
+    else:
+        cases = [
+            (f"synthetic noise {noise} dB", *synthetic_utterance(1.0, 2.5, 2.0, noise, seed))
+            for seed, noise in enumerate((-60, -50, -40))
+        ]
+    for hangover, end_of_turn in ((200, 500), (300, 700), (400, 1000)):
+        print(f"hangover {hangover} ms, end of turn after {end_of_turn} ms of silence")
+        for name, pcm, speech_end in cases:
+            delay, stats = run(pcm, speech_end, hangover_ms=hangover, end_of_turn_ms=end_of_turn)
+            shown = f"{delay * 1000:6.0f} ms" if delay is not None else "  missed"
+            print(f"  {name:<26} endpoint delay {shown} | speech ratio {stats['speech_ratio']:.2f}"
+                  f" | bandwidth saved {stats['bandwidth_saved'] * 100:5.1f}%")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline VAD endpointing benchmark")
+    parser.add_argument("--wav", action="append", default=[])
+    parser.add_argument("--speech-end", action="append", type=float, default=[],
+                        help="true end of speech in seconds, one per --wav")
+    args = parser.parse_args()
+    if len(args.wav) != len(args.speech_end):
+        parser.error("give one --speech-end per --wav")
+    main(args.wav, args.speech_end)
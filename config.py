@@ -1 +1,9 @@
 #Api Keys here
+import os
+
+# Keys can also come from the environment (see README / check_env.py)
+GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "")
+MURF_API_KEY = os.getenv("MURF_API_KEY", "")
+ASSEMBLY_API_KEY = os.getenv("ASSEMBLYAI_API_KEY", "")
+WEATHER_API_KEY = os.getenv("WEATHER_API_KEY", "")
+TAVILY_API_KEY = os.getenv("TAVILY_API_KEY", "")
@@ -1,388 +1,367 @@
-# WebSocket streaming voice agent endpoint
-
-from fastapi import FastAPI, File, UploadFile, WebSocket
-from fastapi.responses import FileResponse
-from fastapi.staticfiles import StaticFiles
-from services.voice_stream_ws import voice_agent_ws
-
-app = FastAPI()
-app.mount("/static", StaticFiles(directory="static"), name="static")
-
-@app.websocket("/ws/voice")
-async def ws_voice(websocket: WebSocket):
-    await voice_agent_ws(websocket)
-
-@app.get("/")
-async def root():
-    return FileResponse("static/index.html")
-
-@app.post("/process-audio/{session_id}")
-async def process_audio_endpoint(session_id: str, file: UploadFile = File(...)):
-    audio_bytes = await file.read()
-    result = await process_audio(audio_bytes, session_id)
-    # ...existing code...
-    return result
-
-# Streaming Murf TTS endpoint
-@app.get("/stream-murf-tts/{session_id}")
-async def stream_murf_tts(session_id: str, text: str):
-    # Streams audio chunks as soon as they are received from Murf
-    return StreamingResponse(murf_tts_streamer(text), media_type="audio/wav")
-
-# Streaming chat endpoint: streams Gemini text, then Murf TTS audio as soon as available
-@app.post("/stream-chat/{session_id}")
-async def stream_chat(session_id: str, file: UploadFile = File(...)):
-    audio_bytes = await file.read()
-    # 1. Transcribe audio (AssemblyAI, blocking)
-    transcript = None
-    headers = {"authorization": ASSEMBLY_API_KEY, "content-type": "application/octet-stream"}
-    try:
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            upload_resp = await client.post("https://api.assemblyai.com/v2/upload", headers=headers, content=audio_bytes)
-            upload_resp.raise_for_status()
-            audio_url = upload_resp.json()["upload_url"]
-            transcribe_resp = await client.post(
-                "https://api.assemblyai.com/v2/transcript",
-                headers=headers,
-                json={"audio_url": audio_url}
-            )
-            transcribe_resp.raise_for_status()
-            transcript_id = transcribe_resp.json()["id"]
-            while True:
-                poll = await client.get(f"https://api.assemblyai.com/v2/transcript/{transcript_id}", headers=headers)
-                poll.raise_for_status()
-                status = poll.json()["status"]
-                if status == "completed":
-                    transcript = poll.json()["text"]
-                    break
-                elif status == "failed":
-                    yield b"event: error\ndata: Transcription failed.\n\n"
-                    return
-                await asyncio.sleep(2)
-    except Exception as e:
-        yield f"event: error\ndata: Transcription error: {e}\n\n".encode()
-        return
-
-    if not transcript or not transcript.strip():
-        yield b"event: error\ndata: I couldn't hear you. Please speak louder or check your microphone.\n\n"
-        return
-
-    # 2. Update chat history
-    if session_id not in chat_histories:
-        chat_histories[session_id] = []
-    chat_histories[session_id].append({"role": "user", "text": transcript})
-
-    # 3. Stream Gemini response (text)
-    gemini_context = []
-    if len(chat_histories[session_id]) >= 2:
-        prev_bot = chat_histories[session_id][-2]
-        if prev_bot["role"] == "bot":
-            gemini_context.append({"role": "model", "parts": [{"text": prev_bot["text"]}]})
-    gemini_context.append({"role": "user", "parts": [{"text": chat_histories[session_id][-1]["text"]}]})
-    try:
-        gemini_text = await call_gemini(gemini_context)
-    except Exception as e:
-        yield f"event: error\ndata: Gemini error: {e}\n\n".encode()
-        return
-    if not gemini_text or not isinstance(gemini_text, str) or not gemini_text.strip():
-        gemini_text = "Sorry, I couldn't generate a response right now."
-    chat_histories[session_id].append({"role": "bot", "text": gemini_text})
-    # Send Gemini text as soon as available
-    yield f"event: gemini\ndata: {gemini_text}\n\n".encode()
-
-    # 4. Stream Murf TTS audio as soon as available
-    try:
-        async for chunk in murf_tts_streamer(gemini_text):
-            # Send each chunk as base64-encoded WAV
-            import base64
-            b64 = base64.b64encode(chunk).decode()
-            yield f"event: audio\ndata: {b64}\n\n".encode()
-    except Exception as e:
-        yield f"event: error\ndata: Murf TTS error: {e}\n\n".encode()
-        return
-
-
-
-
-
-
-# ...existing code...
-
-
-# ...existing code...
-
-# Tavily search skill integration
-from tavily import TavilyClient
-tavily_client = TavilyClient(api_key="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")
-
-# WeatherAPI.com integration
-import re
-import requests
-
-WEATHER_API_KEY = "3a8a9e9977484fa89ef142525252608"
-
-def get_weather(city: str):
-    url = f"http://api.weatherapi.com/v1/current.json?key={WEATHER_API_KEY}&q={city}"
-    try:
-        resp = requests.get(url)
-        if resp.status_code == 200:
-            data = resp.json()
-            location = data['location']['name'] + ', ' + data['location']['country']
-            temp = data['current']['temp_c']
-            feels = data['current']['feelslike_c']
-            desc = data['current']['condition']['text']
-            return f"The weather in {location} is {desc} with a temperature of {temp}°C (feels like {feels}°C)."
-        else:
-            return "Sorry, I couldn't get the weather for that location."
-    except Exception as e:
-        return "Sorry, I couldn't get the weather right now."
-import sys
-import os
-import shutil
 import asyncio
-import httpx
 import base64
+import time
+from contextlib import asynccontextmanager
+from urllib.parse import quote
 
-from fastapi import FastAPI, UploadFile, File, WebSocket, WebSocketDisconnect
-import websockets
-import json
-
-
-# API Keys (imported from config.py)
-from config import GEMINI_API_KEY, MURF_API_KEY, ASSEMBLY_API_KEY
-
-# Chat histories store
-chat_histories = {}
-
-# ======================
-# Gemini API call
-# ======================
-async def call_gemini(prompt: str) -> str:
-    url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent?key={GEMINI_API_KEY}"
-    headers = {"Content-Type": "application/json"}
-    # If prompt is a string, wrap it as a single message; if it's a list, use as context
-    if isinstance(prompt, str):
-        contents = [{"parts": [{"text": prompt}]}]
-    else:
-        contents = prompt
-    payload = {
-        "contents": contents,
-        "system_instruction": {"parts": [{"text": "You are a human. Your name is Nick. You are a helpful, friendly, and conversational voice assistant. If someone greets you by name (Nick), respond warmly as Nick."}]}
-    }
-    try:
-        async with httpx.AsyncClient() as client:
-            resp = await client.post(url, headers=headers, json=payload)
-            resp.raise_for_status()
-            data = resp.json()
-            candidates = data.get("candidates", [])
-            if candidates:
-                return candidates[0].get("content", {}).get("parts", [{}])[0].get("text", "")
-            return "[No Gemini response]"
-    except Exception as e:
-        print("Gemini error:", e)
-        return "[Error contacting Gemini]"
+from fastapi import FastAPI, Request, WebSocket
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
+from fastapi.staticfiles import StaticFiles
+from starlette.background import BackgroundTask
+
+from services import connections
+from services.transcription import complete_webhook
+from services.ingest import INGEST_READ_BYTES, UploadStream, UploadTooLarge
+from services.admission import admission
+from services.blocking import blocking_pool
+from services.pipeline import pipeline
+from services.recording import recorder, replay_store
+from services.tts_cache import FALLBACK_PHRASES, tts_cache
+from services.sessions import session_store
+from services.context import context_builder
+from services.tools import tool_cache
+from services.response_cache import response_cache
+from services.routing import gemini_router
+from services.flow import flow_monitor
+from services.drain import DrainMiddleware, admin_allowed, drain
+from services.warmup import warmup
+from services.voice_stream_ws import voice_agent_ws
+from services.audio_framing import FRAMES_MEDIA_TYPE, SSE_MEDIA_TYPE, frame_stream, sse_stream, wants_frames, wants_wav
+from services.telemetry import RequestTimingMiddleware, TurnTrace, configure_logging, get_logger, metrics_payload
 
+configure_logging()
+log = get_logger("main")
 
-# ======================
-# Murf TTS API call (returns base64 audio)
-# ======================
-from fastapi.responses import StreamingResponse
-import uuid
-
-async def murf_tts_streamer(text: str):
-    import websockets
-    import json
-    ws_url = f"wss://api.murf.ai/v1/speech/stream-input?api-key={MURF_API_KEY}&sample_rate=44100&channel_type=MONO&format=WAV"
-    context_id = str(uuid.uuid4())
-    try:
-        async with websockets.connect(ws_url) as ws:
-            # Send voice config (optional, can be customized)
-            voice_config_msg = {
-                "voice_config": {
-                    "voiceId": "en-IN-aarav",
-                    "style": "Conversational",
-                    "rate": 0,
-                    "pitch": 0,
-                    "variation": 1
-                }
-            }
-            await ws.send(json.dumps(voice_config_msg))
-            # Send text with context_id
-            text_msg = {"context_id": context_id, "text": text, "end": True}
-            await ws.send(json.dumps(text_msg))
-            while True:
-                response = await ws.recv()
-                data = json.loads(response)
-                if "audio" in data:
-                    # Stream each audio chunk as soon as received (base64-encoded WAV)
-                    yield base64.b64decode(data["audio"])
-                if data.get("final"):
-                    break
-    except Exception as e:
-        print("Murf TTS WebSocket error:", e)
-        return
 
 # ======================
 # Process Audio Pipeline
 # ======================
-async def process_audio(audio_bytes: bytes, session_id: str):
-    headers = {"authorization": ASSEMBLY_API_KEY, "content-type": "application/octet-stream"}
-    transcript = None
-    try:
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            # Upload
-            upload_resp = await client.post("https://api.assemblyai.com/v2/upload", headers=headers, content=audio_bytes)
-            upload_resp.raise_for_status()
-            audio_url = upload_resp.json()["upload_url"]
-            # Transcribe
-            transcribe_resp = await client.post(
-                "https://api.assemblyai.com/v2/transcript",
-                headers=headers,
-                json={"audio_url": audio_url}
-            )
-            transcribe_resp.raise_for_status()
-            transcript_id = transcribe_resp.json()["id"]
-
-            # Poll for completion
-            while True:
-                poll = await client.get(f"https://api.assemblyai.com/v2/transcript/{transcript_id}", headers=headers)
-                poll.raise_for_status()
-                status = poll.json()["status"]
-                if status == "completed":
-                    transcript = poll.json()["text"]
-                    break
-                elif status == "failed":
-                    return {"text": "", "gemini": None, "audio_base64": None, "history": [], "error": "Transcription failed."}
-                await asyncio.sleep(2)
-    except httpx.ReadTimeout:
-        return {"text": "", "gemini": None, "audio_base64": None, "history": [], "error": "Transcription service timed out. Please try again or check your network connection."}
-    except Exception as e:
-        print("AssemblyAI error:", e)
-        return {"text": "", "gemini": None, "audio_base64": None, "history": [], "error": f"Transcription service error: {e}"}
-
-
-    if not transcript or not transcript.strip():
-        gemini_text = "I couldn't hear you. Please speak louder or check your microphone."
-        if session_id not in chat_histories:
-            chat_histories[session_id] = []
-        chat_histories[session_id].append({"role": "bot", "text": gemini_text})
-        return {
-            "text": "",
-            "gemini": gemini_text,
-            "audio_base64": None,
-            "history": chat_histories[session_id],
-        }
-
-    # Always append user message to chat_histories before Gemini
-    if session_id not in chat_histories:
-        chat_histories[session_id] = []
-    chat_histories[session_id].append({"role": "user", "text": transcript})
-
-
-    # Build Gemini context: previous bot response (if any) and latest user message
-    gemini_context = []
-    if len(chat_histories[session_id]) >= 2:
-        prev_bot = chat_histories[session_id][-2]
-        if prev_bot["role"] == "bot":
-            gemini_context.append({"role": "model", "parts": [{"text": prev_bot["text"]}]})
-    gemini_context.append({"role": "user", "parts": [{"text": chat_histories[session_id][-1]["text"]}]})
-
-    # Gemini response with minimal context
-    try:
-        gemini_text = await call_gemini(gemini_context)
-    except Exception as e:
-        print(f"[process_audio] Gemini error: {e}")
-        gemini_text = "Sorry, I couldn't generate a response right now."
-    if not gemini_text or not isinstance(gemini_text, str) or not gemini_text.strip():
-        gemini_text = "Sorry, I couldn't generate a response right now."
-    chat_histories[session_id].append({"role": "bot", "text": gemini_text})
-    print(f"[process_audio] Gemini response: {gemini_text}")
-
-    # Murf response (TTS, base64 audio)
-    try:
-        audio_base64 = await call_murf_tts(gemini_text)
-    except Exception as e:
-        print(f"[process_audio] Murf TTS error: {e}")
-        audio_base64 = None
-    if not audio_base64 or not isinstance(audio_base64, str) or not audio_base64.strip():
-        print("[process_audio] Murf TTS returned no audio.")
-        audio_base64 = None
-
-    return {
-        "text": transcript,
-        "gemini": gemini_text,
-        "audio_base64": audio_base64,
-        "history": chat_histories[session_id],
-    }
-
-# Helper for backward compatibility: collect all audio chunks and return as base64 string
-async def call_murf_tts(text: str) -> str:
-    # Always return WAV as base64 (no conversion, no pydub)
-    chunks = []
-    async for chunk in murf_tts_streamer(text):
-        chunks.append(chunk)
-    wav_bytes = b"".join(chunks)
-    return base64.b64encode(wav_bytes).decode("utf-8")
-
-    if not transcript or not transcript.strip():
-        gemini_text = "I couldn't hear you. Please speak louder or check your microphone."
-        chat_histories[session_id].append({"role": "bot", "text": gemini_text})
-        print(f"Nick: {gemini_text}")
-        return {
-            "text": transcript,
-            "gemini": gemini_text,
-            "audio_base64": None,
-            "history": chat_histories[session_id],
-        }
-
-    # Build Gemini context: only latest user message and previous bot response (if any)
-    gemini_context = []
-    if len(chat_histories[session_id]) >= 2:
-        # Add previous bot response
-        prev_bot = chat_histories[session_id][-2]
-        if prev_bot["role"] == "bot":
-            gemini_context.append({"role": "model", "parts": [{"text": prev_bot["text"]}]})
-    # Add latest user message
-    gemini_context.append({"role": "user", "parts": [{"text": chat_histories[session_id][-1]["text"]}]})
-
-    # Gemini response with minimal context
-    gemini_text = await call_gemini(gemini_context)
-    chat_histories[session_id].append({"role": "bot", "text": gemini_text})
-    print(f"Nick: {gemini_text}")
-
-    # Murf response (TTS, base64 audio)
-    audio_base64 = await call_murf_tts(gemini_text)
-    return {
-        "text": transcript,
-        "gemini": gemini_text,
-        "audio_base64": audio_base64,
-        "history": chat_histories[session_id],
-    }
+# A turn's events (services.pipeline) read into the /process-audio result, one at a time. "history"
+# holds only the turns added by this call unless full_history is set.
+class TurnResult:
+    def __init__(self):
+        self.result = {"text": "", "gemini": None, "audio_base64": None, "history": []}
+        self.audio = []
+        self.heard = False
+        self.added = []
+
+    def add(self, event: str, data):
+        result = self.result
+        if event == "transcript":
+            self.heard = True
+            result["text"] = data
+            if data.strip():
+                self.added.append({"role": "user", "text": data})
+        elif event == "reply":
+            result["gemini"] = data
+            if self.heard:
+                self.added.append({"role": "bot", "text": data})
+        elif event == "audio":
+            self.audio.append(data)
+        elif event == "busy":
+            result["busy"] = True
+        elif event == "error" and result["gemini"] is None:
+            result["error"] = data
+
+    async def finish(self, session_id: str, full_history: bool = False) -> dict:
+        if full_history:
+            self.result["history"] = [turn.as_dict() for turn in await session_store.history(session_id)]
+        else:
+            self.result["history"] = self.added
+        log.debug("Gemini response: %s", self.result["gemini"])
+        return self.result
+
+# until_reply stops at the whole reply, for responses that stream the rest of the audio; audio
+# already there is returned
+async def turn_result(events, session_id: str, full_history: bool = False, until_reply: bool = False):
+    turn = TurnResult()
+    async for event, data in events:
+        turn.add(event, data)
+        if until_reply and event == "reply":
+            break
+    return await turn.finish(session_id, full_history), turn.audio
 
 # ======================
 # FastAPI app
-# FastAPI app
 # ======================
 
-from fastapi.responses import FileResponse
-from fastapi.staticfiles import StaticFiles
-
-app = FastAPI()
+# Shared upstream clients live for the lifetime of the app. They, the warm Murf sockets and the
+# cached fallback phrases are set up in the background: requests are served from the start.
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    warmup.start([(pipeline.tts.cache_key(text), lambda text=text: pipeline.tts.synthesize(text)) for text in FALLBACK_PHRASES])
+    try:
+        yield
+    finally:
+        await warmup.close()
+        await context_builder.close()
+        await connections.shutdown()
+        blocking_pool.close()
+        session_store.close()
+        recorder.close()
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(RequestTimingMiddleware)
+app.add_middleware(DrainMiddleware)
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
+# WebSocket streaming voice agent endpoint
+@app.websocket("/ws/voice")
+async def ws_voice(websocket: WebSocket):
+    await voice_agent_ws(websocket)
+
 @app.get("/")
 async def root():
     return FileResponse("static/index.html")
 
+# ?history=full returns the whole (capped) session history instead of just this turn
 @app.post("/process-audio/{session_id}")
-async def process_audio_endpoint(session_id: str, file: UploadFile = File(...)):
-    audio_bytes = await file.read()
-    result = await process_audio(audio_bytes, session_id)
-    # ...existing code...
+async def process_audio_endpoint(session_id: str, request: Request, history: str = "delta"):
+    upload = await audio_upload(request)
+    if isinstance(upload, Response):
+        return upload
+    try:
+        trace, transcription = await upload_turn("process_audio", session_id, request, upload)
+    except UploadTooLarge as e:
+        await upload.close()
+        return JSONResponse({"error": str(e)}, status_code=413)
+    accept = request.headers.get("accept", "")
+    full_history = history == "full"
+    events = pipeline.turn(upload, session_id, trace, transcription=transcription)
+    if wants_frames(accept):
+        # Raw WAV frames instead of base64 in JSON, streamed as it is synthesized; filler audio
+        # covers a slow turn
+        events = pipeline.filler.mask(events, trace)
+        return StreamingResponse(frame_stream(process_frames(trace, events, session_id, full_history)),
+                                 media_type=FRAMES_MEDIA_TYPE, background=BackgroundTask(upload.close))
+    try:
+        if wants_wav(accept):
+            # The reply travels in the headers, so nothing (not even filler) can go out before it
+            result, early = await turn_result(events, session_id, full_history, until_reply=True)
+            audio = client_audio(trace, early, events)
+            headers = {
+                "X-Transcript": quote(result.get("text") or ""),
+                "X-Nick-Reply": quote(result.get("gemini") or ""),
+            }
+            return StreamingResponse(audio, media_type="audio/wav", headers=headers,
+                                     background=BackgroundTask(upload.close))
+        result, audio = await turn_result(events, session_id, full_history)
+    except BaseException:
+        await upload.close()
+        raise
+    await upload.close()
+    result["audio_base64"] = base64.b64encode(b"".join(audio)).decode("utf-8") if audio else None
+    if result["gemini"] and not audio:
+        log.warning("TTS returned no audio")
     return result
 
+# The recording of an HTTP turn, as it arrives (services.ingest): the "file" field of a multipart
+# form, or the raw request body (audio/wav, audio/webm, ...). A body sent with chunked transfer
+# encoding is taken as uploaded while the user talks. A 422 response when the form has no file.
+async def audio_upload(request: Request):
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith("multipart/form-data"):
+        form = await request.form()
+        file = form.get("file")
+        if file is None or isinstance(file, str):
+            await form.close()
+            return JSONResponse({"error": "no audio file in the form"}, status_code=422)
+
+        async def blocks():
+            while block := await file.read(INGEST_READ_BYTES):
+                yield block
+
+        return UploadStream(blocks(), cleanup=form.close)
+    incremental = "chunked" in request.headers.get("transfer-encoding", "") or "content-length" not in request.headers
+    return UploadStream(request.stream(), incremental=incremental)
+
+# Starts transcribing the upload as it arrives and waits for the rest of it. An incremental upload
+# ends when the user stops talking, so its turn is timed from there; any other from when the request
+# arrived, upload included.
+async def upload_turn(name: str, session_id: str, request: Request, upload: UploadStream):
+    transcription = asyncio.ensure_future(pipeline.transcribe(upload, session_id))
+    try:
+        await upload.wait()
+    except BaseException:
+        transcription.cancel()
+        await asyncio.gather(transcription, return_exceptions=True)
+        raise
+    trace = TurnTrace(name, session_id, started=upload.completed_at) if upload.incremental \
+        else request_trace(name, session_id, request)
+    trace.mark("audio_receive", getattr(request.state, "received_at", trace.started), upload.completed_at)
+    return trace, transcription
+
+# Trace for an HTTP turn, timed from when the request arrived (upload included)
+def request_trace(pipeline: str, session_id: str, request: Request) -> TurnTrace:
+    return TurnTrace(pipeline, session_id, started=getattr(request.state, "received_at", None))
+
+# The rest of a turn's audio on its way to the client: first audio and send time go to the trace
+async def client_audio(trace: TurnTrace, early: list, events):
+    async def chunks():
+        for chunk in early:
+            yield chunk
+        async for event, data in events:
+            if event == "audio":
+                yield data
+
+    try:
+        async for chunk in chunks():
+            now = time.perf_counter()
+            trace.mark("perceived_first_audio", trace.started, now)
+            trace.mark("first_audio", trace.started, now)
+            yield chunk
+            trace.add_send(time.perf_counter() - now)
+    finally:
+        await events.aclose()
+
+def without_audio(result: dict) -> dict:
+    return {key: value for key, value in result.items() if key != "audio_base64"}
+
+# /process-audio frames: audio (filler for a slow turn, then the answer) goes out as it arrives, the
+# meta frame once the reply is complete (or, for a turn without one, at the end)
+async def process_frames(trace: TurnTrace, events, session_id: str, full_history: bool):
+    turn = TurnResult()
+    meta_sent = False
+    try:
+        async for event, data in events:
+            if event not in ("audio", "filler_audio"):
+                turn.add(event, data)
+                if event == "reply":
+                    meta_sent = True
+                    yield "meta", without_audio(await turn.finish(session_id, full_history))
+                continue
+            now = time.perf_counter()
+            trace.mark("perceived_first_audio", trace.started, now)
+            if event == "audio":
+                trace.mark("first_audio", trace.started, now)
+            yield event, data
+            trace.add_send(time.perf_counter() - now)
+        if not meta_sent:
+            yield "meta", without_audio(await turn.finish(session_id, full_history))
+    finally:
+        await events.aclose()
+
 # Streaming Murf TTS endpoint
 @app.get("/stream-murf-tts/{session_id}")
 async def stream_murf_tts(session_id: str, text: str):
-    # Streams audio chunks as soon as they are received from Murf
-    return StreamingResponse(murf_tts_streamer(text), media_type="audio/wav")
+    # Streams audio chunks as soon as they are received (repeated lines from the TTS cache)
+    return StreamingResponse(pipeline.speak(text, session_id), media_type="audio/wav")
+
+# Streaming chat endpoint: streams the reply text as it is generated, and its audio as soon as
+# each sentence is synthesized
+@app.post("/stream-chat/{session_id}")
+async def stream_chat(session_id: str, request: Request):
+    upload = await audio_upload(request)
+    if isinstance(upload, Response):
+        return upload
+    try:
+        trace, transcription = await upload_turn("stream_chat", session_id, request, upload)
+    except UploadTooLarge as e:
+        await upload.close()
+        return JSONResponse({"error": str(e)}, status_code=413)
+    turn = pipeline.turn(upload, session_id, trace, transcription=transcription)
+    events = client_events(trace, pipeline.filler.mask(turn, trace))
+    if wants_frames(request.headers.get("accept", "")):
+        return StreamingResponse(frame_stream(events), media_type=FRAMES_MEDIA_TYPE,
+                                 background=BackgroundTask(upload.close))
+    return StreamingResponse(sse_stream(events), media_type=SSE_MEDIA_TYPE, background=BackgroundTask(upload.close))
+
+# A turn's events for /stream-chat ("reply" repeats the "gemini" text, so it is left out). Filler
+# audio goes out as "filler_audio" after a "filler" event with its text.
+async def client_events(trace: TurnTrace, events):
+    try:
+        async for event, data in events:
+            if event == "reply":
+                continue
+            if event not in ("audio", "filler_audio"):
+                yield event, data
+                continue
+            now = time.perf_counter()
+            trace.mark("perceived_first_audio", trace.started, now)
+            if event == "audio":
+                trace.mark("first_audio", trace.started, now)
+            yield event, data
+            trace.add_send(time.perf_counter() - now)
+    finally:
+        await events.aclose()
+
+# Turn engine providers, the SDK thread pool (calls, waits, time spent blocking), filler audio and
+# upstream traffic recording/replay
+@app.get("/stats/pipeline")
+async def pipeline_stats():
+    stats = {"providers": pipeline.providers(), "blocking": blocking_pool.stats(), "filler": pipeline.filler.stats(),
+             "recording": recorder.stats()}
+    if "replay" in pipeline.providers().values():
+        stats["replay"] = replay_store.stats()
+    return stats
+
+# Gemini routes: time to first token per model (rolling percentiles and histogram), hedges fired and won
+@app.get("/stats/routing")
+async def routing_stats():
+    return gemini_router.stats()
+
+# Upstream connection pool stats (hits, dials, waits)
+@app.get("/stats/connections")
+async def connection_stats():
+    return connections.pool_stats()
+
+# AssemblyAI transcript-completed webhook (used when ASSEMBLY_WEBHOOK_URL is set)
+@app.post("/webhooks/assemblyai")
+async def assemblyai_webhook(payload: dict):
+    complete_webhook(payload.get("transcript_id"), payload.get("status"))
+    return {"ok": True}
+
+# TTS cache hit ratio and bytes saved
+@app.get("/stats/tts-cache")
+async def tts_cache_stats():
+    return tts_cache.stats()
+
+# Weather/search tool cache hits and coalesced lookups
+@app.get("/stats/tools")
+async def tool_stats():
+    return tool_cache.stats()
+
+# Response cache hits (exact / approximate) and misses
+@app.get("/stats/response-cache")
+async def response_cache_stats():
+    return response_cache.stats()
+
+# /ws/voice buffer depths, drops and producer waits, largest sessions first
+@app.get("/stats/flow")
+async def flow_stats():
+    return flow_monitor.stats()
+
+# Per-upstream admission: in flight, queued by priority, busy rejections, retries and 429s
+@app.get("/stats/admission")
+async def admission_stats():
+    return admission.stats()
+
+# Graceful drain, sent by serve.py before it stops this worker (the router never forwards /admin/).
+# Needs the ADMIN_TOKEN shared with serve.py in X-Admin-Token.
+@app.post("/admin/drain")
+async def start_drain(request: Request):
+    if not admin_allowed(request.headers.get("x-admin-token", "")):
+        return JSONResponse({"error": "forbidden"}, status_code=403)
+    drain.start()
+    return drain.stats()
+
+# Startup warmup phases (TLS, lazy imports, upstream connections, fallback phrases) and their timings
+@app.get("/stats/startup")
+async def startup_stats():
+    return warmup.stats()
+
+# Turns and /ws/voice sessions still in flight on this worker
+@app.get("/stats/drain")
+async def drain_stats():
+    return drain.stats()
+
+# Prometheus metrics: per-stage latency histograms and turn counts
+@app.get("/metrics")
+async def metrics():
+    body, content_type = metrics_payload()
+    return Response(body, media_type=content_type)
+
+# Session store size and evictions
+@app.get("/stats/sessions")
+async def session_stats():
+    return session_store.stats()
@@ -0,0 +1,344 @@
+# Scale-out launcher: starts N uvicorn workers running main:app on loopback ports and a small
+# router in front of them on the public port.
+#
+#   SESSION_STORE=sqlite python serve.py --workers 4 --port 10000
+#
+# Routing is per request: the router forwards one HTTP request per client connection (a WebSocket
+# upgrade then carries the whole session) and asks the worker to close after answering it, so
+# every request gets its own routing decision, X-Forwarded-For and /admin/ check:
+#   /ws/voice?session=<id>              - sticky on the session id (else on the client address)
+#   /process-audio/<id>, /stream-chat/<id>, /stream-murf-tts/<id> - sticky on the session id
+#   anything else                       - the worker with the fewest open connections
+# Sticky keys use rendezvous hashing, so when a worker goes away only its own sessions move.
+# Workers share chat history through SESSION_STORE=sqlite (one host) or redis (any host); with the
+# default in-process store a session's history lives on the worker it is routed to.
+#
+# SIGTERM / Ctrl-C drains: the router stops accepting, every worker gets POST /admin/drain (new
+# turns are turned away, turns in flight finish, /ws/voice sessions close after their current
+# turn), and workers are stopped once idle or after DRAIN_TIMEOUT seconds. A worker that dies is
+# restarted. GET /stats/router on the public port shows the workers and their connections.
+# /admin/ endpoints need the ADMIN_TOKEN shared with the workers (a random one unless it is set)
+# and are never forwarded from the public port.
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import secrets
+import signal
+import sys
+import time
+from urllib.parse import parse_qs
+
+import httpx
+
+from services.telemetry import configure_logging, get_logger
+
+configure_logging()
+log = get_logger("serve")
+
+WORKERS = int(os.getenv("WORKERS", str(os.cpu_count() or 1)))
+DRAIN_TIMEOUT = float(os.getenv("DRAIN_TIMEOUT", "30"))
+ROUTER_HEADER_TIMEOUT = float(os.getenv("ROUTER_HEADER_TIMEOUT", "10"))
+WORKER_START_TIMEOUT = float(os.getenv("WORKER_START_TIMEOUT", "60"))
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN") or secrets.token_urlsafe(32)
+
+SESSION_PATHS = ("/process-audio/", "/stream-chat/", "/stream-murf-tts/")
+
+
+def routing_key(target: str, headers: dict, peer: str):
+    path, _, query = target.partition("?")
+    if path == "/ws/voice":
+        session = parse_qs(query).get("session")
+        return session[0] if session else headers.get("x-forwarded-for", peer).split(",")[0].strip()
+    for prefix in SESSION_PATHS:
+        if path.startswith(prefix):
+            return path[len(prefix):].split("/", 1)[0]
+    return None
+
+
+def simple_response(status: str, body: dict, extra: str = "") -> bytes:
+    payload = json.dumps(body).encode()
+    return (f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\nContent-Length: {len(payload)}\r\n"
+            f"{extra}Connection: close\r\n\r\n").encode() + payload
+
+
+class Worker:
+    def __init__(self, index: int, port: int):
+        self.index = index
+        self.port = port
+        self.process = None
+        self.ready = False
+        self.draining = False
+        self.connections = 0
+        self.routed = 0
+        self.restarts = 0
+        self._seed = str(index).encode()
+
+    @property
+    def available(self) -> bool:
+        return self.ready and not self.draining and self.process is not None and self.process.returncode is None
+
+    def score(self, key: str) -> bytes:
+        return hashlib.blake2b(key.encode(), digest_size=8, key=self._seed).digest()
+
+    def stats(self) -> dict:
+        return {
+            "port": self.port,
+            "pid": self.process.pid if self.process else None,
+            "ready": self.ready,
+            "draining": self.draining,
+            "connections": self.connections,
+            "routed": self.routed,
+            "restarts": self.restarts,
+        }
+
+
+class Router:
+    def __init__(self, workers: int, host: str, port: int, base_port: int, uvicorn_args: list):
+        self.host = host
+        self.port = port
+        self.workers = [Worker(i, base_port + i) for i in range(workers)]
+        self.uvicorn_args = uvicorn_args
+        self.stopping = False
+        self.server = None
+        self.connections = set()
+        self.rejected = 0
+        self._http = None
+
+    async def spawn(self, worker: Worker):
+        worker.ready = worker.draining = False
+        worker.process = await asyncio.create_subprocess_exec(
+            sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(worker.port),
+            "--timeout-graceful-shutdown", str(int(DRAIN_TIMEOUT)), *self.uvicorn_args,
+            env=dict(os.environ, ADMIN_TOKEN=ADMIN_TOKEN),
+            # Own process group: a Ctrl-C in the terminal reaches the launcher only, which drains first
+            start_new_session=True,
+        )
+        deadline = time.monotonic() + WORKER_START_TIMEOUT
+        while time.monotonic() < deadline and worker.process.returncode is None:
+            try:
+                if (await self._http.get(f"http://127.0.0.1:{worker.port}/stats/drain")).status_code == 200:
+                    worker.ready = True
+                    log.info("worker ready", extra={"fields": {"worker": worker.index, "port": worker.port,
+                                                               "pid": worker.process.pid}})
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.1)
+        raise RuntimeError(f"worker {worker.index} did not start on port {worker.port}")
+
+    async def supervise(self, worker: Worker):
+        # Restart a worker that exits on its own; during shutdown exits are expected
+        while True:
+            code = await worker.process.wait()
+            worker.ready = False
+            if self.stopping:
+                return
+            log.warning("worker exited, restarting", extra={"fields": {"worker": worker.index, "code": code}})
+            worker.restarts += 1
+            await asyncio.sleep(1.0)
+            try:
+                await self.spawn(worker)
+            except RuntimeError as e:
+                log.error(str(e))
+
+    async def drain(self):
+        # Stop routing to the workers, let their turns finish, then stop them
+        for worker in self.workers:
+            worker.draining = True
+        await asyncio.gather(*(self._post_drain(w) for w in self.workers), return_exceptions=True)
+        deadline = time.monotonic() + DRAIN_TIMEOUT
+        pending = [w for w in self.workers if w.process and w.process.returncode is None]
+        while pending and time.monotonic() < deadline:
+            states = await asyncio.gather(*(self._drain_state(w) for w in pending))
+            pending = [w for w, idle in zip(pending, states) if not idle]
+            if pending:
+                await asyncio.sleep(0.2)
+        if pending:
+            log.warning("drain timed out", extra={"fields": {"workers": [w.index for w in pending]}})
+        for worker in self.workers:
+            if worker.process and worker.process.returncode is None:
+                worker.process.terminate()
+        for worker in self.workers:
+            if worker.process is None:
+                continue
+            try:
+                await asyncio.wait_for(worker.process.wait(), DRAIN_TIMEOUT + 5)
+            except asyncio.TimeoutError:
+                worker.process.kill()
+                await worker.process.wait()
+
+    async def _post_drain(self, worker: Worker):
+        await self._http.post(f"http://127.0.0.1:{worker.port}/admin/drain", headers={"X-Admin-Token": ADMIN_TOKEN})
+
+    async def _drain_state(self, worker: Worker) -> bool:
+        if worker.process.returncode is not None:
+            return True
+        try:
+            return (await self._http.get(f"http://127.0.0.1:{worker.port}/stats/drain")).json()["idle"]
+        except (httpx.HTTPError, ValueError, KeyError):
+            return True
+
+    def pick(self, key):
+        workers = [w for w in self.workers if w.available]
+        if not workers:
+            return None
+        if key is None:
+            return min(workers, key=lambda w: w.connections)
+        return max(workers, key=lambda w: w.score(key))
+
+    def stats(self) -> dict:
+        return {
+            "workers": {w.index: w.stats() for w in self.workers},
+            "connections": len(self.connections),
+            "rejected": self.rejected,
+            "stopping": self.stopping,
+        }
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        task = asyncio.current_task()
+        self.connections.add(task)
+        upstream = None
+        try:
+            try:
+                head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), ROUTER_HEADER_TIMEOUT)
+                request_line, *lines = head[:-4].decode("latin-1").split("\r\n")
+                method, target, version = request_line.split(" ", 2)
+            except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, asyncio.TimeoutError, ValueError,
+                    ConnectionError):
+                return
+            headers = {}
+            kept = [request_line]
+            for line in lines:
+                name, _, value = line.partition(":")
+                headers[name.strip().lower()] = value.strip()
+                if name.strip().lower() not in ("x-forwarded-for", "connection", "keep-alive"):
+                    kept.append(line)
+            upgrade = headers.get("upgrade", "").lower() == "websocket"
+            # One request per connection: the worker closes once it has answered, and so does the router
+            kept.append("Connection: Upgrade" if upgrade else "Connection: close")
+            peer = (writer.get_extra_info("peername") or ("",))[0]
+            if target.startswith("/admin/"):
+                writer.write(simple_response("404 Not Found", {"detail": "Not Found"}))
+                return
+            if target == "/stats/router":
+                writer.write(simple_response("200 OK", self.stats()))
+                return
+            worker = self.pick(routing_key(target, headers, peer))
+            if worker is None:
+                self.rejected += 1
+                writer.write(simple_response("503 Service Unavailable", {"error": "no worker available"},
+                                             "Retry-After: 1\r\n"))
+                return
+            try:
+                upstream = await asyncio.open_connection("127.0.0.1", worker.port)
+            except OSError:
+                writer.write(simple_response("502 Bad Gateway", {"error": "worker unreachable"}))
+                return
+            forwarded = headers.get("x-forwarded-for")
+            kept.append(f"X-Forwarded-For: {forwarded + ', ' if forwarded else ''}{peer}")
+            upstream[1].write(("\r\n".join(kept) + "\r\n\r\n").encode("latin-1"))
+            worker.connections += 1
+            worker.routed += 1
+            try:
+                # A WebSocket is piped both ways until either side closes. For anything else only this
+                # request's body goes to the worker (a pipelined request after it is dropped), and its
+                # response comes back until the worker closes.
+                request = pipe(reader, upstream[1]) if upgrade else forward_body(reader, upstream[1], headers)
+                sending = asyncio.create_task(request)
+                response = asyncio.create_task(pipe(upstream[0], writer))
+                done, _ = await asyncio.wait([sending, response], return_when=asyncio.FIRST_COMPLETED)
+                if sending in done and not upgrade and sending.exception() is None:
+                    await response
+                for p in (sending, response):
+                    p.cancel()
+                await asyncio.gather(sending, response, return_exceptions=True)
+            finally:
+                worker.connections -= 1
+        finally:
+            self.connections.discard(task)
+            for w in (writer, upstream[1] if upstream else None):
+                if w is not None:
+                    w.close()
+
+    async def run(self):
+        self._http = httpx.AsyncClient(timeout=2.0)
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop.set)
+        supervisors = []
+        try:
+            await asyncio.gather(*(self.spawn(w) for w in self.workers))
+            supervisors = [asyncio.create_task(self.supervise(w)) for w in self.workers]
+            self.server = await asyncio.start_server(self.handle, self.host, self.port, limit=64 * 1024)
+            log.info("router listening", extra={"fields": {"host": self.host, "port": self.port,
+                                                           "workers": len(self.workers)}})
+            await stop.wait()
+            log.info("shutting down: draining workers")
+            self.stopping = True
+            self.server.close()
+            await self.drain()
+        finally:
+            self.stopping = True
+            for task in supervisors:
+                task.cancel()
+            for worker in self.workers:
+                if worker.process and worker.process.returncode is None:
+                    worker.process.kill()
+                    await worker.process.wait()
+            for task in list(self.connections):
+                task.cancel()
+            await self._http.aclose()
+        log.info("stopped")
+
+
+async def forward_body(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, headers: dict):
+    # Exactly one request body: chunked (chunk by chunk, up to the last chunk and trailers) or
+    # Content-Length bytes; none without either
+    if "chunked" in headers.get("transfer-encoding", "").lower():
+        while True:
+            size_line = await reader.readuntil(b"\r\n")
+            writer.write(size_line)
+            size = int(size_line.split(b";", 1)[0].strip(), 16)
+            if size == 0:
+                while (trailer := await reader.readuntil(b"\r\n")) != b"\r\n":
+                    writer.write(trailer)
+                writer.write(b"\r\n")
+                await writer.drain()
+                return
+            writer.write(await reader.readexactly(size + 2))
+            await writer.drain()
+    remaining = int(headers.get("content-length", "0") or 0)
+    while remaining > 0:
+        data = await reader.read(min(remaining, 64 * 1024))
+        if not data:
+            raise ConnectionError("client closed before the end of the request body")
+        remaining -= len(data)
+        writer.write(data)
+        await writer.drain()
+
+
+async def pipe(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    try:
+        while data := await reader.read(64 * 1024):
+            writer.write(data)
+            await writer.drain()
+    except (ConnectionError, OSError):
+        pass
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run N uvicorn workers of main:app behind a sticky router")
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "10000")))
+    parser.add_argument("--base-port", type=int, default=None, help="first worker port (default: port + 1)")
+    args, uvicorn_args = parser.parse_known_args()
+    if args.workers > 1 and os.getenv("SESSION_STORE", "memory") == "memory":
+        log.warning("SESSION_STORE=memory: chat history is per worker and lost when a worker stops;"
+                    " use sqlite or redis to share it")
+    router = Router(args.workers, args.host, args.port, args.base_port or args.port + 1, uvicorn_args)
+    asyncio.run(router.run())
@@ -0,0 +1,373 @@
+import asyncio
+import os
+import random
+import time
+from collections import OrderedDict, deque
+import httpx
+import websockets
+from services.telemetry import get_logger
+
+# Admission control in front of the upstreams (Gemini, AssemblyAI, Murf).
+# Each upstream has a concurrency limit and an optional token bucket (requests per second). Callers
+# that can't start right away wait in a fair queue: one FIFO per session, served round robin, so a
+# session firing many calls can't starve the others. Three priority classes, served strictly in order:
+#   ACTIVE      - sessions that were admitted recently (a turn in progress, or a returning caller)
+#   NEW         - a session's first call
+#   SPECULATIVE - speculative Gemini requests; these never queue, they only take an idle slot
+# A call whose estimated queueing time is over ADMISSION_MAX_WAIT_MS, or that is still queued when
+# it runs out, fails fast with UpstreamBusy; the endpoints answer it with the cached "busy" phrase.
+# Failed calls are retried with jittered exponential backoff, releasing their slot while they back
+# off. A 429 (or 503) pauses the upstream's token bucket for its Retry-After, so the retries of many
+# sessions don't all land on a provider that is already throttling.
+
+log = get_logger("admission")
+
+ADMISSION_ENABLED = os.getenv("ADMISSION", "1") != "0"
+ADMISSION_MAX_WAIT = int(os.getenv("ADMISSION_MAX_WAIT_MS", "2000")) / 1000
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "256"))
+ADMISSION_ACTIVE_TTL = float(os.getenv("ADMISSION_ACTIVE_TTL", "300"))
+
+RETRY_ATTEMPTS = int(os.getenv("RETRY_ATTEMPTS", "2"))
+RETRY_BASE_DELAY = float(os.getenv("RETRY_BASE_DELAY", "0.25"))
+RETRY_MAX_DELAY = float(os.getenv("RETRY_MAX_DELAY", "4"))
+
+ACTIVE, NEW, SPECULATIVE = 0, 1, 2
+PRIORITY_NAMES = ("active", "new", "speculative")
+
+
+def _limits(name: str, concurrency: int) -> tuple:
+    # ADMIT_<NAME>_CONCURRENCY, ADMIT_<NAME>_RPS (0 = no rate limit), ADMIT_<NAME>_BURST
+    prefix = f"ADMIT_{name.upper()}_"
+    rps = float(os.getenv(prefix + "RPS", "0"))
+    return (
+        int(os.getenv(prefix + "CONCURRENCY", str(concurrency))),
+        rps,
+        float(os.getenv(prefix + "BURST", str(max(1.0, rps)))),
+    )
+
+
+UPSTREAM_LIMITS = {
+    "gemini": _limits("gemini", 32),
+    "assemblyai": _limits("assemblyai", 32),
+    # Realtime STT sessions hold their slot for the whole /ws/voice call
+    "assemblyai_realtime": _limits("assemblyai_realtime", 100),
+    "murf": _limits("murf", 64),
+}
+
+
+class UpstreamBusy(Exception):
+    def __init__(self, upstream: str, wait: float = None):
+        super().__init__(f"{upstream} is busy")
+        self.upstream = upstream
+        self.wait = wait
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+    def delay(self) -> float:
+        # Seconds until a token is available (0 = now)
+        now = time.monotonic()
+        if now < self.paused_until:
+            return self.paused_until - now
+        if self.rate <= 0:
+            return 0.0
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        if self.rate > 0:
+            self.tokens -= 1
+
+    def pause(self, seconds: float):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+class UpstreamLimiter:
+    def __init__(self, name: str, concurrency: int, rate: float = 0.0, burst: float = 1.0,
+                 max_wait: float = ADMISSION_MAX_WAIT, max_queue: int = ADMISSION_MAX_QUEUE):
+        self.name = name
+        self.concurrency = concurrency
+        self.bucket = TokenBucket(rate, burst)
+        self.max_wait = max_wait
+        self.max_queue = max_queue
+        self._queues = [OrderedDict() for _ in PRIORITY_NAMES]  # session -> deque of futures
+        self._waiting = [0] * len(PRIORITY_NAMES)
+        self._timer = None
+        self.in_flight = 0
+        self.hold = 0.0  # moving average of how long a call holds its slot
+        self.admitted = 0
+        self.queued = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.retries = 0
+        self.throttled = 0
+        self.wait_seconds = 0.0
+        self.max_waited = 0.0
+
+    @property
+    def waiting(self) -> int:
+        return sum(self._waiting)
+
+    def estimate_wait(self, priority: int) -> float:
+        ahead = sum(self._waiting[:priority + 1]) + 1
+        wait = self.bucket.paused_until - time.monotonic()
+        if self.in_flight >= self.concurrency:
+            wait = max(wait, ahead / max(self.concurrency, 1) * self.hold)
+        if self.bucket.rate > 0:
+            wait = max(wait, ahead / self.bucket.rate)
+        return max(wait, 0.0)
+
+    async def acquire(self, session_id: str, priority: int = NEW) -> float:
+        # Returns how long the call queued; raises UpstreamBusy instead of queueing past the SLO
+        if self.in_flight < self.concurrency and not self.waiting and self.bucket.delay() == 0:
+            self.bucket.take()
+            self._grant()
+            return 0.0
+        estimate = self.estimate_wait(priority)
+        if priority == SPECULATIVE or self.waiting >= self.max_queue or estimate > self.max_wait:
+            self.rejected += 1
+            raise UpstreamBusy(self.name, estimate)
+        future = asyncio.get_running_loop().create_future()
+        self._queues[priority].setdefault(session_id, deque()).append(future)
+        self._waiting[priority] += 1
+        self.queued += 1
+        started = time.monotonic()
+        self._dispatch()
+        try:
+            await asyncio.wait_for(asyncio.shield(future), self.max_wait)
+        except asyncio.TimeoutError:
+            if not future.done():
+                self._forget(future, priority)
+                self.timeouts += 1
+                raise UpstreamBusy(self.name, self.max_wait) from None
+        except asyncio.CancelledError:
+            if future.done():
+                self.release()
+            else:
+                self._forget(future, priority)
+            raise
+        waited = time.monotonic() - started
+        self.wait_seconds += waited
+        self.max_waited = max(self.max_waited, waited)
+        return waited
+
+    def _forget(self, future, priority: int):
+        # The dispatcher skips cancelled futures when it gets to them
+        future.cancel()
+        self._waiting[priority] -= 1
+
+    def _grant(self):
+        self.in_flight += 1
+        self.admitted += 1
+
+    def release(self, held: float = None):
+        self.in_flight -= 1
+        if held is not None:
+            self.hold = held if not self.hold else 0.8 * self.hold + 0.2 * held
+        self._dispatch()
+
+    def _next(self):
+        for priority, queues in enumerate(self._queues):
+            while queues:
+                session_id, futures = next(iter(queues.items()))
+                future = futures.popleft()
+                if futures:
+                    # Round robin: this session goes to the back of its class
+                    queues.move_to_end(session_id)
+                else:
+                    del queues[session_id]
+                if not future.done():
+                    self._waiting[priority] -= 1
+                    return future
+        return None
+
+    def _dispatch(self):
+        while self.in_flight < self.concurrency and self.waiting:
+            delay = self.bucket.delay()
+            if delay > 0:
+                if self._timer is None:
+                    self._timer = asyncio.get_running_loop().call_later(delay, self._wake)
+                return
+            future = self._next()
+            if future is None:
+                return
+            self.bucket.take()
+            self._grant()
+            future.set_result(None)
+
+    def _wake(self):
+        self._timer = None
+        self._dispatch()
+
+    def throttle(self, seconds: float):
+        # The upstream said 429: nobody starts a new call here until it has had a rest
+        self.throttled += 1
+        self.bucket.pause(seconds)
+
+    def stats(self) -> dict:
+        return {
+            "concurrency": self.concurrency,
+            "rate": self.bucket.rate,
+            "in_flight": self.in_flight,
+            "waiting": dict(zip(PRIORITY_NAMES, self._waiting)),
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "rejected": self.rejected,
+            "timeouts": self.timeouts,
+            "retries": self.retries,
+            "throttled": self.throttled,
+            "avg_wait_ms": round(self.wait_seconds / self.queued * 1000, 1) if self.queued else 0.0,
+            "max_wait_ms": round(self.max_waited * 1000, 1),
+            "avg_hold_ms": round(self.hold * 1000, 1),
+        }
+
+
+def status_code(exc: Exception):
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code
+    if isinstance(exc, websockets.InvalidStatus):
+        return exc.response.status_code
+    return None
+
+
+def is_retryable(exc: Exception) -> bool:
+    status = status_code(exc)
+    if status is not None:
+        return status == 429 or status >= 500
+    # Timeouts are not retried: the caller has already waited the upstream's whole budget
+    return isinstance(exc, (httpx.TransportError, OSError)) and not isinstance(exc, httpx.TimeoutException)
+
+
+def retry_after(exc: Exception):
+    if isinstance(exc, httpx.HTTPStatusError):
+        value = exc.response.headers.get("retry-after")
+    elif isinstance(exc, websockets.InvalidStatus):
+        value = exc.response.headers.get("Retry-After")
+    else:
+        return None
+    try:
+        return min(float(value), RETRY_MAX_DELAY)
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff(attempt: int, base: float = RETRY_BASE_DELAY, cap: float = RETRY_MAX_DELAY) -> float:
+    # Full jitter, so retries from many sessions spread out instead of arriving together
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class _Slot:
+    def __init__(self, controller, upstream: str, session_id: str, speculative: bool):
+        self.controller = controller
+        self.upstream = upstream
+        self.session_id = session_id
+        self.speculative = speculative
+        self.limiter = None
+
+    async def __aenter__(self):
+        self.limiter = await self.controller.acquire(self.upstream, self.session_id, self.speculative)
+        self.started = time.monotonic()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if self.limiter is not None:
+            self.limiter.release(time.monotonic() - self.started)
+        return False
+
+
+class AdmissionController:
+    def __init__(self, limits: dict = None, enabled: bool = ADMISSION_ENABLED, active_ttl: float = ADMISSION_ACTIVE_TTL):
+        self.enabled = enabled
+        self.active_ttl = active_ttl
+        self.limiters = {
+            name: UpstreamLimiter(name, concurrency, rate, burst)
+            for name, (concurrency, rate, burst) in (limits or UPSTREAM_LIMITS).items()
+        }
+        self._seen = OrderedDict()  # session_id -> last admitted (monotonic), oldest first
+
+    def priority(self, session_id: str, speculative: bool = False) -> int:
+        if speculative:
+            return SPECULATIVE
+        seen = self._seen.get(session_id)
+        return ACTIVE if seen is not None and time.monotonic() - seen < self.active_ttl else NEW
+
+    def _touch(self, session_id: str):
+        now = time.monotonic()
+        self._seen[session_id] = now
+        self._seen.move_to_end(session_id)
+        while self._seen:
+            oldest, seen = next(iter(self._seen.items()))
+            if now - seen < self.active_ttl:
+                break
+            del self._seen[oldest]
+
+    async def acquire(self, upstream: str, session_id: str = None, speculative: bool = False):
+        # Returns the limiter to release(), or None when admission control is off
+        limiter = self.limiters.get(upstream)
+        if not self.enabled or limiter is None:
+            return None
+        await limiter.acquire(session_id, self.priority(session_id, speculative))
+        if session_id is not None:
+            self._touch(session_id)
+        return limiter
+
+    def slot(self, upstream: str, session_id: str = None, speculative: bool = False) -> _Slot:
+        return _Slot(self, upstream, session_id, speculative)
+
+    def _failed(self, upstream: str, exc: Exception, attempt: int, attempts: int):
+        # Returns how long to back off before the next attempt, or re-raises
+        if attempt >= attempts or isinstance(exc, UpstreamBusy) or not is_retryable(exc):
+            raise exc
+        limiter = self.limiters.get(upstream)
+        delay = max(backoff(attempt), retry_after(exc) or 0.0)
+        if limiter is not None:
+            limiter.retries += 1
+            if status_code(exc) in (429, 503):
+                limiter.throttle(delay)
+        log.debug("%s attempt %d failed (%s), retrying in %.2f s", upstream, attempt + 1, exc, delay)
+        return delay
+
+    async def call(self, upstream: str, session_id: str, fn, speculative: bool = False, attempts: int = RETRY_ATTEMPTS):
+        # fn() is awaited in an upstream slot, with retries
+        for attempt in range(attempts + 1):
+            try:
+                async with self.slot(upstream, session_id, speculative):
+                    return await fn()
+            except Exception as e:
+                delay = self._failed(upstream, e, attempt, attempts)
+            await asyncio.sleep(delay)
+
+    async def stream(self, upstream: str, session_id: str, factory, speculative: bool = False,
+                     attempts: int = RETRY_ATTEMPTS):
+        # Iterates factory() in an upstream slot; retried only until the first chunk has gone out
+        for attempt in range(attempts + 1):
+            started = False
+            try:
+                async with self.slot(upstream, session_id, speculative):
+                    async for chunk in factory():
+                        started = True
+                        yield chunk
+                    return
+            except Exception as e:
+                if started:
+                    raise
+                delay = self._failed(upstream, e, attempt, attempts)
+            await asyncio.sleep(delay)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "max_wait_ms": int(ADMISSION_MAX_WAIT * 1000),
+            "active_sessions": len(self._seen),
+            "upstreams": {name: limiter.stats() for name, limiter in self.limiters.items()},
+        }
+
+
+admission = AdmissionController()
@@ -0,0 +1,239 @@
+import asyncio
+import shutil
+import struct
+from services.lazy import lazy_import
+from services.telemetry import get_logger
+
+# Streaming audio conversion stage.
+#   Upstream:   browser webm/opus -> 16 kHz PCM16 for STT (ffmpeg subprocess, fed incrementally)
+#   Downstream: Murf 44.1 kHz WAV -> lower-rate PCM16 WAV fragments (NumPy resampler) or Ogg/Opus
+# Buffers are read through memoryview/np.frombuffer so chunks are not copied on the way in.
+
+log = get_logger("audio_codec")
+np = lazy_import("numpy", preload=True)
+
+STT_SAMPLE_RATE = 16000
+FFMPEG = shutil.which("ffmpeg")
+
+# Formats a /ws/voice client may ask for in its config message ("output_format")
+OUTPUT_FORMATS = {
+    "wav": None,
+    "pcm16_24000": 24000,
+    "pcm16_22050": 22050,
+    "pcm16_16000": 16000,
+    "opus": "opus",
+}
+
+
+def parse_wav_header(buf):
+    # Returns (sample_rate, channels, bits_per_sample, data_offset) or None if buf is not RIFF/WAVE
+    if len(buf) < 12 or bytes(buf[:4]) != b"RIFF" or bytes(buf[8:12]) != b"WAVE":
+        return None
+    pos, fmt = 12, None
+    while pos + 8 <= len(buf):
+        chunk_id = bytes(buf[pos:pos + 4])
+        size = int.from_bytes(buf[pos + 4:pos + 8], "little")
+        if chunk_id == b"fmt ":
+            _, channels, sample_rate = struct.unpack_from("<HHI", buf, pos + 8)
+            bits = int.from_bytes(buf[pos + 22:pos + 24], "little")
+            fmt = (sample_rate, channels, bits)
+        elif chunk_id == b"data" and fmt is not None:
+            return fmt + (pos + 8,)
+        pos += 8 + size + (size & 1)
+    return None
+
+
+def wav_header(sample_rate: int, data_size: int = 0xFFFFFFFF - 36, channels: int = 1) -> bytes:
+    # data_size defaults to "unknown/streaming", which browsers and ffmpeg accept
+    byte_rate = sample_rate * channels * 2
+    return (
+        b"RIFF" + struct.pack("<I", min(36 + data_size, 0xFFFFFFFF)) + b"WAVE"
+        + b"fmt " + struct.pack("<IHHIIHH", 16, 1, channels, sample_rate, byte_rate, channels * 2, 16)
+        + b"data" + struct.pack("<I", data_size)
+    )
+
+
+class Resampler:
+    # Streaming mono resampler: anti-alias FIR (when downsampling) + linear interpolation,
+    # vectorized per chunk, with filter/phase state carried across chunk boundaries.
+
+    def __init__(self, in_rate: int, out_rate: int, taps: int = 31):
+        self.in_rate = in_rate
+        self.out_rate = out_rate
+        self.step = in_rate / out_rate
+        self.pos = 0.0
+        self.tail = np.zeros(1, dtype=np.float32)
+        self.leftover = b""
+        if out_rate < in_rate:
+            cutoff = 0.45 * out_rate / in_rate
+            n = np.arange(taps) - (taps - 1) / 2
+            kernel = 2 * cutoff * np.sinc(2 * cutoff * n) * np.hamming(taps)
+            self.kernel = (kernel / kernel.sum()).astype(np.float32)
+            self.history = np.zeros(taps - 1, dtype=np.float32)
+        else:
+            self.kernel = None
+
+    def process(self, pcm) -> bytes:
+        data = memoryview(pcm)
+        if self.leftover:
+            data = memoryview(self.leftover + bytes(data))
+            self.leftover = b""
+        if len(data) % 2:
+            self.leftover = bytes(data[-1:])
+            data = data[:-1]
+        if self.in_rate == self.out_rate:
+            return bytes(data)
+        samples = np.frombuffer(data, dtype="<i2").astype(np.float32)
+        if self.kernel is not None:
+            padded = np.concatenate([self.history, samples])
+            self.history = padded[len(padded) - len(self.history):]
+            samples = np.convolve(padded, self.kernel, mode="valid").astype(np.float32)
+        x = np.concatenate([self.tail, samples])
+        if len(x) < 2:
+            return b""
+        positions = np.arange(self.pos, len(x) - 1, self.step)
+        if positions.size:
+            idx = positions.astype(np.int64)
+            frac = (positions - idx).astype(np.float32)
+            y = x[idx] * (1.0 - frac) + x[idx + 1] * frac
+            self.pos = positions[-1] + self.step - (len(x) - 1)
+        else:
+            y = np.empty(0, dtype=np.float32)
+            self.pos -= len(x) - 1
+        self.tail = x[-1:]
+        return np.clip(np.rint(y), -32768, 32767).astype("<i2").tobytes()
+
+
+class WavFragmentResampler:
+    # Murf sends WAV fragments; re-emit each one at a lower rate as its own small WAV
+    # so the existing per-chunk decodeAudioData client keeps working.
+
+    def __init__(self, out_rate: int):
+        self.out_rate = out_rate
+        self.resampler = None
+
+    def process(self, chunk) -> bytes:
+        view = memoryview(chunk)
+        header = parse_wav_header(view)
+        if header is not None:
+            sample_rate, _, _, offset = header
+            view = view[offset:]
+            if self.resampler is None or self.resampler.in_rate != sample_rate:
+                self.resampler = Resampler(sample_rate, self.out_rate)
+        if self.resampler is None:
+            self.resampler = Resampler(44100, self.out_rate)
+        pcm = self.resampler.process(view)
+        return wav_header(self.out_rate, len(pcm)) + pcm if pcm else b""
+
+
+class FFmpegStream:
+    # Incremental transcoding through an ffmpeg subprocess: write() input as it arrives,
+    # read() output as soon as ffmpeg produces it.
+
+    def __init__(self, args: list):
+        self.args = args
+        self.proc = None
+
+    async def start(self):
+        if FFMPEG is None:
+            raise RuntimeError("ffmpeg is not installed; audio transcoding is unavailable.")
+        self.proc = await asyncio.create_subprocess_exec(
+            FFMPEG, "-hide_banner", "-loglevel", "error", *self.args,
+            stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE,
+        )
+
+    async def transcode(self, chunks, read_size: int = 3200):
+        if self.proc is None:
+            await self.start()
+
+        async def feed():
+            try:
+                async for chunk in chunks:
+                    self.proc.stdin.write(chunk)
+                    await self.proc.stdin.drain()
+            finally:
+                if not self.proc.stdin.is_closing():
+                    self.proc.stdin.close()
+
+        feeder = asyncio.create_task(feed())
+        try:
+            while True:
+                out = await self.proc.stdout.read(read_size)
+                if not out:
+                    break
+                yield out
+            await feeder
+        finally:
+            if not feeder.done():
+                feeder.cancel()
+            await asyncio.gather(feeder, return_exceptions=True)
+            if self.proc.returncode is None:
+                self.proc.kill()
+            await self.proc.wait()
+
+
+def webm_to_pcm16(sample_rate: int = STT_SAMPLE_RATE) -> FFmpegStream:
+    return FFmpegStream([
+        "-f", "webm", "-i", "pipe:0",
+        "-ac", "1", "-ar", str(sample_rate), "-f", "s16le", "pipe:1",
+    ])
+
+
+def wav_to_opus(bitrate: str = "32k") -> FFmpegStream:
+    return FFmpegStream([
+        "-f", "wav", "-i", "pipe:0",
+        "-c:a", "libopus", "-b:a", bitrate, "-application", "voip", "-f", "ogg", "-flush_packets", "1", "pipe:1",
+    ])
+
+
+async def stt_pcm_stream(chunks, input_format: str = "webm"):
+    # Browser audio -> 16 kHz PCM16 for AssemblyAI, chunk by chunk
+    if input_format == "webm" and FFMPEG is None:
+        log.warning("ffmpeg not found; forwarding browser audio to STT unconverted")
+        async for chunk in chunks:
+            yield chunk
+    elif input_format == "webm":
+        async for pcm in webm_to_pcm16().transcode(chunks):
+            yield pcm
+    elif input_format.startswith("pcm16_"):
+        resampler = Resampler(int(input_format.split("_")[1]), STT_SAMPLE_RATE)
+        async for chunk in chunks:
+            pcm = resampler.process(chunk)
+            if pcm:
+                yield pcm
+    else:
+        async for chunk in chunks:
+            yield chunk
+
+
+async def client_audio_stream(chunks, output_format: str = "wav"):
+    # Murf WAV fragments -> what this client asked for
+    target = OUTPUT_FORMATS.get(output_format)
+    if target is None:
+        async for chunk in chunks:
+            yield chunk
+    elif target == "opus":
+        async for out in wav_to_opus().transcode(_continuous_wav(chunks)):
+            yield out
+    else:
+        resampler = WavFragmentResampler(target)
+        async for chunk in chunks:
+            out = resampler.process(chunk)
+            if out:
+                yield out
+
+
+async def _continuous_wav(chunks):
+    # One streaming WAV header followed by bare PCM, so ffmpeg sees a single stream
+    started = False
+    async for chunk in chunks:
+        view = memoryview(chunk)
+        header = parse_wav_header(view)
+        if header is not None:
+            if not started:
+                yield wav_header(header[0], channels=header[1])
+            view = view[header[3]:]
+        elif not started:
+            yield wav_header(44100)
+        started = True
+        yield bytes(view)
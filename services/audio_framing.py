@@ -0,0 +1,57 @@
+import base64
+import json
+import struct
+
+# Wire formats for turn events (("meta" | "gemini" | "error" | "filler", data) and ("audio" |
+# "filler_audio", bytes)).
+#
+#   text/event-stream         - the original SSE format, audio as base64 text events
+#   application/x-nick-frames - length-prefixed binary frames: 1 byte type, 4 byte big-endian
+#                               length, payload. Audio payloads are raw WAV bytes; every other
+#                               event is a small UTF-8 JSON object {"event": ..., "data": ...}.
+# Filler audio (services.filler) has its own event / frame type, so clients that buffer the whole
+# reply before playing it simply skip it. Clients opt in with an Accept header, so old clients keep
+# getting SSE/JSON.
+
+FRAMES_MEDIA_TYPE = "application/x-nick-frames"
+SSE_MEDIA_TYPE = "text/event-stream"
+
+FRAME_META = 1
+FRAME_AUDIO = 2
+FRAME_FILLER_AUDIO = 3
+
+AUDIO_FRAMES = {"audio": FRAME_AUDIO, "filler_audio": FRAME_FILLER_AUDIO}
+
+_FRAME_HEADER = struct.Struct(">BI")
+
+
+def wants_frames(accept: str) -> bool:
+    return FRAMES_MEDIA_TYPE in (accept or "")
+
+
+def wants_wav(accept: str) -> bool:
+    return "audio/wav" in (accept or "") and "application/json" not in (accept or "")
+
+
+def frame_header(kind: int, length: int) -> bytes:
+    return _FRAME_HEADER.pack(kind, length)
+
+
+async def frame_stream(events):
+    async for event, data in events:
+        if event in AUDIO_FRAMES:
+            # Header and payload go out as separate writes, so audio is never copied
+            yield frame_header(AUDIO_FRAMES[event], len(data))
+            yield data
+        else:
+            payload = json.dumps({"event": event, "data": data}).encode("utf-8")
+            yield frame_header(FRAME_META, len(payload)) + payload
+
+
+async def sse_stream(events):
+    async for event, data in events:
+        if event in AUDIO_FRAMES:
+            data = base64.b64encode(data).decode()
+        elif not isinstance(data, str):
+            data = json.dumps(data)
+        yield f"event: {event}\ndata: {data}\n\n".encode()
@@ -0,0 +1,93 @@
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from services.telemetry import get_logger
+
+# Bounded thread pool for calls that can only block: the vendor SDKs (google.generativeai,
+# assemblyai, murf) are synchronous. They run here instead of on the event loop, at most
+# BLOCKING_WORKERS at a time. Callers past that wait on a semaphore (the wait shows in stats), so a
+# slow SDK can neither freeze the loop nor pile up threads. A call whose caller gave up (barge-in,
+# client gone) keeps its slot until the thread is actually done with it.
+
+log = get_logger("blocking")
+
+BLOCKING_WORKERS = int(os.getenv("BLOCKING_WORKERS", "8"))
+
+
+class BlockingPool:
+    def __init__(self, workers: int = BLOCKING_WORKERS):
+        self.workers = workers
+        self._executor = None
+        self._slots = asyncio.Semaphore(workers)
+        self.calls = {}
+        self.in_flight = 0
+        self.waiting = 0
+        self.max_wait = 0.0
+
+    def _pool(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix="blocking")
+        return self._executor
+
+    async def run(self, name: str, fn, *args):
+        # fn(*args) in a pool thread; name groups the calls in stats (e.g. "gemini_sdk")
+        started = time.perf_counter()
+        self.waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+        self.max_wait = max(self.max_wait, time.perf_counter() - started)
+        loop = asyncio.get_running_loop()
+        self.in_flight += 1
+        future = self._pool().submit(self._timed, name, fn, args)
+        future.add_done_callback(lambda _: self._done(loop))
+        return await asyncio.wrap_future(future)
+
+    def _done(self, loop):
+        # Runs in the pool thread when fn returns (or the call is dropped at shutdown)
+        try:
+            loop.call_soon_threadsafe(self._release)
+        except RuntimeError:
+            pass
+
+    def _release(self):
+        self.in_flight -= 1
+        self._slots.release()
+
+    def _timed(self, name: str, fn, args):
+        # Runs in the pool thread; dict updates are atomic enough under the GIL for counters
+        entry = self.calls.setdefault(name, {"calls": 0, "errors": 0, "seconds": 0.0, "max_seconds": 0.0})
+        started = time.perf_counter()
+        try:
+            return fn(*args)
+        except Exception:
+            entry["errors"] += 1
+            raise
+        finally:
+            seconds = time.perf_counter() - started
+            entry["calls"] += 1
+            entry["seconds"] += seconds
+            entry["max_seconds"] = max(entry["max_seconds"], seconds)
+
+    def close(self):
+        if self._executor is not None:
+            # Threads still inside an SDK call are left to finish; nothing waits for them
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "max_wait_ms": round(self.max_wait * 1000, 1),
+            "calls": {
+                name: dict(entry, seconds=round(entry["seconds"], 3), max_seconds=round(entry["max_seconds"], 3))
+                for name, entry in self.calls.items()
+            },
+        }
+
+
+blocking_pool = BlockingPool()
@@ -0,0 +1,298 @@
+import asyncio
+import json
+import os
+import time
+import httpx
+import websockets
+from services.murf_ws import VOICE_CONFIG, murf_ws_url
+from services.telemetry import get_logger
+from services.tls import ssl_context, ws_ssl
+
+# Shared upstream connections, opened at app startup and closed at shutdown:
+# one keep-alive httpx client per upstream and a warm pool of Murf sockets.
+
+log = get_logger("connections")
+
+GEMINI_API_BASE = os.getenv("GEMINI_API_BASE", "https://generativelanguage.googleapis.com")
+ASSEMBLY_API_BASE = os.getenv("ASSEMBLY_API_BASE", "https://api.assemblyai.com")
+
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+
+MURF_POOL_MAX = int(os.getenv("MURF_POOL_MAX", "64"))
+MURF_POOL_MIN_IDLE = int(os.getenv("MURF_POOL_MIN_IDLE", "2"))
+MURF_POOL_IDLE_TIMEOUT = float(os.getenv("MURF_POOL_IDLE_TIMEOUT", "45"))
+MURF_POOL_CHECK_INTERVAL = float(os.getenv("MURF_POOL_CHECK_INTERVAL", "10"))
+
+UPSTREAM_TIMEOUTS = {
+    "gemini": httpx.Timeout(60.0, connect=5.0),
+    "assemblyai": httpx.Timeout(30.0, connect=5.0),
+    # Tools sit in front of Gemini, so they fail fast (services.tools also caps the whole call)
+    "weather": httpx.Timeout(3.0, connect=1.5),
+    "search": httpx.Timeout(5.0, connect=1.5),
+}
+
+try:
+    import h2  # noqa: F401
+    HTTP2_ENABLED = True
+except ImportError:
+    HTTP2_ENABLED = False
+
+
+class PoolStats:
+    __slots__ = ("requests", "hits", "dials", "waits", "evictions", "errors")
+
+    def __init__(self):
+        self.requests = 0
+        self.hits = 0
+        self.dials = 0
+        self.waits = 0
+        self.evictions = 0
+        self.errors = 0
+
+    def as_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+# httpx transport that counts new TCP connections via the httpcore trace hook,
+# so hits = requests that rode on an already-open connection.
+class CountingTransport(httpx.AsyncHTTPTransport):
+    def __init__(self, stats: PoolStats, **kwargs):
+        super().__init__(**kwargs)
+        self.stats = stats
+
+    async def handle_async_request(self, request):
+        stats = self.stats
+        stats.requests += 1
+        dialed = False
+
+        async def trace(event_name, info):
+            nonlocal dialed
+            if event_name == "connection.connect_tcp.complete":
+                dialed = True
+                stats.dials += 1
+
+        request.extensions["trace"] = trace
+        try:
+            return await super().handle_async_request(request)
+        except Exception:
+            stats.errors += 1
+            raise
+        finally:
+            if not dialed:
+                stats.hits += 1
+
+
+_clients = {}
+_http_stats = {}
+
+
+def http_client(upstream: str) -> httpx.AsyncClient:
+    client = _clients.get(upstream)
+    if client is None or client.is_closed:
+        stats = _http_stats.setdefault(upstream, PoolStats())
+        limits = httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+        )
+        transport = CountingTransport(stats, http2=HTTP2_ENABLED, limits=limits, verify=ssl_context())
+        timeout = UPSTREAM_TIMEOUTS.get(upstream, httpx.Timeout(30.0, connect=5.0))
+        client = httpx.AsyncClient(transport=transport, timeout=timeout)
+        _clients[upstream] = client
+    return client
+
+
+def is_open(ws) -> bool:
+    return ws is not None and ws.close_code is None
+
+
+# Warm pool of Murf stream-input sockets that already carry the api key and voice_config.
+class MurfSocketPool:
+    def __init__(self, url: str = None, voice_config: dict = None, max_size: int = MURF_POOL_MAX,
+                 min_idle: int = MURF_POOL_MIN_IDLE, idle_timeout: float = MURF_POOL_IDLE_TIMEOUT):
+        self.url = url
+        self.voice_config = voice_config or VOICE_CONFIG
+        self.max_size = max_size
+        self.min_idle = min_idle
+        self.idle_timeout = idle_timeout
+        self.stats = PoolStats()
+        self._idle = []  # (ws, released_at), most recently used last
+        self._in_use = 0
+        self._dialing = 0
+        self._available = asyncio.Condition()
+        self._maintainer = None
+
+    @property
+    def size(self) -> int:
+        return len(self._idle) + self._in_use + self._dialing
+
+    async def _dial(self):
+        # Caller reserves a slot in self._dialing first so size never overshoots max_size
+        ws = None
+        try:
+            url = self.url or murf_ws_url()
+            ws = await websockets.connect(url, ssl=ws_ssl(url))
+            await ws.send(json.dumps({"voice_config": self.voice_config}))
+        except BaseException as e:
+            # Connected but the voice config didn't go out (or the dial was cancelled): close it
+            if ws is not None:
+                try:
+                    await ws.close()
+                except Exception:
+                    pass
+            if not isinstance(e, asyncio.CancelledError):
+                self.stats.errors += 1
+            raise
+        self.stats.dials += 1
+        return ws
+
+    async def acquire(self):
+        self.stats.requests += 1
+        async with self._available:
+            while True:
+                while self._idle:
+                    ws, _ = self._idle.pop()
+                    if is_open(ws):
+                        self._in_use += 1
+                        self.stats.hits += 1
+                        return ws
+                    self.stats.evictions += 1
+                if self.size < self.max_size:
+                    break
+                self.stats.waits += 1
+                await self._available.wait()
+            self._dialing += 1
+        ws = None
+        try:
+            ws = await self._dial()
+        finally:
+            # Also when the dial is cancelled (barge-in, client gone): the slot goes back either way
+            self._dialing -= 1
+            if ws is not None:
+                self._in_use += 1
+            else:
+                async with self._available:
+                    self._available.notify()
+        return ws
+
+    async def release(self, ws, reusable: bool = True):
+        self._in_use -= 1
+        if reusable and is_open(ws):
+            self._idle.append((ws, time.monotonic()))
+        else:
+            await self._discard(ws)
+        async with self._available:
+            self._available.notify()
+
+    async def _discard(self, ws):
+        self.stats.evictions += 1
+        try:
+            await ws.close()
+        except Exception:
+            pass
+
+    def connection(self):
+        return _PooledConnection(self)
+
+    async def _maintain(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.check()
+            except Exception as e:
+                log.warning("Murf pool maintenance error: %s", e)
+
+    async def check(self):
+        # Evict expired or dead sockets, ping the rest, then top up to min_idle
+        now = time.monotonic()
+        keep = []
+        for ws, released_at in self._idle:
+            if now - released_at > self.idle_timeout or not is_open(ws):
+                await self._discard(ws)
+            else:
+                keep.append((ws, released_at))
+        self._idle = keep
+        for ws, released_at in list(self._idle):
+            try:
+                await asyncio.wait_for(await ws.ping(), timeout=5.0)
+            except Exception:
+                if (ws, released_at) in self._idle:
+                    self._idle.remove((ws, released_at))
+                    await self._discard(ws)
+        await self.warm()
+
+    async def warm(self):
+        while len(self._idle) < self.min_idle and self.size < self.max_size:
+            self._dialing += 1
+            ws = None
+            try:
+                ws = await self._dial()
+                self._idle.insert(0, (ws, time.monotonic()))
+            finally:
+                self._dialing -= 1
+                # A new idle socket, or a freed slot after a failed or cancelled dial
+                async with self._available:
+                    self._available.notify()
+
+    def start(self, interval: float = MURF_POOL_CHECK_INTERVAL):
+        if self._maintainer is None:
+            self._maintainer = asyncio.create_task(self._maintain(interval))
+
+    async def close(self):
+        if self._maintainer is not None:
+            self._maintainer.cancel()
+            await asyncio.gather(self._maintainer, return_exceptions=True)
+            self._maintainer = None
+        idle, self._idle = self._idle, []
+        for ws, _ in idle:
+            await self._discard(ws)
+
+
+class _PooledConnection:
+    def __init__(self, pool: MurfSocketPool):
+        self.pool = pool
+        self.ws = None
+
+    async def __aenter__(self):
+        self.ws = await self.pool.acquire()
+        return self.ws
+
+    async def __aexit__(self, exc_type, exc, tb):
+        # A socket that saw an error or cancellation may have unread audio on it
+        await self.pool.release(self.ws, reusable=exc_type is None)
+
+
+murf_pool = MurfSocketPool()
+
+
+def pool_stats() -> dict:
+    return {
+        "http": {name: stats.as_dict() for name, stats in _http_stats.items()},
+        "http2": HTTP2_ENABLED,
+        "murf": dict(murf_pool.stats.as_dict(), idle=len(murf_pool._idle), in_use=murf_pool._in_use),
+    }
+
+
+async def startup(warm_murf: bool = True):
+    for upstream in UPSTREAM_TIMEOUTS:
+        http_client(upstream)
+    if warm_murf:
+        murf_pool.start()
+        # Pre-dial in the background so startup never blocks on Murf
+        asyncio.create_task(_warm_quietly())
+
+
+async def _warm_quietly():
+    try:
+        await murf_pool.warm()
+    except Exception as e:
+        log.warning("Murf pool warmup failed: %s", e)
+
+
+async def shutdown():
+    await murf_pool.close()
+    for client in list(_clients.values()):
+        await client.aclose()
+    _clients.clear()
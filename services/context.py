@@ -0,0 +1,129 @@
+import asyncio
+import os
+from config import GEMINI_API_KEY
+from services.connections import GEMINI_API_BASE, http_client
+from services.sessions import session_store
+from services.telemetry import get_logger
+
+# Builds Gemini `contents` from session history under a token budget.
+# The newest turns are sent verbatim, newest first until the budget runs out; anything older is
+# folded into a rolling summary by a background Gemini call, so the request in the hot path never
+# waits on summarization. The summary used is whatever was ready when the request was built.
+
+log = get_logger("context")
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))
+CONTEXT_SUMMARY_TOKENS = int(os.getenv("CONTEXT_SUMMARY_TOKENS", "200"))
+CONTEXT_SUMMARIZE = os.getenv("CONTEXT_SUMMARIZE", "1") != "0"
+SUMMARY_MODEL = os.getenv("CONTEXT_SUMMARY_MODEL", "gemini-2.0-flash")
+
+
+def estimate_tokens(text: str) -> int:
+    # Gemini averages about 4 characters per token for English; close enough for budgeting
+    return (len(text) + 3) // 4
+
+
+def turn_tokens(turn) -> int:
+    if turn.tokens is None:
+        turn.tokens = estimate_tokens(turn.text) + 4  # role and part framing
+    return turn.tokens
+
+
+async def summarize_with_gemini(summary: str, turns: list, max_tokens: int = CONTEXT_SUMMARY_TOKENS) -> str:
+    url = f"{GEMINI_API_BASE}/v1beta/models/{SUMMARY_MODEL}:generateContent?key={GEMINI_API_KEY}"
+    lines = "\n".join(f"{'Nick' if turn.role == 'bot' else 'User'}: {turn.text}" for turn in turns)
+    prompt = (
+        f"Summary so far:\n{summary or '(none)'}\n\nNew lines:\n{lines}\n\n"
+        f"Update the summary of this conversation between a user and the voice assistant Nick. "
+        f"Keep names, facts, preferences and open questions. At most {max_tokens * 3 // 4} words."
+    )
+    payload = {
+        "contents": [{"role": "user", "parts": [{"text": prompt}]}],
+        "generationConfig": {"maxOutputTokens": max_tokens, "temperature": 0.2},
+    }
+    resp = await http_client("gemini").post(url, json=payload)
+    resp.raise_for_status()
+    candidates = resp.json().get("candidates", [])
+    if not candidates:
+        raise ValueError("empty summary")
+    return candidates[0].get("content", {}).get("parts", [{}])[0].get("text", "").strip()
+
+
+class ContextBuilder:
+    def __init__(self, store=session_store, budget: int = CONTEXT_TOKEN_BUDGET,
+                 summarize=summarize_with_gemini, summarize_enabled: bool = CONTEXT_SUMMARIZE):
+        self.store = store
+        self.budget = budget
+        self.summarize = summarize
+        self.summarize_enabled = summarize_enabled
+        self._summarizing = {}
+        self.summaries = 0
+        self.summary_errors = 0
+
+    async def build(self, session_id: str, history: list = None) -> list:
+        if history is None:
+            history = await self.store.history(session_id)
+        summary, summary_ts = await self.store.summary(session_id)
+        budget = self.budget - (estimate_tokens(summary) if summary else 0)
+
+        # Newest turns first; the latest turn always goes in. Turns already covered by the summary are skipped.
+        start = len(history)
+        used = 0
+        keep_from = None
+        while start > 0 and history[start - 1].ts > summary_ts:
+            cost = turn_tokens(history[start - 1])
+            if used + cost > budget and start < len(history):
+                break
+            used += cost
+            start -= 1
+            if keep_from is None and used > budget // 2:
+                keep_from = start + 1
+        keep_from = min(start if keep_from is None else keep_from, len(history) - 1)
+
+        # On overflow, fold the older turns down to half the budget into the summary, so a summary
+        # call happens every half-budget of conversation rather than on every turn
+        if start > 0 and history[start - 1].ts > summary_ts and self.summarize_enabled:
+            pending = [turn for turn in history[:keep_from] if turn.ts > summary_ts]
+            self._schedule_summary(session_id, summary, pending)
+
+        contents = []
+        if summary:
+            contents.append({"role": "user", "parts": [{"text": f"(Earlier in this conversation: {summary})"}]})
+        for turn in history[start:]:
+            role = "model" if turn.role == "bot" else "user"
+            if contents and contents[-1]["role"] == role:
+                contents[-1]["parts"].append({"text": turn.text})
+            else:
+                contents.append({"role": role, "parts": [{"text": turn.text}]})
+        return contents
+
+    def _schedule_summary(self, session_id: str, summary: str, pending: list):
+        task = self._summarizing.get(session_id)
+        if task is not None and not task.done():
+            return
+        self._summarizing[session_id] = asyncio.create_task(self._update_summary(session_id, summary, pending))
+
+    async def _update_summary(self, session_id: str, summary: str, pending: list):
+        try:
+            text = await self.summarize(summary, pending)
+            if text:
+                await self.store.set_summary(session_id, text, pending[-1].ts)
+                self.summaries += 1
+        except Exception as e:
+            self.summary_errors += 1
+            log.warning("summary failed for %s: %s", session_id, e)
+        finally:
+            self._summarizing.pop(session_id, None)
+
+    async def close(self):
+        tasks = list(self._summarizing.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def prompt_tokens(contents: list) -> int:
+    return sum(estimate_tokens(part.get("text", "")) + 4 for content in contents for part in content["parts"])
+
+
+context_builder = ContextBuilder()
@@ -0,0 +1,82 @@
+import asyncio
+import hmac
+import json
+import os
+import time
+from services.telemetry import get_logger
+
+# Graceful drain of one worker, started by serve.py (POST /admin/drain) before it stops the
+# process. From then on new HTTP turns get 503 + Connection: close, so the client comes back
+# through the router to another worker; turns already in flight run to completion. /ws/voice
+# sessions finish the turn they are playing, then close with 1012 (service restart) and the
+# client reconnects, resuming its ?session= history from the shared session store.
+
+log = get_logger("drain")
+
+TURN_PATHS = ("/process-audio/", "/stream-chat/", "/stream-murf-tts/")
+# Shared secret for /admin/ endpoints (serve.py passes its own to the workers); unset = no admin access
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+
+def admin_allowed(token: str) -> bool:
+    return bool(ADMIN_TOKEN) and hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode())
+
+
+class Drain:
+    def __init__(self):
+        self.draining = False
+        self.started = None
+        self.requests = 0
+        self.sessions = 0
+        self.rejected = 0
+        self._event = asyncio.Event()
+
+    def start(self):
+        if not self.draining:
+            self.draining = True
+            self.started = time.monotonic()
+            self._event.set()
+            log.info("draining", extra={"fields": {"requests": self.requests, "sessions": self.sessions}})
+
+    async def wait(self):
+        await self._event.wait()
+
+    @property
+    def idle(self) -> bool:
+        return self.requests == 0 and self.sessions == 0
+
+    def stats(self) -> dict:
+        return {
+            "draining": self.draining,
+            "draining_seconds": round(time.monotonic() - self.started, 3) if self.started else None,
+            "requests_in_flight": self.requests,
+            "ws_sessions": self.sessions,
+            "rejected": self.rejected,
+            "idle": self.idle,
+        }
+
+
+class DrainMiddleware:
+    # Pure ASGI, so a turn counts until its streamed response has been sent in full
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith(TURN_PATHS):
+            await self.app(scope, receive, send)
+            return
+        if drain.draining:
+            drain.rejected += 1
+            await send({"type": "http.response.start", "status": 503, "headers": [
+                (b"content-type", b"application/json"), (b"retry-after", b"1"), (b"connection", b"close"),
+            ]})
+            await send({"type": "http.response.body", "body": json.dumps({"error": "draining"}).encode()})
+            return
+        drain.requests += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            drain.requests -= 1
+
+
+drain = Drain()
@@ -0,0 +1,129 @@
+import asyncio
+import itertools
+import os
+import time
+from services.flow import AudioPacer, wav_seconds
+from services.tts_cache import FILLER_PHRASES
+
+# Latency masking for slow turns. When a turn still has no answer audio FILLER_AFTER_MS after it
+# started (end of speech on /ws/voice, request arrival over HTTP) - STT still polling, a slow first
+# Gemini token, a weather/search lookup - a short filler ("Hmm, let me check.") plays instead of
+# dead air. Fillers are fallback phrases (tts_cache.FILLER_PHRASES), synthesized with the Murf voice
+# at startup and replayed from the TTS cache, so they never wait on Murf. A filler goes out at
+# real-time pace, at most FILLER_LEAD_MS ahead of playback; when the answer's first audio arrives
+# the rest of the filler is dropped and the answer follows the fragment the client is playing, so
+# the splice is on a fragment boundary and costs the answer at most FILLER_LEAD_MS and one fragment.
+# At most FILLER_MAX fillers per turn, FILLER_REPEAT_MS of silence apart. FILLER=0 turns it off.
+# Turn traces keep both latencies: perceived_first_audio (any audio) and first_audio (the answer).
+
+FILLER_ENABLED = os.getenv("FILLER", "1") != "0"
+FILLER_AFTER_MS = int(os.getenv("FILLER_AFTER_MS", "800"))
+FILLER_LEAD_MS = int(os.getenv("FILLER_LEAD_MS", "150"))
+FILLER_MAX = int(os.getenv("FILLER_MAX", "2"))
+FILLER_REPEAT_MS = int(os.getenv("FILLER_REPEAT_MS", "2500"))
+
+
+class FillerScheduler:
+    def __init__(self, load, phrases: list = FILLER_PHRASES, enabled: bool = FILLER_ENABLED,
+                 after_ms: int = FILLER_AFTER_MS):
+        # load(text) -> the cached WAV fragments of a phrase, [] when it is not cached
+        self.load = load
+        self.phrases = itertools.cycle(phrases)
+        self.enabled = enabled and bool(phrases)
+        self.after = after_ms / 1000
+        self.turns = 0
+        self.masked = 0
+        self.fillers = 0
+        self.filler_seconds = 0.0
+        self.missing = 0
+        self.spliced = 0
+        self.answer_wait = 0.0
+
+    # events: one turn's (kind, data) events, its answer audio as ("audio", WAV fragment). They are
+    # passed through, with ("filler", text) and ("filler_audio", WAV fragment) ahead of a late answer.
+    # pacer: the turn's AudioPacer when the answer is paced too, so it counts the filler audio.
+    async def mask(self, events, trace, pacer: AudioPacer = None):
+        if not self.enabled:
+            async for event in events:
+                yield event
+            return
+        self.turns += 1
+        pacer = pacer or AudioPacer(FILLER_LEAD_MS)
+        lead = FILLER_LEAD_MS / 1000
+        due = trace.started + self.after
+        fragments = []  # what is left of the filler being played
+        playing_until = 0.0  # when the client is done playing the filler sent so far
+        played = 0
+        pending = None
+        try:
+            while True:
+                if pending is None:
+                    pending = asyncio.ensure_future(events.__anext__())
+                if fragments:
+                    timeout = pacer.delay(lead)
+                elif played < FILLER_MAX:
+                    timeout = max(0.0, due - time.perf_counter())
+                else:
+                    timeout = None
+                if timeout is None or timeout > 0:
+                    await asyncio.wait((pending,), timeout=timeout)
+                if pending.done():
+                    try:
+                        event = pending.result()
+                    except StopAsyncIteration:
+                        pending = None
+                        return
+                    pending = None
+                    if event[0] != "audio":
+                        yield event
+                        continue
+                    # The answer: the filler stops at the fragment already sent
+                    wait = max(0.0, playing_until - time.perf_counter())
+                    if "filler" in trace.tags:
+                        self.spliced += 1
+                        self.answer_wait += wait
+                        trace.tags["filler_wait_ms"] = round(wait * 1000, 1)
+                    yield event
+                    break
+                if not fragments:
+                    text = next(self.phrases)
+                    played += 1
+                    fragments = list(await self.load(text))
+                    if not fragments:
+                        # Not in the TTS cache (yet): no filler rather than a live Murf call
+                        self.missing += 1
+                        due = time.perf_counter() + FILLER_REPEAT_MS / 1000
+                        continue
+                    self.fillers += 1
+                    self.masked += "filler" not in trace.tags
+                    trace.tags["filler"] = trace.tags.get("filler", 0) + 1
+                    yield "filler", text
+                fragment = fragments.pop(0)
+                seconds = wav_seconds(fragment)
+                pacer.add(seconds)
+                playing_until = max(time.perf_counter(), playing_until) + seconds
+                self.filler_seconds += seconds
+                if not fragments:
+                    due = playing_until + FILLER_REPEAT_MS / 1000
+                yield "filler_audio", fragment
+            # Answer audio is flowing: nothing left to schedule
+            async for event in events:
+                yield event
+        finally:
+            if pending is not None:
+                pending.cancel()
+                await asyncio.gather(pending, return_exceptions=True)
+            await events.aclose()
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "after_ms": round(self.after * 1000),
+            "turns": self.turns,
+            "masked_turns": self.masked,
+            "fillers": self.fillers,
+            "filler_seconds": round(self.filler_seconds, 3),
+            "missing": self.missing,
+            "spliced": self.spliced,
+            "answer_wait_ms_avg": round(self.answer_wait / self.spliced * 1000, 1) if self.spliced else 0.0,
+        }
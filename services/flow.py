@@ -0,0 +1,281 @@
+import asyncio
+import os
+import time
+from collections import deque
+from services.audio_codec import parse_wav_header
+
+# Flow control between the stages of /ws/voice.
+#   inbound  - client mic -> STT. The socket is read by its own task into an AudioBuffer, so a slow
+#              STT upstream never stalls control messages. Raw PCM drops the oldest (stale) audio
+#              past the high watermark; webm can't lose bytes mid-container, so it blocks the
+#              reader instead (and the client socket's own flow control takes over). Queued chunks
+#              are merged into one upstream message when the consumer falls behind.
+#   outbound - Murf -> client. Each turn's audio buffer blocks the Murf reader at the high
+#              watermark until it drains to the low one, so a slow client backs up into Murf
+#              instead of into memory. Audio leaves at real-time pace, at most TTS_PACING_LEAD_MS
+#              ahead of the client's playback.
+# Watermarks are in bytes. FLOW_CONTROL=0 restores unbounded buffers and unpaced sends.
+# The web client reports its own side of playback ({"type": "playback", ...}: underruns, jitter
+# buffer depth and target, time from the first reply chunk to sound); the latest report is kept per
+# session and totals across sessions.
+
+FLOW_CONTROL = os.getenv("FLOW_CONTROL", "1") != "0"
+FLOW_IN_HIGH_BYTES = int(os.getenv("FLOW_IN_HIGH_BYTES", str(64 * 1024)))
+FLOW_IN_LOW_BYTES = int(os.getenv("FLOW_IN_LOW_BYTES", str(32 * 1024)))
+FLOW_OUT_HIGH_BYTES = int(os.getenv("FLOW_OUT_HIGH_BYTES", str(256 * 1024)))
+FLOW_OUT_LOW_BYTES = int(os.getenv("FLOW_OUT_LOW_BYTES", str(128 * 1024)))
+FLOW_MERGE_MAX_BYTES = int(os.getenv("FLOW_MERGE_MAX_BYTES", str(32 * 1024)))
+TTS_PACING_LEAD_MS = int(os.getenv("TTS_PACING_LEAD_MS", "1000"))
+PLAYBACK_FIELDS = ("turns", "first_sound_ms", "underruns", "underrun_ms", "depth_ms", "target_ms", "jitter_ms",
+                   "overflow_ms")
+PLAYBACK_SAMPLES = 1000
+
+
+class AudioBuffer:
+    # Bounded queue of audio chunks. get() returns None once finish()/abort() was called and the
+    # buffer is drained. policy: "block" (producer waits for the low watermark) or "drop_oldest".
+    def __init__(self, high: int = None, low: int = None, policy: str = "block", merge_max: int = 0):
+        if not FLOW_CONTROL:
+            high, merge_max = None, 0
+        self.high = high
+        self.low = high // 2 if high is not None and low is None else low
+        self.policy = policy
+        self.merge_max = merge_max
+        self._chunks = deque()
+        self._readable = asyncio.Event()
+        self._writable = asyncio.Event()
+        self._writable.set()
+        self.finished = False
+        self.buffered = 0
+        self.peak = 0
+        self.bytes_in = 0
+        self.dropped_bytes = 0
+        self.dropped_chunks = 0
+        self.merged_chunks = 0
+        self.producer_waits = 0
+        self.producer_wait_seconds = 0.0
+        self.tap = None  # called with every chunk taken in (services.recording)
+
+    async def put(self, chunk: bytes):
+        if self.finished:
+            return
+        if self.high is not None and self.policy == "block" and self.buffered >= self.high:
+            self.producer_waits += 1
+            started = time.perf_counter()
+            self._writable.clear()
+            await self._writable.wait()
+            self.producer_wait_seconds += time.perf_counter() - started
+            if self.finished:
+                return
+        self._chunks.append(chunk)
+        self.buffered += len(chunk)
+        self.bytes_in += len(chunk)
+        if self.tap is not None:
+            self.tap(chunk)
+        if self.high is not None and self.policy == "drop_oldest" and self.buffered > self.high:
+            # Keep the newest audio; what the consumer never got to is stale by now
+            while self.buffered > self.low and len(self._chunks) > 1:
+                old = self._chunks.popleft()
+                self.buffered -= len(old)
+                self.dropped_bytes += len(old)
+                self.dropped_chunks += 1
+        self.peak = max(self.peak, self.buffered)
+        self._readable.set()
+
+    async def get(self):
+        while not self._chunks:
+            if self.finished:
+                return None
+            self._readable.clear()
+            await self._readable.wait()
+        chunk = self._chunks.popleft()
+        if self.merge_max and self._chunks and len(chunk) < self.merge_max:
+            parts = [chunk]
+            size = len(chunk)
+            while self._chunks and size + len(self._chunks[0]) <= self.merge_max:
+                size += len(self._chunks[0])
+                parts.append(self._chunks.popleft())
+            if len(parts) > 1:
+                self.merged_chunks += len(parts) - 1
+                chunk = b"".join(parts)
+        self.buffered -= len(chunk)
+        if self.high is None or self.buffered <= self.low:
+            self._writable.set()
+        return chunk
+
+    def finish(self):
+        # No more audio; what is queued still gets delivered
+        self.finished = True
+        self._readable.set()
+        self._writable.set()
+
+    def abort(self):
+        # Barge-in or teardown: drop what is queued and release a blocked producer
+        self.dropped_bytes += self.buffered
+        self.dropped_chunks += len(self._chunks)
+        self._chunks.clear()
+        self.buffered = 0
+        self.finish()
+
+    def stats(self) -> dict:
+        return {
+            "buffered_bytes": self.buffered,
+            "peak_bytes": self.peak,
+            "bytes_in": self.bytes_in,
+            "dropped_bytes": self.dropped_bytes,
+            "dropped_chunks": self.dropped_chunks,
+            "merged_chunks": self.merged_chunks,
+            "producer_waits": self.producer_waits,
+            "producer_wait_seconds": round(self.producer_wait_seconds, 3),
+        }
+
+
+def inbound_buffer(input_format: str) -> AudioBuffer:
+    policy = "drop_oldest" if input_format.startswith("pcm16_") else "block"
+    return AudioBuffer(FLOW_IN_HIGH_BYTES, FLOW_IN_LOW_BYTES, policy, merge_max=FLOW_MERGE_MAX_BYTES)
+
+
+def outbound_buffer() -> AudioBuffer:
+    # Murf WAV fragments each carry a header, so they are never merged
+    return AudioBuffer(FLOW_OUT_HIGH_BYTES, FLOW_OUT_LOW_BYTES, "block")
+
+
+def wav_seconds(chunk: bytes, sample_rate: int = 44100) -> float:
+    header = parse_wav_header(chunk)
+    if header is None:
+        return len(chunk) / (sample_rate * 2)
+    rate, channels, bits, offset = header
+    return (len(chunk) - offset) / (rate * channels * max(bits // 8, 1))
+
+
+class AudioPacer:
+    # Releases audio no faster than real time, keeping at most `lead` seconds queued at the client.
+    # If the client ran dry (TTS slower than real time) the playback clock restarts from now.
+    def __init__(self, lead_ms: int = TTS_PACING_LEAD_MS):
+        self.lead = lead_ms / 1000
+        self.enabled = FLOW_CONTROL and lead_ms >= 0
+        self.started = None
+        self.sent = 0.0
+        self.waited = 0.0
+
+    def delay(self, lead: float = None) -> float:
+        # Seconds until more audio may go out, keeping `lead` (default: the pacer's) queued
+        if not self.enabled:
+            return 0.0
+        now = time.perf_counter()
+        if self.started is None or now - self.started > self.sent:
+            self.started = now - self.sent
+        return max(0.0, self.sent - (now - self.started) - (self.lead if lead is None else lead))
+
+    def add(self, seconds: float):
+        self.sent += seconds
+
+    async def pace(self, seconds: float):
+        if not self.enabled:
+            return
+        ahead = self.delay()
+        if ahead > 0:
+            await asyncio.sleep(ahead)
+            self.waited += ahead
+        self.add(seconds)
+
+
+class SessionFlow:
+    # Per-session buffer metrics: the inbound buffer, the current turn's outbound buffer and totals
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self.inbound = None
+        self.outbound = None
+        self.turns = 0
+        self.out_peak = 0
+        self.out_dropped = 0
+        self.out_waits = 0
+        self.paced_seconds = 0.0
+        self.send_seconds = 0.0
+        self.playback = {}  # the client's latest playback report
+
+    def end_turn(self, buffer: AudioBuffer, pacer: AudioPacer, send_seconds: float):
+        self.turns += 1
+        self.out_peak = max(self.out_peak, buffer.peak)
+        self.out_dropped += buffer.dropped_bytes
+        self.out_waits += buffer.producer_waits
+        self.paced_seconds += pacer.waited
+        self.send_seconds += send_seconds
+        if self.outbound is buffer:
+            self.outbound = None
+
+    def buffered(self) -> int:
+        return sum(b.buffered for b in (self.inbound, self.outbound) if b is not None)
+
+    def stats(self) -> dict:
+        return {
+            "inbound": self.inbound.stats() if self.inbound is not None else None,
+            "outbound": {
+                "buffered_bytes": self.outbound.buffered if self.outbound is not None else 0,
+                "peak_bytes": max(self.out_peak, self.outbound.peak if self.outbound is not None else 0),
+                "dropped_bytes": self.out_dropped,
+                "producer_waits": self.out_waits,
+                "paced_seconds": round(self.paced_seconds, 3),
+                "client_send_seconds": round(self.send_seconds, 3),
+                "turns": self.turns,
+            },
+            "client_playback": self.playback or None,
+        }
+
+
+class FlowMonitor:
+    def __init__(self):
+        self.sessions = {}
+        self.reports = 0
+        self.underruns = 0
+        self.underrun_ms = 0.0
+        self.first_sound_ms = deque(maxlen=PLAYBACK_SAMPLES)
+
+    def playback(self, flow: SessionFlow, report: dict):
+        # A client report: counters are cumulative per connection, so only their growth is added
+        values = {key: report[key] for key in PLAYBACK_FIELDS
+                  if isinstance(report.get(key), (int, float)) and not isinstance(report.get(key), bool)}
+        before = flow.playback
+        self.reports += 1
+        self.underruns += max(0, values.get("underruns", 0) - before.get("underruns", 0))
+        self.underrun_ms += max(0.0, values.get("underrun_ms", 0) - before.get("underrun_ms", 0))
+        if values.get("turns", 0) > before.get("turns", 0) and "first_sound_ms" in values:
+            self.first_sound_ms.append(values["first_sound_ms"])
+        flow.playback = values
+
+    def open(self, session_id: str) -> SessionFlow:
+        flow = self.sessions[session_id] = SessionFlow(session_id)
+        return flow
+
+    def close(self, session_id: str):
+        self.sessions.pop(session_id, None)
+
+    def stats(self, top: int = 20) -> dict:
+        flows = sorted(self.sessions.values(), key=lambda f: f.buffered(), reverse=True)
+        return {
+            "flow_control": FLOW_CONTROL,
+            "sessions": len(flows),
+            "buffered_bytes": sum(f.buffered() for f in flows),
+            "watermarks": {
+                "inbound": [FLOW_IN_LOW_BYTES, FLOW_IN_HIGH_BYTES],
+                "outbound": [FLOW_OUT_LOW_BYTES, FLOW_OUT_HIGH_BYTES],
+            },
+            "client_playback": {
+                "reports": self.reports,
+                "underruns": self.underruns,
+                "underrun_ms": round(self.underrun_ms, 1),
+                "first_sound_ms": percentiles(self.first_sound_ms),
+            },
+            "top_sessions": {f.session_id: f.stats() for f in flows[:top]},
+        }
+
+
+def percentiles(values) -> dict:
+    values = sorted(values)
+    if not values:
+        return {"count": 0}
+    p50, p95 = (values[min(len(values) - 1, int(len(values) * q))] for q in (0.5, 0.95))
+    return {"count": len(values), "p50": p50, "p95": p95, "max": values[-1]}
+
+
+flow_monitor = FlowMonitor()
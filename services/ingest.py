@@ -0,0 +1,108 @@
+import asyncio
+import os
+import tempfile
+import time
+
+# Uploaded recordings on their way to STT. /process-audio and /stream-chat used to read the whole
+# upload into memory and only then send it to the STT provider in one piece, so the upload to
+# AssemblyAI was added after the recording ended and memory grew with clip length x concurrency.
+# An UploadStream takes the request body as it arrives and spools it: in memory up to
+# INGEST_SPOOL_BYTES, past that in a temporary file. Readers (the STT provider, a retry of it, the
+# recorder) read it from the start while it is still arriving, one INGEST_READ_BYTES block at a
+# time, so STT starts on the first bytes - while the user is still talking when the client uploads
+# incrementally (a chunked request body) - and memory per upload stays bounded.
+
+INGEST_SPOOL_BYTES = int(os.getenv("INGEST_SPOOL_BYTES", str(256 * 1024)))
+INGEST_READ_BYTES = int(os.getenv("INGEST_READ_BYTES", str(32 * 1024)))
+INGEST_MAX_BYTES = int(os.getenv("INGEST_MAX_BYTES", str(50 * 1024 * 1024)))
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+class UploadStream:
+    # body: async iterator of bytes (Request.stream(), or a multipart file read in blocks).
+    # incremental: the client sends the recording while it is being made, so the end of the body is
+    # the end of speech. cleanup: awaited on close (e.g. the parsed multipart form).
+    def __init__(self, body, incremental: bool = False, cleanup=None):
+        self._body = body
+        self.incremental = incremental
+        self._cleanup = cleanup
+        self._spool = tempfile.SpooledTemporaryFile(max_size=INGEST_SPOOL_BYTES)
+        self._grown = asyncio.Event()
+        self._reader = None
+        self.size = 0
+        self.complete = False
+        self.error = None
+        self.completed_at = None
+
+    def _start(self):
+        if self._reader is None:
+            self._reader = asyncio.ensure_future(self._read())
+
+    async def _read(self):
+        try:
+            async for chunk in self._body:
+                if not chunk:
+                    continue
+                if self.size + len(chunk) > INGEST_MAX_BYTES:
+                    raise UploadTooLarge(f"upload larger than {INGEST_MAX_BYTES} bytes")
+                self._spool.seek(0, os.SEEK_END)
+                self._spool.write(chunk)
+                self.size += len(chunk)
+                self._grown.set()
+        except Exception as e:
+            self.error = e
+        finally:
+            self.complete = True
+            self.completed_at = time.perf_counter()
+            self._grown.set()
+
+    async def chunks(self, size: int = INGEST_READ_BYTES):
+        # The body from its first byte, as far as it has arrived, then the rest as it comes in
+        self._start()
+        pos = 0
+        while True:
+            if pos < self.size:
+                self._spool.seek(pos)
+                block = self._spool.read(min(size, self.size - pos))
+                pos += len(block)
+                yield block
+            elif self.complete:
+                if self.error is not None:
+                    raise self.error
+                return
+            else:
+                self._grown.clear()
+                await self._grown.wait()
+
+    async def head(self, size: int) -> bytes:
+        # The first `size` bytes (fewer if the body is shorter), e.g. to sniff a WAV header
+        self._start()
+        while self.size < size and not self.complete:
+            self._grown.clear()
+            await self._grown.wait()
+        self._spool.seek(0)
+        return self._spool.read(size)
+
+    async def wait(self):
+        # Until the whole body is in; raises what ended it early (client gone, too large)
+        self._start()
+        await asyncio.shield(self._reader)
+        if self.error is not None:
+            raise self.error
+
+    async def read(self) -> bytes:
+        # The whole body in memory, for providers that can only take one piece
+        await self.wait()
+        self._spool.seek(0)
+        return self._spool.read()
+
+    async def close(self):
+        if self._reader is not None and not self._reader.done():
+            self._reader.cancel()
+            await asyncio.gather(self._reader, return_exceptions=True)
+        self._spool.close()
+        if self._cleanup is not None:
+            await self._cleanup()
@@ -0,0 +1,60 @@
+import importlib
+import time
+
+# Heavy modules imported on first use instead of at app startup (NumPy alone is ~15% of the
+# import time of main). `np = lazy_import("numpy")` stands in for `import numpy as np`; the first
+# attribute access imports the real module. Modules the request path needs anyway are marked
+# preload: the startup warmup imports them from a worker thread (warm()), so that usually happens
+# in the background before the first request gets there. The rest (provider SDKs) wait for use.
+
+
+class LazyModule:
+    def __init__(self, name: str, preload: bool = False):
+        self.__dict__["_name"] = name
+        self.__dict__["preload"] = preload
+        self.__dict__["_module"] = None
+        self.__dict__["load_seconds"] = None
+
+    def _load(self):
+        module = self.__dict__["_module"]
+        if module is None:
+            # importlib serializes concurrent imports of one module, so a request racing the
+            # warmup thread just waits for it
+            started = time.perf_counter()
+            module = importlib.import_module(self._name)
+            if self.__dict__["_module"] is None:
+                self.__dict__["load_seconds"] = time.perf_counter() - started
+                self.__dict__["_module"] = module
+        return module
+
+    @property
+    def loaded(self) -> bool:
+        return self.__dict__["_module"] is not None
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+
+_modules = {}
+
+
+def lazy_import(name: str, preload: bool = False) -> LazyModule:
+    module = _modules.get(name)
+    if module is None:
+        module = _modules[name] = LazyModule(name, preload)
+    elif preload:
+        module.__dict__["preload"] = True
+    return module
+
+
+def warm():
+    for module in list(_modules.values()):
+        if module.preload:
+            module._load()
+
+
+def stats() -> dict:
+    return {
+        name: {"loaded": m.loaded, "preload": m.preload, "load_ms": round(m.load_seconds * 1000, 1) if m.load_seconds else None}
+        for name, m in _modules.items()
+    }
@@ -1,13 +1,31 @@
-import google.generativeai as genai
+from services.blocking import blocking_pool
+from services.lazy import lazy_import
+
+# The SDK is imported on first use, not at app startup. Its calls block, so they run in the
+# bounded thread pool (services.blocking) and get_response is awaited like any other upstream call.
+genai = lazy_import("google.generativeai")
 
 class LLMService:
-    def __init__(self, api_key: str):
-        genai.configure(api_key=api_key)
-        self.client = genai.GenerativeModel("gemini-2.5-flash")
+    def __init__(self, api_key: str, model: str = "gemini-2.5-flash"):
+        self.api_key = api_key
+        self.model = model
+        self._clients = {}  # system instruction -> GenerativeModel
+
+    def _client(self, system_instruction: str = None):
+        client = self._clients.get(system_instruction)
+        if client is None:
+            genai.configure(api_key=self.api_key)
+            client = self._clients[system_instruction] = genai.GenerativeModel(
+                self.model, system_instruction=system_instruction
+            )
+        return client
 
-    def get_response(self, messages: list) -> str:
+    def get_response_sync(self, messages, system_instruction: str = None) -> str:
         from google.generativeai.types import GenerateContentConfig, ThinkingConfig
         config = GenerateContentConfig(thinking_config=ThinkingConfig(thinking_budget=0))
-        llm_response = self.client.generate_content(messages, config=config)
+        llm_response = self._client(system_instruction).generate_content(messages, config=config)
         llm_text = getattr(llm_response, "text", None)
         return llm_text or str(llm_response)
+
+    async def get_response(self, messages, system_instruction: str = None) -> str:
+        return await blocking_pool.run("gemini_sdk", self.get_response_sync, messages, system_instruction)
@@ -0,0 +1,143 @@
+import asyncio
+import base64
+import json
+import os
+import uuid
+import websockets
+from config import MURF_API_KEY
+from services.flow import outbound_buffer
+from services.tls import ws_ssl
+from services.tts_cache import cache_key
+
+MURF_WS_URL = os.getenv("MURF_WS_URL", "wss://api.murf.ai/v1/speech/stream-input")
+MURF_SAMPLE_RATE = 44100
+MURF_FORMAT = "WAV"
+
+VOICE_CONFIG = {
+    "voiceId": "en-IN-aarav",
+    "style": "Conversational",
+    "rate": 0,
+    "pitch": 0,
+    "variation": 1
+}
+
+
+def murf_ws_url(sample_rate: int = MURF_SAMPLE_RATE, audio_format: str = MURF_FORMAT) -> str:
+    return f"{MURF_WS_URL}?api-key={MURF_API_KEY}&sample_rate={sample_rate}&channel_type=MONO&format={audio_format}"
+
+
+def murf_cache_key(text: str) -> str:
+    return cache_key(text, VOICE_CONFIG, MURF_SAMPLE_RATE, MURF_FORMAT)
+
+
+# One long-lived Murf stream-input connection per voice session.
+# Each turn gets its own context_id; audio for a context lands on its own bounded AudioBuffer
+# (services.flow) and get() returning None marks the end of that context. A full buffer pauses
+# reading from Murf until the turn's consumer catches up.
+# With a pool (services.connections.murf_pool) the socket is borrowed warm and handed
+# back on close; without one it is dialed directly.
+class MurfSession:
+    def __init__(self, url: str = None, voice_config: dict = None, pool=None):
+        self.url = url or murf_ws_url()
+        self.voice_config = voice_config or VOICE_CONFIG
+        self.pool = pool
+        self.ws = None
+        self._reader = None
+        self._lock = asyncio.Lock()
+        self._contexts = {}
+        self._has_text = set()
+
+    async def connect(self):
+        async with self._lock:
+            if self.ws is not None and self._reader is not None and not self._reader.done():
+                return
+            if self.ws is not None and self.pool is not None:
+                await self.pool.release(self.ws, reusable=False)
+            self.ws = None
+            if self.pool is not None:
+                self.ws = await self.pool.acquire()
+            else:
+                self.ws = await websockets.connect(self.url, ssl=ws_ssl(self.url))
+                await self.ws.send(json.dumps({"voice_config": self.voice_config}))
+            self._reader = asyncio.create_task(self._read_loop(self.ws))
+
+    async def _read_loop(self, ws):
+        try:
+            async for message in ws:
+                data = json.loads(message)
+                context_id = data.get("context_id")
+                if context_id is None and len(self._contexts) == 1:
+                    context_id = next(iter(self._contexts))
+                queue = self._contexts.get(context_id)
+                if queue is None:
+                    continue
+                if "audio" in data:
+                    await queue.put(base64.b64decode(data["audio"]))
+                if data.get("final"):
+                    queue.finish()
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            # Connection is gone: finish every open turn so nobody waits forever
+            for queue in self._contexts.values():
+                queue.finish()
+            self._contexts.clear()
+            self._has_text.clear()
+
+    def open_context(self):
+        context_id = str(uuid.uuid4())
+        queue = outbound_buffer()
+        self._contexts[context_id] = queue
+        return context_id, queue
+
+    def close_context(self, context_id: str):
+        queue = self._contexts.pop(context_id, None)
+        if queue is not None:
+            # Releases the reader if it is blocked on this context's full buffer
+            queue.abort()
+        self._has_text.discard(context_id)
+
+    async def send_text(self, context_id: str, text: str):
+        await self.connect()
+        self._has_text.add(context_id)
+        await self.ws.send(json.dumps({"context_id": context_id, "text": text}))
+
+    async def end(self, context_id: str):
+        queue = self._contexts.get(context_id)
+        if context_id not in self._has_text:
+            # Murf never saw this context, so no final will come back
+            if queue is not None:
+                queue.finish()
+            return
+        await self.ws.send(json.dumps({"context_id": context_id, "end": True}))
+
+    async def clear(self, context_id: str):
+        # Barge-in: drop whatever Murf still has queued for this context and finish it locally.
+        # Late audio for the context is ignored by the reader once close_context() runs.
+        queue = self._contexts.get(context_id)
+        if queue is not None:
+            queue.abort()
+        if context_id not in self._has_text or self.ws is None:
+            return
+        self._has_text.discard(context_id)
+        try:
+            await self.ws.send(json.dumps({"context_id": context_id, "clear": True}))
+        except websockets.ConnectionClosed:
+            pass
+
+    async def close(self):
+        if self.ws is None:
+            return
+        if self.pool is not None:
+            # Only hand the socket back if no turn could still have audio in flight on it
+            reusable = not self._contexts and self._reader is not None and not self._reader.done()
+            if self._reader is not None:
+                self._reader.cancel()
+                await asyncio.gather(self._reader, return_exceptions=True)
+            await self.pool.release(self.ws, reusable=reusable)
+        else:
+            await self.ws.close()
+            if self._reader is not None:
+                await asyncio.gather(self._reader, return_exceptions=True)
+        self.ws = None
+        self._reader = None
@@ -0,0 +1,371 @@
+import asyncio
+import time
+import httpx
+from services.admission import UpstreamBusy, admission
+from services.context import context_builder
+from services.filler import FillerScheduler
+from services.flow import wav_seconds
+from services.ingest import UploadStream
+from services.providers import llm_provider, stt_provider, tts_provider
+from services.recording import recorder
+from services.response_cache import response_cache
+from services.segmenter import SentenceSegmenter
+from services.sessions import Turn, session_store
+from services.telemetry import TurnTrace, get_logger, traced_audio
+from services.tools import with_tool_results
+from services.transcription import TranscriptionError
+from services.tts_cache import BUSY_PHRASE, LLM_ERROR_PHRASE, NO_SPEECH_PHRASE, tts_cache
+
+# The voice turn engine behind /process-audio, /stream-chat and /ws/voice:
+#   STT -> session history -> reply (response cache, else context + tools + streamed LLM) ->
+#   sentence segments -> one TTS context, so audio starts while the LLM is still generating.
+# Providers come from services.providers and are all async (SDK-backed ones run in the bounded
+# thread pool), and every upstream call runs under its provider's admission limit and through the
+# recorder (services.recording; a no-op unless RECORD_DIR is set). The endpoints only decide how
+# events reach their client.
+
+log = get_logger("pipeline")
+
+SYSTEM_PROMPT = "You are a human. Your name is Nick. You are a helpful, friendly, and conversational voice assistant. If someone greets you by name (Nick), respond warmly as Nick."
+
+# Events buffered between a turn and a slow HTTP client before the turn waits
+TURN_EVENT_BUFFER = 32
+
+
+class CachedReply(str):
+    # A whole reply from the response cache; its audio can come from the TTS cache as well
+    pass
+
+
+class Pipeline:
+    def __init__(self, stt=None, llm=None, tts=None):
+        self.stt = stt or stt_provider()
+        self.llm = llm or llm_provider()
+        self.tts = tts or tts_provider()
+        # Masks slow turns with cached filler audio; the endpoints that stream audio apply it
+        self.filler = FillerScheduler(self.cached_audio)
+
+    def providers(self) -> dict:
+        return {"stt": self.stt.name, "llm": self.llm.name, "tts": self.tts.name}
+
+    async def transcribe(self, audio, session_id: str = None) -> str:
+        # In an STT admission slot with retries; raises UpstreamBusy when STT is saturated.
+        # audio: the recording's bytes, or an UploadStream still arriving (fed to STT as it does;
+        # a retry reads it again from the start)
+        if isinstance(audio, UploadStream):
+            return await admission.call(self.stt.upstream, session_id, lambda: self._transcribe_upload(audio, session_id))
+        request = {"provider": self.stt.name, "audio": audio}
+        return await admission.call(self.stt.upstream, session_id, lambda: recorder.result(
+            session_id, "stt.transcribe", request, lambda: self.stt.transcribe(audio)))
+
+    async def _transcribe_upload(self, upload: UploadStream, session_id: str = None) -> str:
+        if not recorder.enabled:
+            return await self.stt.transcribe_stream(upload)
+        # Recorded as a transcription of the whole recording from the moment it was all in: that is
+        # when a replay, which gets the recording in one piece, starts
+        transcription = asyncio.ensure_future(self.stt.transcribe_stream(upload))
+        try:
+            audio = await upload.read()
+        except BaseException:
+            transcription.cancel()
+            await asyncio.gather(transcription, return_exceptions=True)
+            raise
+        request = {"provider": self.stt.name, "audio": audio}
+        return await recorder.result(session_id, "stt.transcribe", request, lambda: transcription)
+
+    async def listen(self, pcm_chunks, session_id: str = None):
+        # Realtime transcript events; the session holds an admission slot for as long as it is open
+        async with admission.slot(self.stt.stream_upstream, session_id):
+            async for event in recorder.stream(session_id, "stt.stream", {"provider": self.stt.name},
+                                               self.stt.stream, pcm_chunks):
+                yield event
+
+    def generate(self, prompt, system_prompt: str = SYSTEM_PROMPT, session_id: str = None, speculative: bool = False):
+        # In an LLM admission slot, retried until the first chunk; speculative requests only take an idle slot
+        request = {"provider": self.llm.name, "prompt": prompt, "system_prompt": system_prompt}
+        return admission.stream(self.llm.upstream, session_id, lambda: recorder.stream(
+            session_id, "llm.stream", request, lambda _: self.llm.stream(prompt, system_prompt)), speculative)
+
+    # Reply chunks for one user message. With a session_id the prompt carries the session's
+    # history; pending=True means the message is not stored yet (speculation on a partial transcript).
+    # Repeated questions are answered from the response cache in one CachedReply chunk.
+    async def reply(self, transcript: str, session_id: str = None, system_prompt: str = SYSTEM_PROMPT,
+                    pending: bool = False):
+        prompt = transcript
+        earlier = []
+        if session_id is not None:
+            history = await session_store.history(session_id)
+            if pending:
+                history.append(Turn("user", transcript))
+            earlier = history[:-1]
+            cached = response_cache.get(transcript, system_prompt, earlier)
+            if cached is not None:
+                yield CachedReply(cached)
+                return
+            prompt = await context_builder.build(session_id, history)
+        if not pending:
+            # Tool lookups only for final transcripts (speculation skips partials that need one)
+            prompt = await with_tool_results(prompt, transcript)
+        chunks = []
+        async for chunk in self.generate(prompt, system_prompt, session_id, speculative=pending):
+            chunks.append(chunk)
+            yield chunk
+        # A speculative reply may answer a half-finished sentence, so only final transcripts are cached
+        if session_id is not None and not pending and "".join(chunks).strip():
+            response_cache.put(transcript, "".join(chunks), system_prompt, earlier)
+
+    # One whole utterance. Repeated lines are replayed from the TTS cache, everything else is
+    # synthesized in a TTS admission slot (admitted: the caller holds one already). When TTS is
+    # saturated the cached busy phrase plays instead; other failures just end the audio.
+    async def speak(self, text: str, session_id: str = None, admitted: bool = False):
+        def upstream():
+            return recorder.stream(session_id, "tts.synthesize", {"provider": self.tts.name, "text": text},
+                                   lambda _: self.tts.synthesize(text))
+
+        def synthesize():
+            if admitted:
+                return upstream()
+            return admission.stream(self.tts.upstream, session_id, upstream)
+
+        try:
+            async for chunk in tts_cache.stream(self.tts.cache_key(text), synthesize):
+                yield chunk
+        except UpstreamBusy:
+            for chunk in await self.cached_audio(BUSY_PHRASE):
+                yield chunk
+        except Exception as e:
+            log.warning("TTS error: %s", e)
+
+    def tts_session(self, session_id: str = None):
+        # A session (one upstream socket) for the turns of one conversation
+        return recorder.session(self.tts.session(), session_id)
+
+    async def cached_audio(self, text: str) -> list:
+        # Pre-synthesized lines (tts_cache.FALLBACK_PHRASES), without touching the TTS upstream
+        return await tts_cache.get(self.tts.cache_key(text)) or []
+
+    # One reply: LLM chunks -> sentence segments -> one context of the TTS session, yielding its
+    # audio while the LLM is still generating (paced to real time with a pacer). The exchange is
+    # stored in the session: the reply once it is complete, or as far as it got. llm is an already
+    # running reply stream, e.g. an adopted speculation. on_text gets every reply chunk, on_reply
+    # the whole reply once it is stored. Stage timings go to trace (the caller finishes it), buffer
+    # metrics to flow. The turn holds a TTS admission slot; UpstreamBusy propagates.
+    async def stream_turn(self, transcript: str, tts, session_id: str = None, llm=None, trace: TurnTrace = None,
+                          on_text=None, on_reply=None, system_prompt: str = SYSTEM_PROMPT, pacer=None, flow=None):
+        trace = trace or TurnTrace("turn", session_id)
+        if llm is None:
+            llm = self.reply(transcript, session_id, system_prompt)
+        reply = []
+        stored = False
+        tts_started = None
+        context_id = audio_queue = producer = None
+        completed = False
+
+        async def say(segment):
+            nonlocal tts_started
+            if tts_started is None:
+                tts_started = time.perf_counter()
+            await tts.send_text(context_id, segment)
+
+        async def store():
+            nonlocal stored
+            if session_id is not None and reply and not stored:
+                stored = True
+                await session_store.append(session_id, "bot", "".join(reply))
+
+        async def produce():
+            nonlocal tts_started
+            segmenter = SentenceSegmenter()
+            cached = None
+            llm_started = time.perf_counter()
+            try:
+                try:
+                    async for chunk in llm:
+                        trace.mark("llm_first_token", llm_started)
+                        reply.append(chunk)
+                        if on_text is not None:
+                            await on_text(chunk)
+                        if isinstance(chunk, CachedReply):
+                            trace.tags["response_cache"] = "hit"
+                            cached = chunk
+                            continue
+                        for segment in segmenter.feed(chunk):
+                            await say(segment)
+                except UpstreamBusy:
+                    raise
+                except Exception as e:
+                    log.warning("LLM error: %s", e)
+                    trace.tags["llm_error"] = type(e).__name__
+                if not "".join(reply).strip():
+                    # Failed (or empty) before saying anything: the pre-synthesized apology instead
+                    reply[:] = [LLM_ERROR_PHRASE]
+                    cached = LLM_ERROR_PHRASE
+                    if on_text is not None:
+                        await on_text(LLM_ERROR_PHRASE)
+                trace.mark("llm_complete", llm_started)
+                tail = segmenter.flush()
+                if tail and cached is None:
+                    await say(tail)
+                await store()
+                if on_reply is not None:
+                    await on_reply("".join(reply))
+                if cached is not None:
+                    tts_started = time.perf_counter()
+                    async for audio_chunk in self.speak(cached, session_id, admitted=True):
+                        await audio_queue.put(audio_chunk)
+            finally:
+                await tts.end(context_id)
+
+        try:
+            if session_id is not None:
+                await session_store.append(session_id, "user", transcript)
+            async with admission.slot(self.tts.upstream, session_id):
+                context_id, audio_queue = tts.open_context()
+                if flow is not None:
+                    flow.outbound = audio_queue
+                producer = asyncio.create_task(produce())
+                while (audio_chunk := await audio_queue.get()) is not None:
+                    if tts_started is not None:
+                        trace.mark("tts_first_byte", tts_started)
+                    if pacer is not None:
+                        await pacer.pace(wav_seconds(audio_chunk))
+                    yield audio_chunk
+                if tts_started is not None:
+                    trace.mark("tts_complete", tts_started)
+                await producer
+                completed = True
+        finally:
+            if producer is not None and not producer.done():
+                producer.cancel()
+                await asyncio.gather(producer, return_exceptions=True)
+            await llm.aclose()
+            if context_id is not None:
+                if not completed:
+                    # Cancelled (barge-in) or failed: stop the TTS synthesizing the rest of this reply
+                    await tts.clear(context_id)
+                tts.close_context(context_id)
+            if flow is not None and audio_queue is not None:
+                flow.end_turn(audio_queue, pacer, trace.send_seconds)
+            await store()
+
+    # One recorded utterance as events, for the HTTP endpoints:
+    #   ("transcript", text)            - stored as the user turn unless blank
+    #   ("gemini", text)...             - the reply as it is generated
+    #   ("reply", text)                 - the whole reply, stored as the bot turn
+    #   ("audio", WAV fragment)...      - TTS audio; the first fragments can come before "reply"
+    #   ("busy", upstream)              - an upstream is saturated; the busy phrase follows
+    #   ("error", message)              - nothing to answer (no transcript) or the audio failed
+    # The trace is finished when the events end. audio: bytes or an UploadStream; transcription: a
+    # transcription of it started earlier (see main.upload_turn), awaited instead of starting one.
+    async def turn(self, audio, session_id: str, trace: TurnTrace = None,
+                   system_prompt: str = SYSTEM_PROMPT, transcription: asyncio.Future = None):
+        trace = trace or TurnTrace("turn", session_id)
+        outcome = "error"
+        replied = False
+        try:
+            try:
+                with trace.span("stt"):
+                    if transcription is None:
+                        transcription = asyncio.ensure_future(self.transcribe(audio, session_id))
+                    transcript = await transcription or ""
+            except UpstreamBusy as e:
+                # Nothing reached the session yet; the client can simply send the recording again
+                trace.tags["busy"] = e.upstream
+                yield "busy", e.upstream
+                async for event in self._say(BUSY_PHRASE, session_id, trace):
+                    yield event
+                outcome = "busy"
+                return
+            except TranscriptionError as e:
+                yield "error", str(e)
+                return
+            except httpx.ReadTimeout:
+                yield "error", "Transcription service timed out. Please try again or check your network connection."
+                return
+            except Exception as e:
+                log.warning("STT error: %s", e)
+                yield "error", f"Transcription service error: {e}"
+                return
+            yield "transcript", transcript
+
+            if not transcript.strip():
+                if session_id is not None:
+                    await session_store.append(session_id, "bot", NO_SPEECH_PHRASE)
+                # Pre-warmed at startup, so this is served from the TTS cache
+                async for event in self._say(NO_SPEECH_PHRASE, session_id, trace):
+                    yield event
+                outcome = "ok"
+                return
+
+            try:
+                async for event in self._reply_events(transcript, session_id, trace, system_prompt):
+                    replied = replied or event[0] == "reply"
+                    yield event
+                outcome = "ok"
+            except UpstreamBusy as e:
+                trace.tags["busy"] = e.upstream
+                yield "busy", e.upstream
+                if not replied:
+                    if session_id is not None:
+                        await session_store.append(session_id, "bot", BUSY_PHRASE)
+                    async for event in self._say(BUSY_PHRASE, session_id, trace):
+                        yield event
+                outcome = "busy"
+            except Exception as e:
+                log.warning("TTS error: %s", e)
+                yield "error", f"TTS error: {e}"
+        except (asyncio.CancelledError, GeneratorExit):
+            outcome = "interrupted"
+            raise
+        finally:
+            if transcription is not None and not transcription.done():
+                transcription.cancel()
+                await asyncio.gather(transcription, return_exceptions=True)
+            trace.finish(outcome)
+
+    async def _say(self, text: str, session_id: str, trace: TurnTrace):
+        yield "gemini", text
+        yield "reply", text
+        async for chunk in traced_audio(trace, self.speak(text, session_id), to_client=False):
+            yield "audio", chunk
+
+    async def _reply_events(self, transcript: str, session_id: str, trace: TurnTrace, system_prompt: str):
+        # stream_turn in its own task, its text and audio merged into one event stream
+        events = asyncio.Queue(TURN_EVENT_BUFFER)
+        tts = self.tts_session(session_id)
+
+        async def on_text(chunk):
+            await events.put(("gemini", chunk))
+
+        async def on_reply(text):
+            await events.put(("reply", text))
+
+        async def run():
+            async for chunk in self.stream_turn(transcript, tts, session_id, trace=trace, on_text=on_text,
+                                                on_reply=on_reply, system_prompt=system_prompt):
+                await events.put(("audio", chunk))
+
+        task = asyncio.create_task(run())
+        get = None
+        try:
+            while True:
+                get = asyncio.ensure_future(events.get())
+                await asyncio.wait({get, task}, return_when=asyncio.FIRST_COMPLETED)
+                if get.done():
+                    yield get.result()
+                    continue
+                get.cancel()
+                # The turn is over; whatever it queued before that still goes out
+                while not events.empty():
+                    yield events.get_nowait()
+                break
+            task.result()
+        finally:
+            for pending in (get, task):
+                if pending is not None and not pending.done():
+                    pending.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            await tts.close()
+
+
+pipeline = Pipeline()
@@ -0,0 +1,493 @@
+import asyncio
+import base64
+import json
+import os
+import uuid
+from config import ASSEMBLY_API_KEY, GEMINI_API_KEY, MURF_API_KEY
+from services.audio_codec import wav_header
+from services.connections import GEMINI_API_BASE, http_client, murf_pool
+from services.flow import outbound_buffer
+from services.llm_service import LLMService
+from services.murf_ws import MURF_FORMAT, MURF_SAMPLE_RATE, VOICE_CONFIG, MurfSession, murf_cache_key
+from services.recording import REPLAY_SPEED, ReplayMiss, normalize, prompt_text, replay_key, replay_store
+from services.routing import gemini_router
+from services.stt_service import STTService
+from services.telemetry import get_logger
+from services.transcription import get_transcriber, transcriber_for, transcriber_for_upload
+from services.tts_cache import cache_key
+from services.tts_service import TTSService
+
+# Async provider interfaces for the turn engine (services.pipeline), one per stage:
+#   STTProvider - transcribe(audio bytes) -> text; transcribe_stream(upload) -> text, for a recording
+#                 still being uploaded (services.ingest); stream(PCM16 chunks) -> transcript events
+#   LLMProvider - stream(prompt, system prompt) -> reply text chunks
+#   TTSProvider - session() -> a MurfSession-style object (one context per turn, text segments in,
+#                 WAV fragments out); synthesize(text) -> WAV fragments of one whole utterance
+# upstream names the admission limit (services.admission) the engine runs each call under.
+# Implementations, picked with STT_PROVIDER / LLM_PROVIDER / TTS_PROVIDER:
+#   assemblyai, gemini, murf               - the native async clients (HTTP/2 pools, warm sockets)
+#   assemblyai_sdk, gemini_sdk, murf_sdk   - the vendor SDKs; they block, so every call runs in
+#                                            the bounded thread pool (services.blocking)
+#   stub                                   - local canned transcript/reply and silent audio, for
+#                                            working on the app without keys or network
+#   replay                                 - recorded upstream traffic (services.recording), served
+#                                            back with its original timing
+
+log = get_logger("providers")
+
+STT_PROVIDER = os.getenv("STT_PROVIDER", "assemblyai")  # assemblyai | assemblyai_sdk | stub | replay
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "gemini")  # gemini | gemini_sdk | stub | replay
+TTS_PROVIDER = os.getenv("TTS_PROVIDER", "murf")  # murf | murf_sdk | stub | replay
+
+STUB_TRANSCRIPT = os.getenv("STUB_TRANSCRIPT", "Hi Nick, how are you doing today?")
+STUB_REPLY = os.getenv("STUB_REPLY", "I'm doing great, thanks for asking! It's lovely to hear from you. What's on your mind?")
+STUB_TOKEN_INTERVAL = float(os.getenv("STUB_TOKEN_INTERVAL", "0.02"))
+STUB_SECONDS_PER_WORD = float(os.getenv("STUB_SECONDS_PER_WORD", "0.3"))
+
+
+class STTProvider:
+    name = "base"
+    upstream = None
+    stream_upstream = None
+
+    async def transcribe(self, audio_bytes: bytes) -> str:
+        raise NotImplementedError
+
+    async def transcribe_stream(self, upload) -> str:
+        # Providers that can't take audio as it arrives get the whole upload once it is in
+        return await self.transcribe(await upload.read())
+
+    async def stream(self, pcm_chunks):
+        # Events: {"message_type": "PartialTranscript" | "FinalTranscript", "text": ...}
+        raise NotImplementedError
+        yield
+
+
+class LLMProvider:
+    name = "base"
+    upstream = None
+
+    async def stream(self, prompt, system_prompt: str):
+        # prompt: one message, or a prepared `contents` list from services.context
+        raise NotImplementedError
+        yield
+
+
+class TTSProvider:
+    name = "base"
+    upstream = None
+
+    def session(self):
+        raise NotImplementedError
+
+    async def synthesize(self, text: str):
+        raise NotImplementedError
+        yield
+
+    def cache_key(self, text: str) -> str:
+        raise NotImplementedError
+
+
+class AssemblyAIProvider(STTProvider):
+    name = "assemblyai"
+    upstream = "assemblyai"
+    stream_upstream = "assemblyai_realtime"
+
+    async def transcribe(self, audio_bytes: bytes) -> str:
+        return await transcriber_for(audio_bytes).transcribe(audio_bytes)
+
+    async def transcribe_stream(self, upload) -> str:
+        return await (await transcriber_for_upload(upload)).transcribe_stream(upload)
+
+    async def stream(self, pcm_chunks):
+        async for event in get_transcriber("streaming").stream(pcm_chunks):
+            yield event
+
+
+class AssemblyAISDKProvider(AssemblyAIProvider):
+    # Recordings through the assemblyai SDK; the SDK has no async realtime client, so /ws/voice
+    # keeps the native v3 stream
+    name = "assemblyai_sdk"
+
+    def __init__(self):
+        self.service = STTService(ASSEMBLY_API_KEY)
+
+    async def transcribe(self, audio_bytes: bytes) -> str:
+        return await self.service.transcribe(audio_bytes)
+
+    async def transcribe_stream(self, upload) -> str:
+        # The SDK takes the recording in one piece
+        return await self.transcribe(await upload.read())
+
+
+class GeminiProvider(LLMProvider):
+    # The model comes from the router (services.routing), which may also hedge the request on another
+    name = "gemini"
+    upstream = "gemini"
+
+    def __init__(self, router=gemini_router):
+        self.router = router
+
+    def stream(self, prompt, system_prompt: str):
+        return self.router.stream(prompt, lambda model: self._stream(model, prompt, system_prompt))
+
+    async def _stream(self, model: str, prompt, system_prompt: str):
+        url = f"{GEMINI_API_BASE}/v1beta/models/{model}:streamGenerateContent?alt=sse&key={GEMINI_API_KEY}"
+        headers = {"Content-Type": "application/json"}
+        payload = {
+            "contents": [{"parts": [{"text": prompt}]}] if isinstance(prompt, str) else prompt,
+            "system_instruction": {"parts": [{"text": system_prompt}]}
+        }
+        async with http_client("gemini").stream("POST", url, headers=headers, json=payload) as resp:
+            resp.raise_for_status()
+            async for line in resp.aiter_lines():
+                # alt=sse: one "data: {...}" line per streamed candidate
+                if not line.startswith("data:"):
+                    continue
+                try:
+                    data = json.loads(line[5:])
+                    chunks = [cand.get("content", {}).get("parts", [{}])[0].get("text", "")
+                              for cand in data.get("candidates", [])]
+                except Exception:
+                    continue
+                for chunk in chunks:
+                    if chunk:
+                        yield chunk
+
+
+class GeminiSDKProvider(LLMProvider):
+    # generate_content is not streamed: the whole reply arrives as one chunk. Routed like
+    # GeminiProvider, but a cancelled hedge's call still runs to the end in its pool thread.
+    name = "gemini_sdk"
+    upstream = "gemini"
+
+    def __init__(self, router=gemini_router):
+        self.router = router
+        self.services = {}  # model -> LLMService
+
+    def stream(self, prompt, system_prompt: str):
+        return self.router.stream(prompt, lambda model: self._stream(model, prompt, system_prompt))
+
+    async def _stream(self, model: str, prompt, system_prompt: str):
+        service = self.services.get(model)
+        if service is None:
+            service = self.services[model] = LLMService(GEMINI_API_KEY, model)
+        text = await service.get_response(prompt, system_prompt)
+        if text:
+            yield text
+
+
+class MurfProvider(TTSProvider):
+    name = "murf"
+    upstream = "murf"
+
+    def session(self):
+        return MurfSession(pool=murf_pool)
+
+    async def synthesize(self, text: str):
+        # Raises on failure so a partial stream is never mistaken for a complete one
+        context_id = str(uuid.uuid4())
+        # Pooled sockets already carry the api key and voice config
+        async with murf_pool.connection() as ws:
+            await ws.send(json.dumps({"context_id": context_id, "text": text, "end": True}))
+            while True:
+                data = json.loads(await ws.recv())
+                if data.get("context_id", context_id) != context_id:
+                    continue
+                if "audio" in data:
+                    # Stream each audio chunk as soon as received (base64-encoded WAV)
+                    yield base64.b64decode(data["audio"])
+                if data.get("final"):
+                    break
+
+    def cache_key(self, text: str) -> str:
+        return murf_cache_key(text)
+
+
+class MurfSDKProvider(MurfProvider):
+    # text_to_speech.generate renders a file and returns its URL, which is then downloaded
+    name = "murf_sdk"
+
+    def __init__(self):
+        self.service = TTSService(MURF_API_KEY, VOICE_CONFIG["voiceId"], VOICE_CONFIG["style"], MURF_SAMPLE_RATE,
+                                  MURF_FORMAT)
+
+    def session(self):
+        return SegmentSession(self.synthesize)
+
+    async def synthesize(self, text: str):
+        url = await self.service.synthesize(text)
+        if not url:
+            raise RuntimeError("Murf returned no audio file")
+        resp = await http_client("murf").get(url)
+        resp.raise_for_status()
+        yield resp.content
+
+
+class SegmentSession:
+    # The MurfSession interface for TTS providers without a stream-input socket: each text segment
+    # of a context is synthesized on its own, in order, into the context's bounded buffer
+    def __init__(self, synthesize):
+        self.synthesize = synthesize
+        self._contexts = {}  # context_id -> (audio buffer, text queue, synthesis task)
+
+    async def connect(self):
+        pass
+
+    def open_context(self):
+        context_id = str(uuid.uuid4())
+        audio = outbound_buffer()
+        texts = asyncio.Queue()
+        self._contexts[context_id] = (audio, texts, asyncio.create_task(self._run(audio, texts)))
+        return context_id, audio
+
+    async def _run(self, audio, texts):
+        try:
+            while (text := await texts.get()) is not None:
+                async for chunk in self.synthesize(text):
+                    await audio.put(chunk)
+        except Exception as e:
+            log.warning("TTS segment failed: %s", e)
+        finally:
+            audio.finish()
+
+    async def send_text(self, context_id: str, text: str):
+        self._contexts[context_id][1].put_nowait(text)
+
+    async def end(self, context_id: str):
+        context = self._contexts.get(context_id)
+        if context is not None:
+            context[1].put_nowait(None)
+
+    async def clear(self, context_id: str):
+        context = self._contexts.get(context_id)
+        if context is not None:
+            context[0].abort()
+            context[2].cancel()
+
+    def close_context(self, context_id: str):
+        context = self._contexts.pop(context_id, None)
+        if context is not None:
+            context[0].abort()
+            context[2].cancel()
+
+    async def close(self):
+        tasks = [task for _, _, task in self._contexts.values()]
+        for context_id in list(self._contexts):
+            self.close_context(context_id)
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+class StubSTT(STTProvider):
+    name = "stub"
+
+    async def transcribe(self, audio_bytes: bytes) -> str:
+        return STUB_TRANSCRIPT if audio_bytes else ""
+
+    async def stream(self, pcm_chunks):
+        # A partial on the first audio, the final at each forced endpoint and at the end of audio
+        heard = False
+        async for chunk in pcm_chunks:
+            if isinstance(chunk, dict):
+                if heard:
+                    yield {"message_type": "FinalTranscript", "text": STUB_TRANSCRIPT}
+                heard = False
+            elif not heard:
+                heard = True
+                yield {"message_type": "PartialTranscript", "text": STUB_TRANSCRIPT.split(" ")[0]}
+        if heard:
+            yield {"message_type": "FinalTranscript", "text": STUB_TRANSCRIPT}
+
+
+class StubLLM(LLMProvider):
+    name = "stub"
+
+    async def stream(self, prompt, system_prompt: str):
+        words = STUB_REPLY.split(" ")
+        for i, word in enumerate(words):
+            await asyncio.sleep(STUB_TOKEN_INTERVAL)
+            yield word + (" " if i + 1 < len(words) else "")
+
+
+class StubTTS(TTSProvider):
+    name = "stub"
+
+    def session(self):
+        return SegmentSession(self.synthesize)
+
+    async def synthesize(self, text: str):
+        # Silence as long as the text would take to say, in 0.1 s WAV fragments like Murf's
+        fragment = MURF_SAMPLE_RATE // 10 * 2
+        for _ in range(max(1, round(len(text.split()) * STUB_SECONDS_PER_WORD * 10))):
+            await asyncio.sleep(0)
+            yield wav_header(MURF_SAMPLE_RATE, fragment) + bytes(fragment)
+
+    def cache_key(self, text: str) -> str:
+        return cache_key(text, {"stub": STUB_SECONDS_PER_WORD}, MURF_SAMPLE_RATE, MURF_FORMAT)
+
+
+class ReplaySTT(STTProvider):
+    name = "replay"
+
+    def __init__(self, speed: float = REPLAY_SPEED):
+        self.speed = speed
+
+    async def transcribe(self, audio_bytes: bytes) -> str:
+        call = replay_store.take("stt.transcribe", replay_key("stt.transcribe", {"audio": audio_bytes}))
+        text = ""
+        async for text in call.play(self.speed):
+            pass
+        return text
+
+    async def stream(self, pcm_chunks):
+        # Each transcript event once as much audio has come in as had when it was recorded
+        call = replay_store.take("stt.stream")
+        received = 0
+        ended = False
+        arrived = asyncio.Event()
+
+        async def consume():
+            nonlocal received, ended
+            try:
+                async for _ in pcm_chunks:
+                    received += 1
+                    arrived.set()
+            finally:
+                ended = True
+                arrived.set()
+
+        reader = asyncio.create_task(consume())
+        try:
+            for count, after, event in call.timeline():
+                while received < count and not ended:
+                    arrived.clear()
+                    await arrived.wait()
+                if self.speed > 0 and after > 0:
+                    await asyncio.sleep(after / self.speed)
+                yield event
+            await reader
+        finally:
+            reader.cancel()
+            await asyncio.gather(reader, return_exceptions=True)
+
+
+class ReplayLLM(LLMProvider):
+    name = "replay"
+
+    def __init__(self, speed: float = REPLAY_SPEED):
+        self.speed = speed
+
+    async def stream(self, prompt, system_prompt: str):
+        call = replay_store.take("llm.stream", normalize(prompt_text(prompt)))
+        async for chunk in call.play(self.speed):
+            yield chunk
+
+
+class ReplayTTS(TTSProvider):
+    # Lines that were never recorded (typically the startup warmup's phrases) fall back to the
+    # stub's silence, so a replay still runs; replay_store counts them as misses
+    name = "replay"
+
+    def __init__(self, speed: float = REPLAY_SPEED):
+        self.speed = speed
+        self.stub = StubTTS()
+
+    def session(self):
+        return ReplaySession(self.speed)
+
+    async def synthesize(self, text: str):
+        try:
+            call = replay_store.take("tts.synthesize", normalize(text))
+        except ReplayMiss:
+            async for chunk in self.stub.synthesize(text):
+                yield chunk
+            return
+        async for chunk in call.play(self.speed):
+            yield chunk
+
+    def cache_key(self, text: str) -> str:
+        # A voice of its own: a miss's silence must never be cached as the live Murf voice's audio
+        voice = {**VOICE_CONFIG, "voiceId": f"replay:{VOICE_CONFIG.get('voiceId')}"}
+        return cache_key(text, voice, MURF_SAMPLE_RATE, MURF_FORMAT)
+
+
+class ReplaySession:
+    # The MurfSession interface over recorded TTS contexts: a context is matched on its first
+    # text segment, and its audio plays from there at the recorded offsets
+    def __init__(self, speed: float):
+        self.speed = speed
+        self._contexts = {}  # context_id -> (audio buffer, playback task)
+
+    async def connect(self):
+        pass
+
+    def open_context(self):
+        context_id = str(uuid.uuid4())
+        audio = outbound_buffer()
+        self._contexts[context_id] = (audio, None)
+        return context_id, audio
+
+    async def _play(self, call, audio):
+        try:
+            async for chunk in call.play(self.speed):
+                await audio.put(chunk)
+        except Exception as e:
+            log.warning("TTS replay failed: %s", e)
+        finally:
+            audio.finish()
+
+    async def send_text(self, context_id: str, text: str):
+        audio, task = self._contexts[context_id]
+        if task is None:
+            call = replay_store.take("tts.context", normalize(text))
+            self._contexts[context_id] = (audio, asyncio.create_task(self._play(call, audio)))
+
+    async def end(self, context_id: str):
+        audio, task = self._contexts.get(context_id, (None, True))
+        if task is None:
+            # Nothing was said in this context
+            audio.finish()
+
+    async def clear(self, context_id: str):
+        context = self._contexts.get(context_id)
+        if context is not None:
+            context[0].abort()
+            if context[1] is not None:
+                context[1].cancel()
+
+    def close_context(self, context_id: str):
+        context = self._contexts.pop(context_id, None)
+        if context is not None:
+            context[0].abort()
+            if context[1] is not None:
+                context[1].cancel()
+
+    async def close(self):
+        tasks = [task for _, task in self._contexts.values() if task is not None]
+        for context_id in list(self._contexts):
+            self.close_context(context_id)
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+STT_PROVIDERS = {"assemblyai": AssemblyAIProvider, "assemblyai_sdk": AssemblyAISDKProvider, "stub": StubSTT,
+                 "replay": ReplaySTT}
+LLM_PROVIDERS = {"gemini": GeminiProvider, "gemini_sdk": GeminiSDKProvider, "stub": StubLLM, "replay": ReplayLLM}
+TTS_PROVIDERS = {"murf": MurfProvider, "murf_sdk": MurfSDKProvider, "stub": StubTTS, "replay": ReplayTTS}
+
+
+def _create(kind: str, registry: dict, name: str):
+    if name not in registry:
+        raise ValueError(f"unknown {kind} provider {name!r} (expected one of: {', '.join(registry)})")
+    return registry[name]()
+
+
+def stt_provider(name: str = STT_PROVIDER) -> STTProvider:
+    return _create("STT", STT_PROVIDERS, name)
+
+
+def llm_provider(name: str = LLM_PROVIDER) -> LLMProvider:
+    return _create("LLM", LLM_PROVIDERS, name)
+
+
+def tts_provider(name: str = TTS_PROVIDER) -> TTSProvider:
+    return _create("TTS", TTS_PROVIDERS, name)
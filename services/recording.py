@@ -0,0 +1,515 @@
+import asyncio
+import bisect
+import hashlib
+import itertools
+import json
+import os
+import queue
+import struct
+import threading
+import time
+from collections import OrderedDict, deque
+from services.telemetry import get_logger
+from services.tools import TOOL_NOTE_PREFIX
+
+# Record and replay of upstream traffic, for performance regression tests on real conversations.
+#
+# Capture (RECORD_DIR set): every upstream call the turn engine makes (STT transcribe/stream, the
+# LLM stream, TTS synthesize and TTS contexts) is written to <RECORD_DIR>/<session>.nkt: the
+# request, what was sent after it started (audio, text segments) and every response chunk, each
+# with its arrival time. Audio is stored out of line, content-addressed, in <RECORD_DIR>/audio/
+# <sha1>, so repeated audio (cached phrases, the same upload retried) is stored once and the trace
+# files stay small. Writing happens on one background thread; the event loop only enqueues.
+#
+# Trace file: b"NKT1", then records of a 17-byte header (kind u8, call id u32, wall clock us u64,
+# payload length u32) and the payload:
+#   CALL  - JSON {"op": ..., "request": {...}}, bytes in the request as {"sha1": ..., "bytes": n}
+#   TEXT  - a text chunk of the response (UTF-8)
+#   AUDIO - an audio chunk of the response (20-byte sha1 of the blob)
+#   EVENT - a JSON response item (STT transcript events)
+#   INPUT - audio sent to the upstream after the call started (20-byte sha1)
+#   SEND  - text sent to the upstream after the call started (TTS context segments)
+#   END   - JSON {} when the call completed, {"error": ...} or {"cleared": true} when it did not
+#
+# Replay (STT_PROVIDER / LLM_PROVIDER / TTS_PROVIDER=replay, REPLAY_DIR): the replay providers in
+# services.providers serve recorded calls back with their original timing divided by REPLAY_SPEED
+# (0 = no waiting). A call is matched on its content (the audio, the user's message, the text to
+# speak), falling back to the next recorded call of the same kind, so code changes that reshape a
+# request still replay. Tool lookups (weather, search) are not recorded.
+
+log = get_logger("recording")
+
+RECORD_DIR = os.getenv("RECORD_DIR") or None
+REPLAY_DIR = os.getenv("REPLAY_DIR") or None
+REPLAY_SPEED = float(os.getenv("REPLAY_SPEED", "1.0"))
+RECORD_OPEN_FILES = int(os.getenv("RECORD_OPEN_FILES", "64"))
+
+MAGIC = b"NKT1"
+CALL, TEXT, AUDIO, EVENT, INPUT, SEND, END = range(1, 8)
+_RECORD = struct.Struct(">BIQI")
+
+_call_ids = itertools.count(1)
+
+
+class ReplayMiss(RuntimeError):
+    pass
+
+
+def normalize(text: str) -> str:
+    return " ".join((text or "").lower().split())
+
+
+def prompt_text(prompt) -> str:
+    # The user's latest message in a plain prompt or a Gemini `contents` list, without tool notes
+    if isinstance(prompt, str):
+        return prompt
+    for content in reversed(prompt or []):
+        if content.get("role") == "user":
+            parts = [part.get("text", "") for part in content.get("parts", [])]
+            texts = [text for text in parts if not text.startswith(TOOL_NOTE_PREFIX)]
+            return texts[-1] if texts else ""
+    return ""
+
+
+def replay_key(op: str, request: dict, first_send: str = None):
+    # What a live call and a recorded one are matched on; None matches by order only
+    if op == "stt.transcribe":
+        audio = request.get("audio")
+        return audio.get("sha1") if isinstance(audio, dict) else hashlib.sha1(audio or b"").hexdigest()
+    if op == "llm.stream":
+        return normalize(prompt_text(request.get("prompt")))
+    if op == "tts.synthesize":
+        return normalize(request.get("text"))
+    if op == "tts.context":
+        return normalize(first_send)
+    return None
+
+
+# ======================
+# Capture
+# ======================
+
+class Recorder:
+    def __init__(self, directory: str = RECORD_DIR):
+        self.directory = directory
+        self.enabled = directory is not None
+        self.calls = 0
+        self.records = 0
+        self.bytes = 0
+        self.blobs = 0
+        self.blob_bytes = 0
+        self.deduped_bytes = 0
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+        self._files = OrderedDict()  # session -> open trace file, least recently written first
+        self._known = set()  # blob digests on disk
+
+    def _put(self, session_id, kind: int, call: int, payload):
+        if self._thread is None:
+            os.makedirs(os.path.join(self.directory, "audio"), exist_ok=True)
+            self._thread = threading.Thread(target=self._run, name="recorder", daemon=True)
+            self._thread.start()
+        self._queue.put((session_id or "anonymous", kind, call, time.time_ns() // 1000, payload))
+
+    def start(self, session_id, op: str, request: dict) -> int:
+        call = next(_call_ids)
+        self.calls += 1
+        self._put(session_id, CALL, call, {"op": op, "request": request})
+        return call
+
+    def item(self, session_id, call: int, item):
+        if isinstance(item, (bytes, bytearray, memoryview)):
+            self._put(session_id, AUDIO, call, bytes(item))
+        elif isinstance(item, str):
+            self._put(session_id, TEXT, call, item)
+        else:
+            self._put(session_id, EVENT, call, item)
+
+    def sent(self, session_id, call: int, item):
+        if isinstance(item, (bytes, bytearray, memoryview)):
+            self._put(session_id, INPUT, call, bytes(item))
+        elif isinstance(item, str):
+            self._put(session_id, SEND, call, item)
+        else:
+            self._put(session_id, EVENT, call, {"sent": item})
+
+    def end(self, session_id, call: int, error: BaseException = None, **fields):
+        if error is not None:
+            fields["error"] = f"{type(error).__name__}: {error}"
+        self._put(session_id, END, call, fields)
+
+    async def result(self, session_id, op: str, request: dict, call_upstream):
+        # One awaited call: the result is its only response item
+        if not self.enabled:
+            return await call_upstream()
+        call = self.start(session_id, op, request)
+        try:
+            value = await call_upstream()
+        except BaseException as e:
+            self.end(session_id, call, e)
+            raise
+        self.item(session_id, call, value)
+        self.end(session_id, call)
+        return value
+
+    async def stream(self, session_id, op: str, request: dict, open_stream, inputs=None):
+        # open_stream(inputs) -> the upstream's async iterator; inputs, when given, is the audio
+        # sent to the upstream while the call is open, recorded on its way through
+        if not self.enabled:
+            async for item in open_stream(inputs):
+                yield item
+            return
+        call = self.start(session_id, op, request)
+        if inputs is not None:
+            inputs = self._inputs(session_id, call, inputs)
+        error = None
+        try:
+            async for item in open_stream(inputs):
+                self.item(session_id, call, item)
+                yield item
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            if isinstance(error, (asyncio.CancelledError, GeneratorExit)):
+                self.end(session_id, call, cleared=True)
+            else:
+                self.end(session_id, call, error)
+
+    async def _inputs(self, session_id, call: int, chunks):
+        async for chunk in chunks:
+            self.sent(session_id, call, chunk)
+            yield chunk
+
+    def session(self, tts, session_id):
+        # A TTS session (services.murf_ws.MurfSession interface) whose contexts are recorded
+        return RecordingSession(tts, self, session_id) if self.enabled else tts
+
+    # Writer thread: trace files and audio blobs
+
+    def _run(self):
+        while True:
+            try:
+                entry = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                for f in self._files.values():
+                    f.flush()
+                continue
+            if entry is None:
+                break
+            try:
+                self._write(*entry)
+            except Exception as e:
+                log.warning("trace write failed: %s", e)
+        for f in self._files.values():
+            f.close()
+        self._files.clear()
+
+    def _blob(self, data: bytes) -> bytes:
+        digest = hashlib.sha1(data).digest()
+        if digest not in self._known:
+            self._known.add(digest)
+            path = os.path.join(self.directory, "audio", digest.hex())
+            if os.path.exists(path):
+                self.deduped_bytes += len(data)
+            else:
+                with open(path, "wb") as f:
+                    f.write(data)
+                self.blobs += 1
+                self.blob_bytes += len(data)
+        else:
+            self.deduped_bytes += len(data)
+        return digest
+
+    def _encode(self, value):
+        if isinstance(value, bytes):
+            return {"sha1": self._blob(value).hex(), "bytes": len(value)}
+        if isinstance(value, dict):
+            return {key: self._encode(item) for key, item in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [self._encode(item) for item in value]
+        return value
+
+    def _file(self, session_id: str):
+        f = self._files.get(session_id)
+        if f is not None:
+            self._files.move_to_end(session_id)
+            return f
+        if len(self._files) >= RECORD_OPEN_FILES:
+            _, oldest = self._files.popitem(last=False)
+            oldest.close()
+        safe = "".join(c if c.isalnum() or c in "-_." else "_" for c in session_id)
+        path = os.path.join(self.directory, f"{safe}.nkt")
+        f = open(path, "ab")
+        if f.tell() == 0:
+            f.write(MAGIC)
+        self._files[session_id] = f
+        return f
+
+    def _write(self, session_id: str, kind: int, call: int, at_us: int, payload):
+        if kind in (AUDIO, INPUT):
+            data = self._blob(payload)
+        elif kind in (TEXT, SEND):
+            data = payload.encode("utf-8")
+        else:
+            data = json.dumps(self._encode(payload), separators=(",", ":"), default=str).encode("utf-8")
+        f = self._file(session_id)
+        f.write(_RECORD.pack(kind, call, at_us, len(data)))
+        f.write(data)
+        self.records += 1
+        self.bytes += _RECORD.size + len(data)
+
+    def close(self):
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "directory": self.directory,
+            "calls": self.calls,
+            "records": self.records,
+            "trace_bytes": self.bytes,
+            "audio_blobs": self.blobs,
+            "audio_bytes": self.blob_bytes,
+            "audio_deduped_bytes": self.deduped_bytes,
+        }
+
+
+class RecordingBuffer:
+    # A TTS context's audio buffer; what the TTS session puts in is recorded as it arrives. Audio the
+    # engine puts in itself (a cached reply) is not the upstream's, so it is left out.
+    def __init__(self, buffer, record):
+        self._buffer = buffer
+        self._record = record
+        self._local = set()
+        buffer.tap = self._tap
+
+    def __getattr__(self, name):
+        return getattr(self._buffer, name)
+
+    def _tap(self, chunk: bytes):
+        if id(chunk) not in self._local:
+            self._record(chunk)
+
+    async def put(self, chunk: bytes):
+        self._local.add(id(chunk))
+        try:
+            await self._buffer.put(chunk)
+        finally:
+            self._local.discard(id(chunk))
+
+
+class RecordingSession:
+    def __init__(self, tts, recorder: Recorder, session_id):
+        self._tts = tts
+        self._recorder = recorder
+        self._session_id = session_id
+        self._calls = {}  # context_id -> call id
+
+    def __getattr__(self, name):
+        return getattr(self._tts, name)
+
+    async def connect(self):
+        await self._tts.connect()
+
+    def open_context(self):
+        context_id, audio = self._tts.open_context()
+        call = self._recorder.start(self._session_id, "tts.context", {})
+        self._calls[context_id] = call
+        return context_id, RecordingBuffer(audio, lambda chunk: self._recorder.item(self._session_id, call, chunk))
+
+    async def send_text(self, context_id: str, text: str):
+        self._recorder.sent(self._session_id, self._calls[context_id], text)
+        await self._tts.send_text(context_id, text)
+
+    async def end(self, context_id: str):
+        await self._tts.end(context_id)
+
+    async def clear(self, context_id: str):
+        call = self._calls.pop(context_id, None)
+        if call is not None:
+            self._recorder.end(self._session_id, call, cleared=True)
+        await self._tts.clear(context_id)
+
+    def close_context(self, context_id: str):
+        call = self._calls.pop(context_id, None)
+        if call is not None:
+            self._recorder.end(self._session_id, call)
+        self._tts.close_context(context_id)
+
+    async def close(self):
+        for call in self._calls.values():
+            self._recorder.end(self._session_id, call, cleared=True)
+        self._calls.clear()
+        await self._tts.close()
+
+
+recorder = Recorder()
+
+
+# ======================
+# Replay
+# ======================
+
+class RecordedCall:
+    def __init__(self, op: str, request: dict, started_us: int):
+        self.op = op
+        self.request = request
+        self.started_us = started_us
+        self.items = []  # (seconds from the start, kind, value)
+        self.sends = []  # (seconds from the start, kind, value)
+        self.end = None
+        self.used = False
+
+    @property
+    def key(self):
+        first_send = next((value for _, kind, value in self.sends if kind == SEND), None)
+        return replay_key(self.op, self.request, first_send)
+
+    def base(self) -> float:
+        # TTS contexts are timed from their first text: that is when synthesis can start
+        if self.op == "tts.context":
+            return next((at for at, kind, _ in self.sends if kind == SEND), 0.0)
+        return 0.0
+
+    def timeline(self):
+        # (inputs sent before it, seconds after the last of them, item): for streams whose responses
+        # follow their input (realtime STT) rather than the clock
+        sent = [at for at, _, _ in self.sends]
+        for at, _, value in self.items:
+            count = bisect.bisect_right(sent, at)
+            yield count, at - (sent[count - 1] if count else 0.0), value
+
+    async def play(self, speed: float = None):
+        # The recorded response items, each at its recorded time (divided by speed) from now
+        speed = REPLAY_SPEED if speed is None else speed
+        base = self.base()
+        started = time.perf_counter()
+        for at, _, value in self.items:
+            if speed > 0:
+                wait = max(0.0, at - base) / speed - (time.perf_counter() - started)
+                if wait > 0:
+                    await asyncio.sleep(wait)
+            yield value
+        end = self.end or {}
+        if "error" in end:
+            raise RuntimeError(f"replayed {self.op} failure: {end['error']}")
+
+
+def read_trace(path: str):
+    # Yields (kind, call id, wall clock us, payload bytes)
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a trace file")
+        while header := f.read(_RECORD.size):
+            if len(header) < _RECORD.size:
+                break
+            kind, call, at_us, length = _RECORD.unpack(header)
+            yield kind, call, at_us, f.read(length)
+
+
+def load_trace(path: str, audio_dir: str = None) -> list:
+    # The calls of one trace file, in the order they started, with their audio loaded
+    audio_dir = audio_dir or os.path.join(os.path.dirname(path), "audio")
+    blobs = {}
+
+    def blob(digest: bytes) -> bytes:
+        if digest not in blobs:
+            with open(os.path.join(audio_dir, digest.hex()), "rb") as f:
+                blobs[digest] = f.read()
+        return blobs[digest]
+
+    calls = {}
+    for kind, call_id, at_us, payload in read_trace(path):
+        if kind == CALL:
+            data = json.loads(payload)
+            calls[call_id] = RecordedCall(data["op"], data["request"], at_us)
+            continue
+        call = calls.get(call_id)
+        if call is None:
+            continue
+        at = (at_us - call.started_us) / 1e6
+        if kind == TEXT:
+            call.items.append((at, kind, payload.decode("utf-8")))
+        elif kind == AUDIO:
+            call.items.append((at, kind, blob(payload)))
+        elif kind == EVENT:
+            data = json.loads(payload)
+            if isinstance(data, dict) and set(data) == {"sent"}:
+                call.sends.append((at, kind, data["sent"]))
+            else:
+                call.items.append((at, kind, data))
+        elif kind == INPUT:
+            call.sends.append((at, kind, blob(payload)))
+        elif kind == SEND:
+            call.sends.append((at, kind, payload.decode("utf-8")))
+        elif kind == END:
+            call.end = json.loads(payload)
+    return list(calls.values())
+
+
+class ReplayStore:
+    # Recorded calls by kind, handed out once each: the one with the same content if there is one,
+    # else the next one recorded
+    def __init__(self, directory: str = REPLAY_DIR):
+        self.directory = directory
+        self._loaded = False
+        self._by_op = {}  # op -> deque of calls, in recorded order
+        self._by_key = {}  # (op, key) -> deque of calls
+        self.exact = 0
+        self.in_order = 0
+        self.misses = 0
+
+    def load(self, directory: str = None):
+        self.directory = directory or self.directory
+        if self.directory is None:
+            raise ReplayMiss("REPLAY_DIR is not set")
+        calls = []
+        for name in sorted(os.listdir(self.directory)):
+            if name.endswith(".nkt"):
+                calls.extend(load_trace(os.path.join(self.directory, name)))
+        calls.sort(key=lambda call: call.started_us)
+        self._by_op, self._by_key = {}, {}
+        self.exact = self.in_order = self.misses = 0
+        for call in calls:
+            self._by_op.setdefault(call.op, deque()).append(call)
+            self._by_key.setdefault((call.op, call.key), deque()).append(call)
+        self._loaded = True
+        log.info("replay traces loaded", extra={"fields": {
+            "directory": self.directory, "calls": {op: len(q) for op, q in self._by_op.items()}}})
+
+    def take(self, op: str, key=None) -> RecordedCall:
+        if not self._loaded:
+            self.load()
+        candidates = self._by_key.get((op, key)) if key is not None else None
+        call = None
+        while candidates:
+            call = candidates.popleft()
+            if not call.used:
+                self.exact += 1
+                break
+            call = None
+        if call is None:
+            ordered = self._by_op.get(op) or deque()
+            while ordered:
+                candidate = ordered.popleft()
+                if not candidate.used:
+                    call = candidate
+                    self.in_order += 1
+                    break
+        if call is None:
+            self.misses += 1
+            raise ReplayMiss(f"no recorded {op} call left to replay")
+        call.used = True
+        return call
+
+    def stats(self) -> dict:
+        left = {op: sum(not call.used for call in calls) for op, calls in self._by_op.items()}
+        return {"directory": self.directory, "exact": self.exact, "in_order": self.in_order,
+                "misses": self.misses, "left": left}
+
+
+replay_store = ReplayStore()
@@ -0,0 +1,169 @@
+import asyncio
+from collections import deque
+from urllib.parse import unquote, urlparse
+
+# Minimal RESP2 client for the Redis-compatible session store (Redis, Valkey, KeyDB, Dragonfly or
+# benchmarks/fake_redis.py), so scale-out needs no extra dependency. One pipelined connection
+# per process: replies come back in command order, so a single reader task resolves a FIFO of
+# futures and every caller's commands go out in one write without waiting on the others.
+
+
+class RedisError(Exception):
+    pass
+
+
+def encode(*args) -> bytes:
+    parts = [b"*%d\r\n" % len(args)]
+    for arg in args:
+        if isinstance(arg, str):
+            arg = arg.encode()
+        elif not isinstance(arg, bytes):
+            arg = str(arg).encode()
+        parts.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+    return b"".join(parts)
+
+
+async def read_reply(reader: asyncio.StreamReader):
+    line = await reader.readline()
+    if not line.endswith(b"\r\n"):
+        raise ConnectionError("connection closed")
+    kind, rest = line[:1], line[1:-2]
+    if kind == b"+":
+        return rest.decode()
+    if kind == b"-":
+        # Returned rather than raised so the rest of the pipeline stays in step
+        return RedisError(rest.decode())
+    if kind == b":":
+        return int(rest)
+    if kind == b"$":
+        size = int(rest)
+        if size < 0:
+            return None
+        return (await reader.readexactly(size + 2))[:-2]
+    if kind == b"*":
+        size = int(rest)
+        if size < 0:
+            return None
+        return [await read_reply(reader) for _ in range(size)]
+    raise RedisError(f"unexpected reply {line[:40]!r}")
+
+
+class _Connection:
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.pending = deque()
+        self.loop = asyncio.get_running_loop()
+        self.task = self.loop.create_task(self._read())
+
+    @property
+    def alive(self) -> bool:
+        return not self.task.done()
+
+    async def _read(self):
+        try:
+            while True:
+                reply = await read_reply(self.reader)
+                future = self.pending.popleft()
+                if not future.done():
+                    future.set_result(reply)
+        except (Exception, asyncio.CancelledError) as e:
+            error = e if isinstance(e, ConnectionError) else ConnectionError(f"redis connection lost: {e!r}")
+            while self.pending:
+                future = self.pending.popleft()
+                if not future.done():
+                    future.set_exception(error)
+            self.writer.close()
+
+    def send(self, commands) -> list:
+        # No await between queueing the futures and the write: replies line up with them
+        futures = [self.loop.create_future() for _ in commands]
+        self.pending.extend(futures)
+        self.writer.write(b"".join(encode(*command) for command in commands))
+        return futures
+
+    def close(self):
+        self.task.cancel()
+        self.writer.close()
+
+
+class RedisClient:
+    def __init__(self, url: str, timeout: float = 5.0):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "127.0.0.1"
+        self.port = parsed.port or 6379
+        self.password = unquote(parsed.password) if parsed.password else None
+        self.username = unquote(parsed.username) if parsed.username else None
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.timeout = timeout
+        self._conn = None
+        self._dialing = None
+        self.commands = 0
+        self.round_trips = 0
+        self.dials = 0
+        self.errors = 0
+
+    @property
+    def address(self) -> str:
+        return f"{self.host}:{self.port}/{self.db}"
+
+    async def _dial(self) -> _Connection:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(self.host, self.port), self.timeout)
+        conn = _Connection(reader, writer)
+        setup = []
+        if self.password:
+            setup.append(("AUTH", self.username, self.password) if self.username else ("AUTH", self.password))
+        if self.db:
+            setup.append(("SELECT", self.db))
+        if setup:
+            for reply in await asyncio.wait_for(asyncio.gather(*conn.send(setup)), self.timeout):
+                if isinstance(reply, RedisError):
+                    conn.close()
+                    raise reply
+        self.dials += 1
+        self._conn = conn
+        return conn
+
+    async def _connection(self) -> _Connection:
+        loop = asyncio.get_running_loop()
+        conn = self._conn
+        if conn is not None and conn.alive and conn.loop is loop:
+            return conn
+        # One dial at a time; concurrent callers wait for the same one
+        dialing = self._dialing
+        if dialing is None or dialing.done() or dialing.get_loop() is not loop:
+            dialing = self._dialing = loop.create_task(self._dial())
+        return await asyncio.shield(dialing)
+
+    async def execute(self, *commands) -> list:
+        # Sends the commands as one pipeline and returns their replies; an error reply raises
+        conn = await self._connection()
+        futures = conn.send(commands)
+        self.commands += len(commands)
+        self.round_trips += 1
+        try:
+            await conn.writer.drain()
+            replies = await asyncio.wait_for(asyncio.gather(*futures), self.timeout)
+        except (ConnectionError, OSError, asyncio.TimeoutError):
+            self.errors += 1
+            raise
+        for reply in replies:
+            if isinstance(reply, RedisError):
+                self.errors += 1
+                raise reply
+        return replies
+
+    def stats(self) -> dict:
+        return {
+            "address": self.address,
+            "connected": self._conn is not None and self._conn.alive,
+            "commands": self.commands,
+            "round_trips": self.round_trips,
+            "dials": self.dials,
+            "errors": self.errors,
+        }
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
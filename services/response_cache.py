@@ -0,0 +1,186 @@
+import hashlib
+import os
+import re
+import time
+from collections import OrderedDict
+from services.lazy import lazy_import
+from services.tools import route_intent
+
+# Response cache in front of Gemini for repeated questions ("what's your name", "how are you, Nick").
+#   exact tier  - normalized text
+#   approx tier - hashed character-trigram + word vectors, cosine nearest neighbour over one NumPy
+#                 matrix (RESPONSE_CACHE_APPROX=0 to turn off)
+# Entries are scoped by the system prompt. Messages that lean on the conversation ("tell me more",
+# "why is that") are also scoped by the previous bot reply, so they only hit in the same context.
+# Anything the tool router would send to weather/search is never cached.
+
+np = lazy_import("numpy", preload=True)
+
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE", "1") != "0"
+RESPONSE_CACHE_APPROX = os.getenv("RESPONSE_CACHE_APPROX", "1") != "0"
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "86400"))
+RESPONSE_CACHE_MAX = int(os.getenv("RESPONSE_CACHE_MAX", "2000"))
+RESPONSE_CACHE_THRESHOLD = float(os.getenv("RESPONSE_CACHE_THRESHOLD", "0.86"))
+EMBED_DIM = 512
+
+CONTEXT_WORDS = {
+    "it", "that", "this", "those", "these", "them", "they", "he", "she", "him", "her", "his", "its",
+    "there", "more", "again", "else", "also", "another", "why", "yes", "no", "yeah", "nope", "ok", "okay",
+    "sure", "same", "other", "one", "first", "second", "last", "previous", "continue",
+}
+
+
+CONTRACTIONS = {
+    "what's": "what is", "whats": "what is", "how's": "how is", "hows": "how is", "who's": "who is",
+    "where's": "where is", "it's": "it is", "i'm": "i am", "im": "i am", "you're": "you are",
+    "youre": "you are", "can't": "cannot", "don't": "do not", "dont": "do not", "let's": "let us",
+}
+
+
+def normalize_question(text: str) -> str:
+    text = text.lower().replace("’", "'")
+    words = re.sub(r"[^\w\s']", " ", text).split()
+    return " ".join(CONTRACTIONS.get(word, word) for word in words)
+
+
+def needs_context(normalized: str) -> bool:
+    words = normalized.split()
+    return len(words) < 2 or any(word in CONTEXT_WORDS for word in words)
+
+
+def _numbers(normalized: str) -> list:
+    return re.findall(r"\d+", normalized)
+
+
+def _bucket(feature: str) -> int:
+    return int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=4).digest(), "little")
+
+
+def embed(normalized: str) -> "np.ndarray":
+    # Hashed bag of character trigrams (robust to STT spelling noise) and whole words, L2-normalized
+    vector = np.zeros(EMBED_DIM, dtype=np.float32)
+    padded = f" {normalized} "
+    for i in range(len(padded) - 2):
+        h = _bucket(padded[i:i + 3])
+        vector[h % EMBED_DIM] += 1.0 if h & 0x80000000 else -1.0
+    for word in normalized.split():
+        h = _bucket("w:" + word)
+        vector[h % EMBED_DIM] += 2.0 if h & 0x80000000 else -2.0
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class ResponseCache:
+    def __init__(self, max_entries: int = RESPONSE_CACHE_MAX, ttl: float = RESPONSE_CACHE_TTL,
+                 threshold: float = RESPONSE_CACHE_THRESHOLD, approx: bool = RESPONSE_CACHE_APPROX,
+                 enabled: bool = RESPONSE_CACHE_ENABLED):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+        self.approx = approx
+        self.enabled = enabled
+        # (scope, normalized) -> (expires, reply, slot); slot indexes the vector matrix, which is
+        # allocated with the first entry (NumPy is only imported then)
+        self._entries = OrderedDict()
+        self._vectors = None
+        self._scopes = None
+        self._slot_keys = [None] * max_entries
+        self._free = list(range(max_entries - 1, -1, -1))
+        self.exact_hits = 0
+        self.approx_hits = 0
+        self.misses = 0
+        self.skipped = 0
+        self.stores = 0
+        self.lookup_seconds = 0.0
+        self.lookups = 0
+
+    def _scope(self, normalized: str, system_prompt: str, history: list) -> int:
+        context = ""
+        if needs_context(normalized):
+            last_bot = next((turn.text for turn in reversed(history or []) if turn.role == "bot"), "")
+            context = normalize_question(last_bot)[-200:]
+        digest = hashlib.blake2b(f"{system_prompt}\x00{context}".encode(), digest_size=7).digest()
+        return int.from_bytes(digest, "little")
+
+    def _key(self, text: str, system_prompt: str, history: list):
+        if not self.enabled or route_intent(text) is not None:
+            return None
+        normalized = normalize_question(text)
+        if not normalized:
+            return None
+        return self._scope(normalized, system_prompt, history), normalized
+
+    def get(self, text: str, system_prompt: str = "", history: list = None):
+        # history: the turns before this message. Returns the cached reply or None.
+        started = time.perf_counter()
+        try:
+            key = self._key(text, system_prompt, history)
+            if key is None:
+                self.skipped += 1
+                return None
+            now = time.monotonic()
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.exact_hits += 1
+                return entry[1]
+            if self.approx and self._entries:
+                scope, normalized = key
+                scores = self._vectors @ embed(normalized)
+                scores[self._scopes != scope] = -1.0
+                best = int(np.argmax(scores))
+                # Numbers carry the meaning ("what is 18 times 3"), so they must match exactly
+                if scores[best] >= self.threshold and _numbers(self._slot_keys[best][1]) == _numbers(normalized):
+                    match = self._entries.get(self._slot_keys[best])
+                    if match is not None and match[0] > now:
+                        self._entries.move_to_end(self._slot_keys[best])
+                        self.approx_hits += 1
+                        return match[1]
+            self.misses += 1
+            return None
+        finally:
+            self.lookups += 1
+            self.lookup_seconds += time.perf_counter() - started
+
+    def put(self, text: str, reply: str, system_prompt: str = "", history: list = None):
+        key = self._key(text, system_prompt, history)
+        if key is None or not reply:
+            return
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._release(old[2])
+        while len(self._entries) >= self.max_entries:
+            _, evicted = self._entries.popitem(last=False)
+            self._release(evicted[2])
+        if self._vectors is None:
+            self._vectors = np.zeros((self.max_entries, EMBED_DIM), dtype=np.float32)
+            self._scopes = np.full(self.max_entries, -1, dtype=np.int64)
+        slot = self._free.pop()
+        self._vectors[slot] = embed(key[1])
+        self._scopes[slot] = key[0]
+        self._slot_keys[slot] = key
+        self._entries[key] = (time.monotonic() + self.ttl, reply, slot)
+        self.stores += 1
+
+    def _release(self, slot: int):
+        self._vectors[slot] = 0.0
+        self._scopes[slot] = -1
+        self._slot_keys[slot] = None
+        self._free.append(slot)
+
+    def stats(self) -> dict:
+        hits = self.exact_hits + self.approx_hits
+        decided = hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "exact_hits": self.exact_hits,
+            "approx_hits": self.approx_hits,
+            "misses": self.misses,
+            "skipped": self.skipped,
+            "stores": self.stores,
+            "hit_ratio": hits / decided if decided else 0.0,
+            "lookup_ms_avg": self.lookup_seconds / self.lookups * 1000 if self.lookups else 0.0,
+        }
+
+
+response_cache = ResponseCache()
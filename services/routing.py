@@ -0,0 +1,261 @@
+import asyncio
+import os
+import random
+import time
+from collections import deque
+from services.admission import UpstreamBusy, admission
+from services.telemetry import LATENCY_BUCKETS, PROMETHEUS_ENABLED, get_logger
+from services.tools import TOOL_NOTE_PREFIX
+
+if PROMETHEUS_ENABLED:
+    from services.telemetry import ROUTE_SECONDS
+
+# Latency-aware model routing and hedged requests for Gemini (services.providers.GeminiProvider).
+# GEMINI_ROUTES lists the models a reply may come from, each with a quality tier (higher = better):
+# "model:tier,...". A turn needs ROUTE_TIER, a short conversational one (the user said at most
+# ROUTE_SHORT_WORDS words, and no live data came with it) only ROUTE_SHORT_TIER. It goes to the
+# eligible model with the lowest rolling p50 time to first token over the last ROUTE_WINDOW
+# replies. Models with fewer than ROUTE_MIN_SAMPLES go first (in listed order) until they have
+# them, and ROUTE_EXPLORE of the turns go to another eligible model so its numbers stay current.
+# Hedging: when the first token hasn't come after the route's p(HEDGE_QUANTILE) (HEDGE_DELAY_MS until
+# it has samples), the same request goes to the next best eligible model (or the same one) and
+# whichever streams first is used; the other is cancelled. A hedge only takes an idle Gemini slot
+# (admission's speculative class), and hedges are capped at HEDGE_BUDGET per request, so a slow
+# provider doesn't get twice the load. A loser's time is recorded as a lower bound of its latency.
+# Failover: when the primary fails with no hedge in flight, the hedge target is tried right away
+# (in the primary's slot, outside the hedge budget); the error is raised once both have failed.
+
+log = get_logger("routing")
+
+GEMINI_ROUTES = os.getenv("GEMINI_ROUTES", "gemini-2.0-flash:2,gemini-2.0-flash-lite:1")
+ROUTE_TIER = int(os.getenv("ROUTE_TIER", "2"))
+ROUTE_SHORT_TIER = int(os.getenv("ROUTE_SHORT_TIER", "1"))
+ROUTE_SHORT_WORDS = int(os.getenv("ROUTE_SHORT_WORDS", "12"))
+ROUTE_WINDOW = int(os.getenv("ROUTE_WINDOW", "200"))
+ROUTE_MIN_SAMPLES = int(os.getenv("ROUTE_MIN_SAMPLES", "20"))
+ROUTE_EXPLORE = float(os.getenv("ROUTE_EXPLORE", "0.05"))
+HEDGE_ENABLED = os.getenv("HEDGE", "1") != "0"
+HEDGE_QUANTILE = float(os.getenv("HEDGE_QUANTILE", "0.95"))
+HEDGE_DELAY = int(os.getenv("HEDGE_DELAY_MS", "1500")) / 1000
+HEDGE_MIN_DELAY = int(os.getenv("HEDGE_MIN_DELAY_MS", "150")) / 1000
+HEDGE_BUDGET = float(os.getenv("HEDGE_BUDGET", "0.1"))
+
+
+def parse_routes(spec: str) -> list:
+    routes = []
+    for item in spec.split(","):
+        model, _, tier = item.strip().partition(":")
+        if model:
+            routes.append(Route(model, int(tier or 0)))
+    return routes
+
+
+def user_text(prompt) -> str:
+    # The latest user message of a Gemini `contents` list (or a plain prompt), tool notes included
+    if isinstance(prompt, str):
+        return prompt
+    for content in reversed(prompt):
+        if content.get("role", "user") == "user":
+            return " ".join(part.get("text", "") for part in content.get("parts", []))
+    return ""
+
+
+def required_tier(prompt) -> int:
+    text = user_text(prompt)
+    if TOOL_NOTE_PREFIX not in text and len(text.split()) <= ROUTE_SHORT_WORDS:
+        return ROUTE_SHORT_TIER
+    return ROUTE_TIER
+
+
+class Route:
+    def __init__(self, model: str, tier: int, window: int = ROUTE_WINDOW):
+        self.model = model
+        self.tier = tier
+        self.samples = deque(maxlen=window)  # seconds to first token, newest last
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.requests = 0
+        self.hedges = 0
+        self.wins = 0
+        self.cancelled = 0
+        self.errors = 0
+
+    def quantile(self, q: float):
+        if not self.samples:
+            return None
+        values = sorted(self.samples)
+        return values[min(len(values) - 1, int(len(values) * q))]
+
+    def observe(self, seconds: float, outcome: str):
+        self.samples.append(seconds)
+        i = 0
+        while i < len(LATENCY_BUCKETS) and seconds > LATENCY_BUCKETS[i]:
+            i += 1
+        self.buckets[i] += 1
+        if PROMETHEUS_ENABLED:
+            ROUTE_SECONDS.labels(self.model, outcome).observe(seconds)
+
+    def stats(self) -> dict:
+        quantiles = {f"p{round(q * 100)}_ms": self.quantile(q) for q in (0.5, 0.95, 0.99)}
+        return {
+            "tier": self.tier,
+            "requests": self.requests,
+            "hedges": self.hedges,
+            "wins": self.wins,
+            "cancelled": self.cancelled,
+            "errors": self.errors,
+            "samples": len(self.samples),
+            **{key: None if value is None else round(value * 1000, 1) for key, value in quantiles.items()},
+            # Time to first token: count per bucket, keyed by its upper bound in ms
+            "histogram": {
+                ("+Inf" if i == len(LATENCY_BUCKETS) else str(int(LATENCY_BUCKETS[i] * 1000))): count
+                for i, count in enumerate(self.buckets) if count
+            },
+        }
+
+
+class _Attempt:
+    # One request in flight; `first` resolves with its first chunk
+    def __init__(self, route: Route, chunks, hedge: bool):
+        self.route = route
+        self.chunks = chunks
+        self.hedge = hedge
+        self.started = time.perf_counter()
+        self.first = asyncio.ensure_future(chunks.__anext__())
+
+    async def cancel(self):
+        self.first.cancel()
+        await asyncio.gather(self.first, return_exceptions=True)
+        await self.chunks.aclose()
+
+
+class ModelRouter:
+    def __init__(self, routes: list, upstream: str = "gemini", hedging: bool = HEDGE_ENABLED):
+        self.routes = routes
+        self.upstream = upstream
+        self.hedging = hedging
+        self.hedge_tokens = 1.0
+        self.requests = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.hedges_busy = 0
+        self.hedges_over_budget = 0
+        self.failovers = 0
+
+    def eligible(self, tier: int) -> list:
+        # The routes good enough for the tier: those still without enough samples, then fastest first
+        routes = [route for route in self.routes if route.tier >= tier] or self.routes[:1]
+        warm = sorted((route for route in routes if len(route.samples) >= ROUTE_MIN_SAMPLES),
+                      key=lambda route: route.quantile(0.5))
+        return [route for route in routes if len(route.samples) < ROUTE_MIN_SAMPLES] + warm
+
+    def choose(self, tier: int) -> list:
+        # [primary, hedge target]
+        routes = self.eligible(tier)
+        if len(routes) > 1 and random.random() < ROUTE_EXPLORE:
+            routes.insert(0, routes.pop(random.randrange(1, len(routes))))
+        return [routes[0], routes[1] if len(routes) > 1 else routes[0]]
+
+    def hedge_delay(self, route: Route) -> float:
+        if len(route.samples) < ROUTE_MIN_SAMPLES:
+            return HEDGE_DELAY
+        return max(HEDGE_MIN_DELAY, route.quantile(HEDGE_QUANTILE))
+
+    async def _hedged(self, chunks):
+        # A hedge runs in an idle slot or not at all
+        async with admission.slot(self.upstream, None, speculative=True):
+            async for chunk in chunks:
+                yield chunk
+
+    def _start(self, route: Route, open_stream, hedge: bool) -> _Attempt:
+        route.requests += 1
+        if hedge:
+            route.hedges += 1
+            return _Attempt(route, self._hedged(open_stream(route.model)), True)
+        return _Attempt(route, open_stream(route.model), False)
+
+    async def stream(self, prompt, open_stream):
+        # Reply chunks from open_stream(model) on the chosen route, hedged
+        primary, alternate = self.choose(required_tier(prompt))
+        self.requests += 1
+        self.hedge_tokens = min(1.0 + HEDGE_BUDGET * 10, self.hedge_tokens + HEDGE_BUDGET)
+        attempts = [self._start(primary, open_stream, False)]
+        delay = self.hedge_delay(primary) if self.hedging else None
+        winner, first, error = None, None, None
+        failed = set()  # routes whose request failed
+        try:
+            while winner is None:
+                pending = [attempt.first for attempt in attempts if not attempt.first.done()]
+                if not pending and alternate not in failed:
+                    # Nothing in flight (the primary failed, no hedge running): try the hedge target now
+                    delay = None
+                    self.failovers += 1
+                    log.debug("%s failed (%r), failing over to %s", primary.model, error, alternate.model)
+                    attempts.append(self._start(alternate, open_stream, False))
+                    continue
+                if not pending:
+                    raise error
+                done, _ = await asyncio.wait(pending, timeout=delay, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    delay = None
+                    self._hedge(attempts, alternate, open_stream)
+                    continue
+                for attempt in attempts:
+                    if attempt.first not in done or winner is not None:
+                        continue
+                    try:
+                        first = attempt.first.result()
+                    except StopAsyncIteration:
+                        first = None
+                    except Exception as e:
+                        if isinstance(e, UpstreamBusy) and attempt.hedge:
+                            self.hedges_busy += 1
+                        else:
+                            attempt.route.errors += 1
+                            failed.add(attempt.route)
+                            error = error or e
+                        continue
+                    winner = attempt
+            elapsed = time.perf_counter() - winner.started
+            winner.route.wins += 1
+            winner.route.observe(elapsed, "won")
+            if winner.hedge:
+                self.hedge_wins += 1
+            for attempt in attempts:
+                if attempt is not winner and not attempt.first.done():
+                    attempt.route.cancelled += 1
+                    attempt.route.observe(time.perf_counter() - attempt.started, "cancelled")
+                    await attempt.cancel()
+            if first is None:
+                return
+            yield first
+            async for chunk in winner.chunks:
+                yield chunk
+        finally:
+            for attempt in attempts:
+                await attempt.cancel()
+
+    def _hedge(self, attempts: list, route: Route, open_stream):
+        if self.hedge_tokens < 1.0:
+            self.hedges_over_budget += 1
+            return
+        self.hedge_tokens -= 1.0
+        self.hedged += 1
+        log.debug("no first token from %s yet, hedging on %s", attempts[0].route.model, route.model)
+        attempts.append(self._start(route, open_stream, True))
+
+    def stats(self) -> dict:
+        return {
+            "hedging": self.hedging,
+            "requests": self.requests,
+            "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins,
+            "hedges_busy": self.hedges_busy,
+            "hedges_over_budget": self.hedges_over_budget,
+            "failovers": self.failovers,
+            # Upstream requests per reply: 1.0 without hedges or failovers
+            "request_cost": round((self.requests + self.hedged + self.failovers) / self.requests, 3) if self.requests else None,
+            "routes": {route.model: route.stats() for route in self.routes},
+        }
+
+
+gemini_router = ModelRouter(parse_routes(GEMINI_ROUTES))
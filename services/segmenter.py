@@ -0,0 +1,64 @@
+import re
+
+# Streaming sentence/clause segmenter: Gemini tokens go in, speakable segments come out.
+# Short first segments are flushed on a clause boundary so Murf can start talking early.
+
+_SENTENCE_END = re.compile(r"[.!?…]+[\"')\]]*\s+")
+_CLAUSE_END = re.compile(r"[,;:—]\s+")
+_ABBREVIATIONS = {"mr.", "mrs.", "ms.", "dr.", "st.", "vs.", "e.g.", "i.e.", "etc.", "no."}
+
+
+class SentenceSegmenter:
+    def __init__(self, min_chars: int = 12, max_chars: int = 220, first_clause_chars: int = 24):
+        self.min_chars = min_chars
+        self.max_chars = max_chars
+        self.first_clause_chars = first_clause_chars
+        self.buffer = ""
+        self.emitted = 0
+
+    def feed(self, text: str) -> list:
+        self.buffer += text
+        segments = []
+        while True:
+            segment = self._next_segment()
+            if segment is None:
+                break
+            segments.append(segment)
+        return segments
+
+    def flush(self):
+        segment = self.buffer.strip()
+        self.buffer = ""
+        if segment:
+            self.emitted += 1
+            return segment
+        return None
+
+    def _next_segment(self):
+        cut = None
+        for match in _SENTENCE_END.finditer(self.buffer):
+            if match.end() < self.min_chars:
+                continue
+            last_word = self.buffer[:match.end()].split()[-1].lower()
+            if last_word in _ABBREVIATIONS:
+                continue
+            cut = match.end()
+            break
+        if cut is None and self.emitted == 0:
+            # First segment only: a clause is enough to get audio going
+            for match in _CLAUSE_END.finditer(self.buffer):
+                if match.end() >= self.first_clause_chars:
+                    cut = match.end()
+                    break
+        if cut is None and len(self.buffer) > self.max_chars:
+            cut = self.buffer.rfind(" ", 0, self.max_chars)
+            if cut <= 0:
+                cut = self.max_chars
+        if cut is None:
+            return None
+        segment = self.buffer[:cut].strip()
+        self.buffer = self.buffer[cut:]
+        if not segment:
+            return None
+        self.emitted += 1
+        return segment
@@ -0,0 +1,361 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+from services.redis_client import RedisClient
+
+# Chat history per session_id, bounded three ways:
+#   SESSION_TTL        - sessions idle for longer than this are dropped
+#   SESSION_MAX        - least recently used sessions are evicted past this count
+#   SESSION_MAX_TURNS  - only the newest turns of a session are kept
+# SESSION_STORE=memory keeps everything in this process; SESSION_STORE=sqlite keeps it in one
+# SQLite file (WAL mode) that survives restarts and is shared by several uvicorn workers on one
+# host; SESSION_STORE=redis keeps it in a Redis-compatible server shared by workers on any host.
+
+SESSION_STORE = os.getenv("SESSION_STORE", "memory")  # memory | sqlite | redis
+SESSION_TTL = float(os.getenv("SESSION_TTL", "3600"))
+SESSION_MAX = int(os.getenv("SESSION_MAX", "10000"))
+SESSION_MAX_TURNS = int(os.getenv("SESSION_MAX_TURNS", "40"))
+SESSION_DB_PATH = os.getenv("SESSION_DB_PATH", os.path.join(".cache", "sessions.sqlite3"))
+SESSION_REDIS_URL = os.getenv("SESSION_REDIS_URL", "redis://127.0.0.1:6379/0")
+SESSION_REDIS_PREFIX = os.getenv("SESSION_REDIS_PREFIX", "nick:session:")
+
+
+class Turn:
+    # tokens is filled in (and then cached) by services.context
+    __slots__ = ("role", "text", "ts", "tokens")
+
+    def __init__(self, role: str, text: str, ts: float = None):
+        self.role = role
+        self.text = text
+        self.ts = time.time() if ts is None else ts
+        self.tokens = None
+
+    def as_dict(self) -> dict:
+        return {"role": self.role, "text": self.text}
+
+
+class _Session:
+    __slots__ = ("turns", "last_seen", "summary", "summary_ts")
+
+    def __init__(self, max_turns: int):
+        self.turns = deque(maxlen=max_turns)
+        self.last_seen = time.monotonic()
+        self.summary = ""
+        self.summary_ts = 0.0
+
+
+class SessionStore:
+    name = "base"
+
+    async def history(self, session_id: str) -> list:
+        raise NotImplementedError
+
+    async def append(self, session_id: str, role: str, text: str) -> Turn:
+        raise NotImplementedError
+
+    async def delete(self, session_id: str):
+        raise NotImplementedError
+
+    # Rolling summary of the turns up to summary_ts (see services.context)
+    async def summary(self, session_id: str) -> tuple:
+        raise NotImplementedError
+
+    async def set_summary(self, session_id: str, text: str, upto_ts: float):
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class MemorySessionStore(SessionStore):
+    # OrderedDict in access order: the front is both the LRU victim and the oldest last_seen,
+    # so expiry and eviction only ever look at the front. All methods run without awaiting,
+    # which keeps them atomic on the event loop.
+    name = "memory"
+
+    def __init__(self, ttl: float = SESSION_TTL, max_sessions: int = SESSION_MAX,
+                 max_turns: int = SESSION_MAX_TURNS):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.max_turns = max_turns
+        self._sessions = OrderedDict()
+        self.expired = 0
+        self.evicted = 0
+
+    def _sweep(self, now: float):
+        sessions = self._sessions
+        while sessions:
+            session_id, session = next(iter(sessions.items()))
+            if now - session.last_seen <= self.ttl:
+                break
+            del sessions[session_id]
+            self.expired += 1
+        while len(sessions) > self.max_sessions:
+            sessions.popitem(last=False)
+            self.evicted += 1
+
+    def _get(self, session_id: str, create: bool):
+        now = time.monotonic()
+        self._sweep(now)
+        session = self._sessions.get(session_id)
+        if session is None:
+            if not create:
+                return None
+            session = self._sessions[session_id] = _Session(self.max_turns)
+            self._sweep(now)
+        else:
+            self._sessions.move_to_end(session_id)
+        session.last_seen = now
+        return session
+
+    async def history(self, session_id: str) -> list:
+        session = self._get(session_id, create=False)
+        return list(session.turns) if session is not None else []
+
+    async def append(self, session_id: str, role: str, text: str) -> Turn:
+        turn = Turn(role, text)
+        self._get(session_id, create=True).turns.append(turn)
+        return turn
+
+    async def delete(self, session_id: str):
+        self._sessions.pop(session_id, None)
+
+    async def summary(self, session_id: str) -> tuple:
+        session = self._sessions.get(session_id)
+        return (session.summary, session.summary_ts) if session is not None else ("", 0.0)
+
+    async def set_summary(self, session_id: str, text: str, upto_ts: float):
+        session = self._sessions.get(session_id)
+        if session is not None:
+            session.summary = text
+            session.summary_ts = upto_ts
+
+    def stats(self) -> dict:
+        return {
+            "backend": self.name,
+            "sessions": len(self._sessions),
+            "expired": self.expired,
+            "evicted": self.evicted,
+            "ttl": self.ttl,
+            "max_sessions": self.max_sessions,
+            "max_turns": self.max_turns,
+        }
+
+
+class SQLiteSessionStore(SessionStore):
+    # One connection per process guarded by a lock; queries run in a worker thread so the
+    # event loop never waits on the disk. WAL + busy_timeout lets several workers share the file.
+    name = "sqlite"
+
+    def __init__(self, path: str = SESSION_DB_PATH, ttl: float = SESSION_TTL, max_sessions: int = SESSION_MAX,
+                 max_turns: int = SESSION_MAX_TURNS, sweep_every: int = 200):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.max_turns = max_turns
+        self.sweep_every = sweep_every
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=10, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS sessions (
+                id TEXT PRIMARY KEY, last_seen REAL NOT NULL, summary TEXT NOT NULL DEFAULT '',
+                summary_ts REAL NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS sessions_last_seen ON sessions(last_seen);
+            CREATE TABLE IF NOT EXISTS turns (
+                session_id TEXT NOT NULL, seq INTEGER NOT NULL, role TEXT NOT NULL, text TEXT NOT NULL,
+                ts REAL NOT NULL, PRIMARY KEY (session_id, seq)
+            ) WITHOUT ROWID;
+        """)
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(sessions)")}
+        if "summary" not in columns:
+            self._db.execute("ALTER TABLE sessions ADD COLUMN summary TEXT NOT NULL DEFAULT ''")
+            self._db.execute("ALTER TABLE sessions ADD COLUMN summary_ts REAL NOT NULL DEFAULT 0")
+
+    def _run(self, fn, *args):
+        with self._lock:
+            return fn(*args)
+
+    def _history(self, session_id: str) -> list:
+        now = time.time()
+        row = self._db.execute("SELECT last_seen FROM sessions WHERE id = ?", (session_id,)).fetchone()
+        if row is None or now - row[0] > self.ttl:
+            return []
+        self._db.execute("UPDATE sessions SET last_seen = ? WHERE id = ?", (now, session_id))
+        rows = self._db.execute(
+            "SELECT role, text, ts FROM turns WHERE session_id = ? ORDER BY seq", (session_id,)
+        ).fetchall()
+        return [Turn(*r) for r in rows]
+
+    def _append(self, session_id: str, turn: Turn):
+        db = self._db
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            row = db.execute("SELECT last_seen FROM sessions WHERE id = ?", (session_id,)).fetchone()
+            if row is not None and turn.ts - row[0] > self.ttl:
+                db.execute("DELETE FROM turns WHERE session_id = ?", (session_id,))
+                db.execute("UPDATE sessions SET summary = '', summary_ts = 0 WHERE id = ?", (session_id,))
+            db.execute(
+                "INSERT INTO sessions (id, last_seen) VALUES (?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET last_seen = excluded.last_seen",
+                (session_id, turn.ts),
+            )
+            seq = db.execute(
+                "SELECT COALESCE(MAX(seq), 0) + 1 FROM turns WHERE session_id = ?", (session_id,)
+            ).fetchone()[0]
+            db.execute("INSERT INTO turns VALUES (?, ?, ?, ?, ?)", (session_id, seq, turn.role, turn.text, turn.ts))
+            db.execute("DELETE FROM turns WHERE session_id = ? AND seq <= ?", (session_id, seq - self.max_turns))
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        self._writes += 1
+        if self._writes % self.sweep_every == 0:
+            self._sweep()
+
+    def _sweep(self):
+        # Expired sessions first, then the least recently used ones past the cap
+        db = self._db
+        cutoff = time.time() - self.ttl
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            db.execute("DELETE FROM turns WHERE session_id IN (SELECT id FROM sessions WHERE last_seen < ?)", (cutoff,))
+            db.execute("DELETE FROM sessions WHERE last_seen < ?", (cutoff,))
+            extra = db.execute("SELECT COUNT(*) FROM sessions").fetchone()[0] - self.max_sessions
+            if extra > 0:
+                victims = "SELECT id FROM sessions ORDER BY last_seen LIMIT ?"
+                db.execute(f"DELETE FROM turns WHERE session_id IN ({victims})", (extra,))
+                db.execute(f"DELETE FROM sessions WHERE id IN ({victims})", (extra,))
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+    def _delete(self, session_id: str):
+        self._db.execute("DELETE FROM turns WHERE session_id = ?", (session_id,))
+        self._db.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+
+    def _summary(self, session_id: str) -> tuple:
+        row = self._db.execute("SELECT summary, summary_ts FROM sessions WHERE id = ?", (session_id,)).fetchone()
+        return tuple(row) if row is not None else ("", 0.0)
+
+    def _set_summary(self, session_id: str, text: str, upto_ts: float):
+        self._db.execute("UPDATE sessions SET summary = ?, summary_ts = ? WHERE id = ?", (text, upto_ts, session_id))
+
+    async def history(self, session_id: str) -> list:
+        return await asyncio.to_thread(self._run, self._history, session_id)
+
+    async def summary(self, session_id: str) -> tuple:
+        return await asyncio.to_thread(self._run, self._summary, session_id)
+
+    async def set_summary(self, session_id: str, text: str, upto_ts: float):
+        await asyncio.to_thread(self._run, self._set_summary, session_id, text, upto_ts)
+
+    async def append(self, session_id: str, role: str, text: str) -> Turn:
+        turn = Turn(role, text)
+        await asyncio.to_thread(self._run, self._append, session_id, turn)
+        return turn
+
+    async def delete(self, session_id: str):
+        await asyncio.to_thread(self._run, self._delete, session_id)
+
+    def stats(self) -> dict:
+        with self._lock:
+            sessions = self._db.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+        return {
+            "backend": self.name,
+            "path": self.path,
+            "sessions": sessions,
+            "ttl": self.ttl,
+            "max_sessions": self.max_sessions,
+            "max_turns": self.max_turns,
+        }
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class RedisSessionStore(SessionStore):
+    # A list of JSON turns per session (RPUSH + LTRIM keeps the newest max_turns) and a hash for
+    # the summary. Both keys get the TTL again on every read and write, so the server expires idle
+    # sessions by itself; each call is one pipelined round trip. SESSION_MAX is not enforced here:
+    # cap memory with the server's maxmemory + allkeys-lru instead.
+    name = "redis"
+
+    def __init__(self, url: str = SESSION_REDIS_URL, ttl: float = SESSION_TTL, max_sessions: int = SESSION_MAX,
+                 max_turns: int = SESSION_MAX_TURNS, prefix: str = SESSION_REDIS_PREFIX):
+        self.client = RedisClient(url)
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.max_turns = max_turns
+        self.prefix = prefix
+        self._ttl_ms = max(int(ttl * 1000), 1)
+
+    def _keys(self, session_id: str) -> tuple:
+        return f"{self.prefix}{session_id}:turns", f"{self.prefix}{session_id}:meta"
+
+    async def history(self, session_id: str) -> list:
+        turns, meta = self._keys(session_id)
+        items, _, _ = await self.client.execute(
+            ("LRANGE", turns, 0, -1), ("PEXPIRE", turns, self._ttl_ms), ("PEXPIRE", meta, self._ttl_ms),
+        )
+        return [Turn(*json.loads(item)) for item in items]
+
+    async def append(self, session_id: str, role: str, text: str) -> Turn:
+        turn = Turn(role, text)
+        turns, meta = self._keys(session_id)
+        await self.client.execute(
+            ("RPUSH", turns, json.dumps([role, text, turn.ts])), ("LTRIM", turns, -self.max_turns, -1),
+            ("PEXPIRE", turns, self._ttl_ms), ("PEXPIRE", meta, self._ttl_ms),
+        )
+        return turn
+
+    async def delete(self, session_id: str):
+        await self.client.execute(("DEL", *self._keys(session_id)))
+
+    async def summary(self, session_id: str) -> tuple:
+        (text, upto_ts), = await self.client.execute(("HMGET", self._keys(session_id)[1], "summary", "summary_ts"))
+        return (text.decode(), float(upto_ts)) if text is not None else ("", 0.0)
+
+    async def set_summary(self, session_id: str, text: str, upto_ts: float):
+        turns, meta = self._keys(session_id)
+        exists, = await self.client.execute(("EXISTS", turns))
+        if exists:
+            await self.client.execute(
+                ("HSET", meta, "summary", text, "summary_ts", repr(upto_ts)), ("PEXPIRE", meta, self._ttl_ms),
+            )
+
+    def stats(self) -> dict:
+        return {
+            "backend": self.name,
+            "redis": self.client.stats(),
+            "ttl": self.ttl,
+            "max_turns": self.max_turns,
+        }
+
+    def close(self):
+        self.client.close()
+
+
+def create_session_store(name: str = SESSION_STORE) -> SessionStore:
+    if name == "sqlite":
+        return SQLiteSessionStore()
+    if name == "redis":
+        return RedisSessionStore()
+    return MemorySessionStore()
+
+
+session_store = create_session_store()
@@ -0,0 +1,171 @@
+import asyncio
+import difflib
+import os
+import re
+from services.context import estimate_tokens
+from services.tools import route_intent
+
+# Speculative LLM generation on partial transcripts.
+# When a partial transcript has stopped changing for SPECULATE_STABLE_MS, the Gemini request is
+# started on it while the STT provider is still finalizing. If the final transcript matches the
+# speculated text closely enough the reply is adopted (chunks already generated are replayed, the
+# rest streams live); otherwise it is cancelled and a normal request starts on the final text.
+# Speculative replies have no side effects until adopted: nothing is sent to the client or Murf,
+# and a partial that would need a tool lookup (weather, search) is not speculated on at all.
+
+SPECULATION_ENABLED = os.getenv("SPECULATE", "1") != "0"
+SPECULATE_MIN_WORDS = int(os.getenv("SPECULATE_MIN_WORDS", "3"))
+SPECULATE_STABLE_MS = int(os.getenv("SPECULATE_STABLE_MS", "250"))
+SPECULATE_MATCH = float(os.getenv("SPECULATE_MATCH", "0.95"))
+
+
+def normalize_transcript(text: str) -> str:
+    return " ".join(re.sub(r"[^\w\s']", " ", text.lower()).split())
+
+
+def similarity(a: str, b: str) -> float:
+    # Word-level, so punctuation and casing changes between partial and final don't count
+    return difflib.SequenceMatcher(None, a.split(), b.split()).ratio()
+
+
+class SpeculativeReply:
+    def __init__(self, text: str, source):
+        self.text = text
+        self.chunks = []
+        self.done = False
+        self._updated = asyncio.Event()
+        self.task = asyncio.create_task(self._run(source))
+
+    async def _run(self, source):
+        try:
+            async for chunk in source:
+                self.chunks.append(chunk)
+                self._updated.set()
+        finally:
+            self.done = True
+            self._updated.set()
+
+    def __aiter__(self):
+        return self.stream()
+
+    async def stream(self):
+        sent = 0
+        while True:
+            while sent < len(self.chunks):
+                yield self.chunks[sent]
+                sent += 1
+            if self.done:
+                if not self.task.cancelled() and self.task.exception() is not None:
+                    raise self.task.exception()
+                return
+            self._updated.clear()
+            await self._updated.wait()
+
+    async def aclose(self):
+        # Called by the adopting turn when it ends; stops generation after a barge-in
+        if not self.done:
+            await self.cancel()
+
+    def tokens(self) -> int:
+        return sum(estimate_tokens(chunk) for chunk in self.chunks)
+
+    async def cancel(self):
+        self.task.cancel()
+        await asyncio.gather(self.task, return_exceptions=True)
+
+
+class Speculator:
+    # start(text) returns the async iterator of reply chunks for a (partial) user message
+    def __init__(self, start, min_words: int = SPECULATE_MIN_WORDS, stable_ms: int = SPECULATE_STABLE_MS,
+                 match: float = SPECULATE_MATCH):
+        self.start = start
+        self.min_words = min_words
+        self.stable = stable_ms / 1000
+        self.match = match
+        self.current = None
+        self._partial = ""
+        self._timer = None
+        self._discarded = []  # cancelled from a timer callback, awaited on the next final or close
+        self.started = 0
+        self.tool_skips = 0
+        self.hits = 0
+        self.misses = 0
+        self.wasted_tokens = 0
+
+    def on_partial(self, text: str):
+        normalized = normalize_transcript(text)
+        if normalized == self._partial:
+            return
+        self._partial = normalized
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if len(normalized.split()) >= self.min_words:
+            self._timer = asyncio.get_running_loop().call_later(self.stable, self._speculate, text, normalized)
+
+    def _speculate(self, text: str, normalized: str):
+        self._timer = None
+        current = self.current
+        if current is not None and normalize_transcript(current.text) == normalized:
+            return
+        if current is not None:
+            # The user kept talking; the old guess is stale
+            self._discard(current)
+        if route_intent(text) is not None:
+            # Its answer needs live data for words the user may not have finished
+            self.tool_skips += 1
+            return
+        self.current = SpeculativeReply(text, self.start(text))
+        self.started += 1
+
+    def _discard(self, reply: SpeculativeReply):
+        self.misses += 1
+        self.wasted_tokens += reply.tokens()
+        reply.task.cancel()
+        self._discarded.append(reply.task)
+        self.current = None
+
+    async def _reap(self):
+        # Lets the discarded requests finish unwinding (closing their upstream streams) and
+        # retrieves their exceptions
+        tasks, self._discarded = self._discarded, []
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def on_final(self, text: str):
+        # Returns the adopted reply (iterate it for chunks), or None to start a fresh request
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._partial = ""
+        await self._reap()
+        reply, self.current = self.current, None
+        if reply is None:
+            return None
+        failed = reply.done and not reply.task.cancelled() and reply.task.exception() is not None
+        if not failed and similarity(normalize_transcript(text), normalize_transcript(reply.text)) >= self.match:
+            self.hits += 1
+            return reply
+        self.misses += 1
+        self.wasted_tokens += reply.tokens()
+        await reply.cancel()
+        return None
+
+    async def close(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self.current is not None:
+            reply, self.current = self.current, None
+            await reply.cancel()
+        await self._reap()
+
+    def stats(self) -> dict:
+        decided = self.hits + self.misses
+        return {
+            "started": self.started,
+            "tool_skips": self.tool_skips,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / decided if decided else 0.0,
+            "wasted_tokens": self.wasted_tokens,
+        }
@@ -1,12 +1,24 @@
-import assemblyai as aai
-from fastapi import UploadFile
+import io
+from services.blocking import blocking_pool
+from services.lazy import lazy_import
+
+# The SDK is imported on first use, not at app startup. Its calls block (upload, then polling
+# until the transcript is done), so they run in the bounded thread pool (services.blocking).
+aai = lazy_import("assemblyai")
 
 class STTService:
     def __init__(self, api_key: str):
-        aai.settings.api_key = api_key
+        self.api_key = api_key
+
+    def transcribe_sync(self, audio_bytes: bytes) -> str:
+        aai.settings.api_key = self.api_key
+        transcript = aai.Transcriber().transcribe(io.BytesIO(audio_bytes))
+        if transcript.status == aai.TranscriptStatus.error:
+            raise RuntimeError(transcript.error or "Transcription failed.")
+        return transcript.text or ""
 
-    async def transcribe(self, file: UploadFile) -> str:
-        audio_bytes = await file.read()
-        transcriber = aai.Transcriber()
-        transcript = transcriber.transcribe(audio_bytes)
-        return transcript.text
+    async def transcribe(self, audio) -> str:
+        # audio: bytes, or an UploadFile
+        if hasattr(audio, "read"):
+            audio = await audio.read()
+        return await blocking_pool.run("assemblyai_sdk", self.transcribe_sync, audio)
@@ -0,0 +1,219 @@
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+
+# Per-turn latency tracing and structured logging.
+# A TurnTrace collects the stage timings of one turn: audio receive, STT, LLM first token and
+# completion, TTS first byte and completion, time spent sending to the client, first audio at the
+# client (perceived_first_audio counts filler audio, first_audio only the answer) and the whole
+# turn. Recording a stage is a perf_counter() call and a dict store; when the turn ends finish()
+# observes Prometheus histograms (GET /metrics), writes one "turn" log record and, with
+# OTEL_ENABLED=1 and OpenTelemetry installed, exports the stages as spans under one turn span.
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")  # text | json
+OTEL_ENABLED = os.getenv("OTEL_ENABLED", "0") != "0"
+
+STAGES = (
+    "audio_receive", "stt", "llm_first_token", "llm_complete", "tts_first_byte", "tts_complete",
+    "client_send", "perceived_first_audio", "first_audio", "turn",
+)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0, 8.0, 13.0, 20.0, 30.0)
+
+try:
+    from prometheus_client import CONTENT_TYPE_LATEST, Counter, Histogram, generate_latest
+    PROMETHEUS_ENABLED = True
+except ImportError:
+    PROMETHEUS_ENABLED = False
+
+if PROMETHEUS_ENABLED:
+    STAGE_SECONDS = Histogram(
+        "nick_stage_seconds", "Voice pipeline stage latency", ("pipeline", "stage"), buckets=LATENCY_BUCKETS
+    )
+    TURNS = Counter("nick_turns", "Finished voice turns", ("pipeline", "outcome"))
+    ROUTE_SECONDS = Histogram(
+        "nick_llm_route_first_token_seconds", "Gemini time to first token per model (services.routing)",
+        ("model", "outcome"), buckets=LATENCY_BUCKETS
+    )
+
+_tracer = None
+if OTEL_ENABLED:
+    try:
+        from opentelemetry import trace as otel_trace
+        # Exporters come from the usual OpenTelemetry SDK setup (e.g. opentelemetry-instrument)
+        _tracer = otel_trace.get_tracer("nick.voice")
+    except ImportError:
+        pass
+
+
+class StructuredFormatter(logging.Formatter):
+    # Extra key/values go in extra={"fields": {...}}; text mode appends them as key=value
+    def __init__(self, json_lines: bool):
+        super().__init__("%(asctime)s %(levelname)s %(name)s: %(message)s")
+        self.json_lines = json_lines
+
+    def format(self, record: logging.LogRecord) -> str:
+        fields = getattr(record, "fields", None) or {}
+        if not self.json_lines:
+            line = super().format(record)
+            return line + "".join(f" {key}={json.dumps(value, default=str)}" for key, value in fields.items())
+        data = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            **fields,
+        }
+        if record.exc_info:
+            data["exc"] = self.formatException(record.exc_info)
+        return json.dumps(data, default=str)
+
+
+def configure_logging(level: str = LOG_LEVEL, fmt: str = LOG_FORMAT):
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(StructuredFormatter(fmt == "json"))
+    root = logging.getLogger("nick")
+    root.handlers[:] = [handler]
+    root.setLevel(level.upper())
+    root.propagate = False
+
+
+def get_logger(name: str) -> logging.Logger:
+    return logging.getLogger(f"nick.{name}")
+
+
+log = get_logger("trace")
+
+
+class _Span:
+    __slots__ = ("trace", "stage", "started")
+
+    def __init__(self, trace, stage: str):
+        self.trace = trace
+        self.stage = stage
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.trace.mark(self.stage, self.started)
+        return False
+
+
+class TurnTrace:
+    # pipeline: "ws" | "process_audio" | "stream_chat". Times are perf_counter() values.
+    def __init__(self, pipeline: str, session_id: str = None, started: float = None):
+        self.pipeline = pipeline
+        self.session_id = session_id
+        self.started = time.perf_counter() if started is None else started
+        self._wall_ns = time.time_ns() - int((time.perf_counter() - self.started) * 1e9)
+        self.stages = {}
+        self.tags = {}
+        self.send_seconds = 0.0
+        self.finished = False
+
+    def span(self, stage: str) -> _Span:
+        return _Span(self, stage)
+
+    def mark(self, stage: str, since: float, now: float = None):
+        # First measurement wins, so "first token" style stages can be marked on every chunk
+        if stage not in self.stages:
+            self.stages[stage] = (since, time.perf_counter() if now is None else now)
+
+    def add_send(self, seconds: float):
+        self.send_seconds += seconds
+
+    def durations(self) -> dict:
+        return {stage: end - start for stage, (start, end) in self.stages.items()}
+
+    def finish(self, outcome: str = "ok"):
+        if self.finished:
+            return
+        self.finished = True
+        ended = time.perf_counter()
+        self.stages["turn"] = (self.started, ended)
+        durations = self.durations()
+        if self.send_seconds:
+            durations["client_send"] = self.send_seconds
+        if PROMETHEUS_ENABLED:
+            for stage, seconds in durations.items():
+                STAGE_SECONDS.labels(self.pipeline, stage).observe(seconds)
+            TURNS.labels(self.pipeline, outcome).inc()
+        if log.isEnabledFor(logging.INFO):
+            log.info("turn", extra={"fields": {
+                "pipeline": self.pipeline,
+                "session_id": self.session_id,
+                "outcome": outcome,
+                "stages_ms": {stage: round(seconds * 1000, 1) for stage, seconds in durations.items()},
+                **self.tags,
+            }})
+        if _tracer is not None:
+            self._export(outcome)
+
+    def _ns(self, t: float) -> int:
+        return self._wall_ns + int((t - self.started) * 1e9)
+
+    def _export(self, outcome: str):
+        start, end = self.stages["turn"]
+        root = _tracer.start_span(f"turn {self.pipeline}", start_time=self._ns(start), attributes={
+            "session.id": self.session_id or "", "pipeline": self.pipeline, "outcome": outcome,
+            **{key: str(value) for key, value in self.tags.items()},
+        })
+        context = otel_trace.set_span_in_context(root)
+        for stage, (stage_start, stage_end) in self.stages.items():
+            if stage != "turn":
+                _tracer.start_span(stage, context=context, start_time=self._ns(stage_start)).end(
+                    end_time=self._ns(stage_end)
+                )
+        root.end(end_time=self._ns(end))
+
+
+async def traced_audio(trace: TurnTrace, chunks, to_client: bool = True, finish: bool = False):
+    # TTS audio on its way out: first byte, completion and the time the consumer held each chunk
+    # (for a streaming response that is the time spent writing it to the client).
+    # finish=True ends the trace with the stream, for responses that outlive the endpoint.
+    if trace is None:
+        async for chunk in chunks:
+            yield chunk
+        return
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        async for chunk in chunks:
+            now = time.perf_counter()
+            trace.mark("tts_first_byte", started, now)
+            if to_client:
+                trace.mark("first_audio", trace.started, now)
+            yield chunk
+            if to_client:
+                trace.add_send(time.perf_counter() - now)
+        trace.mark("tts_complete", started)
+        outcome = "ok"
+    except (asyncio.CancelledError, GeneratorExit):
+        outcome = "interrupted"
+        raise
+    finally:
+        if finish:
+            trace.finish(outcome)
+
+
+def metrics_payload() -> tuple:
+    if not PROMETHEUS_ENABLED:
+        return b"# prometheus_client is not installed\n", "text/plain; charset=utf-8"
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+
+class RequestTimingMiddleware:
+    # Pure ASGI (no per-request task or buffering): stamps when a request arrived, before the
+    # upload is read and parsed, as request.state.received_at
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            scope.setdefault("state", {})["received_at"] = time.perf_counter()
+        await self.app(scope, receive, send)
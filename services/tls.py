@@ -0,0 +1,25 @@
+import ssl
+import threading
+import httpx
+
+# One TLS context for every upstream connection. Building a context loads the whole CA bundle
+# (~35 ms of CPU on the event loop); otherwise every httpx client builds one at startup and
+# websockets.connect() builds a fresh one for each Murf and AssemblyAI realtime socket it dials.
+
+_context = None
+_lock = threading.Lock()
+
+
+def ssl_context() -> ssl.SSLContext:
+    global _context
+    if _context is None:
+        # The startup warmup builds it in a worker thread; a request may get here first
+        with _lock:
+            if _context is None:
+                _context = httpx.create_ssl_context()
+    return _context
+
+
+def ws_ssl(url: str):
+    # websockets.connect() only accepts ssl= for wss:// URLs
+    return ssl_context() if url.startswith("wss://") else None
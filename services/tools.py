@@ -0,0 +1,206 @@
+import asyncio
+import os
+import re
+import time
+from collections import OrderedDict
+import httpx
+from config import TAVILY_API_KEY, WEATHER_API_KEY
+from services.connections import http_client
+from services.telemetry import get_logger
+
+# Tools Nick can use before answering: current weather (WeatherAPI.com) and web search (Tavily).
+# Everything is async on the shared httpx clients with a hard timeout, results are cached by
+# normalized city/query, and concurrent identical lookups share a single upstream call.
+# route_intent() is a cheap local regex router that decides whether a tool runs at all,
+# so ordinary chit-chat never pays for a lookup.
+
+log = get_logger("tools")
+
+WEATHER_API_BASE = os.getenv("WEATHER_API_BASE", "http://api.weatherapi.com")
+TAVILY_API_BASE = os.getenv("TAVILY_API_BASE", "https://api.tavily.com")
+TOOL_TIMEOUT = float(os.getenv("TOOL_TIMEOUT", "2.5"))
+WEATHER_CACHE_TTL = float(os.getenv("WEATHER_CACHE_TTL", "600"))
+WEATHER_UNKNOWN_TTL = float(os.getenv("WEATHER_UNKNOWN_TTL", "60"))
+SEARCH_CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", "1800"))
+TOOL_CACHE_MAX = int(os.getenv("TOOL_CACHE_MAX", "2048"))
+TOOLS_ENABLED = os.getenv("TOOLS_ENABLED", "1") != "0"
+TOOL_NOTE_PREFIX = "(Live data you can use in your answer: "
+
+
+class ToolError(Exception):
+    pass
+
+
+class ToolCache:
+    # TTL + LRU cache with request coalescing: the first caller for a key starts the lookup,
+    # everyone arriving before it finishes awaits the same future. Failures are not cached.
+    # ttl is seconds, or a function of the result for answers that should expire sooner.
+    def __init__(self, max_entries: int = TOOL_CACHE_MAX):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.errors = 0
+
+    async def fetch(self, key: str, ttl: float, loader):
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires, value = entry
+            if time.monotonic() < expires:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._entries[key]
+        future = self._inflight.get(key)
+        if future is not None:
+            self.coalesced += 1
+            # shield: one waiter being cancelled must not cancel the shared lookup
+            return await asyncio.shield(future)
+        self.misses += 1
+        future = asyncio.ensure_future(loader())
+        self._inflight[key] = future
+        # Settle in a callback so the result is cached even if every waiter timed out
+        future.add_done_callback(lambda done: self._settle(key, ttl, done))
+        return await asyncio.shield(future)
+
+    def _settle(self, key: str, ttl: float, future):
+        self._inflight.pop(key, None)
+        if future.cancelled() or future.exception() is not None:
+            self.errors += 1
+            return
+        value = future.result()
+        self._entries[key] = (time.monotonic() + (ttl(value) if callable(ttl) else ttl), value)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "entries": len(self._entries),
+            "inflight": len(self._inflight),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "errors": self.errors,
+            "hit_ratio": (self.hits + self.coalesced) / lookups if lookups else 0.0,
+        }
+
+
+tool_cache = ToolCache()
+
+
+def normalize_key(text: str) -> str:
+    return " ".join(re.sub(r"[^\w\s]", " ", text.lower()).split())
+
+
+UNKNOWN_LOCATION = "Sorry, I couldn't get the weather for that location."
+
+
+async def _fetch_weather(city: str) -> str:
+    resp = await http_client("weather").get(
+        f"{WEATHER_API_BASE}/v1/current.json", params={"key": WEATHER_API_KEY, "q": city}
+    )
+    # WeatherAPI answers 400 for a location it doesn't know; a bad key (401/403), 429 or 5xx is a
+    # failure and must not be cached
+    if resp.status_code == 400:
+        return UNKNOWN_LOCATION
+    resp.raise_for_status()
+    data = resp.json()
+    location = data['location']['name'] + ', ' + data['location']['country']
+    temp = data['current']['temp_c']
+    feels = data['current']['feelslike_c']
+    desc = data['current']['condition']['text']
+    return f"The weather in {location} is {desc} with a temperature of {temp}°C (feels like {feels}°C)."
+
+
+def weather_ttl(answer: str) -> float:
+    return WEATHER_UNKNOWN_TTL if answer == UNKNOWN_LOCATION else WEATHER_CACHE_TTL
+
+
+async def get_weather(city: str) -> str:
+    try:
+        return await asyncio.wait_for(
+            tool_cache.fetch(f"weather:{normalize_key(city)}", weather_ttl, lambda: _fetch_weather(city)),
+            TOOL_TIMEOUT,
+        )
+    except asyncio.TimeoutError:
+        return "Sorry, the weather service is taking too long right now."
+    except (httpx.HTTPError, KeyError, ValueError):
+        return "Sorry, I couldn't get the weather right now."
+
+
+async def _fetch_search(query: str) -> str:
+    resp = await http_client("search").post(
+        f"{TAVILY_API_BASE}/search",
+        json={"api_key": TAVILY_API_KEY, "query": query, "max_results": 3, "include_answer": True,
+              "search_depth": "basic"},
+    )
+    resp.raise_for_status()
+    data = resp.json()
+    if data.get("answer"):
+        return data["answer"]
+    snippets = [r.get("content", "") for r in data.get("results", [])[:3] if r.get("content")]
+    if not snippets:
+        raise ToolError("no search results")
+    return " ".join(snippets)
+
+
+async def web_search(query: str) -> str:
+    return await asyncio.wait_for(
+        tool_cache.fetch(f"search:{normalize_key(query)}", SEARCH_CACHE_TTL, lambda: _fetch_search(query)),
+        TOOL_TIMEOUT,
+    )
+
+
+# --- Intent routing ---
+
+WEATHER_RE = re.compile(r"\b(weather|temperature|forecast|raining|rain|snowing|sunny|humid|degrees)\b", re.I)
+CITY_RE = re.compile(r"\b(?:in|at|for)\s+([A-Za-z][A-Za-z .'-]{1,40}?)\s*(?:\b(?:today|tomorrow|tonight|now|right now|this \w+|please))?\s*[?.!]*$", re.I)
+SEARCH_RE = re.compile(
+    r"\b(search|look up|google|latest|news|headlines|who won|score|stock price|release date|current(?:ly)?)\b", re.I
+)
+CITY_STOPWORDS = {"the", "it", "there", "here", "my area", "me", "general"}
+
+
+def route_intent(text: str):
+    # Returns (tool, argument) or None; runs in microseconds, no model call
+    if not TOOLS_ENABLED or not text:
+        return None
+    if WEATHER_RE.search(text):
+        match = CITY_RE.search(text.strip())
+        if match and match.group(1).strip().lower() not in CITY_STOPWORDS:
+            return "weather", match.group(1).strip()
+    if SEARCH_RE.search(text):
+        return "search", text.strip()
+    return None
+
+
+async def run_tools(text: str):
+    # Returns a short text with live data for Gemini, or None
+    intent = route_intent(text)
+    if intent is None:
+        return None
+    tool, argument = intent
+    try:
+        if tool == "weather":
+            return await get_weather(argument)
+        return f"Web search results for '{argument}': {await web_search(argument)}"
+    except (asyncio.TimeoutError, httpx.HTTPError, ToolError, KeyError, ValueError) as e:
+        log.warning("%s failed: %r", tool, e)
+        return None
+
+
+async def with_tool_results(contents, text: str):
+    # Appends live data to the latest user message of a Gemini `contents` list (or a plain prompt)
+    result = await run_tools(text)
+    if result is None:
+        return contents
+    note = f"{TOOL_NOTE_PREFIX}{result})"
+    if isinstance(contents, str):
+        return [{"role": "user", "parts": [{"text": contents}, {"text": note}]}]
+    contents = list(contents)
+    last = contents[-1]
+    contents[-1] = {**last, "parts": last["parts"] + [{"text": note}]}
+    return contents
@@ -0,0 +1,281 @@
+import asyncio
+import json
+import os
+import time
+import websockets
+from config import ASSEMBLY_API_KEY
+from services.connections import ASSEMBLY_API_BASE, http_client
+from services.tls import ws_ssl
+
+# Pluggable speech-to-text backends.
+#   BatchTranscriber     - upload + transcript job, finished by webhook or adaptive backoff polling
+#   StreamingTranscriber - AssemblyAI realtime (v3 streaming) over a WebSocket, PCM16 in, events out
+# Streaming events use the same shape voice_agent_ws always consumed:
+#   {"message_type": "PartialTranscript" | "FinalTranscript", "text": ...}
+# transcribe_stream() takes a recording still being uploaded (services.ingest.UploadStream) and
+# forwards it as it arrives: a chunked upload to AssemblyAI, or PCM straight into a realtime session.
+
+ASSEMBLY_STREAMING_URL = os.getenv("ASSEMBLY_STREAMING_URL", "wss://streaming.assemblyai.com/v3/ws")
+ASSEMBLY_WEBHOOK_URL = os.getenv("ASSEMBLY_WEBHOOK_URL", "")
+STT_BACKEND = os.getenv("STT_BACKEND", "auto")  # auto | batch | streaming
+
+POLL_INITIAL_DELAY = float(os.getenv("STT_POLL_INITIAL_DELAY", "0.15"))
+POLL_MAX_DELAY = float(os.getenv("STT_POLL_MAX_DELAY", "1.5"))
+POLL_BACKOFF = float(os.getenv("STT_POLL_BACKOFF", "1.6"))
+TRANSCRIBE_TIMEOUT = float(os.getenv("STT_TIMEOUT", "60"))
+
+STREAM_SAMPLE_RATE = 16000
+
+
+class TranscriptionError(Exception):
+    pass
+
+
+class TranscriptionBackend:
+    name = "base"
+
+    async def transcribe(self, audio_bytes: bytes) -> str:
+        raise NotImplementedError
+
+    async def transcribe_stream(self, upload) -> str:
+        return await self.transcribe(await upload.read())
+
+    async def stream(self, audio_chunk_iter):
+        raise NotImplementedError
+        yield
+
+
+# Webhook completions land here (see /webhooks/assemblyai in main.py)
+_pending_webhooks = {}
+
+
+def complete_webhook(transcript_id: str, status: str):
+    future = _pending_webhooks.get(transcript_id)
+    if future is not None and not future.done():
+        future.set_result(status)
+
+
+def poll_delays(initial: float = POLL_INITIAL_DELAY, factor: float = POLL_BACKOFF, cap: float = POLL_MAX_DELAY):
+    # Short clips usually finish in well under a second, so start fast and back off
+    delay = initial
+    while True:
+        yield delay
+        delay = min(delay * factor, cap)
+
+
+class BatchTranscriber(TranscriptionBackend):
+    name = "batch"
+
+    def __init__(self, webhook_url: str = ASSEMBLY_WEBHOOK_URL, timeout: float = TRANSCRIBE_TIMEOUT):
+        self.webhook_url = webhook_url
+        self.timeout = timeout
+        self.polls = 0
+
+    async def transcribe(self, audio_bytes: bytes) -> str:
+        return await self._transcribe(audio_bytes)
+
+    async def transcribe_stream(self, upload) -> str:
+        # An async iterator body goes out with chunked transfer encoding, block by block as it arrives
+        return await self._transcribe(upload.chunks())
+
+    async def _transcribe(self, content) -> str:
+        headers = {"authorization": ASSEMBLY_API_KEY, "content-type": "application/octet-stream"}
+        client = http_client("assemblyai")
+        upload_resp = await client.post(f"{ASSEMBLY_API_BASE}/v2/upload", headers=headers, content=content)
+        upload_resp.raise_for_status()
+        job = {"audio_url": upload_resp.json()["upload_url"]}
+        if self.webhook_url:
+            job["webhook_url"] = self.webhook_url
+        transcribe_resp = await client.post(f"{ASSEMBLY_API_BASE}/v2/transcript", headers=headers, json=job)
+        transcribe_resp.raise_for_status()
+        transcript_id = transcribe_resp.json()["id"]
+        return await self._wait(client, headers, transcript_id)
+
+    async def _wait(self, client, headers, transcript_id: str) -> str:
+        deadline = time.monotonic() + self.timeout
+        if self.webhook_url:
+            future = asyncio.get_running_loop().create_future()
+            _pending_webhooks[transcript_id] = future
+            try:
+                # The webhook may be delivered to another worker; fall back to polling
+                await asyncio.wait_for(future, timeout=self.timeout / 2)
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                _pending_webhooks.pop(transcript_id, None)
+        for delay in poll_delays():
+            self.polls += 1
+            poll = await client.get(f"{ASSEMBLY_API_BASE}/v2/transcript/{transcript_id}", headers=headers)
+            poll.raise_for_status()
+            data = poll.json()
+            if data["status"] == "completed":
+                return data.get("text") or ""
+            if data["status"] == "error" or data["status"] == "failed":
+                raise TranscriptionError(data.get("error") or "Transcription failed.")
+            if time.monotonic() + delay > deadline:
+                raise TranscriptionError("Transcription timed out.")
+            await asyncio.sleep(delay)
+
+
+class StreamingTranscriber(TranscriptionBackend):
+    name = "streaming"
+
+    def __init__(self, url: str = ASSEMBLY_STREAMING_URL, sample_rate: int = STREAM_SAMPLE_RATE,
+                 chunk_ms: int = 50, realtime: bool = False):
+        self.url = url
+        self.sample_rate = sample_rate
+        self.chunk_bytes = sample_rate * 2 * chunk_ms // 1000
+        self.realtime = realtime
+
+    async def stream(self, audio_chunk_iter):
+        url = f"{self.url}?sample_rate={self.sample_rate}&format_turns=false&encoding=pcm_s16le"
+        headers = {"Authorization": ASSEMBLY_API_KEY}
+        async with websockets.connect(url, additional_headers=headers, ssl=ws_ssl(url)) as ws:
+            async def send_audio():
+                try:
+                    async for chunk in audio_chunk_iter:
+                        # Control messages (e.g. ForceEndpoint from the VAD) travel as JSON text
+                        await ws.send(json.dumps(chunk) if isinstance(chunk, dict) else chunk)
+                finally:
+                    try:
+                        await ws.send(json.dumps({"type": "Terminate"}))
+                    except websockets.ConnectionClosed:
+                        pass
+            send_task = asyncio.create_task(send_audio())
+            try:
+                async for msg in ws:
+                    data = json.loads(msg)
+                    if data.get("type") == "Turn":
+                        yield {
+                            "message_type": "FinalTranscript" if data.get("end_of_turn") else "PartialTranscript",
+                            "text": data.get("transcript", ""),
+                            "end_of_turn_confidence": data.get("end_of_turn_confidence"),
+                        }
+                    elif data.get("type") == "Termination":
+                        break
+                    elif "error" in data:
+                        raise TranscriptionError(data["error"])
+            finally:
+                if not send_task.done():
+                    send_task.cancel()
+                await asyncio.gather(send_task, return_exceptions=True)
+
+    async def transcribe(self, audio_bytes: bytes) -> str:
+        pcm = pcm16_from_wav(audio_bytes, self.sample_rate)
+        if pcm is None:
+            raise TranscriptionError(f"Streaming STT needs {self.sample_rate} Hz mono PCM16 WAV input.")
+        return await self._finals(self._chunks(pcm))
+
+    async def transcribe_stream(self, upload) -> str:
+        offset = pcm16_data_offset(await upload.head(WAV_HEAD_BYTES), self.sample_rate)
+        if offset is None:
+            raise TranscriptionError(f"Streaming STT needs {self.sample_rate} Hz mono PCM16 WAV input.")
+        return await self._finals(self._upload_chunks(upload, offset))
+
+    async def _finals(self, chunks) -> str:
+        finals = []
+        async for event in self.stream(chunks):
+            if event["message_type"] == "FinalTranscript" and event["text"]:
+                finals.append(event["text"])
+        return " ".join(finals)
+
+    async def _upload_chunks(self, upload, offset: int):
+        # The upload's PCM in chunk_bytes messages as it arrives (the last one may be shorter)
+        pending = bytearray()
+        skip = offset
+        async for block in upload.chunks():
+            if skip:
+                dropped = min(skip, len(block))
+                block, skip = block[dropped:], skip - dropped
+            pending += block
+            while len(pending) >= self.chunk_bytes:
+                yield bytes(pending[:self.chunk_bytes])
+                del pending[:self.chunk_bytes]
+        if len(pending) > 1:
+            yield bytes(pending[:len(pending) & ~1])
+
+    async def _chunks(self, pcm: bytes):
+        view = memoryview(pcm)
+        pace = self.chunk_bytes / (self.sample_rate * 2)
+        for start in range(0, len(view), self.chunk_bytes):
+            yield bytes(view[start:start + self.chunk_bytes])
+            if self.realtime:
+                await asyncio.sleep(pace)
+
+
+# Enough of an upload to find its WAV header (fmt and the start of data, past any LIST chunks)
+WAV_HEAD_BYTES = 4096
+
+
+def pcm16_data_offset(head: bytes, sample_rate: int):
+    # Where the PCM starts in a mono PCM16 WAV at sample_rate, from its first bytes, else None.
+    # The data size is not checked: a WAV streamed while recording doesn't know it yet.
+    if len(head) < 12 or head[:4] != b"RIFF" or head[8:12] != b"WAVE":
+        return None
+    pos, fmt_ok = 12, False
+    while pos + 8 <= len(head):
+        chunk_id = head[pos:pos + 4]
+        size = int.from_bytes(head[pos + 4:pos + 8], "little")
+        if chunk_id == b"data":
+            return pos + 8 if fmt_ok else None
+        if chunk_id == b"fmt ":
+            body = head[pos + 8:pos + 8 + size]
+            fmt_ok = (
+                len(body) >= 16
+                and int.from_bytes(body[0:2], "little") == 1
+                and int.from_bytes(body[2:4], "little") == 1
+                and int.from_bytes(body[4:8], "little") == sample_rate
+                and int.from_bytes(body[14:16], "little") == 16
+            )
+        pos += 8 + size + (size & 1)
+    return None
+
+
+def pcm16_from_wav(audio_bytes: bytes, sample_rate: int):
+    # Minimal RIFF walk: returns the data chunk of a mono PCM16 WAV at sample_rate, else None
+    if len(audio_bytes) < 12 or audio_bytes[:4] != b"RIFF" or audio_bytes[8:12] != b"WAVE":
+        return None
+    pos, fmt_ok = 12, False
+    while pos + 8 <= len(audio_bytes):
+        chunk_id = audio_bytes[pos:pos + 4]
+        size = int.from_bytes(audio_bytes[pos + 4:pos + 8], "little")
+        body = audio_bytes[pos + 8:pos + 8 + size]
+        if chunk_id == b"fmt ":
+            fmt_ok = (
+                int.from_bytes(body[0:2], "little") == 1
+                and int.from_bytes(body[2:4], "little") == 1
+                and int.from_bytes(body[4:8], "little") == sample_rate
+                and int.from_bytes(body[14:16], "little") == 16
+            )
+        elif chunk_id == b"data":
+            return body if fmt_ok else None
+        pos += 8 + size + (size & 1)
+    return None
+
+
+_backends = {}
+
+
+def get_transcriber(name: str) -> TranscriptionBackend:
+    backend = _backends.get(name)
+    if backend is None:
+        backend = StreamingTranscriber() if name == "streaming" else BatchTranscriber()
+        _backends[name] = backend
+    return backend
+
+
+def transcriber_for(audio_bytes: bytes) -> TranscriptionBackend:
+    # Realtime streaming for PCM16 WAV recordings, batch for compressed containers (webm, mp3, ...)
+    name = STT_BACKEND
+    if name == "auto":
+        name = "streaming" if pcm16_from_wav(audio_bytes, STREAM_SAMPLE_RATE) is not None else "batch"
+    return get_transcriber(name)
+
+
+async def transcriber_for_upload(upload) -> TranscriptionBackend:
+    # The same choice for an upload still arriving, from its first bytes
+    name = STT_BACKEND
+    if name == "auto":
+        head = await upload.head(WAV_HEAD_BYTES)
+        name = "streaming" if pcm16_data_offset(head, STREAM_SAMPLE_RATE) is not None else "batch"
+    return get_transcriber(name)
@@ -0,0 +1,232 @@
+import asyncio
+import hashlib
+import json
+import mmap
+import os
+import struct
+import unicodedata
+from collections import OrderedDict
+from services.telemetry import get_logger
+
+# Content-addressed cache for synthesized speech.
+# Memory tier: LRU of chunk lists bounded by bytes. Disk tier: one file per key,
+# read back through mmap and evicted oldest-first once the directory exceeds its budget.
+# Cached audio is replayed chunk by chunk, exactly as Murf streamed it.
+
+log = get_logger("tts_cache")
+
+TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR", ".cache/tts")
+TTS_CACHE_MEMORY_BYTES = int(os.getenv("TTS_CACHE_MEMORY_BYTES", str(32 * 1024 * 1024)))
+TTS_CACHE_DISK_BYTES = int(os.getenv("TTS_CACHE_DISK_BYTES", str(512 * 1024 * 1024)))
+
+# Said when an upstream is saturated (services.admission); it must never need Murf itself
+BUSY_PHRASE = "I'm a little busy right now. Please try again in a moment."
+
+# Said for a recording with no speech in it, and when the LLM fails before saying anything
+NO_SPEECH_PHRASE = "I couldn't hear you. Please speak louder or check your microphone."
+LLM_ERROR_PHRASE = "Sorry, I couldn't generate a response right now."
+
+# Short fillers played while a slow turn has no audio yet (services.filler), "|"-separated
+FILLER_PHRASES = [p.strip() for p in os.getenv(
+    "FILLER_PHRASES", "Hmm, let me check.|One moment.|Let me think about that.|Just a second."
+).split("|") if p.strip()]
+
+# Lines Nick says over and over; synthesized once at startup
+FALLBACK_PHRASES = [
+    NO_SPEECH_PHRASE,
+    LLM_ERROR_PHRASE,
+    "Hi, I'm Nick! How can I help you today?",
+    BUSY_PHRASE,
+    *FILLER_PHRASES,
+]
+
+_HEADER = struct.Struct("<I")
+
+
+def normalize_text(text: str) -> str:
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def cache_key(text: str, voice_config: dict, sample_rate: int, audio_format: str) -> str:
+    parts = [
+        normalize_text(text),
+        voice_config.get("voiceId"),
+        voice_config.get("style"),
+        voice_config.get("rate"),
+        voice_config.get("pitch"),
+        sample_rate,
+        audio_format,
+    ]
+    return hashlib.sha256(json.dumps(parts).encode("utf-8")).hexdigest()
+
+
+class TTSCache:
+    def __init__(self, directory: str = TTS_CACHE_DIR, memory_bytes: int = TTS_CACHE_MEMORY_BYTES,
+                 disk_bytes: int = TTS_CACHE_DISK_BYTES):
+        self.directory = directory
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self._memory = OrderedDict()  # key -> list of chunks
+        self._memory_size = 0
+        self._disk_size = None
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+
+    # ---- memory tier ----
+
+    def _remember(self, key: str, chunks: list):
+        size = sum(len(c) for c in chunks)
+        if size > self.memory_bytes:
+            return
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_size -= sum(len(c) for c in old)
+        self._memory[key] = chunks
+        self._memory_size += size
+        while self._memory_size > self.memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_size -= sum(len(c) for c in evicted)
+
+    # ---- disk tier ----
+    # File layout: chunk count, chunk lengths, then the chunks back to back.
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key + ".bin")
+
+    def _read_disk(self, key: str):
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                view = memoryview(mm)
+                try:
+                    (count,) = _HEADER.unpack_from(mm, 0)
+                    lengths = struct.unpack_from(f"<{count}I", mm, _HEADER.size)
+                    offset = _HEADER.size + 4 * count
+                    chunks = []
+                    for length in lengths:
+                        chunks.append(bytes(view[offset:offset + length]))
+                        offset += length
+                finally:
+                    view.release()
+            os.utime(path)  # mtime doubles as last-used time for eviction
+            return chunks
+        except (FileNotFoundError, ValueError, struct.error):
+            return None
+
+    def _write_disk(self, key: str, chunks: list):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Unique per process: several workers may fill the same entry at once
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(_HEADER.pack(len(chunks)))
+            f.write(struct.pack(f"<{len(chunks)}I", *(len(c) for c in chunks)))
+            for chunk in chunks:
+                f.write(chunk)
+        os.replace(tmp, path)
+        if self._disk_size is None:
+            self._disk_size = self._scan_disk_size()
+        else:
+            self._disk_size += os.path.getsize(path)
+        if self._disk_size > self.disk_bytes:
+            self._evict_disk()
+
+    def _disk_entries(self):
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith(".bin"):
+                    path = os.path.join(root, name)
+                    try:
+                        st = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    entries.append((st.st_mtime, st.st_size, path))
+        return entries
+
+    def _scan_disk_size(self) -> int:
+        return sum(size for _, size, _ in self._disk_entries())
+
+    def _evict_disk(self):
+        # Drop least recently used files until we are back under 90% of the budget
+        entries = sorted(self._disk_entries())
+        total = sum(size for _, size, _ in entries)
+        target = self.disk_bytes * 0.9
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except FileNotFoundError:
+                pass
+        self._disk_size = total
+
+    # ---- public API ----
+
+    async def get(self, key: str):
+        chunks = self._memory.get(key)
+        if chunks is not None:
+            self._memory.move_to_end(key)
+            self.memory_hits += 1
+            return chunks
+        chunks = await asyncio.to_thread(self._read_disk, key)
+        if chunks is not None:
+            self.disk_hits += 1
+            self._remember(key, chunks)
+        return chunks
+
+    async def put(self, key: str, chunks: list):
+        self._remember(key, chunks)
+        try:
+            await asyncio.to_thread(self._write_disk, key, chunks)
+        except OSError as e:
+            log.warning("TTS cache disk write failed: %s", e)
+
+    async def stream(self, key: str, synthesize):
+        # Replay a hit, or stream live audio through while recording it for next time
+        chunks = await self.get(key)
+        if chunks is not None:
+            self.bytes_saved += sum(len(c) for c in chunks)
+            for chunk in chunks:
+                yield chunk
+            return
+        self.misses += 1
+        recorded = []
+        async for chunk in synthesize():
+            recorded.append(chunk)
+            yield chunk
+        # Only complete syntheses are cached; an abandoned stream never gets here
+        if recorded:
+            await self.put(key, recorded)
+
+    async def prewarm(self, keyed_synths):
+        for key, synthesize in keyed_synths:
+            if await self.get(key) is not None:
+                continue
+            try:
+                chunks = [chunk async for chunk in synthesize()]
+            except Exception as e:
+                log.warning("TTS cache prewarm failed: %s", e)
+                continue
+            if chunks:
+                await self.put(key, chunks)
+
+    def stats(self) -> dict:
+        hits = self.memory_hits + self.disk_hits
+        lookups = hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_ratio": hits / lookups if lookups else 0.0,
+            "bytes_saved": self.bytes_saved,
+            "memory_entries": len(self._memory),
+            "memory_bytes": self._memory_size,
+            "disk_bytes": self._disk_size,
+        }
+
+
+tts_cache = TTSCache()
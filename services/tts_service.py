@@ -1,10 +1,27 @@
-from murf import Murf
+from services.blocking import blocking_pool
+from services.lazy import lazy_import
+
+# The SDK is imported on first use, not at app startup. Its calls block, so they run in the
+# bounded thread pool (services.blocking). synthesize returns the URL of the rendered audio file.
+murf = lazy_import("murf")
 
 class TTSService:
-    def __init__(self, api_key: str, voice_id: str = "en-IN-aarav"):
-        self.client = Murf(api_key=api_key)
+    def __init__(self, api_key: str, voice_id: str = "en-IN-aarav", style: str = "Conversational",
+                 sample_rate: int = 44100, audio_format: str = "WAV"):
+        self.api_key = api_key
         self.voice_id = voice_id
+        self.style = style
+        self.sample_rate = sample_rate
+        self.audio_format = audio_format
+        self.client = None
 
-    def synthesize(self, text: str) -> str:
-        res = self.client.text_to_speech.generate(text=text, voice_id=self.voice_id)
+    def synthesize_sync(self, text: str) -> str:
+        if self.client is None:
+            self.client = murf.Murf(api_key=self.api_key)
+        res = self.client.text_to_speech.generate(
+            text=text, voice_id=self.voice_id, style=self.style, sample_rate=self.sample_rate, format=self.audio_format,
+        )
         return getattr(res, "audio_file", None)
+
+    async def synthesize(self, text: str) -> str:
+        return await blocking_pool.run("murf_sdk", self.synthesize_sync, text)
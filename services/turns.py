@@ -0,0 +1,63 @@
+import asyncio
+import os
+import time
+from services.telemetry import get_logger
+
+# Per-session turn scheduler. The STT loop keeps reading while a turn (LLM -> TTS -> client)
+# runs as its own task; a new utterance cancels the turn in flight before the next one starts.
+
+log = get_logger("turns")
+
+BARGE_IN_DEADLINE = float(os.getenv("BARGE_IN_DEADLINE", "0.25"))
+
+
+class TurnScheduler:
+    def __init__(self, deadline: float = BARGE_IN_DEADLINE):
+        self.deadline = deadline
+        self.current = None
+        self.cancellations = 0
+        self.last_cancel_latency = None
+        self.overruns = 0
+
+    @property
+    def busy(self) -> bool:
+        return self.current is not None and not self.current.done()
+
+    async def start(self, turn_coro):
+        await self.cancel()
+        self.current = asyncio.create_task(turn_coro)
+        self.current.add_done_callback(_log_turn_error)
+        return self.current
+
+    async def cancel(self) -> bool:
+        # Returns True if a turn was actually interrupted
+        task = self.current
+        if task is None or task.done():
+            return False
+        started = time.perf_counter()
+        task.cancel()
+        done, _ = await asyncio.wait({task}, timeout=self.deadline)
+        self.last_cancel_latency = time.perf_counter() - started
+        self.cancellations += 1
+        if not done:
+            # Keep going; the old turn finishes its cleanup in the background
+            self.overruns += 1
+            log.warning("turn cleanup exceeded %.0f ms", self.deadline * 1000)
+        return True
+
+    async def wait(self):
+        # Let the last turn finish playing (end of audio, not a barge-in); errors propagate
+        task, self.current = self.current, None
+        if task is not None:
+            await task
+
+    async def close(self):
+        await self.cancel()
+        if self.current is not None:
+            await asyncio.gather(self.current, return_exceptions=True)
+            self.current = None
+
+
+def _log_turn_error(task):
+    if not task.cancelled() and task.exception() is not None:
+        log.error("turn failed", exc_info=task.exception())
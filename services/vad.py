@@ -0,0 +1,122 @@
+import os
+from collections import deque
+from services.lazy import lazy_import
+
+# Streaming voice activity detection on 16 kHz PCM16.
+# Features (frame energy vs. an adaptive noise floor, spectral flatness) are computed for all
+# frames of a chunk at once with NumPy; only the small speech/silence state machine is per frame.
+# Silence beyond the hangover is dropped before it reaches the STT provider, and a long enough
+# pause raises "end_of_turn" so the turn can be closed without waiting on the provider.
+
+np = lazy_import("numpy", preload=True)
+
+VAD_ENABLED = os.getenv("VAD_ENABLED", "1") != "0"
+VAD_HANGOVER_MS = int(os.getenv("VAD_HANGOVER_MS", "300"))
+VAD_END_OF_TURN_MS = int(os.getenv("VAD_END_OF_TURN_MS", "700"))
+
+
+class StreamingVAD:
+    def __init__(self, sample_rate: int = 16000, frame_ms: int = 20, hangover_ms: int = VAD_HANGOVER_MS,
+                 end_of_turn_ms: int = VAD_END_OF_TURN_MS, preroll_ms: int = 200, min_speech_ms: int = 60,
+                 margin_db: float = 9.0, flatness_max: float = 0.45, initial_noise_db: float = -55.0):
+        self.frame_ms = frame_ms
+        self.frame_len = sample_rate * frame_ms // 1000
+        self.frame_bytes = self.frame_len * 2
+        self.hangover_frames = hangover_ms // frame_ms
+        self.end_of_turn_frames = end_of_turn_ms // frame_ms
+        self.min_speech_frames = max(1, min_speech_ms // frame_ms)
+        self.margin_db = margin_db
+        self.flatness_max = flatness_max
+        self.noise_db = initial_noise_db
+        self.window = np.hanning(self.frame_len).astype(np.float32)
+        self.preroll = deque(maxlen=max(1, preroll_ms // frame_ms))
+        self.pending = b""
+        self.in_speech = False
+        self.speech_run = 0
+        self.silence_run = 0
+        self.speech_frames = 0
+        self.silence_frames = 0
+        self.bytes_in = 0
+        self.bytes_forwarded = 0
+        self.turns = 0
+
+    def features(self, frames: "np.ndarray"):
+        energy_db = 10.0 * np.log10(np.mean(frames * frames, axis=1) + 1e-10)
+        spectrum = np.abs(np.fft.rfft(frames * self.window, axis=1)) ** 2 + 1e-12
+        flatness = np.exp(np.mean(np.log(spectrum), axis=1)) / np.mean(spectrum, axis=1)
+        return energy_db, flatness
+
+    def process(self, pcm):
+        # Returns (audio to forward, events) where events are "speech_start" / "end_of_turn"
+        data = self.pending + bytes(pcm) if self.pending else memoryview(pcm)
+        self.bytes_in += len(pcm)
+        n = len(data) // self.frame_bytes
+        self.pending = bytes(data[n * self.frame_bytes:])
+        if n == 0:
+            return b"", []
+        raw = np.frombuffer(data, dtype="<i2", count=n * self.frame_len).reshape(n, self.frame_len)
+        energy_db, flatness = self.features(raw.astype(np.float32) / 32768.0)
+        voiced = (energy_db > self.noise_db + self.margin_db) & (flatness < self.flatness_max)
+
+        out, events = [], []
+        view = memoryview(data)
+        for i in range(n):
+            frame = view[i * self.frame_bytes:(i + 1) * self.frame_bytes]
+            if voiced[i]:
+                self.speech_frames += 1
+                self.speech_run += 1
+                self.silence_run = 0
+                if not self.in_speech:
+                    self.preroll.append(frame)
+                    if self.speech_run >= self.min_speech_frames:
+                        self.in_speech = True
+                        events.append("speech_start")
+                        out.extend(self.preroll)
+                        self.preroll.clear()
+                else:
+                    out.append(frame)
+                continue
+            self.silence_frames += 1
+            self.speech_run = 0
+            # Track the noise floor on unvoiced frames; fall fast, rise slowly
+            rate = 0.3 if energy_db[i] < self.noise_db else 0.02
+            self.noise_db += rate * (energy_db[i] - self.noise_db)
+            if self.in_speech:
+                self.silence_run += 1
+                if self.silence_run <= self.hangover_frames:
+                    out.append(frame)
+                if self.silence_run >= self.end_of_turn_frames:
+                    self.in_speech = False
+                    self.turns += 1
+                    events.append("end_of_turn")
+            else:
+                self.preroll.append(frame)
+        forwarded = b"".join(out)
+        self.bytes_forwarded += len(forwarded)
+        return forwarded, events
+
+    def stats(self) -> dict:
+        frames = self.speech_frames + self.silence_frames
+        return {
+            "speech_ratio": self.speech_frames / frames if frames else 0.0,
+            "speech_seconds": self.speech_frames * self.frame_ms / 1000,
+            "silence_seconds": self.silence_frames * self.frame_ms / 1000,
+            "bytes_in": self.bytes_in,
+            "bytes_forwarded": self.bytes_forwarded,
+            "bandwidth_saved": 1 - self.bytes_forwarded / self.bytes_in if self.bytes_in else 0.0,
+            "turns": self.turns,
+        }
+
+
+async def vad_filter(pcm_chunks, vad: StreamingVAD, on_event=None):
+    # Sits in front of the STT stream: yields voiced audio, and on end_of_turn yields
+    # a ForceEndpoint control message so the provider finalizes the turn right away
+    async for chunk in pcm_chunks:
+        forwarded, events = vad.process(chunk)
+        if forwarded:
+            yield forwarded
+        for event in events:
+            if on_event is not None:
+                await on_event(event)
+            if event == "end_of_turn":
+                yield {"type": "ForceEndpoint"}
@@ -1,98 +1,252 @@
 import asyncio
-import websockets
 import json
-import base64
-import httpx
+import re
+import time
+import uuid
+from contextlib import aclosing
 from fastapi import WebSocket
-from config import ASSEMBLY_API_KEY, GEMINI_API_KEY, MURF_API_KEY
-
-# This is a coroutine to stream audio chunks to AssemblyAI and yield transcript events
-async def assemblyai_stream(audio_chunk_iter):
-    ws_url = f"wss://api.assemblyai.com/v2/realtime/ws?sample_rate=16000"
-    headers = {"Authorization": ASSEMBLY_API_KEY}
-    async with websockets.connect(ws_url, extra_headers=headers) as ws:
-        async def send_audio():
-            async for chunk in audio_chunk_iter:
-                await ws.send(chunk)
-            await ws.send(json.dumps({"terminate_session": True}))
-        send_task = asyncio.create_task(send_audio())
-        while True:
-            msg = await ws.recv()
-            data = json.loads(msg)
-            if data.get("message_type") == "FinalTranscript" or data.get("message_type") == "PartialTranscript":
-                yield data
-            if data.get("message_type") == "SessionTerminated":
-                break
-        await send_task
-
-# This is a coroutine to stream text to Gemini and yield text chunks
-async def gemini_stream(text):
-    url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:streamGenerateContent?key={GEMINI_API_KEY}"
-    headers = {"Content-Type": "application/json"}
-    payload = {
-        "contents": [{"parts": [{"text": text}]}],
-        "system_instruction": {"parts": [{"text": "You are a helpful, friendly, conversational voice assistant named Nick."}]}
-    }
-    async with httpx.AsyncClient(timeout=60.0) as client:
-        async with client.stream("POST", url, headers=headers, json=payload) as resp:
-            async for line in resp.aiter_lines():
-                if line.strip():
-                    try:
-                        data = json.loads(line)
-                        for cand in data.get("candidates", []):
-                            chunk = cand.get("content", {}).get("parts", [{}])[0].get("text", "")
-                            if chunk:
-                                yield chunk
-                    except Exception:
-                        continue
-
-# This is a coroutine to stream text to Murf and yield audio chunks
-async def murf_stream(text):
-    ws_url = f"wss://api.murf.ai/v1/speech/stream-input?api-key={MURF_API_KEY}&sample_rate=44100&channel_type=MONO&format=WAV"
-    context_id = "streaming-ctx"
-    async with websockets.connect(ws_url) as ws:
-        voice_config_msg = {
-            "voice_config": {
-                "voiceId": "en-IN-aarav",
-                "style": "Conversational",
-                "rate": 0,
-                "pitch": 0,
-                "variation": 1
-            }
-        }
-        await ws.send(json.dumps(voice_config_msg))
-        text_msg = {"context_id": context_id, "text": text, "end": True}
-        await ws.send(json.dumps(text_msg))
-        while True:
-            response = await ws.recv()
-            data = json.loads(response)
-            if "audio" in data:
-                yield base64.b64decode(data["audio"])
-            if data.get("final"):
-                break
+from services.admission import UpstreamBusy
+from services.audio_codec import client_audio_stream, stt_pcm_stream
+from services.drain import drain
+from services.flow import AudioPacer, SessionFlow, flow_monitor, inbound_buffer
+from services.pipeline import pipeline
+from services.sessions import session_store
+from services.speculation import SPECULATION_ENABLED, Speculator
+from services.telemetry import TurnTrace, get_logger
+from services.tts_cache import BUSY_PHRASE
+from services.turns import TurnScheduler
+from services.vad import VAD_ENABLED, StreamingVAD, vad_filter
+
+log = get_logger("voice_ws")
+
+# A client-chosen ?session= id: its history outlives the socket (until SESSION_TTL), so a
+# reconnect - to this worker or, with a shared session store, another one - carries on the talk
+SESSION_PARAM = re.compile(r"[A-Za-z0-9_-]{1,64}")
+
+VOICE_SYSTEM_PROMPT = "You are a helpful, friendly, conversational voice assistant named Nick."
+
+# Gemini reply chunks for one user message, from the turn engine with the voice prompt (see
+# Pipeline.reply; pending=True is speculation on a partial transcript)
+def llm_reply(transcript: str, session_id: str = None, pending: bool = False):
+    return pipeline.reply(transcript, session_id, VOICE_SYSTEM_PROMPT, pending)
+
+# One turn through the shared engine (Pipeline.stream_turn) on the session's own TTS session:
+# reply text goes to the client as JSON while audio, paced to real time and converted to the
+# client's output format, goes out as binary. Stage timings go to trace, which the turn finishes;
+# buffer metrics go to flow. If Murf or Gemini is saturated the client gets the cached busy phrase.
+async def run_turn(websocket: WebSocket, transcript: str, tts, output_format: str = "wav",
+                   session_id: str = None, llm=None, trace: TurnTrace = None, flow: SessionFlow = None):
+    trace = trace or TurnTrace("ws", session_id)
+
+    async def send_text(chunk):
+        await websocket.send_json({"type": "gemini", "text": chunk})
+
+    # The answer and any filler share one pacer and one output stream, so the answer is spliced in
+    # right after the filler fragment already sent
+    pacer = AudioPacer()
+    answering = False
+
+    async def answer_events():
+        audio = pipeline.stream_turn(transcript, tts, session_id, llm, trace, on_text=send_text,
+                                     system_prompt=VOICE_SYSTEM_PROMPT, pacer=pacer, flow=flow)
+        async with aclosing(audio):
+            async for audio_chunk in audio:
+                yield "audio", audio_chunk
+
+    async def audio_chunks(events):
+        nonlocal answering
+        async for event, data in events:
+            if event == "filler":
+                await websocket.send_json({"type": "filler", "text": data})
+                continue
+            answering = answering or event == "audio"
+            yield data
+
+    outcome = "error"
+    try:
+        events = pipeline.filler.mask(answer_events(), trace, pacer)
+        audio = audio_chunks(events)
+        async with aclosing(events), aclosing(audio), aclosing(client_audio_stream(audio, output_format)) as client_audio:
+            async for audio_chunk in client_audio:
+                sending = time.perf_counter()
+                await websocket.send_bytes(audio_chunk)
+                trace.mark("perceived_first_audio", trace.started)
+                if answering:
+                    trace.mark("first_audio", trace.started)
+                trace.add_send(time.perf_counter() - sending)
+        outcome = "ok"
+    except asyncio.CancelledError:
+        outcome = "interrupted"
+        raise
+    except UpstreamBusy as e:
+        outcome = "busy"
+        trace.tags.setdefault("busy", e.upstream)
+        await send_busy(websocket, output_format, e)
+    finally:
+        trace.finish(outcome)
+
+# Fast-fail answer when an upstream is saturated; the phrase is pre-synthesized into the TTS cache
+async def send_busy(websocket: WebSocket, output_format: str, error: UpstreamBusy):
+    await websocket.send_json({"type": "busy", "upstream": error.upstream})
+    chunks = await pipeline.cached_audio(BUSY_PHRASE)
+
+    async def cached():
+        for chunk in chunks:
+            yield chunk
+
+    async for audio_chunk in client_audio_stream(cached(), output_format):
+        await websocket.send_bytes(audio_chunk)
+
+# Reads one client message. Returns audio bytes, b"" for a config message, or None at end of audio.
+# Config messages are JSON text: {"input_format": "webm" | "pcm16_<rate>", "output_format": see OUTPUT_FORMATS}
+# Playback reports ({"type": "playback", ...}, see static/main.js) go to on_playback.
+async def receive_client_message(websocket: WebSocket, options: dict, on_playback=None):
+    message = await websocket.receive()
+    if message["type"] == "websocket.disconnect":
+        return None
+    data = message.get("bytes")
+    if data is not None:
+        return None if data == b"__END__" else data
+    text = message.get("text") or ""
+    if text == "__END__":
+        return None
+    try:
+        config = json.loads(text)
+    except ValueError:
+        return b""
+    if isinstance(config, dict):
+        if config.get("type") == "playback":
+            if on_playback is not None:
+                on_playback(config)
+            return b""
+        for key in ("input_format", "output_format"):
+            if key in config:
+                options[key] = config[key]
+    return b""
 
 # Main FastAPI WebSocket endpoint
 async def voice_agent_ws(websocket: WebSocket):
     await websocket.accept()
+    options = {"input_format": "webm", "output_format": "wav"}
+    vad = StreamingVAD()
+    turns = TurnScheduler()
+    speculator = None
+    resume = websocket.query_params.get("session", "")
+    resumable = SESSION_PARAM.fullmatch(resume) is not None
+    session_id = f"ws-{resume}" if resumable else f"ws-{uuid.uuid4()}"
+    # A MurfSession (one warm stream-input socket) with the default TTS provider
+    tts = pipeline.tts_session(session_id)
+    # End of the user's speech: the VAD endpoint if there is one, else the last partial transcript
+    speech_end = {"vad": None, "partial": None}
+    flow = flow_monitor.open(session_id)
+    receiver = drainer = connect_task = None
+    close_code = 1000
+    drain.sessions += 1
     try:
-        # 1. Receive audio chunks from frontend and stream to AssemblyAI
+        def on_playback(report):
+            flow_monitor.playback(flow, report)
+
+        # The client's config message (if any) comes first and decides the input format
+        first = await receive_client_message(websocket, options, on_playback)
+        inbound = flow.inbound = inbound_buffer(options["input_format"])
+
+        # 1. Receive audio chunks from frontend and stream to AssemblyAI. The socket is read by its
+        # own task into a bounded buffer, so a slow upstream doesn't hold up the client.
+        async def receive_audio():
+            chunk = first
+            try:
+                while chunk is not None:
+                    if chunk:
+                        await inbound.put(chunk)
+                    chunk = await receive_client_message(websocket, options, on_playback)
+            finally:
+                inbound.finish()
+        receiver = asyncio.create_task(receive_audio())
+
+        # Worker draining: let the turn in flight finish playing, then end the session so the
+        # client reconnects through the router to another worker
+        async def close_on_drain():
+            nonlocal close_code
+            await drain.wait()
+            while turns.busy:
+                await asyncio.wait({turns.current})
+            close_code = 1012
+            await websocket.send_json({"type": "reconnect", "reason": "draining"})
+            receiver.cancel()
+        drainer = asyncio.create_task(close_on_drain())
+
         async def audio_iter():
-            while True:
-                chunk = await websocket.receive_bytes()
-                if chunk == b"__END__":
-                    break
+            while (chunk := await inbound.get()) is not None:
                 yield chunk
-        # 2. Get transcript from AssemblyAI
-        async for stt_event in assemblyai_stream(audio_iter()):
+        # Dial Murf while the user is still talking
+        connect_task = asyncio.create_task(tts.connect())
+        # Server-side VAD drops silence before it goes upstream and forces early endpoints
+        async def on_vad_event(event):
+            if event == "end_of_turn":
+                speech_end["vad"] = time.perf_counter()
+                await websocket.send_json({"type": "vad", "event": event, "stats": vad.stats()})
+
+        pcm = stt_pcm_stream(audio_iter(), options["input_format"])
+        if VAD_ENABLED:
+            pcm = vad_filter(pcm, vad, on_vad_event)
+        async def barge_in():
+            if await turns.cancel():
+                await websocket.send_json({"type": "interrupt"})
+
+        # Start Gemini on a stable partial transcript while the STT provider finalizes
+        if SPECULATION_ENABLED:
+            speculator = Speculator(lambda text: llm_reply(text, session_id, pending=True))
+
+        # 2. Get transcript from AssemblyAI (browser audio converted to 16 kHz PCM16 on the way).
+        # Turns run as their own tasks so STT keeps listening while Nick is talking.
+        async for stt_event in pipeline.listen(pcm, session_id):
             transcript = stt_event.get("text") or stt_event.get("transcript")
-            if transcript and stt_event.get("message_type") == "FinalTranscript":
-                # 3. Stream transcript to Gemini
-                async for gemini_chunk in gemini_stream(transcript):
-                    await websocket.send_json({"type": "gemini", "text": gemini_chunk})
-                    # 4. Stream Gemini chunk to Murf and send audio back
-                    async for audio_chunk in murf_stream(gemini_chunk):
-                        await websocket.send_bytes(audio_chunk)
+            if not transcript:
+                continue
+            if stt_event.get("message_type") == "FinalTranscript":
+                # 3. Stream Gemini into Murf, 4. send audio back as it arrives
+                final_at = time.perf_counter()
+                ended = speech_end["vad"] or speech_end["partial"] or final_at
+                speech_end["vad"] = speech_end["partial"] = None
+                trace = TurnTrace("ws", session_id, started=ended)
+                trace.mark("stt", ended, final_at)
+                await barge_in()
+                llm = await speculator.on_final(transcript) if speculator else None
+                if speculator:
+                    trace.tags["speculation"] = "hit" if llm is not None else "miss"
+                await connect_task
+                await turns.start(run_turn(websocket, transcript, tts, options["output_format"], session_id, llm, trace, flow))
+            else:
+                speech_end["partial"] = time.perf_counter()
+                if turns.busy:
+                    # The user is speaking over the reply: cut it off on the first recognized words
+                    await barge_in()
+                if speculator:
+                    speculator.on_partial(transcript)
+        await turns.wait()
+    except UpstreamBusy as e:
+        await send_busy(websocket, options["output_format"], e)
     except Exception as e:
         await websocket.send_json({"type": "error", "error": str(e)})
     finally:
-        await websocket.close()
+        for task in (receiver, drainer):
+            if task is not None:
+                task.cancel()
+        drain.sessions -= 1
+        log.info("session closed", extra={"fields": {
+            "session_id": session_id, "vad": vad.stats(), "speculation": speculator.stats() if speculator else None,
+            "flow": flow.stats(),
+        }})
+        flow_monitor.close(session_id)
+        if speculator:
+            await speculator.close()
+        await turns.close()
+        if not resumable:
+            await session_store.delete(session_id)
+        # A dial still in flight (the client left before its first final) would hand the session
+        # its socket after close() found none to release
+        if connect_task is not None:
+            connect_task.cancel()
+            await asyncio.gather(connect_task, return_exceptions=True)
+        await tts.close()
+        await websocket.close(close_code)
@@ -0,0 +1,91 @@
+import asyncio
+import os
+import time
+from services import connections, lazy
+from services.connections import ASSEMBLY_API_BASE, GEMINI_API_BASE, http_client, murf_pool
+from services.telemetry import get_logger
+from services.tls import ssl_context
+from services.tts_cache import tts_cache
+
+# Startup warmup. It runs as a background task, so the app takes traffic as soon as it has been
+# imported instead of after every upstream is reachable:
+#   tls      - the shared TLS context (CA bundle) in a worker thread, then the upstream HTTP clients
+#   imports  - modules marked preload in services.lazy (NumPy), also in a worker thread
+#   connect  - one keep-alive connection each to Gemini and AssemblyAI (a HEAD request, off with
+#              WARMUP_PRECONNECT=0) and the warm Murf sockets
+#   tts      - the fallback phrases, synthesized into the TTS cache
+# A request that gets somewhere before its phase is done does that piece of work itself.
+
+WARMUP_PRECONNECT = os.getenv("WARMUP_PRECONNECT", "1") != "0"
+
+log = get_logger("warmup")
+
+
+class Warmup:
+    def __init__(self):
+        self.started = None
+        self.finished = None
+        self.phases = {}
+        self.errors = {}
+        self._task = None
+
+    @property
+    def ready(self) -> bool:
+        return self.finished is not None
+
+    def start(self, tts_jobs: list = ()):
+        self.started = time.perf_counter()
+        self._task = asyncio.create_task(self._run(list(tts_jobs)))
+
+    async def _phase(self, name: str, work):
+        started = time.perf_counter()
+        try:
+            await work
+        except Exception as e:
+            self.errors[name] = str(e) or type(e).__name__
+            log.warning("warmup %s failed: %s", name, e)
+        self.phases[name] = round(time.perf_counter() - started, 4)
+
+    async def _tls(self):
+        await asyncio.to_thread(ssl_context)
+        await connections.startup(warm_murf=False)
+        murf_pool.start()
+
+    async def _connect(self):
+        upstreams = [("gemini", GEMINI_API_BASE), ("assemblyai", ASSEMBLY_API_BASE)] if WARMUP_PRECONNECT else []
+        results = await asyncio.gather(
+            murf_pool.warm(), *(http_client(name).head(base) for name, base in upstreams), return_exceptions=True
+        )
+        failed = [r for r in results if isinstance(r, Exception)]
+        if failed:
+            raise failed[0]
+
+    async def _run(self, tts_jobs: list):
+        await self._phase("tls", self._tls())
+        await asyncio.gather(
+            self._phase("imports", asyncio.to_thread(lazy.warm)),
+            self._phase("connect", self._connect()),
+            self._phase("tts", tts_cache.prewarm(tts_jobs)),
+        )
+        self.finished = time.perf_counter()
+        log.info("warmup done", extra={"fields": {
+            "seconds": round(self.finished - self.started, 3), "phases": self.phases, "errors": self.errors,
+        }})
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    def stats(self) -> dict:
+        end = self.finished or time.perf_counter()
+        return {
+            "ready": self.ready,
+            "warmup_seconds": round(end - self.started, 3) if self.started else None,
+            "phases": self.phases,
+            "errors": self.errors,
+            "lazy_modules": lazy.stats(),
+        }
+
+
+warmup = Warmup()
@@ -109,23 +109,27 @@ window.addEventListener('DOMContentLoaded', () => {
 });
 // --- Streaming Voice Agent ---
 let wsVoice = null;
-let audioStreamContext = null;
-let audioStreamSource = null;
-let audioStreamQueue = [];
-let audioStreamPlaying = false;
+let audioStreamPlayer = null;
 
 async function startStreamingVoiceAgent() {
   // Send API keys as first message after connect
  const wsProtocol = location.protocol === 'https:' ? 'wss:' : 'ws:';
-wsVoice = new WebSocket(`${wsProtocol}//${location.host}/ws/voice`);
+// ?session= keeps the conversation if the socket is moved to another server worker
+wsVoice = new WebSocket(`${wsProtocol}//${location.host}/ws/voice?session=${sessionId}`);
   wsVoice.binaryType = "arraybuffer";
+  // Created on the click that started the call, so the browser lets it play
+  if (!audioStreamPlayer) {
+    audioStreamPlayer = new NickPlayer(STREAM_SAMPLE_RATE);
+  }
   wsVoice.onopen = () => {
     console.log("Voice WebSocket connected");
-    // Send keys as JSON
+    // Send keys and audio formats as JSON (24 kHz replies are plenty for speech)
     wsVoice.send(JSON.stringify({
       murfKey: localStorage.getItem('murfKey'),
       assemblyKey: localStorage.getItem('assemblyKey'),
-      geminiKey: localStorage.getItem('geminiKey')
+      geminiKey: localStorage.getItem('geminiKey'),
+      input_format: 'webm',
+      output_format: 'pcm16_24000'
     }));
     startStreamingRecording();
   };
@@ -135,6 +139,8 @@ wsVoice = new WebSocket(`${wsProtocol}//${location.host}/ws/voice`);
         const msg = JSON.parse(event.data);
         if (msg.type === "gemini" && msg.text) {
           appendMessage('bot', msg.text);
+        } else if (msg.type === "interrupt") {
+          interruptStreamedAudio();
         } else if (msg.type === "error") {
           appendMessage('error', msg.error);
         }
@@ -143,13 +149,21 @@ wsVoice = new WebSocket(`${wsProtocol}//${location.host}/ws/voice`);
       playStreamedAudioChunk(event.data);
     }
   };
-  wsVoice.onclose = () => {
+  wsVoice.onclose = (event) => {
     console.log("Voice WebSocket closed");
     stopStreamingRecording();
+    // 1012: the worker is restarting; reconnect and carry on with the same session
+    if (event.code === 1012 && streamingActive) {
+      setTimeout(startStreamingVoiceAgent, 250);
+    }
   };
 }
 
 function stopStreamingVoiceAgent() {
+  if (audioStreamPlayer) {
+    audioStreamPlayer.close();
+    audioStreamPlayer = null;
+  }
   if (wsVoice) {
     wsVoice.close();
     wsVoice = null;
@@ -180,18 +194,261 @@ function stopStreamingRecording() {
   }
 }
 
-function playStreamedAudioChunk(arrayBuffer) {
-  if (!audioStreamContext) {
-    audioStreamContext = new (window.AudioContext || window.webkitAudioContext)();
+// Replies arrive as raw 24 kHz PCM16 (output_format above), or as WAV fragments with the "wav"
+// output format. NickPlayer plays them through an AudioWorklet (static/playback-worklet.js): the
+// PCM goes straight into the worklet's ring buffer, with no per-chunk decoding on the main thread
+// and no gaps between chunks. The jitter-buffer depth adapts to how irregularly chunks arrive, and
+// playback metrics go back to the server as {"type": "playback", ...} messages. Browsers without
+// AudioWorklet fall back to scheduling one AudioBufferSource per chunk.
+const STREAM_SAMPLE_RATE = 24000;
+const JITTER_MIN_MS = 60;
+const JITTER_MAX_MS = 800;
+const JITTER_START_MS = 120;
+const REPLY_IDLE_MS = 1000;  // this long without audio ends a reply
+const PLAYBACK_REPORT_MS = 2000;
+
+class NickPlayer {
+  constructor(sampleRate) {
+    this.sampleRate = sampleRate;
+    this.context = new (window.AudioContext || window.webkitAudioContext)({ sampleRate });
+    this.node = null;
+    this.fallback = !this.context.audioWorklet;
+    if (!this.fallback) {
+      this.context.audioWorklet.addModule('/static/playback-worklet.js').then(() => this.connect()).catch((e) => {
+        console.warn('AudioWorklet playback unavailable, falling back to buffer sources', e);
+        this.fallback = true;
+        this.pending.forEach((pcm) => this.scheduleFallback(pcm));
+        this.pending = [];
+      });
+    }
+    this.format = null;  // parsed from the first WAV fragment: {rate, channels}
+    this.carry = null;  // odd trailing byte of the last chunk
+    this.pending = [];  // chunks received before the worklet was loaded
+    // Jitter estimate (RFC 3550 style): how far chunk arrivals stray from the audio they carry
+    this.jitter = 0;
+    this.targetMs = JITTER_START_MS;
+    this.replyStart = null;  // arrival time and audio time of the current reply's first chunk
+    this.replyAudio = 0;
+    this.lastArrival = 0;
+    this.lastTransit = 0;
+    this.firstChunkAt = null;
+    this.metrics = { turns: 0, first_sound_ms: null, underruns: 0, underrun_ms: 0, depth_ms: 0,
+                     target_ms: this.targetMs, jitter_ms: 0, overflow_ms: 0 };
+    this.reported = '';
+    this.reportTimer = setInterval(() => this.requestStats(), PLAYBACK_REPORT_MS);
+    // Fallback path
+    this.playhead = 0;
+    this.sources = [];
+  }
+
+  connect() {
+    this.node = new AudioWorkletNode(this.context, 'nick-playback', {
+      numberOfInputs: 0,
+      outputChannelCount: [1],
+      processorOptions: {
+        target: this.frames(this.targetMs),
+        idle: this.frames(REPLY_IDLE_MS),
+        capacity: this.sampleRate * 30,
+      },
+    });
+    this.node.port.onmessage = (event) => this.onWorkletMessage(event.data);
+    this.node.connect(this.context.destination);
+    this.pending.forEach((pcm) => this.post(pcm));
+    this.pending = [];
+  }
+
+  frames(ms) {
+    return Math.round(ms * this.sampleRate / 1000);
+  }
+
+  // One binary message from the socket
+  push(arrayBuffer) {
+    if (this.context.state === 'suspended') this.context.resume();
+    let bytes = new Uint8Array(arrayBuffer);
+    if (bytes.length >= 12 && bytes[0] === 0x52 && bytes[1] === 0x49 && bytes[2] === 0x46 && bytes[3] === 0x46) {
+      bytes = this.stripWavHeader(bytes);
+    }
+    if (this.carry !== null) {
+      const joined = new Uint8Array(bytes.length + 1);
+      joined[0] = this.carry;
+      joined.set(bytes, 1);
+      bytes = joined;
+      this.carry = null;
+    }
+    if (bytes.length & 1) {
+      this.carry = bytes[bytes.length - 1];
+      bytes = bytes.subarray(0, bytes.length - 1);
+    }
+    if (!bytes.length) return;
+    let pcm = new Int16Array(bytes.buffer.slice(bytes.byteOffset, bytes.byteOffset + bytes.length));
+    const rate = this.format ? this.format.rate : this.sampleRate;
+    if (this.format && this.format.channels > 1) pcm = downmix(pcm, this.format.channels);
+    if (rate !== this.sampleRate) pcm = resample(pcm, rate, this.sampleRate);
+    this.measureArrival(pcm.length / this.sampleRate);
+    if (this.node) {
+      this.post(pcm);
+    } else if (this.fallback) {
+      this.scheduleFallback(pcm);
+    } else {
+      this.pending.push(pcm);
+    }
+  }
+
+  // Murf WAV fragments: the format comes from the first header, every later header is skipped
+  stripWavHeader(bytes) {
+    const view = new DataView(bytes.buffer, bytes.byteOffset, bytes.byteLength);
+    let offset = 12;
+    while (offset + 8 <= bytes.length) {
+      const id = String.fromCharCode(bytes[offset], bytes[offset + 1], bytes[offset + 2], bytes[offset + 3]);
+      const size = view.getUint32(offset + 4, true);
+      if (id === 'fmt ' && !this.format) {
+        this.format = { channels: view.getUint16(offset + 10, true), rate: view.getUint32(offset + 12, true) };
+      }
+      if (id === 'data') return bytes.subarray(offset + 8);
+      offset += 8 + size + (size & 1);
+    }
+    return bytes.subarray(bytes.length);
+  }
+
+  post(pcm) {
+    this.node.port.postMessage({ type: 'pcm', pcm: pcm.buffer }, [pcm.buffer]);
+  }
+
+  // Adapts the jitter buffer: the target covers four times the smoothed arrival jitter
+  measureArrival(seconds) {
+    const now = performance.now();
+    if (this.replyStart === null || now - this.lastArrival > REPLY_IDLE_MS) {
+      this.replyStart = now;
+      this.replyAudio = 0;
+      this.lastTransit = 0;
+      this.firstChunkAt = now;
+    } else {
+      // Positive when a chunk is later than the audio already received would play out
+      const lateness = (now - this.replyStart) - this.replyAudio * 1000;
+      const transit = Math.max(0, lateness);
+      this.jitter += (Math.abs(transit - this.lastTransit) - this.jitter) / 16;
+      this.lastTransit = transit;
+    }
+    this.replyAudio += seconds;
+    this.lastArrival = now;
+    const target = Math.min(JITTER_MAX_MS, Math.max(JITTER_MIN_MS, JITTER_START_MS / 2 + 4 * this.jitter));
+    // Grow at once, shrink slowly
+    this.setTarget(target > this.targetMs ? target : this.targetMs + (target - this.targetMs) / 8);
+  }
+
+  setTarget(ms) {
+    this.targetMs = ms;
+    this.metrics.target_ms = Math.round(ms);
+    if (this.node) this.node.port.postMessage({ type: 'target', frames: this.frames(ms) });
+  }
+
+  onWorkletMessage(msg) {
+    const ms = (frames) => Math.round(frames * 1000 / this.sampleRate);
+    if (msg.underruns > this.metrics.underruns) {
+      // Ran dry mid-reply: buffer more from now on
+      this.setTarget(Math.min(JITTER_MAX_MS, this.targetMs * 1.5));
+    }
+    Object.assign(this.metrics, {
+      underruns: msg.underruns,
+      underrun_ms: ms(msg.underrunFrames),
+      overflow_ms: ms(msg.overflowFrames),
+      depth_ms: ms(msg.depth),
+      jitter_ms: Math.round(this.jitter),
+    });
+    if (msg.type === 'started' && this.firstChunkAt !== null) {
+      // First reply chunk in -> audible: jitter buffer plus the output device's latency
+      const outputMs = ((this.context.outputLatency || 0) + (this.context.baseLatency || 0)) * 1000;
+      this.metrics.first_sound_ms = Math.round(performance.now() - this.firstChunkAt + outputMs);
+      this.metrics.turns += 1;
+      this.firstChunkAt = null;
+      this.report();
+    }
+  }
+
+  requestStats() {
+    if (this.node) {
+      this.node.port.postMessage({ type: 'stats' });
+    }
+    this.report();
+  }
+
+  report() {
+    const body = JSON.stringify({ type: 'playback', ...this.metrics });
+    if (body !== this.reported && wsVoice && wsVoice.readyState === 1) {
+      wsVoice.send(body);
+      this.reported = body;
+    }
+  }
+
+  // Barge-in: drop everything still queued for playback
+  clear() {
+    this.carry = null;
+    this.replyStart = null;
+    this.firstChunkAt = null;
+    this.pending = [];
+    if (this.node) this.node.port.postMessage({ type: 'clear' });
+    this.sources.forEach((source) => {
+      try { source.stop(); } catch (e) {}
+    });
+    this.sources = [];
+    this.playhead = 0;
+  }
+
+  close() {
+    clearInterval(this.reportTimer);
+    this.report();
+    this.context.close();
   }
-  audioStreamContext.decodeAudioData(arrayBuffer.slice(0), (audioBuffer) => {
-    const source = audioStreamContext.createBufferSource();
+
+  scheduleFallback(pcm) {
+    const audioBuffer = this.context.createBuffer(1, pcm.length, this.sampleRate);
+    const channel = audioBuffer.getChannelData(0);
+    for (let i = 0; i < pcm.length; i++) channel[i] = pcm[i] / 32768;
+    const source = this.context.createBufferSource();
     source.buffer = audioBuffer;
-    source.connect(audioStreamContext.destination);
-    source.start();
-  }, (err) => {
-    console.error("Audio decode error", err);
-  });
+    source.connect(this.context.destination);
+    const startAt = Math.max(this.context.currentTime, this.playhead);
+    source.start(startAt);
+    this.playhead = startAt + audioBuffer.duration;
+    this.sources.push(source);
+    source.onended = () => {
+      this.sources = this.sources.filter((s) => s !== source);
+    };
+  }
+}
+
+function downmix(pcm, channels) {
+  const mono = new Int16Array(Math.floor(pcm.length / channels));
+  for (let i = 0; i < mono.length; i++) {
+    let sum = 0;
+    for (let c = 0; c < channels; c++) sum += pcm[i * channels + c];
+    mono[i] = sum / channels;
+  }
+  return mono;
+}
+
+function resample(pcm, from, to) {
+  // Linear interpolation; only used when a WAV fragment's rate differs from the context's
+  const out = new Int16Array(Math.floor(pcm.length * to / from));
+  const step = from / to;
+  for (let i = 0; i < out.length; i++) {
+    const pos = i * step;
+    const j = Math.floor(pos);
+    const next = j + 1 < pcm.length ? pcm[j + 1] : pcm[j];
+    out[i] = pcm[j] + (next - pcm[j]) * (pos - j);
+  }
+  return out;
+}
+
+function playStreamedAudioChunk(arrayBuffer) {
+  if (!audioStreamPlayer) {
+    audioStreamPlayer = new NickPlayer(STREAM_SAMPLE_RATE);
+  }
+  audioStreamPlayer.push(arrayBuffer);
+}
+
+function interruptStreamedAudio() {
+  if (audioStreamPlayer) audioStreamPlayer.clear();
 }
 
 // --- UI Hook Example ---
@@ -330,13 +587,15 @@ async function sendToBackend(audioBlob) {
   formData.append("file", audioBlob, "recording.wav");
 
   try {
+    // Ask for binary frames: raw WAV audio instead of base64 inside JSON
     const response = await fetch(`/process-audio/${sessionId}`, {
       method: "POST",
       body: formData,
+      headers: { "Accept": `${NICK_FRAMES_TYPE}, application/json;q=0.5` },
     });
 
     if (!response.ok) throw new Error("Transcription failed.");
-    const data = await response.json();
+    const data = await readProcessAudioResponse(response);
 
 
     // Remove the placeholder
@@ -356,8 +615,9 @@ async function sendToBackend(audioBlob) {
       appendMessage('error', 'No transcript received.');
     }
 
-    // Play TTS audio from base64, then show Nick's response
-    if (data.audio_base64 && typeof data.audio_base64 === 'string' && data.audio_base64.trim() !== "" && data.gemini) {
+    // Play TTS audio (framed WAV blob or legacy base64), then show Nick's response
+    const hasAudio = data.audio_url || (data.audio_base64 && typeof data.audio_base64 === 'string' && data.audio_base64.trim() !== "");
+    if (hasAudio && data.gemini) {
       let audioPlayer = document.getElementById("tts-audio");
       if (!audioPlayer) {
         audioPlayer = document.createElement("audio");
@@ -366,10 +626,11 @@ async function sendToBackend(audioBlob) {
         document.querySelector(".container").appendChild(audioPlayer);
       }
       // Always use WAV for Murf TTS
-      const audioSrc = `data:audio/wav;base64,${data.audio_base64}`;
+      const audioSrc = data.audio_url || `data:audio/wav;base64,${data.audio_base64}`;
       audioPlayer.src = audioSrc;
       audioPlayer.load();
       audioPlayer.onended = async () => {
+        if (data.audio_url) URL.revokeObjectURL(data.audio_url);
         appendMessage('bot', data.gemini);
         if (isRecording) {
           await startRecording();
@@ -383,7 +644,7 @@ async function sendToBackend(audioBlob) {
     } else if (data.gemini) {
       // If no audio or TTS failed, show Nick's response and a warning
       appendMessage('bot', data.gemini);
-      if (!data.audio_base64 || data.audio_base64.trim() === "") {
+      if (!hasAudio) {
         appendMessage('error', 'TTS failed or no audio generated.');
       }
       if (isRecording) {
@@ -403,6 +664,59 @@ async function sendToBackend(audioBlob) {
 
 }
 
+// --- Binary frames (application/x-nick-frames) ---
+// Each frame: 1 byte type, 4 byte big-endian length, payload.
+// Type 1 = JSON {event, data}, type 2 = raw WAV audio bytes, type 3 = filler audio played while a
+// slow reply is on its way (only useful when playing as it streams, so skipped here).
+const NICK_FRAMES_TYPE = "application/x-nick-frames";
+const FRAME_META = 1;
+const FRAME_AUDIO = 2;
+
+async function readNickFrames(response, onFrame) {
+  const reader = response.body.getReader();
+  let buffer = new Uint8Array(0);
+  for (;;) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    const merged = new Uint8Array(buffer.length + value.length);
+    merged.set(buffer);
+    merged.set(value, buffer.length);
+    buffer = merged;
+    let offset = 0;
+    while (buffer.length - offset >= 5) {
+      const view = new DataView(buffer.buffer, buffer.byteOffset + offset, 5);
+      const kind = view.getUint8(0);
+      const length = view.getUint32(1);
+      if (buffer.length - offset - 5 < length) break;
+      onFrame(kind, buffer.subarray(offset + 5, offset + 5 + length));
+      offset += 5 + length;
+    }
+    buffer = buffer.slice(offset);
+  }
+}
+
+async function readProcessAudioResponse(response) {
+  const type = response.headers.get("content-type") || "";
+  if (!type.startsWith(NICK_FRAMES_TYPE)) {
+    return response.json();
+  }
+  let data = null;
+  const audioParts = [];
+  const decoder = new TextDecoder();
+  await readNickFrames(response, (kind, payload) => {
+    if (kind === FRAME_META) {
+      const msg = JSON.parse(decoder.decode(payload));
+      if (msg.event === "meta") data = msg.data;
+    } else if (kind === FRAME_AUDIO) {
+      audioParts.push(payload.slice());
+    }
+  });
+  if (data && audioParts.length) {
+    data.audio_url = URL.createObjectURL(new Blob(audioParts, { type: "audio/wav" }));
+  }
+  return data;
+}
+
 function appendMessage(role, text) {
   const msg = document.createElement("div");
   msg.className = `message ${role}`;
@@ -0,0 +1,117 @@
+// Streaming playback for /ws/voice replies (see NickPlayer in main.js). PCM arrives from the main
+// thread as Int16 ArrayBuffers at the context's sample rate and is written straight into a ring
+// buffer; the audio thread reads it out 128 frames at a time.
+// Jitter buffer: after a gap, playback holds back `target` frames' worth of time, so chunks that
+// arrive up to that late don't cut the audio. Audio sent ahead of real time (the server paces with
+// a lead) starts at once when it already covers the target beyond one chunk. The main thread sets
+// the target from measured arrival jitter.
+// Running dry mid-reply is an underrun (the gap is counted once the next chunk shows up); running
+// dry for longer than `idle` frames is the end of the reply.
+
+class NickPlaybackProcessor extends AudioWorkletProcessor {
+  constructor(options) {
+    super();
+    const opts = options.processorOptions || {};
+    this.ring = new Float32Array(opts.capacity || sampleRate * 20);
+    this.read = 0;
+    this.write = 0;
+    this.size = 0;
+    this.target = opts.target || Math.round(sampleRate * 0.12);
+    this.idle = opts.idle || sampleRate;
+    this.state = 'idle'; // idle (between replies) | buffering | playing | starved
+    this.starvedAt = 0;
+    this.bufferingSince = 0;
+    this.chunkMax = 0;
+    this.fresh = false; // buffering the start of a reply, not refilling after an underrun
+    this.underruns = 0;
+    this.underrunFrames = 0;
+    this.overflowFrames = 0;
+    this.port.onmessage = (event) => this.onMessage(event.data);
+  }
+
+  onMessage(msg) {
+    if (msg.type === 'pcm') {
+      this.push(new Int16Array(msg.pcm));
+    } else if (msg.type === 'target') {
+      this.target = msg.frames;
+    } else if (msg.type === 'clear') {
+      this.read = this.write = this.size = 0;
+      this.state = 'idle';
+    } else if (msg.type === 'stats') {
+      this.report();
+    }
+  }
+
+  push(samples) {
+    if (this.state === 'starved') {
+      const gap = currentFrame - this.starvedAt;
+      if (gap < this.idle) {
+        this.underruns += 1;
+        this.underrunFrames += gap;
+        this.state = 'buffering';
+        this.bufferingSince = currentFrame;
+      } else {
+        this.state = 'idle';
+      }
+    }
+    if (this.state === 'idle') {
+      this.state = 'buffering';
+      this.bufferingSince = currentFrame;
+      this.fresh = true;
+    }
+    this.chunkMax = Math.max(this.chunkMax, samples.length);
+    const capacity = this.ring.length;
+    for (let i = 0; i < samples.length; i++) {
+      this.ring[this.write] = samples[i] / 32768;
+      this.write = (this.write + 1) % capacity;
+    }
+    this.size += samples.length;
+    if (this.size > capacity) {
+      // Overran the ring: the oldest audio was overwritten
+      this.overflowFrames += this.size - capacity;
+      this.read = this.write;
+      this.size = capacity;
+    }
+  }
+
+  report(started) {
+    this.port.postMessage({
+      type: started ? 'started' : 'stats',
+      depth: this.size,
+      target: this.target,
+      underruns: this.underruns,
+      underrunFrames: this.underrunFrames,
+      overflowFrames: this.overflowFrames,
+    });
+  }
+
+  process(inputs, outputs) {
+    const out = outputs[0][0];
+    if (this.state === 'buffering' && this.size > 0 && (currentFrame - this.bufferingSince >= this.target
+        || this.size >= this.target + this.chunkMax)) {
+      // A reply (or the rest of one, after an underrun) starts playing
+      if (this.fresh) this.report(true);
+      this.fresh = false;
+      this.state = 'playing';
+    }
+    let n = 0;
+    if (this.state === 'playing') {
+      const capacity = this.ring.length;
+      n = Math.min(out.length, this.size);
+      for (let i = 0; i < n; i++) {
+        out[i] = this.ring[this.read];
+        this.read = (this.read + 1) % capacity;
+      }
+      this.size -= n;
+      if (this.size === 0) {
+        this.state = 'starved';
+        this.starvedAt = currentFrame + n;
+      }
+    }
+    out.fill(0, n);
+    for (let c = 1; c < outputs[0].length; c++) outputs[0][c].set(out);
+    return true;
+  }
+}
+
+registerProcessor('nick-playback', NickPlaybackProcessor);